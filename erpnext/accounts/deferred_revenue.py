@@ -4,7 +4,10 @@ import frappe
 from frappe import _
 from frappe.utils import date_diff, add_months, today, getdate, add_days, flt, get_last_day
 from erpnext.accounts.utils import get_account_currency
+from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import get_accounting_dimensions
 from frappe.email import sendmail_to_system_managers
+from collections import OrderedDict
+from six import iteritems
 
 def validate_service_stop_date(doc):
 	''' Validates service_stop_date for Purchase Invoice and Sales Invoice '''
@@ -39,17 +42,7 @@ def convert_deferred_expense_to_expense(start_date=None, end_date=None):
 	if not end_date:
 		end_date = add_days(today(), -1)
 
-	# check for the purchase invoice for which GL entries has to be done
-	invoices = frappe.db.sql_list('''
-		select distinct parent from `tabPurchase Invoice Item`
-		where service_start_date<=%s and service_end_date>=%s
-		and enable_deferred_expense = 1 and docstatus = 1 and ifnull(amount, 0) > 0
-	''', (end_date, start_date))
-
-	# For each invoice, book deferred expense
-	for invoice in invoices:
-		doc = frappe.get_doc("Purchase Invoice", invoice)
-		book_deferred_income_or_expense(doc, end_date)
+	book_deferred_entries("Purchase Invoice", start_date, end_date)
 
 def convert_deferred_revenue_to_income(start_date=None, end_date=None):
 	# book the expense/income on the last day, but it will be trigger on the 1st of month at 12:00 AM
@@ -58,158 +51,239 @@ def convert_deferred_revenue_to_income(start_date=None, end_date=None):
 	if not end_date:
 		end_date = add_days(today(), -1)
 
-	# check for the sales invoice for which GL entries has to be done
-	invoices = frappe.db.sql_list('''
-		select distinct parent from `tabSales Invoice Item`
-		where service_start_date<=%s and service_end_date>=%s
-		and enable_deferred_revenue = 1 and docstatus = 1 and ifnull(amount, 0) > 0
-	''', (end_date, start_date))
-
-	for invoice in invoices:
-		doc = frappe.get_doc("Sales Invoice", invoice)
-		book_deferred_income_or_expense(doc, end_date)
-
-def get_booking_dates(doc, item, posting_date=None):
-	if not posting_date:
-		posting_date = add_days(today(), -1)
-
-	last_gl_entry = False
-
-	deferred_account = "deferred_revenue_account" if doc.doctype=="Sales Invoice" else "deferred_expense_account"
-
-	prev_gl_entry = frappe.db.sql('''
-		select name, posting_date from `tabGL Entry` where company=%s and account=%s and
-		voucher_type=%s and voucher_no=%s and voucher_detail_no=%s
-		order by posting_date desc limit 1
-	''', (doc.company, item.get(deferred_account), doc.doctype, doc.name, item.name), as_dict=True)
-
-	if prev_gl_entry:
-		start_date = getdate(add_days(prev_gl_entry[0].posting_date, 1))
-	else:
-		start_date = item.service_start_date
-
-	end_date = get_last_day(start_date)
-	if end_date >= item.service_end_date:
-		end_date = item.service_end_date
-		last_gl_entry = True
-	elif item.service_stop_date and end_date >= item.service_stop_date:
-		end_date = item.service_stop_date
-		last_gl_entry = True
-
-	if end_date > getdate(posting_date):
-		end_date = posting_date
-
-	if getdate(start_date) <= getdate(end_date):
-		return start_date, end_date, last_gl_entry
-	else:
-		return None, None, None
-
-def calculate_amount(doc, item, last_gl_entry, total_days, total_booking_days, account_currency):
-	if doc.doctype == "Sales Invoice":
-		total_credit_debit, total_credit_debit_currency = "debit", "debit_in_account_currency"
-		deferred_account = "deferred_revenue_account"
-	else:
-		total_credit_debit, total_credit_debit_currency = "credit", "credit_in_account_currency"
-		deferred_account = "deferred_expense_account"
-
-	amount, base_amount = 0, 0
-	if not last_gl_entry:
-		base_amount = flt(item.base_net_amount*total_booking_days/flt(total_days), item.precision("base_net_amount"))
-		if account_currency==doc.company_currency:
-			amount = base_amount
-		else:
-			amount = flt(item.net_amount*total_booking_days/flt(total_days), item.precision("net_amount"))
-	else:
-		gl_entries_details = frappe.db.sql('''
-			select sum({0}) as total_credit, sum({1}) as total_credit_in_account_currency, voucher_detail_no
-			from `tabGL Entry` where company=%s and account=%s and voucher_type=%s and voucher_no=%s and voucher_detail_no=%s
-			group by voucher_detail_no
-		'''.format(total_credit_debit, total_credit_debit_currency),
-			(doc.company, item.get(deferred_account), doc.doctype, doc.name, item.name), as_dict=True)
-		already_booked_amount = gl_entries_details[0].total_credit if gl_entries_details else 0
-		base_amount = flt(item.base_net_amount - already_booked_amount, item.precision("base_net_amount"))
-		if account_currency==doc.company_currency:
-			amount = base_amount
-		else:
-			already_booked_amount_in_account_currency = gl_entries_details[0].total_credit_in_account_currency if gl_entries_details else 0
-			amount = flt(item.net_amount - already_booked_amount_in_account_currency, item.precision("net_amount"))
-
-	return amount, base_amount
+	book_deferred_entries("Sales Invoice", start_date, end_date)
 
 def book_deferred_income_or_expense(doc, posting_date=None):
-	enable_check = "enable_deferred_revenue" \
-		if doc.doctype=="Sales Invoice" else "enable_deferred_expense"
-
-	def _book_deferred_revenue_or_expense(item):
-		start_date, end_date, last_gl_entry = get_booking_dates(doc, item, posting_date=posting_date)
-		if not (start_date and end_date): return
-
-		account_currency = get_account_currency(item.expense_account)
-		if doc.doctype == "Sales Invoice":
-			against, project = doc.customer, doc.project
-			credit_account, debit_account = item.income_account, item.deferred_revenue_account
-		else:
-			against, project = doc.supplier, item.project
-			credit_account, debit_account = item.deferred_expense_account, item.expense_account
-
-		total_days = date_diff(item.service_end_date, item.service_start_date) + 1
-		total_booking_days = date_diff(end_date, start_date) + 1
+	book_deferred_entries(doc.doctype, None, posting_date or add_days(today(), -1), invoices=[doc.name])
 
-		amount, base_amount = calculate_amount(doc, item, last_gl_entry,
-			total_days, total_booking_days, account_currency)
+def book_deferred_entries(doctype, start_date, end_date, invoices=None, chunk_size=100):
+	"""
+		Book the deferred income or expense of the invoice items in service between the dates,
+		up to `end_date`, a chunk of invoices at a time.
 
-		make_gl_entries(doc, credit_account, debit_account, against,
-			amount, base_amount, end_date, project, account_currency, item.cost_center, item.name)
+		The items of each chunk are read with the periods booked for them from the GL entries,
+		and each chunk is committed, so a run that stopped midway only books the periods left
+		when it is run again.
+	"""
+	invoices = get_deferred_invoices(doctype, start_date, end_date, invoices)
 
-		if getdate(end_date) < getdate(posting_date) and not last_gl_entry:
-			_book_deferred_revenue_or_expense(item)
-
-
-	for item in doc.get('items'):
-		if item.get(enable_check):
-			_book_deferred_revenue_or_expense(item)
+	for i in range(0, len(invoices), chunk_size):
+		items_by_invoice = get_deferred_items(doctype, start_date, end_date, invoices[i:i + chunk_size])
+		try:
+			make_deferred_gl_entries(doctype, items_by_invoice, end_date)
+			frappe.db.commit()
+		except Exception:
+			frappe.db.rollback()
 
-def make_gl_entries(doc, credit_account, debit_account, against,
-	amount, base_amount, posting_date, project, account_currency, cost_center, voucher_detail_no):
+			# book the invoices of the chunk one by one, to leave out only the ones with errors
+			for invoice, items in iteritems(items_by_invoice):
+				try:
+					make_deferred_gl_entries(doctype, {invoice: items}, end_date)
+					frappe.db.commit()
+				except Exception:
+					frappe.db.rollback()
+					title = _("Error while processing deferred accounting for {0}").format(invoice)
+					traceback = frappe.get_traceback()
+					frappe.log_error(message=traceback , title=title)
+					sendmail_to_system_managers(title, traceback)
+
+def get_deferred_conditions(doctype, start_date, invoices=None):
+	enable_check = "enable_deferred_revenue" if doctype == "Sales Invoice" else "enable_deferred_expense"
+
+	conditions = """item.parent = inv.name and inv.docstatus = 1
+		and item.service_start_date <= %(end_date)s
+		and item.{0} = 1 and ifnull(item.amount, 0) > 0""".format(enable_check)
+	if start_date:
+		conditions += " and item.service_end_date >= %(start_date)s"
+	if invoices:
+		conditions += " and inv.name in %(invoices)s"
+
+	return conditions
+
+def get_deferred_invoices(doctype, start_date, end_date, invoices=None):
+	"""Returns the names of the invoices with deferred items in service between the dates"""
+	return frappe.db.sql_list("""
+		select distinct inv.name
+		from `tab{doctype} Item` item, `tab{doctype}` inv
+		where {conditions}
+		order by inv.name""".format(doctype=doctype, #nosec
+			conditions=get_deferred_conditions(doctype, start_date, invoices)), {
+			"start_date": start_date,
+			"end_date": end_date,
+			"invoices": invoices
+		})
+
+def get_deferred_items(doctype, start_date, end_date, invoices=None):
+	"""Returns the deferred items in service between the dates, with what is booked for them, by invoice"""
+	if doctype == "Sales Invoice":
+		deferred_account, dr_or_cr = "deferred_revenue_account", "debit"
+		party_field, project_field = "inv.customer", "inv.project"
+	else:
+		deferred_account, dr_or_cr = "deferred_expense_account", "credit"
+		party_field, project_field = "inv.supplier", "item.project"
+
+	dimensions = get_accounting_dimensions()
+	dimension_fields = "".join([", inv.{0}".format(d) for d in dimensions])
+
+	items = frappe.db.sql("""
+		select
+			item.name, item.parent, item.cost_center, item.expense_account, item.income_account,
+			item.{deferred_account} as deferred_account, item.service_start_date, item.service_end_date,
+			item.service_stop_date, item.net_amount, item.base_net_amount,
+			inv.company, inv.currency, inv.conversion_rate, inv.remarks, inv.is_opening,
+			{party_field} as party, {project_field} as project {dimension_fields}
+		from `tab{doctype} Item` item, `tab{doctype}` inv
+		where {conditions}
+		order by inv.name, item.idx""".format(doctype=doctype, deferred_account=deferred_account, #nosec
+			party_field=party_field, project_field=project_field, dimension_fields=dimension_fields,
+			conditions=get_deferred_conditions(doctype, start_date, invoices)), {
+			"start_date": start_date,
+			"end_date": end_date,
+			"invoices": invoices
+		}, as_dict=1)
+
+	items_by_invoice = OrderedDict()
+	for d in items:
+		items_by_invoice.setdefault(d.parent, []).append(d)
+
+	invoice_list = list(items_by_invoice)
+	for i in range(0, len(invoice_list), 500):
+		booked = {}
+		for d in frappe.db.sql("""
+			select voucher_detail_no, account, max(posting_date) as last_booked_date,
+				sum({0}) as booked_amount, sum({0}_in_account_currency) as booked_amount_in_account_currency
+			from `tabGL Entry`
+			where voucher_type = %s and voucher_no in %s and ifnull(voucher_detail_no, '') != ''
+			group by voucher_detail_no, account""".format(dr_or_cr), #nosec
+			(doctype, invoice_list[i:i + 500]), as_dict=1):
+			booked[(d.voucher_detail_no, d.account)] = d
+
+		for invoice in invoice_list[i:i + 500]:
+			for d in items_by_invoice[invoice]:
+				d.update(booked.get((d.name, d.deferred_account)) or {})
+
+	return items_by_invoice
+
+def get_booking_periods(item, posting_date):
+	"""Returns the start date, end date and last booking flag of the periods to book up to the posting date"""
+	periods = []
+
+	start_date = getdate(add_days(item.last_booked_date, 1)) if item.last_booked_date \
+		else getdate(item.service_start_date)
+
+	while True:
+		last_gl_entry = False
+		end_date = get_last_day(start_date)
+		if end_date >= getdate(item.service_end_date):
+			end_date = getdate(item.service_end_date)
+			last_gl_entry = True
+		elif item.service_stop_date and end_date >= getdate(item.service_stop_date):
+			end_date = getdate(item.service_stop_date)
+			last_gl_entry = True
+
+		if end_date > getdate(posting_date):
+			end_date = getdate(posting_date)
+
+		if start_date > end_date:
+			break
+
+		periods.append((start_date, end_date, last_gl_entry))
+
+		if last_gl_entry or end_date >= getdate(posting_date):
+			break
+
+		start_date = add_days(end_date, 1)
+
+	return periods
+
+def make_deferred_gl_entries(doctype, items_by_invoice, posting_date):
+	"""Post the deferred entries of the items, with the entries of each date posted together"""
+	from erpnext.accounts.general_ledger import make_gl_entries_in_bulk
+
+	precision = frappe.get_precision(doctype + " Item", "base_net_amount")
+	net_amount_precision = frappe.get_precision(doctype + " Item", "net_amount")
+	dimensions = get_accounting_dimensions()
+
+	gl_entries_by_date = OrderedDict()
+	for invoice, items in iteritems(items_by_invoice):
+		doc = frappe.get_doc({
+			"doctype": doctype,
+			"name": invoice,
+			"docstatus": 1,
+			"company": items[0].company,
+			"currency": items[0].currency,
+			"conversion_rate": items[0].conversion_rate,
+			"remarks": items[0].remarks,
+			"is_opening": items[0].is_opening,
+			"project": items[0].project
+		})
+		for dimension in dimensions:
+			doc.set(dimension, items[0].get(dimension))
+
+		for item in items:
+			account_currency = get_account_currency(item.expense_account)
+			if doctype == "Sales Invoice":
+				credit_account, debit_account = item.income_account, item.deferred_account
+			else:
+				credit_account, debit_account = item.deferred_account, item.expense_account
+
+			total_days = date_diff(item.service_end_date, item.service_start_date) + 1
+			booked_amount = flt(item.booked_amount)
+			booked_amount_in_account_currency = flt(item.booked_amount_in_account_currency)
+
+			for start_date, end_date, last_gl_entry in get_booking_periods(item, posting_date):
+				if not last_gl_entry:
+					total_booking_days = date_diff(end_date, start_date) + 1
+					base_amount = flt(item.base_net_amount * total_booking_days / flt(total_days), precision)
+					amount = flt(item.net_amount * total_booking_days / flt(total_days), net_amount_precision)
+				else:
+					base_amount = flt(item.base_net_amount - booked_amount, precision)
+					amount = flt(item.net_amount - booked_amount_in_account_currency, net_amount_precision)
+
+				if account_currency == doc.company_currency:
+					amount = base_amount
+
+				booked_amount += base_amount
+				booked_amount_in_account_currency += amount
+
+				if amount == 0:
+					continue
+
+				gl_entries_by_date.setdefault((doc.company, end_date), []).extend(
+					get_deferred_gl_entries(doc, item, credit_account, debit_account,
+						amount, base_amount, end_date, account_currency))
+
+	for gl_entries in gl_entries_by_date.values():
+		make_gl_entries_in_bulk(gl_entries, merge_entries=False)
+
+def get_deferred_gl_entries(doc, item, credit_account, debit_account, amount, base_amount,
+	posting_date, account_currency):
 	# GL Entry for crediting the amount in the deferred expense
-	from erpnext.accounts.general_ledger import make_gl_entries
-
-	if amount == 0: return
-
 	gl_entries = []
 	gl_entries.append(
 		doc.get_gl_dict({
 			"account": credit_account,
-			"against": against,
+			"against": item.party,
 			"credit": base_amount,
 			"credit_in_account_currency": amount,
-			"cost_center": cost_center,
-			"voucher_detail_no": voucher_detail_no,
+			"cost_center": item.cost_center,
+			"voucher_detail_no": item.name,
 			'posting_date': posting_date,
-			'project': project
+			'project': item.project
 		}, account_currency)
 	)
 	# GL Entry to debit the amount from the expense
 	gl_entries.append(
 		doc.get_gl_dict({
 			"account": debit_account,
-			"against": against,
+			"against": item.party,
 			"debit": base_amount,
 			"debit_in_account_currency": amount,
-			"cost_center": cost_center,
-			"voucher_detail_no": voucher_detail_no,
+			"cost_center": item.cost_center,
+			"voucher_detail_no": item.name,
 			'posting_date': posting_date,
-			'project': project
+			'project': item.project
 		}, account_currency)
 	)
 
-	if gl_entries:
-		try:
-			make_gl_entries(gl_entries, cancel=(doc.docstatus == 2), merge_entries=True)
-			frappe.db.commit()
-		except:
-			frappe.db.rollback()
-			title = _("Error while processing deferred accounting for {0}").format(doc.name)
-			traceback = frappe.get_traceback()
-			frappe.log_error(message=traceback , title=title)
-			sendmail_to_system_managers(title, traceback)
\ No newline at end of file
+	return gl_entries
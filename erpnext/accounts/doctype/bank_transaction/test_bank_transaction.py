@@ -8,7 +8,8 @@ import unittest
 from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
 from erpnext.accounts.doctype.purchase_invoice.test_purchase_invoice import make_purchase_invoice
 from erpnext.accounts.doctype.payment_entry.test_payment_entry import get_payment_entry
-from erpnext.accounts.page.bank_reconciliation.bank_reconciliation import reconcile, get_linked_payments
+from erpnext.accounts.page.bank_reconciliation.bank_reconciliation import reconcile, get_linked_payments, \
+	get_linked_payments_for_transactions
 
 test_dependencies = ["Item", "Cost Center"]
 
@@ -36,6 +37,14 @@ class TestBankTransaction(unittest.TestCase):
 		linked_payments = get_linked_payments(bank_transaction.name)
 		self.assertTrue(linked_payments[0].party == "Conrad Electronic")
 
+	# Check if ERPNext can match the payments of several bank transactions at once, within an amount tolerance
+	def test_linked_payments_for_transactions(self):
+		conrad = frappe.get_doc("Bank Transaction", dict(description="Re 95282925234 FE/000002917 AT171513000281183046 Conrad Electronic"))
+		herr_g = frappe.get_doc("Bank Transaction", dict(description="1512567 BG/000003025 OPSKATTUZWXXX AT776000000098709849 Herr G"))
+		linked_payments = get_linked_payments_for_transactions([conrad.name, herr_g.name], amount_tolerance=10)
+		self.assertEqual(linked_payments[conrad.name][0].party, "Conrad Electronic")
+		self.assertEqual(linked_payments[herr_g.name][0].paid_amount, 1700)
+
 	# This test validates a simple reconciliation leading to the clearance of the bank transaction and the payment
 	def test_reconcile(self):
 		bank_transaction = frappe.get_doc("Bank Transaction", dict(description="1512567 BG/000002918 OPSKATTUZWXXX AT776000000098709837 Herr G"))
@@ -10,6 +10,7 @@ from erpnext.accounts.utils import get_fiscal_year
 from erpnext.buying.doctype.purchase_order.test_purchase_order import create_purchase_order
 from erpnext.accounts.doctype.budget.budget import get_actual_expense, BudgetError
 from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.doctype.monthly_expense_summary.monthly_expense_summary import get_expense
 
 class TestBudget(unittest.TestCase):
 	def test_monthly_budget_crossed_ignore(self):
@@ -239,6 +240,20 @@ class TestBudget(unittest.TestCase):
 		budget.cancel()
 		jv.cancel()
 
+	def test_monthly_expense_summary(self):
+		args = ("_Test Company", "_Test Fiscal Year 2013", "_Test Account Cost for Goods Sold - _TC")
+		expense = get_expense(*args, cost_center="_Test Cost Center - _TC")
+		expense_till_january = get_expense(*args, month_end_date="2013-01-31", cost_center="_Test Cost Center - _TC")
+
+		jv = make_journal_entry("_Test Account Cost for Goods Sold - _TC",
+			"_Test Bank - _TC", 1000, "_Test Cost Center - _TC", posting_date="2013-02-28", submit=True)
+
+		self.assertEqual(get_expense(*args, cost_center="_Test Cost Center - _TC"), expense + 1000)
+		self.assertEqual(get_expense(*args, month_end_date="2013-01-31", cost_center="_Test Cost Center - _TC"),
+			expense_till_january)
+
+		jv.cancel()
+		self.assertEqual(get_expense(*args, cost_center="_Test Cost Center - _TC"), expense)
 
 def set_total_expense_zero(posting_date, budget_against_field=None, budget_against_CC=None):
 	if budget_against_field == "Project":
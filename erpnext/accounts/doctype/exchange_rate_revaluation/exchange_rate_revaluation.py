@@ -10,6 +10,7 @@ from frappe.model.document import Document
 from frappe.model.meta import get_field_precision
 from erpnext.setup.utils import get_exchange_rate
 from erpnext.accounts.doctype.journal_entry.journal_entry import get_balance_on
+import pandas as pd
 
 class ExchangeRateRevaluation(Document):
 	def validate(self):
@@ -28,31 +29,19 @@ class ExchangeRateRevaluation(Document):
 			frappe.throw(_("Please select Company and Posting Date to getting entries"))
 
 	def get_accounts_data(self, account=None):
-		accounts = []
 		self.validate_mandatory()
 		company_currency = erpnext.get_company_currency(self.company)
 		precision = get_field_precision(frappe.get_meta("Exchange Rate Revaluation Account")
 			.get_field("new_balance_in_base_currency"), company_currency)
 
 		account_details = self.get_accounts_from_gle()
-		for d in account_details:
-			current_exchange_rate = d.balance / d.balance_in_account_currency \
-				if d.balance_in_account_currency else 0
-			new_exchange_rate = get_exchange_rate(d.account_currency, company_currency, self.posting_date)
-			new_balance_in_base_currency = flt(d.balance_in_account_currency * new_exchange_rate)
-			gain_loss = flt(new_balance_in_base_currency, precision) - flt(d.balance, precision)
-			if gain_loss:
-				accounts.append({
-					"account": d.account,
-					"party_type": d.party_type,
-					"party": d.party,
-					"account_currency": d.account_currency,
-					"balance_in_base_currency": d.balance,
-					"balance_in_account_currency": d.balance_in_account_currency,
-					"current_exchange_rate": current_exchange_rate,
-					"new_exchange_rate": new_exchange_rate,
-					"new_balance_in_base_currency": new_balance_in_base_currency
-				})
+		if not account_details:
+			self.throw_invalid_response_message(account_details)
+			return []
+
+		exchange_rates = get_exchange_rates(set(d.account_currency for d in account_details),
+			company_currency, self.posting_date)
+		accounts = get_revaluation_rows(account_details, exchange_rates, precision)
 
 		if not accounts:
 			self.throw_invalid_response_message(account_details)
@@ -61,32 +50,28 @@ class ExchangeRateRevaluation(Document):
 
 	def get_accounts_from_gle(self):
 		company_currency = erpnext.get_company_currency(self.company)
-		accounts = frappe.db.sql_list("""
-			select name
-			from tabAccount
-			where is_group = 0
-				and report_type = 'Balance Sheet'
-				and root_type in ('Asset', 'Liability', 'Equity')
-				and account_type != 'Stock'
-				and company=%s
-				and account_currency != %s
-			order by name""",(self.company, company_currency))
-
-		account_details = []
-		if accounts:
-			account_details = frappe.db.sql("""
-				select
-					account, party_type, party, account_currency,
-					sum(debit_in_account_currency) - sum(credit_in_account_currency) as balance_in_account_currency,
-					sum(debit) - sum(credit) as balance
-				from `tabGL Entry`
-				where account in (%s)
-				group by account, party_type, party
-				having sum(debit) != sum(credit)
-				order by account
-			""" % ', '.join(['%s']*len(accounts)), tuple(accounts), as_dict=1)
-
-		return account_details
+		return frappe.db.sql("""
+			select
+				gle.account, gle.party_type, gle.party, acc.account_currency,
+				sum(gle.debit_in_account_currency) - sum(gle.credit_in_account_currency) as balance_in_account_currency,
+				sum(gle.debit) - sum(gle.credit) as balance
+			from `tabGL Entry` gle, `tabAccount` acc
+			where gle.account = acc.name
+				and acc.is_group = 0
+				and acc.report_type = 'Balance Sheet'
+				and acc.root_type in ('Asset', 'Liability', 'Equity')
+				and acc.account_type != 'Stock'
+				and acc.company = %(company)s
+				and acc.account_currency != %(company_currency)s
+				and gle.posting_date <= %(posting_date)s
+			group by gle.account, gle.party_type, gle.party
+			having sum(gle.debit) != sum(gle.credit)
+			order by gle.account
+		""", {
+			"company": self.company,
+			"company_currency": company_currency,
+			"posting_date": self.posting_date
+		}, as_dict=1)
 
 	def throw_invalid_response_message(self, account_details):
 		if account_details:
@@ -157,18 +142,60 @@ class ExchangeRateRevaluation(Document):
 		journal_entry.set_total_debit_credit()
 		return journal_entry.as_dict()
 
+def get_exchange_rates(currencies, company_currency, posting_date):
+	"""Returns the exchange rate of each currency on the posting date, fetched once per currency"""
+	return {currency: flt(get_exchange_rate(currency, company_currency, posting_date))
+		for currency in currencies}
+
+def get_revaluation_rows(account_details, exchange_rates, precision):
+	"""Returns the balances revalued at the exchange rates of their currencies,
+		leaving out the ones without gain or loss at the precision"""
+	# the rates are applied to all the balances at once
+	df = pd.DataFrame(account_details)
+	df["balance_in_base_currency"] = df["balance"].astype(float)
+	df["balance_in_account_currency"] = df["balance_in_account_currency"].astype(float)
+	df["current_exchange_rate"] = (df["balance_in_base_currency"]
+		/ df["balance_in_account_currency"].where(df["balance_in_account_currency"] != 0)).fillna(0)
+	df["new_exchange_rate"] = df["account_currency"].map(exchange_rates).astype(float)
+	df["new_balance_in_base_currency"] = df["balance_in_account_currency"] * df["new_exchange_rate"]
+
+	gain_loss = (df["new_balance_in_base_currency"].round(precision)
+		- df["balance_in_base_currency"].round(precision)).round(precision)
+
+	return df[gain_loss != 0][["account", "party_type", "party", "account_currency",
+		"balance_in_base_currency", "balance_in_account_currency", "current_exchange_rate",
+		"new_exchange_rate", "new_balance_in_base_currency"]].to_dict("records")
+
 @frappe.whitelist()
 def get_account_details(account, company, posting_date, party_type=None, party=None):
-	account_currency, account_type = frappe.db.get_value("Account", account,
-		["account_currency", "account_type"])
+	acc = frappe.get_doc("Account", account)
+	acc.check_permission("read")
+
+	account_currency, account_type = acc.account_currency, acc.account_type
 	if account_type in ["Receivable", "Payable"] and not (party_type and party):
 		frappe.throw(_("Party Type and Party is mandatory for {0} account").format(account_type))
 
 	account_details = {}
 	company_currency = erpnext.get_company_currency(company)
-	balance = get_balance_on(account, party_type=party_type, party=party, in_account_currency=False)
+
+	conditions = ""
+	if party_type and party:
+		conditions = " and party_type = %(party_type)s and party = %(party)s"
+
+	# both balances in one query
+	balance, balance_in_account_currency = frappe.db.sql("""
+		select sum(debit) - sum(credit),
+			sum(debit_in_account_currency) - sum(credit_in_account_currency)
+		from `tabGL Entry`
+		where account = %(account)s and posting_date <= %(posting_date)s {0}""".format(conditions), {
+			"account": account,
+			"posting_date": posting_date,
+			"party_type": party_type,
+			"party": party
+		})[0]
+
+	balance, balance_in_account_currency = flt(balance), flt(balance_in_account_currency)
 	if balance:
-		balance_in_account_currency = get_balance_on(account, party_type=party_type, party=party)
 		current_exchange_rate = balance / balance_in_account_currency if balance_in_account_currency else 0
 		new_exchange_rate = get_exchange_rate(account_currency, company_currency, posting_date)
 		new_balance_in_base_currency = balance_in_account_currency * new_exchange_rate
@@ -181,4 +208,4 @@ def get_account_details(account, company, posting_date, party_type=None, party=N
 			"new_balance_in_base_currency": new_balance_in_base_currency
 		}
 
-	return account_details
\ No newline at end of file
+	return account_details
@@ -5,6 +5,99 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
+from frappe.utils import flt, nowdate
+from erpnext.accounts.utils import get_balance_on
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.doctype.exchange_rate_revaluation.exchange_rate_revaluation import (get_revaluation_rows,
+	get_account_details)
 
 class TestExchangeRateRevaluation(unittest.TestCase):
-	pass
+	def test_revaluation_rows(self):
+		exchange_rates = {"USD": 62.9, "EUR": 70.25}
+		account_details = [
+			# gain
+			frappe._dict(account="_Test Bank USD - _TC", party_type=None, party=None, account_currency="USD",
+				balance_in_account_currency=100, balance=5000),
+			# loss on a party balance
+			frappe._dict(account="_Test Receivable USD - _TC", party_type="Customer", party="_Test Customer USD",
+				account_currency="USD", balance_in_account_currency=-40.5, balance=-2400.25),
+			# no balance left in the account currency
+			frappe._dict(account="_Test Bank EUR - _TC", party_type=None, party=None, account_currency="EUR",
+				balance_in_account_currency=0, balance=15.5),
+			# gain within the precision
+			frappe._dict(account="_Test Bank EUR - _TC", party_type="Supplier", party="_Test Supplier",
+				account_currency="EUR", balance_in_account_currency=10, balance=702.504)
+		]
+
+		rows = get_revaluation_rows(account_details, exchange_rates, 2)
+		expected_rows = get_revaluation_rows_per_row(account_details, exchange_rates, 2)
+
+		self.assertEqual([(d["account"], d["party"]) for d in rows],
+			[(d["account"], d["party"]) for d in expected_rows])
+		self.assertEqual(len(rows), 3)
+
+		for row, expected in zip(rows, expected_rows):
+			for fieldname in ("balance_in_base_currency", "balance_in_account_currency", "current_exchange_rate",
+				"new_exchange_rate", "new_balance_in_base_currency"):
+				self.assertAlmostEqual(row[fieldname], expected[fieldname], 9)
+
+		self.assertEqual(rows[2]["current_exchange_rate"], 0)
+		self.assertEqual(rows[2]["new_balance_in_base_currency"], 0)
+
+	def test_account_details(self):
+		make_journal_entry("_Test Bank USD - _TC", "_Test Bank - _TC", 100, exchange_rate=50, submit=True)
+
+		account_details = get_account_details("_Test Bank USD - _TC", "_Test Company", nowdate())
+		self.assertEqual(account_details["balance_in_base_currency"],
+			flt(get_balance_on("_Test Bank USD - _TC", nowdate(), in_account_currency=False)))
+		self.assertEqual(account_details["balance_in_account_currency"],
+			flt(get_balance_on("_Test Bank USD - _TC", nowdate())))
+
+		frappe.set_user("Guest")
+		try:
+			self.assertRaises(frappe.PermissionError, get_account_details,
+				"_Test Bank USD - _TC", "_Test Company", nowdate())
+		finally:
+			frappe.set_user("Administrator")
+
+	def test_revaluation_entry_posted_in_bulk(self):
+		balance = get_balance_on("_Test Bank USD - _TC", nowdate(), in_account_currency=False)
+
+		jv = make_journal_entry("_Test Bank USD - _TC", "_Test Bank - _TC", 100, exchange_rate=50, save=False)
+		jv.voucher_type = "Exchange Rate Revaluation"
+		jv.get("accounts")[1].credit_in_account_currency = 5000
+		jv.submit()
+
+		gl_entries = frappe.db.sql("""select account, debit, credit from `tabGL Entry`
+			where voucher_type='Journal Entry' and voucher_no=%s order by account""", jv.name, as_dict=1)
+		self.assertEqual([(d.account, d.debit, d.credit) for d in gl_entries],
+			[("_Test Bank - _TC", 0, 5000), ("_Test Bank USD - _TC", 5000, 0)])
+
+		jv.cancel()
+		self.assertFalse(frappe.db.sql("""select name from `tabGL Entry`
+			where voucher_type='Journal Entry' and voucher_no=%s""", jv.name))
+		self.assertEqual(get_balance_on("_Test Bank USD - _TC", nowdate(), in_account_currency=False), balance)
+
+def get_revaluation_rows_per_row(account_details, exchange_rates, precision):
+	# the revaluation as computed for each balance before the rows were revalued together
+	accounts = []
+	for d in account_details:
+		current_exchange_rate = d.balance / d.balance_in_account_currency \
+			if d.balance_in_account_currency else 0
+		new_exchange_rate = exchange_rates[d.account_currency]
+		new_balance_in_base_currency = flt(d.balance_in_account_currency * new_exchange_rate)
+		gain_loss = flt(new_balance_in_base_currency, precision) - flt(d.balance, precision)
+		if gain_loss:
+			accounts.append({
+				"account": d.account,
+				"party_type": d.party_type,
+				"party": d.party,
+				"account_currency": d.account_currency,
+				"balance_in_base_currency": d.balance,
+				"balance_in_account_currency": d.balance_in_account_currency,
+				"current_exchange_rate": current_exchange_rate,
+				"new_exchange_rate": new_exchange_rate,
+				"new_balance_in_base_currency": new_balance_in_base_currency
+			})
+
+	return accounts
@@ -238,6 +238,10 @@ def update_outstanding_amt(account, party_type, party, against_voucher_type, aga
 		ref_doc.db_set('outstanding_amount', bal)
 		ref_doc.set_status(update=True)
 
+		if against_voucher_type == "Sales Invoice":
+			from erpnext.accounts.doctype.subscription.subscription import set_subscriptions_due
+			set_subscriptions_due(against_voucher)
+
 def validate_frozen_account(account, adv_adj=None):
 	frozen_account = frappe.db.get_value("Account", account, "freeze_account")
 	if frozen_account == 'Yes' and not adv_adj:
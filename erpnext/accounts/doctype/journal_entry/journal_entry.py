@@ -487,7 +487,7 @@ class JournalEntry(AccountsController):
 		from frappe.utils import money_in_words
 		self.total_amount_in_words = money_in_words(amt, currency)
 
-	def make_gl_entries(self, cancel=0, adv_adj=0):
+	def make_gl_entries(self, cancel=0, adv_adj=0, update_outstanding="Yes"):
 		from erpnext.accounts.general_ledger import make_gl_entries
 
 		gl_map = []
@@ -519,7 +519,13 @@ class JournalEntry(AccountsController):
 				)
 
 		if gl_map:
-			make_gl_entries(gl_map, cancel=cancel, adv_adj=adv_adj)
+			if self.voucher_type == "Exchange Rate Revaluation" and not cancel and not adv_adj \
+				and all(d.reference_type in (None, "", "Exchange Rate Revaluation") for d in self.get("accounts")):
+				# revaluation entries are not against invoices, so the entries are posted together
+				from erpnext.accounts.general_ledger import make_gl_entries_in_bulk
+				make_gl_entries_in_bulk(gl_map)
+			else:
+				make_gl_entries(gl_map, cancel=cancel, adv_adj=adv_adj, update_outstanding=update_outstanding)
 
 	def get_balance(self):
 		if not self.get('accounts'):
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt, now, getdate, get_first_day
+from frappe.model.document import Document
+from six import iteritems
+
+exclude_from_linked_with = True
+
+summary_fields = ("company", "fiscal_year", "account", "cost_center", "project", "month_start_date", "amount")
+
+class MonthlyExpenseSummary(Document):
+	pass
+
+def update_monthly_expense_summary(gl_entries, sign=1):
+	'''Add the GL entries of the expense accounts to the rows of their months, or take them out with `sign` -1.
+
+	The amounts are only added to the rows, so that concurrent vouchers do not overwrite each other.
+	Concurrent vouchers may add two rows for the same key, so the rows are always summed'''
+	from erpnext.accounts.utils import get_fiscal_year
+
+	totals = {}
+	for d in gl_entries:
+		if d.get("account") and frappe.get_cached_value("Account", d.get("account"), "root_type") == "Expense":
+			fiscal_year = d.get("fiscal_year") or get_fiscal_year(d.get("posting_date"), company=d.get("company"))[0]
+			key = (d.get("company"), fiscal_year, d.get("account"), d.get("cost_center") or None,
+				d.get("project") or None, getdate(get_first_day(d.get("posting_date"))))
+			totals[key] = totals.get(key, 0) + sign * (flt(d.get("debit")) - flt(d.get("credit")))
+
+	if not totals:
+		return
+
+	existing = {}
+	for d in frappe.db.sql("""select name, company, fiscal_year, account, cost_center, project, month_start_date
+		from `tabMonthly Expense Summary`
+		where account in %(accounts)s and month_start_date in %(months)s""", {
+			"accounts": list(set(key[2] for key in totals)),
+			"months": list(set(key[5] for key in totals))
+		}, as_dict=1):
+		existing.setdefault((d.company, d.fiscal_year, d.account, d.cost_center or None, d.project or None,
+			getdate(d.month_start_date)), d.name)
+
+	rows, updated = [], []
+	for key, amount in iteritems(totals):
+		if existing.get(key):
+			frappe.db.sql("""update `tabMonthly Expense Summary`
+				set amount = amount + %s, modified = %s
+				where name = %s""", (amount, now(), existing[key]))
+			updated.append(existing[key])
+		elif flt(amount, 9):
+			rows.append(list(key) + [amount])
+
+	make_monthly_expense_summary_entries(rows)
+
+	if sign < 0 and updated:
+		# rows left without an amount would keep the links to the accounts,
+		# cost centers and projects of cancelled vouchers
+		frappe.db.sql("""delete from `tabMonthly Expense Summary`
+			where name in %s and amount = 0""", [updated])
+
+def remove_voucher_from_monthly_expense_summary(voucher_type, voucher_no):
+	'''Take the GL entries of the voucher out of the summary, before they are deleted'''
+	update_monthly_expense_summary(frappe.db.sql("""
+		select company, fiscal_year, account, cost_center, project, posting_date, debit, credit
+		from `tabGL Entry`
+		where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no), as_dict=1), sign=-1)
+
+def make_monthly_expense_summary_entries(rows):
+	timestamp, user = now(), frappe.session.user
+	for i in range(0, len(rows), 500):
+		chunk = rows[i:i + 500]
+		frappe.db.sql("""
+			insert into `tabMonthly Expense Summary`
+				(name, creation, modified, modified_by, owner, docstatus, {0})
+			values {1}
+		""".format(", ".join(summary_fields),
+			", ".join(["(" + ", ".join(["%s"] * (len(summary_fields) + 6)) + ")"] * len(chunk))),
+			tuple(v for row in chunk
+				for v in [frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0] + row))
+
+def rebuild_monthly_expense_summary(company=None):
+	'''Replace the summary with the totals of the GL entries of the expense accounts'''
+	frappe.db.sql("""delete from `tabMonthly Expense Summary` {0}""".format(
+		"where company = %(company)s" if company else ""), {"company": company})
+
+	totals = {}
+
+	# grouped by date and folded into months here, to keep the query portable
+	for d in frappe.db.sql("""
+		select gle.company, gle.fiscal_year, gle.account, gle.cost_center, gle.project, gle.posting_date,
+			sum(gle.debit) - sum(gle.credit) as amount
+		from `tabGL Entry` gle, `tabAccount` acc
+		where gle.account = acc.name and acc.root_type = 'Expense' and gle.docstatus = 1 {0}
+		group by gle.company, gle.fiscal_year, gle.account, gle.cost_center, gle.project, gle.posting_date""".format(
+			"and gle.company = %(company)s" if company else ""), {"company": company}, as_dict=1):
+		key = (d.company, d.fiscal_year, d.account, d.cost_center or None, d.project or None,
+			get_first_day(d.posting_date))
+		totals[key] = totals.get(key, 0) + flt(d.amount)
+
+	make_monthly_expense_summary_entries([list(key) + [amount] for key, amount in iteritems(totals)])
+
+def get_expense(company, fiscal_year, account, month_end_date=None, cost_center=None, project=None):
+	'''Returns the expense booked in the account in the fiscal year, up to the month of `month_end_date`.
+		With `cost_center`, the expense of the cost center and its children'''
+	values = {
+		"company": company,
+		"fiscal_year": fiscal_year,
+		"account": account,
+		"month_end_date": month_end_date,
+		"project": project
+	}
+
+	conditions = ""
+	if month_end_date:
+		conditions += " and mes.month_start_date <= %(month_end_date)s"
+
+	if cost_center:
+		values.update(frappe.db.get_value("Cost Center", cost_center, ["lft", "rgt"], as_dict=1))
+		conditions += """ and exists(select name from `tabCost Center`
+			where lft >= %(lft)s and rgt <= %(rgt)s and name = mes.cost_center)"""
+
+	if project:
+		conditions += " and mes.project = %(project)s"
+
+	return flt(frappe.db.sql("""
+		select sum(mes.amount)
+		from `tabMonthly Expense Summary` mes
+		where mes.company = %(company)s and mes.fiscal_year = %(fiscal_year)s
+			and mes.account = %(account)s {0}""".format(conditions), values)[0][0])
+
+def on_doctype_update():
+	frappe.db.add_index("Monthly Expense Summary", ["account", "month_start_date"])
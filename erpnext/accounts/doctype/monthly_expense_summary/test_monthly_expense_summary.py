@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import flt, nowdate
+from erpnext.accounts.utils import get_fiscal_year
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.doctype.monthly_expense_summary.monthly_expense_summary import get_expense
+
+class TestMonthlyExpenseSummary(unittest.TestCase):
+	def test_expense_from_summary(self):
+		account = "_Test Account Cost for Goods Sold - _TC"
+		fiscal_year, year_start_date, year_end_date = get_fiscal_year(nowdate(), company="_Test Company")
+
+		def get_expense_from_gl():
+			return flt(frappe.db.sql("""select sum(debit) - sum(credit) from `tabGL Entry`
+				where company = '_Test Company' and account = %s and posting_date between %s and %s""",
+				(account, year_start_date, year_end_date))[0][0])
+
+		existing_expense = get_expense("_Test Company", fiscal_year, account)
+		self.assertEqual(existing_expense, get_expense_from_gl())
+
+		jv = make_journal_entry(account, "_Test Bank - _TC", 400, "_Test Cost Center - _TC", submit=True)
+		self.assertEqual(get_expense("_Test Company", fiscal_year, account), existing_expense + 400)
+
+		jv.cancel()
+		self.assertEqual(get_expense("_Test Company", fiscal_year, account), existing_expense)
+		self.assertEqual(get_expense("_Test Company", fiscal_year, account), get_expense_from_gl())
+
+	def test_rows_of_cancelled_voucher_deleted(self):
+		from erpnext.accounts.doctype.account.test_account import create_account
+
+		account = create_account(account_name="_Test Monthly Expense Summary Account",
+			parent_account="Direct Expenses - _TC", company="_Test Company")
+
+		jv = make_journal_entry(account, "_Test Bank - _TC", 100, "_Test Cost Center - _TC", submit=True)
+		self.assertTrue(frappe.db.exists("Monthly Expense Summary", {"account": account}))
+
+		jv.cancel()
+		self.assertFalse(frappe.db.exists("Monthly Expense Summary", {"account": account}))
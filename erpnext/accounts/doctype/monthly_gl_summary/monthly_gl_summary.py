@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt, cint, now, getdate, add_days, add_months, get_first_day, get_last_day
+from frappe.model.document import Document
+from six import iteritems
+from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import get_accounting_dimensions
+
+exclude_from_linked_with = True
+
+key_fields = ("company", "month_start_date", "account", "party_type", "party", "cost_center", "project",
+	"finance_book", "is_opening", "is_period_closing")
+amount_fields = ("debit", "credit", "debit_in_account_currency", "credit_in_account_currency")
+
+class MonthlyGLSummary(Document):
+	pass
+
+def get_summary_key(d, dimensions):
+	'''Returns the key of the summary row of a GL entry'''
+	return tuple([d.get("company"), getdate(get_first_day(d.get("posting_date"))), d.get("account"),
+		d.get("party_type") or None, d.get("party") or None, d.get("cost_center") or None,
+		d.get("project") or None, d.get("finance_book") or None, d.get("is_opening") or "No",
+		1 if d.get("voucher_type") == "Period Closing Voucher" else 0]
+		+ [d.get(dimension) or None for dimension in dimensions])
+
+def get_stored_key(d, dimensions):
+	return tuple([d.company, getdate(d.month_start_date), d.account, d.party_type or None, d.party or None,
+		d.cost_center or None, d.project or None, d.finance_book or None, d.is_opening or "No",
+		cint(d.is_period_closing)] + [d.get(dimension) or None for dimension in dimensions])
+
+def update_monthly_gl_summary(gl_entries, sign=1):
+	'''Add the GL entries to the rows of their months, or take them out with `sign` -1.
+
+	Concurrent vouchers may add two rows for the same key, so the rows are always summed'''
+	dimensions = get_accounting_dimensions()
+
+	totals = {}
+	for d in gl_entries:
+		key = get_summary_key(d, dimensions)
+		totals[key] = [a + sign * flt(d.get(fieldname))
+			for a, fieldname in zip(totals.get(key, [0, 0, 0, 0]), amount_fields)]
+
+	if not totals:
+		return
+
+	existing = {}
+	for d in frappe.db.sql("""select name, {0} from `tabMonthly GL Summary`
+		where company in %(companies)s and account in %(accounts)s and month_start_date in %(months)s""".format(
+			", ".join(list(key_fields) + dimensions)), {
+			"companies": list(set(key[0] for key in totals)),
+			"accounts": list(set(key[2] for key in totals)),
+			"months": list(set(key[1] for key in totals))
+		}, as_dict=1):
+		existing.setdefault(get_stored_key(d, dimensions), d.name)
+
+	rows, updated = [], []
+	for key, values in iteritems(totals):
+		if existing.get(key):
+			frappe.db.sql("""update `tabMonthly GL Summary`
+				set debit = debit + %s, credit = credit + %s,
+					debit_in_account_currency = debit_in_account_currency + %s,
+					credit_in_account_currency = credit_in_account_currency + %s,
+					modified = %s
+				where name = %s""", tuple(values + [now(), existing[key]]))
+			updated.append(existing[key])
+		else:
+			rows.append(list(key) + values)
+
+	make_monthly_gl_summary_entries(rows, dimensions)
+
+	if sign < 0 and updated:
+		# rows left without amounts would keep the links to the accounts, parties,
+		# cost centers and projects of cancelled vouchers
+		frappe.db.sql("""delete from `tabMonthly GL Summary`
+			where name in %s and debit = 0 and credit = 0
+				and debit_in_account_currency = 0 and credit_in_account_currency = 0""", [updated])
+
+def remove_voucher_from_monthly_gl_summary(voucher_type, voucher_no):
+	'''Take the GL entries of the voucher out of the summary, before they are deleted'''
+	dimensions = get_accounting_dimensions()
+	update_monthly_gl_summary(frappe.db.sql("""
+		select company, posting_date, account, party_type, party, cost_center, project, finance_book,
+			is_opening, voucher_type, {0}
+		from `tabGL Entry`
+		where voucher_type=%s and voucher_no=%s""".format(", ".join(list(amount_fields) + dimensions)),
+		(voucher_type, voucher_no), as_dict=1), sign=-1)
+
+def make_monthly_gl_summary_entries(rows, dimensions):
+	fields = list(key_fields) + dimensions + list(amount_fields)
+	timestamp, user = now(), frappe.session.user
+	for i in range(0, len(rows), 500):
+		chunk = rows[i:i + 500]
+		frappe.db.sql("""
+			insert into `tabMonthly GL Summary`
+				(name, creation, modified, modified_by, owner, docstatus, {0})
+			values {1}
+		""".format(", ".join(fields),
+			", ".join(["(" + ", ".join(["%s"] * (len(fields) + 6)) + ")"] * len(chunk))),
+			tuple(v for row in chunk
+				for v in [frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0] + row))
+
+def get_summary_rows_from_gl(company, month_start_date, dimensions):
+	group_by_fields = ["account", "party_type", "party", "cost_center", "project", "finance_book"] + dimensions
+
+	return [[company, month_start_date, d.account, d.party_type, d.party, d.cost_center, d.project,
+		d.finance_book, d.is_opening, d.is_period_closing] + [d.get(dimension) for dimension in dimensions]
+		+ [flt(d.get(fieldname)) for fieldname in amount_fields]
+		for d in frappe.db.sql("""
+			select {0}, ifnull(is_opening, 'No') as is_opening,
+				if(voucher_type = 'Period Closing Voucher', 1, 0) as is_period_closing,
+				sum(debit) as debit, sum(credit) as credit,
+				sum(debit_in_account_currency) as debit_in_account_currency,
+				sum(credit_in_account_currency) as credit_in_account_currency
+			from `tabGL Entry`
+			where company = %(company)s and posting_date between %(month_start_date)s and %(month_end_date)s
+			group by {0}, ifnull(is_opening, 'No'), if(voucher_type = 'Period Closing Voucher', 1, 0)""".format(
+				", ".join(group_by_fields)), {
+				"company": company,
+				"month_start_date": month_start_date,
+				"month_end_date": get_last_day(month_start_date)
+			}, as_dict=1)]
+
+def rebuild_monthly_gl_summary(company=None, from_date=None):
+	'''Replace the summary with the totals of the GL entries, a month at a time.
+	A rebuild stopped midway can be resumed from the month it stopped at, with `from_date`
+
+	Can be run as `bench --site [site] rebuild-monthly-gl-summary`'''
+	dimensions = get_accounting_dimensions()
+	companies = [company] if company else frappe.db.sql_list("select name from `tabCompany`")
+
+	for company in companies:
+		first_posting_date, last_posting_date = frappe.db.sql("""select min(posting_date), max(posting_date)
+			from `tabGL Entry` where company = %s""", company)[0]
+		if not first_posting_date:
+			continue
+
+		month_start_date = getdate(get_first_day(max(getdate(from_date), getdate(first_posting_date))
+			if from_date else first_posting_date))
+
+		frappe.db.sql("""delete from `tabMonthly GL Summary`
+			where company = %s and month_start_date >= %s""", (company, month_start_date))
+
+		while month_start_date <= getdate(last_posting_date):
+			make_monthly_gl_summary_entries(get_summary_rows_from_gl(company, month_start_date, dimensions),
+				dimensions)
+			frappe.db.commit()
+
+			month_start_date = getdate(add_months(month_start_date, 1))
+
+def get_balances(company, from_date=None, to_date=None, group_by=("account",), conditions="",
+	values=None, ignore_closing_entries=False):
+	'''Returns the debit and credit of the GL entries posted between the dates, grouped by the fields.
+
+	The months within the dates are read from the summary, the days before and after them from the GL entries.
+	`conditions` are added to both queries, so they can only use the fields of the summary'''
+	from_date = getdate(from_date) if from_date else None
+	to_date = getdate(to_date) if to_date else None
+
+	months_from_date = from_date
+	if from_date and from_date != get_first_day(from_date):
+		months_from_date = getdate(add_months(get_first_day(from_date), 1))
+
+	months_to_date = to_date
+	if to_date and to_date != get_last_day(to_date):
+		months_to_date = getdate(add_days(get_first_day(to_date), -1))
+
+	has_months = not (months_from_date and months_to_date and months_from_date > months_to_date)
+
+	values = dict(values or {})
+	values.update({
+		"company": company,
+		"from_date": from_date,
+		"to_date": to_date,
+		"months_from_date": months_from_date,
+		"months_to_date": months_to_date
+	})
+
+	fields = ", ".join(group_by)
+	amounts = """sum(debit) as debit, sum(credit) as credit,
+		sum(debit_in_account_currency) as debit_in_account_currency,
+		sum(credit_in_account_currency) as credit_in_account_currency"""
+
+	balances = []
+	if has_months:
+		summary_conditions = conditions
+		if months_from_date:
+			summary_conditions += " and month_start_date >= %(months_from_date)s"
+		if months_to_date:
+			summary_conditions += " and month_start_date <= %(months_to_date)s"
+		if ignore_closing_entries:
+			summary_conditions += " and is_period_closing = 0"
+
+		balances += frappe.db.sql("""
+			select {fields}, {amounts}
+			from `tabMonthly GL Summary`
+			where company = %(company)s {conditions}
+			group by {fields}""".format(fields=fields, amounts=amounts, conditions=summary_conditions), #nosec
+			values, as_dict=1)
+
+	gl_conditions = conditions
+	if from_date:
+		gl_conditions += " and posting_date >= %(from_date)s"
+	if to_date:
+		gl_conditions += " and posting_date <= %(to_date)s"
+	if ignore_closing_entries:
+		gl_conditions += " and ifnull(voucher_type, '') != 'Period Closing Voucher'"
+
+	# the entries of the days out of the months
+	if has_months:
+		outside_months = []
+		if months_from_date:
+			outside_months.append("posting_date < %(months_from_date)s")
+		if months_to_date:
+			outside_months.append("posting_date > %(months_to_date)s")
+		gl_conditions += " and ({0})".format(" or ".join(outside_months)) if outside_months else ""
+
+	if not has_months or outside_months:
+		balances += frappe.db.sql("""
+			select {fields}, {amounts}
+			from `tabGL Entry`
+			where company = %(company)s {conditions}
+			group by {fields}""".format(fields=fields, amounts=amounts, conditions=gl_conditions), #nosec
+			values, as_dict=1)
+
+	totals = {}
+	for d in balances:
+		key = tuple(d.get(fieldname) for fieldname in group_by)
+		if key in totals:
+			for fieldname in amount_fields:
+				totals[key][fieldname] = flt(totals[key][fieldname]) + flt(d.get(fieldname))
+		else:
+			totals[key] = d
+
+	return list(totals.values())
+
+def on_doctype_update():
+	frappe.db.add_index("Monthly GL Summary", ["company", "month_start_date", "account"])
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import flt, nowdate, get_first_day, add_days
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.doctype.monthly_gl_summary.monthly_gl_summary import get_balances
+
+class TestMonthlyGLSummary(unittest.TestCase):
+	def test_balances_from_summary(self):
+		def get_balance_from_gl(from_date=None):
+			return flt(frappe.db.sql("""select sum(debit) - sum(credit) from `tabGL Entry`
+				where account = '_Test Bank - _TC' and posting_date <= %s and posting_date >= %s""",
+				(nowdate(), from_date or "1900-01-01"))[0][0])
+
+		def get_balance_from_summary(from_date=None):
+			balances = get_balances("_Test Company", from_date=from_date, to_date=nowdate(),
+				conditions=" and account = '_Test Bank - _TC'")
+			return flt(balances[0].debit) - flt(balances[0].credit) if balances else 0.0
+
+		jv = make_journal_entry("_Test Bank - _TC", "_Test Account Cost for Goods Sold - _TC", 500,
+			"_Test Cost Center - _TC", posting_date=nowdate(), submit=True)
+
+		for from_date in (None, get_first_day(nowdate()), add_days(get_first_day(nowdate()), -3)):
+			self.assertEqual(get_balance_from_summary(from_date), get_balance_from_gl(from_date))
+
+		jv.cancel()
+		self.assertEqual(get_balance_from_summary(), get_balance_from_gl())
+
+	def test_rows_of_cancelled_voucher_deleted(self):
+		from erpnext.accounts.doctype.account.test_account import create_account
+
+		account = create_account(account_name="_Test Monthly GL Summary Account",
+			parent_account="Current Assets - _TC", company="_Test Company")
+
+		jv = make_journal_entry(account, "_Test Bank - _TC", 100, "_Test Cost Center - _TC",
+			posting_date=nowdate(), submit=True)
+		self.assertTrue(frappe.db.exists("Monthly GL Summary", {"account": account}))
+
+		jv.cancel()
+		self.assertFalse(frappe.db.exists("Monthly GL Summary", {"account": account}))
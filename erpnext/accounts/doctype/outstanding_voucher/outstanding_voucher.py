@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe, erpnext
+from frappe.utils import flt, now
+from frappe.model.document import Document
+from six import iteritems
+
+exclude_from_linked_with = True
+
+outstanding_voucher_fields = ("company", "party_type", "party", "account", "voucher_type", "voucher_no",
+	"posting_date", "due_date", "invoice_amount", "payment_amount", "outstanding_amount")
+
+# GL entries counted as invoices, as in erpnext.accounts.utils.get_outstanding_invoices
+invoice_condition = """((voucher_type = 'Journal Entry' and (against_voucher = '' or against_voucher is null))
+	or (voucher_type not in ('Journal Entry', 'Payment Entry')))"""
+
+class OutstandingVoucher(Document):
+	pass
+
+def get_party_account_type_of_account(party_type, account):
+	if account:
+		root_type, account_type = frappe.get_cached_value("Account", account, ["root_type", "account_type"])
+		party_account_type = "Receivable" if root_type == "Asset" else "Payable"
+		return account_type or party_account_type
+
+	return erpnext.get_party_account_type(party_type)
+
+def get_precision():
+	return frappe.get_precision("Sales Invoice", "outstanding_amount") or 2
+
+def get_open_vouchers(party_type, party, account):
+	'''Returns the names of the vouchers of the party with an outstanding amount in the account'''
+	return frappe.db.sql_list("""select voucher_no from `tabOutstanding Voucher`
+		where party_type = %s and party = %s and account = %s and outstanding_amount > %s""",
+		(party_type, party, account, 0.5 / (10**get_precision())))
+
+def update_outstanding_vouchers(gl_entries):
+	'''Refresh the outstanding amounts of the vouchers posted or paid by the party GL entries'''
+	vouchers = set()
+	for d in gl_entries:
+		if d.get("party_type") and d.get("party"):
+			vouchers.add((d.get("party_type"), d.get("party"), d.get("account"),
+				d.get("voucher_type"), d.get("voucher_no")))
+			if d.get("against_voucher"):
+				vouchers.add((d.get("party_type"), d.get("party"), d.get("account"),
+					d.get("against_voucher_type"), d.get("against_voucher")))
+
+	for party_type, party, account, voucher_type, voucher_no in vouchers:
+		refresh_outstanding_voucher(party_type, party, account, voucher_type, voucher_no)
+
+def refresh_outstanding_voucher(party_type, party, account, voucher_type, voucher_no):
+	if get_party_account_type_of_account(party_type, account) == "Receivable":
+		dr_or_cr = "debit_in_account_currency - credit_in_account_currency"
+	else:
+		dr_or_cr = "credit_in_account_currency - debit_in_account_currency"
+
+	values = {
+		"party_type": party_type,
+		"party": party,
+		"account": account,
+		"voucher_type": voucher_type,
+		"voucher_no": voucher_no
+	}
+
+	invoice = frappe.db.sql("""
+		select company, min(posting_date) as posting_date, max(due_date) as due_date,
+			sum({dr_or_cr}) as invoice_amount
+		from `tabGL Entry`
+		where voucher_type = %(voucher_type)s and voucher_no = %(voucher_no)s
+			and party_type = %(party_type)s and party = %(party)s and account = %(account)s
+			and {dr_or_cr} > 0 and {invoice_condition}
+		group by company""".format(dr_or_cr=dr_or_cr, invoice_condition=invoice_condition), #nosec
+		values, as_dict=1)
+
+	payment_amount = frappe.db.sql("""
+		select ifnull(sum(-({dr_or_cr})), 0)
+		from `tabGL Entry`
+		where against_voucher_type = %(voucher_type)s and against_voucher = %(voucher_no)s
+			and party_type = %(party_type)s and party = %(party)s and account = %(account)s
+			and -({dr_or_cr}) > 0""".format(dr_or_cr=dr_or_cr), values)[0][0] #nosec
+
+	frappe.db.sql("""delete from `tabOutstanding Voucher`
+		where voucher_type = %(voucher_type)s and voucher_no = %(voucher_no)s
+			and party_type = %(party_type)s and party = %(party)s and account = %(account)s""", values)
+
+	if invoice:
+		make_outstanding_vouchers(get_open_voucher_rows({
+			(party_type, party, account, voucher_type, voucher_no): [invoice[0].company,
+				invoice[0].posting_date, invoice[0].due_date, flt(invoice[0].invoice_amount), flt(payment_amount)]
+		}))
+
+def get_open_voucher_rows(vouchers):
+	'''Returns the rows of the vouchers with an outstanding amount, from a dict of
+		(party_type, party, account, voucher_type, voucher_no): [company, posting_date, due_date, invoice_amount, payment_amount]'''
+	precision = get_precision()
+
+	rows = []
+	for (party_type, party, account, voucher_type, voucher_no), d in iteritems(vouchers):
+		company, posting_date, due_date, invoice_amount, payment_amount = d
+		outstanding_amount = flt(invoice_amount - payment_amount, precision)
+		if outstanding_amount > 0.5 / (10**precision):
+			rows.append([company, party_type, party, account, voucher_type, voucher_no,
+				posting_date, due_date, invoice_amount, payment_amount, outstanding_amount])
+
+	return rows
+
+def make_outstanding_vouchers(rows):
+	timestamp, user = now(), frappe.session.user
+	for i in range(0, len(rows), 500):
+		chunk = rows[i:i + 500]
+		frappe.db.sql("""
+			insert into `tabOutstanding Voucher`
+				(name, creation, modified, modified_by, owner, docstatus, {0})
+			values {1}
+		""".format(", ".join(outstanding_voucher_fields),
+			", ".join(["(" + ", ".join(["%s"] * (len(outstanding_voucher_fields) + 6)) + ")"] * len(chunk))),
+			tuple(v for row in chunk
+				for v in [frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0] + row))
+
+def get_outstanding_vouchers_from_gl(company=None, party_type=None, party=None):
+	'''Returns the open voucher rows computed from the GL entries, in grouped queries'''
+	conditions = ""
+	for fieldname, value in (("company", company), ("party_type", party_type), ("party", party)):
+		if value:
+			conditions += " and {0} = %({0})s".format(fieldname)
+
+	values = {"company": company, "party_type": party_type, "party": party}
+
+	# debit and credit parts are summed apart, the account type decides which is the invoice
+	vouchers = {}
+	for d in frappe.db.sql("""
+		select company, party_type, party, account, voucher_type, voucher_no,
+			min(posting_date) as posting_date, max(due_date) as due_date,
+			sum(if(debit_in_account_currency > credit_in_account_currency,
+				debit_in_account_currency - credit_in_account_currency, 0)) as debit_amount,
+			sum(if(credit_in_account_currency > debit_in_account_currency,
+				credit_in_account_currency - debit_in_account_currency, 0)) as credit_amount
+		from `tabGL Entry`
+		where ifnull(party, '') != '' and {invoice_condition} {conditions}
+		group by company, party_type, party, account, voucher_type, voucher_no""".format( #nosec
+			invoice_condition=invoice_condition, conditions=conditions), values, as_dict=1):
+		receivable = get_party_account_type_of_account(d.party_type, d.account) == "Receivable"
+		invoice_amount = flt(d.debit_amount if receivable else d.credit_amount)
+		if invoice_amount > 0:
+			vouchers[(d.party_type, d.party, d.account, d.voucher_type, d.voucher_no)] = \
+				[d.company, d.posting_date, d.due_date, invoice_amount, 0.0]
+
+	for d in frappe.db.sql("""
+		select party_type, party, account, against_voucher_type, against_voucher,
+			sum(if(debit_in_account_currency > credit_in_account_currency,
+				debit_in_account_currency - credit_in_account_currency, 0)) as debit_amount,
+			sum(if(credit_in_account_currency > debit_in_account_currency,
+				credit_in_account_currency - debit_in_account_currency, 0)) as credit_amount
+		from `tabGL Entry`
+		where ifnull(party, '') != '' and ifnull(against_voucher, '') != '' {conditions}
+		group by party_type, party, account, against_voucher_type, against_voucher""".format( #nosec
+			conditions=conditions), values, as_dict=1):
+		key = (d.party_type, d.party, d.account, d.against_voucher_type, d.against_voucher)
+		if key in vouchers:
+			receivable = get_party_account_type_of_account(d.party_type, d.account) == "Receivable"
+			vouchers[key][4] = flt(d.credit_amount if receivable else d.debit_amount)
+
+	return get_open_voucher_rows(vouchers)
+
+def rebuild_outstanding_vouchers(company=None):
+	'''Replace the outstanding vouchers with the ones computed from the GL entries'''
+	frappe.db.sql("delete from `tabOutstanding Voucher` {0}".format(
+		"where company = %(company)s" if company else ""), {"company": company})
+
+	make_outstanding_vouchers(get_outstanding_vouchers_from_gl(company))
+
+def verify_outstanding_vouchers(company=None, party_type=None, party=None, fix=False):
+	"""
+	Compare the outstanding vouchers with the outstanding amounts computed from the GL entries.
+	Returns the drift.
+
+	If `fix` is set, the outstanding vouchers of the parties with drift are computed again.
+	"""
+	conditions = ""
+	for fieldname, value in (("company", company), ("party_type", party_type), ("party", party)):
+		if value:
+			conditions += " and {0} = %({0})s".format(fieldname)
+
+	stored = {}
+	for d in frappe.db.sql("""select party_type, party, account, voucher_type, voucher_no, outstanding_amount
+		from `tabOutstanding Voucher` where 1=1 {0}""".format(conditions), #nosec
+		{"company": company, "party_type": party_type, "party": party}):
+		stored[tuple(d[:5])] = stored.get(tuple(d[:5]), 0) + flt(d[5])
+
+	expected = {}
+	for row in get_outstanding_vouchers_from_gl(company, party_type, party):
+		expected[tuple(row[1:6])] = row[10]
+
+	precision = get_precision()
+	drift = []
+	for key in set(stored) | set(expected):
+		if flt(stored.get(key), precision) != flt(expected.get(key), precision):
+			drift.append(frappe._dict({
+				"party_type": key[0],
+				"party": key[1],
+				"account": key[2],
+				"voucher_type": key[3],
+				"voucher_no": key[4],
+				"outstanding_amount": flt(stored.get(key)),
+				"expected_outstanding_amount": flt(expected.get(key))
+			}))
+
+	if fix:
+		for d in drift:
+			refresh_outstanding_voucher(d.party_type, d.party, d.account, d.voucher_type, d.voucher_no)
+
+	return drift
+
+def on_doctype_update():
+	frappe.db.add_index("Outstanding Voucher", ["party_type", "party", "account", "outstanding_amount"])
+	frappe.db.add_index("Outstanding Voucher", ["voucher_type", "voucher_no"])
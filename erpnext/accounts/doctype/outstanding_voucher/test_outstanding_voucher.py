@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from erpnext.accounts.doctype.payment_entry.payment_entry import get_payment_entry
+from erpnext.accounts.doctype.outstanding_voucher.outstanding_voucher import verify_outstanding_vouchers
+
+class TestOutstandingVoucher(unittest.TestCase):
+	def test_outstanding_voucher_on_payment(self):
+		si = create_sales_invoice(qty=1, rate=1000)
+
+		def get_outstanding_amount():
+			return frappe.db.get_value("Outstanding Voucher",
+				{"voucher_type": "Sales Invoice", "voucher_no": si.name}, "outstanding_amount")
+
+		self.assertEqual(get_outstanding_amount(), 1000)
+
+		pe = get_payment_entry("Sales Invoice", si.name, bank_account="_Test Cash - _TC")
+		pe.paid_amount = pe.received_amount = 400
+		pe.references[0].allocated_amount = 400
+		pe.insert()
+		pe.submit()
+
+		self.assertEqual(get_outstanding_amount(), 600)
+		self.assertEqual(verify_outstanding_vouchers(party_type="Customer", party=si.customer), [])
+
+		pe.cancel()
+		self.assertEqual(get_outstanding_amount(), 1000)
+
+		si.cancel()
+		self.assertEqual(get_outstanding_amount(), None)
+		self.assertEqual(verify_outstanding_vouchers(party_type="Customer", party=si.customer), [])
+
+	def test_verify_and_fix_drift(self):
+		si = create_sales_invoice(qty=1, rate=300)
+		frappe.db.sql("""update `tabOutstanding Voucher` set outstanding_amount = 100
+			where voucher_type = 'Sales Invoice' and voucher_no = %s""", si.name)
+
+		drift = verify_outstanding_vouchers(party_type="Customer", party=si.customer, fix=True)
+		self.assertEqual([(d.voucher_no, d.outstanding_amount, d.expected_outstanding_amount) for d in drift],
+			[(si.name, 100, 300)])
+
+		self.assertEqual(verify_outstanding_vouchers(party_type="Customer", party=si.customer), [])
@@ -422,7 +422,7 @@ class PaymentEntry(AccountsController):
 
 		self.set("remarks", "\n".join(remarks))
 
-	def make_gl_entries(self, cancel=0, adv_adj=0):
+	def make_gl_entries(self, cancel=0, adv_adj=0, update_outstanding="Yes"):
 		if self.payment_type in ("Receive", "Pay") and not self.get("party_account_field"):
 			self.setup_party_account_field()
 
@@ -431,7 +431,7 @@ class PaymentEntry(AccountsController):
 		self.add_bank_gl_entries(gl_entries)
 		self.add_deductions_gl_entries(gl_entries)
 
-		make_gl_entries(gl_entries, cancel=cancel, adv_adj=adv_adj)
+		make_gl_entries(gl_entries, cancel=cancel, adv_adj=adv_adj, update_outstanding=update_outstanding)
 
 	def add_party_gl_entries(self, gl_entries):
 		if self.party_account:
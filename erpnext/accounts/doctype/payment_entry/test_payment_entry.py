@@ -149,6 +149,32 @@ class TestPaymentEntry(unittest.TestCase):
 		outstanding_amount = flt(frappe.db.get_value("Sales Invoice", pi.name, "outstanding_amount"))
 		self.assertEqual(outstanding_amount, 0)
 
+	def test_outstanding_vouchers_on_partial_payment(self):
+		from erpnext.accounts.utils import get_outstanding_invoices
+
+		si = create_sales_invoice(qty=1, rate=1000)
+
+		def get_outstanding_amount():
+			for d in get_outstanding_invoices("Customer", si.customer, si.debit_to):
+				if d.voucher_no == si.name:
+					return d.outstanding_amount
+
+		self.assertEqual(get_outstanding_amount(), 1000)
+
+		pe = get_payment_entry("Sales Invoice", si.name, bank_account="_Test Cash - _TC")
+		pe.paid_amount = pe.received_amount = 400
+		pe.references[0].allocated_amount = 400
+		pe.insert()
+		pe.submit()
+
+		self.assertEqual(get_outstanding_amount(), 600)
+
+		pe.cancel()
+		self.assertEqual(get_outstanding_amount(), 1000)
+
+		si.cancel()
+		self.assertEqual(get_outstanding_amount(), None)
+
 	def test_payment_entry_against_ec(self):
 
 		payable = frappe.get_cached_value('Company',  "_Test Company",  'default_payable_account')
@@ -76,8 +76,21 @@ erpnext.accounts.PaymentReconciliationController = frappe.ui.form.Controller.ext
 	},
 
 	refresh: function() {
+		var me = this;
 		this.frm.disable_save();
 		this.toggle_primary_action();
+
+		// bulk reconciliation runs in the background
+		frappe.realtime.off("payment_reconciliation_done");
+		frappe.realtime.on("payment_reconciliation_done", function(data) {
+			frappe.hide_progress();
+			if (data.error) {
+				frappe.msgprint(data.error);
+			} else {
+				frappe.show_alert({message: __("Successfully Reconciled"), indicator: "green"});
+				me.get_unreconciled_entries();
+			}
+		});
 	},
 
 	onload_post_render: function() {
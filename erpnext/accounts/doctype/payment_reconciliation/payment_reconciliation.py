@@ -160,12 +160,19 @@ class PaymentReconciliation(Document):
 
 				reconciled_entry.append(self.get_payment_details(e, dr_or_cr))
 
-		if lst:
-			reconcile_against_document(lst)
-
 		if dr_or_cr_notes:
 			reconcile_dr_cr_note(dr_or_cr_notes)
 
+		if len(lst) > 30:
+			frappe.enqueue(reconcile_payment_entries, queue="long", timeout=3600,
+				entries=lst, now=frappe.flags.in_test)
+			msgprint(_("Reconciliation of {0} entries has been queued. The entries will be refreshed when it is done.")
+				.format(len(lst)))
+			return
+
+		if lst:
+			reconcile_against_document(lst)
+
 		msgprint(_("Successfully Reconciled"))
 		self.get_unreconciled_entries()
 
@@ -255,6 +262,18 @@ class PaymentReconciliation(Document):
 
 		return cond
 
+def reconcile_payment_entries(entries):
+	try:
+		reconcile_against_document(entries, publish_progress=True)
+	except Exception:
+		frappe.db.rollback()
+		frappe.publish_realtime("payment_reconciliation_done",
+			{"error": _("Reconciliation failed, please check the Error Log")}, user=frappe.session.user)
+		raise
+
+	frappe.db.commit()
+	frappe.publish_realtime("payment_reconciliation_done", {}, user=frappe.session.user)
+
 def reconcile_dr_cr_note(dr_cr_notes):
 	for d in dr_cr_notes:
 		voucher_type = ('Credit Note'
@@ -32,6 +32,40 @@ frappe.ui.form.on('Period Closing Voucher', {
 				frappe.set_route("query-report", "General Ledger");
 			}, "fa fa-table");
 		}
+
+		if(frm.doc.docstatus==0 && !frm.is_new()) {
+			frm.add_custom_button(__('Preview Closing Entries'), function() {
+				frm.call({
+					doc: frm.doc,
+					method: "preview_closing_entries",
+					freeze: true,
+					callback: function(r) {
+						if(!r.message) return;
+
+						let rows = r.message.map(d => `<tr>
+							<td>${d.account}</td>
+							<td>${d.cost_center || ""}</td>
+							<td class="text-right">${format_currency(d.debit, erpnext.get_currency(frm.doc.company))}</td>
+							<td class="text-right">${format_currency(d.credit, erpnext.get_currency(frm.doc.company))}</td>
+						</tr>`).join("");
+
+						frappe.msgprint({
+							title: __("Closing Entries"),
+							wide: true,
+							message: `<table class="table table-bordered">
+								<tr>
+									<th>${__("Account")}</th>
+									<th>${__("Cost Center")}</th>
+									<th class="text-right">${__("Debit")}</th>
+									<th class="text-right">${__("Credit")}</th>
+								</tr>
+								${rows}
+							</table>`
+						});
+					}
+				});
+			});
+		}
 	}
 	
 })
@@ -3,10 +3,13 @@
 
 from __future__ import unicode_literals
 import frappe
-from frappe.utils import flt
+from frappe.utils import flt, getdate, add_days, get_first_day, get_last_day
+from collections import OrderedDict
 from frappe import _
 from erpnext.accounts.utils import get_account_currency
 from erpnext.controllers.accounts_controller import AccountsController
+from erpnext.accounts.doctype.monthly_expense_summary.monthly_expense_summary import remove_voucher_from_monthly_expense_summary
+from erpnext.accounts.doctype.monthly_gl_summary.monthly_gl_summary import remove_voucher_from_monthly_gl_summary
 
 class PeriodClosingVoucher(AccountsController):
 	def validate(self):
@@ -17,6 +20,8 @@ class PeriodClosingVoucher(AccountsController):
 		self.make_gl_entries()
 
 	def on_cancel(self):
+		remove_voucher_from_monthly_gl_summary(self.doctype, self.name)
+		remove_voucher_from_monthly_expense_summary(self.doctype, self.name)
 		frappe.db.sql("""delete from `tabGL Entry`
 			where voucher_type = 'Period Closing Voucher' and voucher_no=%s""", self.name)
 
@@ -47,6 +52,20 @@ class PeriodClosingVoucher(AccountsController):
 				.format(pce[0][0], self.posting_date))
 
 	def make_gl_entries(self):
+		from erpnext.accounts.general_ledger import make_gl_entries_in_bulk
+		make_gl_entries_in_bulk(self.get_gl_entries(), publish_progress=True)
+
+	def preview_closing_entries(self):
+		"""Returns the closing entries that would be posted on submit, without posting them"""
+		self.validate()
+		return [{
+			"account": d.account,
+			"cost_center": d.cost_center,
+			"debit": d.debit,
+			"credit": d.credit
+		} for d in self.get_gl_entries()]
+
+	def get_gl_entries(self):
 		gl_entries = []
 		net_pl_balance = 0
 		pl_accounts = self.get_pl_balances()
@@ -80,19 +99,65 @@ class PeriodClosingVoucher(AccountsController):
 				"cost_center": cost_center
 			}))
 
-		from erpnext.accounts.general_ledger import make_gl_entries
-		make_gl_entries(gl_entries)
+		return gl_entries
 
 	def get_pl_balances(self):
-		"""Get balance for pl accounts"""
-		return frappe.db.sql("""
+		"""Get balance for pl accounts.
+
+		The balance of the expense accounts in company currency, for the months closed in full,
+		is read from the Monthly Expense Summary, the rest from the GL entries"""
+		company_currency = frappe.get_cached_value('Company', self.company, "default_currency")
+
+		posting_date = getdate(self.posting_date)
+		if posting_date == get_last_day(posting_date):
+			summary_end_date = posting_date
+		else:
+			summary_end_date = add_days(get_first_day(posting_date), -1)
+
+		values = {
+			"company": self.company,
+			"company_currency": company_currency,
+			"fiscal_year": self.fiscal_year,
+			"year_start_date": self.get("year_start_date"),
+			"posting_date": self.posting_date,
+			"summary_end_date": summary_end_date
+		}
+
+		summary_account_condition = """t2.root_type = 'Expense'
+			and ifnull(t2.account_currency, %(company_currency)s) = %(company_currency)s"""
+
+		balances = frappe.db.sql("""
+			select
+				t1.account, t1.cost_center, t2.account_currency,
+				sum(t1.amount) as balance_in_account_currency,
+				sum(t1.amount) as balance_in_company_currency
+			from `tabMonthly Expense Summary` t1, `tabAccount` t2
+			where t1.account = t2.name and {0}
+			and t2.docstatus < 2 and t2.company = %(company)s
+			and t1.fiscal_year = %(fiscal_year)s and t1.month_start_date <= %(summary_end_date)s
+			group by t1.account, t1.cost_center
+		""".format(summary_account_condition), values, as_dict=1)
+
+		balances += frappe.db.sql("""
 			select
 				t1.account, t1.cost_center, t2.account_currency,
 				sum(t1.debit_in_account_currency) - sum(t1.credit_in_account_currency) as balance_in_account_currency,
 				sum(t1.debit) - sum(t1.credit) as balance_in_company_currency
 			from `tabGL Entry` t1, `tabAccount` t2
 			where t1.account = t2.name and t2.report_type = 'Profit and Loss'
-			and t2.docstatus < 2 and t2.company = %s
-			and t1.posting_date between %s and %s
+			and t2.docstatus < 2 and t2.company = %(company)s
+			and t1.posting_date between %(year_start_date)s and %(posting_date)s
+			and not ({0} and t1.posting_date <= %(summary_end_date)s)
 			group by t1.account, t1.cost_center
-		""", (self.company, self.get("year_start_date"), self.posting_date), as_dict=1)
+		""".format(summary_account_condition), values, as_dict=1)
+
+		pl_balances = OrderedDict()
+		for d in balances:
+			key = (d.account, d.cost_center)
+			if key in pl_balances:
+				pl_balances[key].balance_in_account_currency += flt(d.balance_in_account_currency)
+				pl_balances[key].balance_in_company_currency += flt(d.balance_in_company_currency)
+			else:
+				pl_balances[key] = d
+
+		return list(pl_balances.values())
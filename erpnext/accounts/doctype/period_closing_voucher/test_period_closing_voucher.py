@@ -65,7 +65,26 @@ class TestPeriodClosingVoucher(unittest.TestCase):
 			self.assertEqual(gle_for_random_expense_account[0].amount_in_account_currency,
 				-1*random_expense_account[0].balance_in_account_currency)
 
-	def make_period_closing_voucher(self):
+	def test_preview_closing_entries(self):
+		make_journal_entry("_Test Account Cost for Goods Sold - _TC",
+			"_Test Bank - _TC", 600, "_Test Cost Center - _TC", posting_date=now(), submit=True)
+
+		pcv = self.make_period_closing_voucher(submit=False)
+		preview = sorted((d["account"], d["cost_center"], flt(d["debit"]), flt(d["credit"]))
+			for d in pcv.preview_closing_entries())
+
+		self.assertFalse(frappe.db.get_value("GL Entry", {"voucher_no": pcv.name}))
+
+		pcv.submit()
+		posted = sorted((d.account, d.cost_center, flt(d.debit), flt(d.credit))
+			for d in frappe.get_all("GL Entry", filters={"voucher_type": "Period Closing Voucher",
+				"voucher_no": pcv.name}, fields=["account", "cost_center", "debit", "credit"]))
+
+		self.assertEqual(preview, posted)
+
+		pcv.cancel()
+
+	def make_period_closing_voucher(self, submit=True):
 		pcv = frappe.get_doc({
 			"doctype": "Period Closing Voucher",
 			"closing_account_head": "_Test Account Reserves and Surplus - _TC",
@@ -76,7 +95,8 @@ class TestPeriodClosingVoucher(unittest.TestCase):
 			"remarks": "test"
 		})
 		pcv.insert()
-		pcv.submit()
+		if submit:
+			pcv.submit()
 
 		return pcv
 
@@ -402,21 +402,7 @@ def make_invoice(doc_list={}, email_queue_list={}, customers_list={}):
 	for docs in doc_list:
 		for name, doc in iteritems(docs):
 			if not frappe.db.exists('Sales Invoice', {'offline_pos_name': name}):
-				if isinstance(doc, dict):
-					validate_records(doc)
-					si_doc = frappe.new_doc('Sales Invoice')
-					si_doc.offline_pos_name = name
-					si_doc.update(doc)
-					si_doc.set_posting_time = 1
-					si_doc.customer = get_customer_id(doc)
-					si_doc.due_date = doc.get('posting_date')
-					name_list = submit_invoice(si_doc, name, doc, name_list)
-				else:
-					doc.due_date = doc.get('posting_date')
-					doc.customer = get_customer_id(doc)
-					doc.set_posting_time = 1
-					doc.offline_pos_name = name
-					name_list = submit_invoice(doc, name, doc, name_list)
+				name_list = make_offline_invoice(name, doc, name_list)
 			else:
 				name_list.append(name)
 
@@ -431,6 +417,116 @@ def make_invoice(doc_list={}, email_queue_list={}, customers_list={}):
 		'synced_contacts': get_contacts(customers)
 	}
 
+def make_offline_invoice(name, doc, name_list):
+	if isinstance(doc, dict):
+		validate_records(doc)
+		si_doc = frappe.new_doc('Sales Invoice')
+		si_doc.offline_pos_name = name
+		si_doc.update(doc)
+		si_doc.set_posting_time = 1
+		si_doc.customer = get_customer_id(doc)
+		si_doc.due_date = doc.get('posting_date')
+		return submit_invoice(si_doc, name, doc, name_list)
+	else:
+		doc.due_date = doc.get('posting_date')
+		doc.customer = get_customer_id(doc)
+		doc.set_posting_time = 1
+		doc.offline_pos_name = name
+		return submit_invoice(doc, name, doc, name_list)
+
+@frappe.whitelist()
+def sync_invoices(doc_list={}, email_queue_list={}, customers_list={}):
+	"""Sync a large queue of offline invoices in the background.
+
+	Returns a sync id and the status of each invoice. The status can be polled
+	with `get_sync_status`, invoices which are `Submitted` or `Draft` can be removed
+	from the offline queue and `Failed` ones can be sent again in a later sync."""
+	if isinstance(doc_list, string_types):
+		doc_list = json.loads(doc_list)
+
+	if isinstance(email_queue_list, string_types):
+		email_queue_list = json.loads(email_queue_list)
+
+	if isinstance(customers_list, string_types):
+		customers_list = json.loads(customers_list)
+
+	customers_list = make_customer_and_address(customers_list)
+
+	invoices = []
+	for docs in doc_list:
+		for name, doc in iteritems(docs):
+			invoices.append((name, doc))
+
+	sync_id = frappe.generate_hash(length=10)
+	status = get_offline_invoice_status([name for name, doc in invoices])
+	pending = [(name, doc) for name, doc in invoices if status[name] == "Queued"]
+	set_sync_status(sync_id, status)
+
+	frappe.enqueue(make_invoices_in_background, queue="long", timeout=3600,
+		sync_id=sync_id, invoices=pending, email_queue_list=email_queue_list,
+		now=frappe.flags.in_test)
+
+	customers = get_customers_list()
+	return {
+		'sync_id': sync_id,
+		'invoices': get_sync_status(sync_id).get('invoices'),
+		'customers': customers_list,
+		'synced_customers_list': customers,
+		'synced_address': get_customers_address(customers),
+		'synced_contacts': get_contacts(customers)
+	}
+
+@frappe.whitelist()
+def get_sync_status(sync_id):
+	return frappe.cache().get_value("pos_invoice_sync|" + sync_id) or {}
+
+def set_sync_status(sync_id, status, email_queue=None):
+	data = get_sync_status(sync_id) or {"email_queue": []}
+	data["invoices"] = status
+	data["email_queue"].extend(email_queue or [])
+	data["completed"] = "Queued" not in status.values()
+	frappe.cache().set_value("pos_invoice_sync|" + sync_id, data, expires_in_sec=86400)
+
+def make_invoices_in_background(sync_id, invoices, email_queue_list=None, chunk_size=20):
+	"""Make the invoices in chunks, one after the other, so that the stock and accounting
+		ledger of an item is posted in the order of sale, and publish the status after each chunk"""
+	status = get_sync_status(sync_id).get("invoices") or {}
+	email_queue_list = email_queue_list or {}
+
+	for i in range(0, len(invoices), chunk_size):
+		chunk = invoices[i:i + chunk_size]
+		names = [name for name, doc in chunk]
+
+		for name, doc in chunk:
+			try:
+				make_offline_invoice(name, doc, [])
+			except Exception:
+				# e.g. its customer or items could not be made, it is marked Failed and the rest are made
+				frappe.db.rollback()
+				frappe.log_error(frappe.get_traceback(), _("Offline POS Invoice {0}").format(name))
+
+		status.update(get_offline_invoice_status(names, default="Failed"))
+		email_queue = make_email_queue({key: data for key, data in iteritems(email_queue_list)
+			if key in names and status[key] != "Failed"})
+		frappe.db.commit()
+
+		set_sync_status(sync_id, status, email_queue)
+		frappe.publish_realtime("pos_invoice_sync", {"sync_id": sync_id,
+			"synced": len([d for d in status.values() if d != "Queued"]), "total": len(status)},
+			user=frappe.session.user)
+
+def get_offline_invoice_status(names, default="Queued"):
+	status = {name: default for name in names}
+	if not names:
+		return status
+
+	for name, docstatus in frappe.db.sql("""select offline_pos_name, docstatus
+		from `tabSales Invoice` where offline_pos_name in ({0})"""
+		.format(", ".join(["%s"] * len(names))), tuple(names)):
+		status[name] = "Draft" if docstatus == 0 else "Submitted"
+
+	return status
+
 
 def validate_records(doc):
 	validate_item(doc)
@@ -606,6 +702,7 @@ def save_invoice(doc, name, name_list):
 		if not frappe.db.exists('Sales Invoice', {'offline_pos_name': name}):
 			si = frappe.new_doc('Sales Invoice')
 			si.update(doc)
+			si.offline_pos_name = name
 			si.set_posting_time = 1
 			si.customer = get_customer_id(doc)
 			si.due_date = doc.get('posting_date')
@@ -19,7 +19,8 @@ from erpnext.assets.doctype.asset.depreciation \
 	import get_disposal_account_and_cost_center, get_gl_entries_on_asset_disposal
 from erpnext.stock.doctype.batch.batch import set_batch_nos
 from erpnext.stock.doctype.serial_no.serial_no import get_serial_nos, get_delivery_note_serial_no
-from erpnext.setup.doctype.company.company import update_company_current_month_sales
+from erpnext.setup.doctype.company.company import update_company_current_month_sales, update_company_monthly_sales
+from erpnext.selling.doctype.monthly_sales_summary.monthly_sales_summary import update_monthly_sales_summary
 from erpnext.accounts.general_ledger import get_round_off_account_and_cost_center
 from erpnext.accounts.doctype.loyalty_program.loyalty_program import \
 	get_loyalty_program_details_with_points, get_loyalty_details, validate_loyalty_points
@@ -189,8 +190,10 @@ class SalesInvoice(SellingController):
 
 		self.update_time_sheet(self.name)
 
+		update_monthly_sales_summary(self)
 		if frappe.db.get_single_value('Selling Settings', 'sales_update_frequency') == "Each Transaction":
 			update_company_current_month_sales(self.company)
+			update_company_monthly_sales(self.company)
 			self.update_project()
 		update_linked_doc(self.doctype, self.name, self.inter_company_invoice_reference)
 
@@ -257,8 +260,10 @@ class SalesInvoice(SellingController):
 		self.make_gl_entries_on_cancel()
 		frappe.db.set(self, 'status', 'Cancelled')
 
+		update_monthly_sales_summary(self)
 		if frappe.db.get_single_value('Selling Settings', 'sales_update_frequency') == "Each Transaction":
 			update_company_current_month_sales(self.company)
+			update_company_monthly_sales(self.company)
 			self.update_project()
 		if not self.is_return and self.loyalty_program:
 			self.delete_loyalty_point_entry()
@@ -754,6 +754,58 @@ class TestSalesInvoice(unittest.TestCase):
 
 		self.pos_gl_entry(si, pos, 50)
 
+	def test_sync_pos_invoices(self):
+		from erpnext.accounts.doctype.sales_invoice.pos import sync_invoices, get_sync_status
+
+		make_pos_profile()
+		make_purchase_receipt(company= "_Test Company with perpetual inventory",supplier_warehouse= "Work In Progress - TCP1", item_code= "_Test FG Item",warehouse= "Stores - TCP1",cost_center= "Main - TCP1")
+		pos = create_sales_invoice(company= "_Test Company with perpetual inventory", debit_to="Debtors - TCP1", item_code= "_Test FG Item", warehouse="Stores - TCP1", income_account = "Sales - TCP1", expense_account = "Cost of Goods Sold - TCP1", cost_center = "Main - TCP1", do_not_save=True)
+
+		pos.is_pos = 1
+		pos.update_stock = 1
+		pos.append("payments", {'mode_of_payment': 'Cash', 'account': 'Cash - TCP1', 'amount': 100})
+
+		offline_pos_name = str(cint(time.time()))
+		sync = sync_invoices([{offline_pos_name: pos}])
+
+		status = get_sync_status(sync.get('sync_id'))
+		self.assertTrue(status.get('completed'))
+		self.assertEqual(status.get('invoices'), {offline_pos_name: 'Submitted'})
+		self.assertTrue(frappe.db.get_value('Sales Invoice',
+			{'offline_pos_name': offline_pos_name, 'docstatus': 1}))
+
+		# already synced invoices are not made again
+		sync = sync_invoices([{offline_pos_name: pos}])
+		self.assertEqual(sync.get('invoices'), {offline_pos_name: 'Submitted'})
+		self.assertEqual(frappe.db.count('Sales Invoice', {'offline_pos_name': offline_pos_name}), 1)
+
+	def test_sync_pos_invoices_with_a_failed_invoice(self):
+		from erpnext.accounts.doctype.sales_invoice.pos import sync_invoices, get_sync_status
+
+		make_pos_profile()
+		make_purchase_receipt(company= "_Test Company with perpetual inventory",supplier_warehouse= "Work In Progress - TCP1", item_code= "_Test FG Item",warehouse= "Stores - TCP1",cost_center= "Main - TCP1")
+		pos = create_sales_invoice(company= "_Test Company with perpetual inventory", debit_to="Debtors - TCP1", item_code= "_Test FG Item", warehouse="Stores - TCP1", income_account = "Sales - TCP1", expense_account = "Cost of Goods Sold - TCP1", cost_center = "Main - TCP1", do_not_save=True)
+
+		pos.is_pos = 1
+		pos.update_stock = 1
+		pos.append("payments", {'mode_of_payment': 'Cash', 'account': 'Cash - TCP1', 'amount': 100})
+
+		# its item can not be made, as the item group does not exist
+		failed_invoice = {
+			"customer": "_Test Customer",
+			"company": "_Test Company",
+			"items": [{"item_code": "_Test Offline POS Item", "item_group": "_Test Missing Item Group", "qty": 1}]
+		}
+
+		timestamp = str(cint(time.time()))
+		failed_pos_name, offline_pos_name = timestamp + "-1", timestamp + "-2"
+		sync = sync_invoices([{failed_pos_name: failed_invoice}, {offline_pos_name: pos}])
+
+		status = get_sync_status(sync.get('sync_id'))
+		self.assertTrue(status.get('completed'))
+		self.assertEqual(status.get('invoices'), {failed_pos_name: 'Failed', offline_pos_name: 'Submitted'})
+		self.assertFalse(frappe.db.exists('Sales Invoice', {'offline_pos_name': failed_pos_name}))
+
 	def test_make_pos_invoice_in_draft(self):
 		from erpnext.accounts.doctype.sales_invoice.pos import make_invoice
 		from erpnext.stock.doctype.item.test_item import make_item
@@ -1425,6 +1477,26 @@ class TestSalesInvoice(unittest.TestCase):
 		current_month_sales = frappe.get_cached_value('Company',  "_Test Company",  "total_monthly_sales")
 		self.assertEqual(current_month_sales, existing_current_month_sales)
 
+	def test_monthly_sales_summary(self):
+		from erpnext.selling.doctype.monthly_sales_summary.monthly_sales_summary import get_monthly_sales
+
+		def get_totals():
+			invoices = get_monthly_sales("_Test Company", nowdate(), nowdate(), customer="_Test Customer")
+			items = get_monthly_sales("_Test Company", nowdate(), nowdate(), customer="_Test Customer",
+				item_code="_Test Item")
+			return [flt(invoices[0].base_grand_total) if invoices else 0,
+				cint(invoices[0].invoice_count) if invoices else 0,
+				flt(items[0].qty) if items else 0, flt(items[0].base_net_amount) if items else 0]
+
+		existing_totals = get_totals()
+
+		si = create_sales_invoice(qty=5, rate=100)
+		self.assertEqual(get_totals(), [existing_totals[0] + si.base_grand_total, existing_totals[1] + 1,
+			existing_totals[2] + 5, existing_totals[3] + 500])
+
+		si.cancel()
+		self.assertEqual(get_totals(), existing_totals)
+
 	def test_rounding_adjustment(self):
 		si = create_sales_invoice(rate=24900, do_not_save=True)
 		for tax in ["Tax 1", "Tax2"]:
@@ -1676,6 +1748,14 @@ class TestSalesInvoice(unittest.TestCase):
 
 		self.check_gl_entries(si.name, expected_gle, "2019-01-31")
 
+		# booked periods are not booked again when a run is repeated
+		convert_deferred_revenue_to_income(start_date="2019-01-01", end_date="2019-03-31")
+		self.check_gl_entries(si.name, expected_gle, "2019-01-31")
+
+		# the entries posted together are given their fiscal year, like the ones inserted one by one
+		self.assertFalse(frappe.db.sql("""select name from `tabGL Entry`
+			where voucher_type='Sales Invoice' and voucher_no=%s and ifnull(fiscal_year, '') = ''""", si.name))
+
 	def check_gl_entries(self, voucher_no, expected_gle, posting_date):
 		gl_entries = frappe.db.sql("""select account, debit, credit, posting_date
 			from `tabGL Entry`
@@ -7,6 +7,7 @@ from __future__ import unicode_literals
 import frappe
 from frappe import _
 from frappe.model.document import Document
+from itertools import groupby
 from frappe.utils.data import nowdate, getdate, cint, add_days, date_diff, get_last_day, add_to_date, flt
 from erpnext.accounts.doctype.subscription_plan.subscription_plan import get_plan_rate
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import get_accounting_dimensions
@@ -206,6 +207,41 @@ class Subscription(Document):
 	def validate(self):
 		self.validate_trial_period()
 		self.validate_plans_billing_cycle(self.get_billing_cycle_and_interval())
+		self.set_next_action_date()
+
+	def set_next_action_date(self):
+		"""
+		Sets the date from which `process` can change the `Subscription`. The scheduler only
+		processes the subscriptions whose date has come.
+
+		Changes that depend on the payment of the current invoice are not dated, the date is
+		set when the outstanding amount of the invoice changes.
+		"""
+		self.next_action_date = None
+
+		current_invoice = None
+		if len(self.invoices):
+			current_invoice = frappe.db.get_value('Sales Invoice', self.invoices[-1].invoice,
+				['posting_date', 'due_date', 'status'], as_dict=1)
+
+		if self.status == 'Active':
+			# invoicing, past due and cancellation at period end are checked once the period is over
+			if getdate(self.current_invoice_end) == getdate(self.current_invoice_start):
+				self.next_action_date = self.current_invoice_end
+			else:
+				self.next_action_date = add_days(self.current_invoice_end, 1)
+
+			if self.generate_invoice_at_period_start and (not current_invoice
+				or (current_invoice.status == 'Paid'
+					and getdate(current_invoice.posting_date) != getdate(self.current_invoice_start))):
+				self.next_action_date = min(getdate(self.next_action_date), getdate(self.current_invoice_start))
+
+		elif self.status in ['Past Due Date', 'Unpaid'] and current_invoice:
+			if self.is_not_outstanding(current_invoice):
+				self.next_action_date = nowdate()
+			elif self.status == 'Past Due Date':
+				grace_period = cint(frappe.db.get_single_value('Subscription Settings', 'grace_period'))
+				self.next_action_date = add_days(current_invoice.due_date, grace_period + 1)
 
 	def validate_trial_period(self):
 		"""
@@ -299,14 +335,22 @@ class Subscription(Document):
 		if prorate:
 			prorate_factor = get_prorata_factor(self.current_invoice_end, self.current_invoice_start)
 
+		# shared by the subscriptions processed together, see `process_subscriptions`
+		plan_rates = self.flags.plan_rates if self.flags.plan_rates is not None else {}
+
 		items = []
 		customer = self.customer
 		for plan in plans:
-			item_code = frappe.db.get_value("Subscription Plan", plan.plan, "item")
+			key = (plan.plan, plan.qty, customer)
+			if key not in plan_rates:
+				plan_rates[key] = (frappe.db.get_value("Subscription Plan", plan.plan, "item"),
+					get_plan_rate(plan.plan, plan.qty, customer))
+
+			item_code, rate = plan_rates[key]
 			if not prorate:
-				items.append({'item_code': item_code, 'qty': plan.qty, 'rate': get_plan_rate(plan.plan, plan.qty, customer)})
+				items.append({'item_code': item_code, 'qty': plan.qty, 'rate': rate})
 			else:
-				items.append({'item_code': item_code, 'qty': plan.qty, 'rate': (get_plan_rate(plan.plan, plan.qty, customer) * prorate_factor)})
+				items.append({'item_code': item_code, 'qty': plan.qty, 'rate': (rate * prorate_factor)})
 
 		return items
 
@@ -458,30 +502,57 @@ def get_prorata_factor(period_end, period_start):
 
 def process_all():
 	"""
-	Task to updates the status of all `Subscription` apart from those that are cancelled
+	Task to updates the status of the due `Subscription`s, in background jobs of about 500
+	subscriptions that run in parallel. The subscriptions of a customer are processed in
+	the same job, one after the other.
 	"""
-	subscriptions = get_all_subscriptions()
-	for subscription in subscriptions:
-		process(subscription)
+	names = []
+	for customer, subscriptions in groupby(get_all_subscriptions(), key=lambda d: d.customer):
+		names.extend([d.name for d in subscriptions])
+
+		if len(names) >= 500:
+			enqueue_process_subscriptions(names)
+			names = []
+
+	if names:
+		enqueue_process_subscriptions(names)
 
 
 def get_all_subscriptions():
 	"""
-	Returns all `Subscription` documents
+	Returns the `Subscription`s due for processing, apart from those that are cancelled
 	"""
 	return frappe.db.sql(
-		'select name from `tabSubscription` where status != "Cancelled"',
-		as_dict=1
+		'select name, customer from `tabSubscription` '
+		'where status != "Cancelled" and next_action_date <= %s '
+		'order by customer',
+		nowdate(), as_dict=1
 	)
 
 
-def process(data):
+def enqueue_process_subscriptions(names):
+	frappe.enqueue(process_subscriptions, queue='long', timeout=3600,
+		names=names, now=frappe.flags.in_test)
+
+
+def process_subscriptions(names):
+	"""
+	Processes the `Subscription`s, the items and rates of the plans are looked up once
+	for each plan, quantity and customer
+	"""
+	plan_rates = {}
+	for name in names:
+		process({'name': name}, plan_rates)
+
+
+def process(data, plan_rates=None):
 	"""
 	Checks a `Subscription` and updates it status as necessary
 	"""
 	if data:
 		try:
 			subscription = frappe.get_doc('Subscription', data['name'])
+			subscription.flags.plan_rates = plan_rates
 			subscription.process()
 			frappe.db.commit()
 		except frappe.ValidationError:
@@ -491,6 +562,19 @@ def process(data):
 			frappe.db.commit()
 
 
+def set_subscriptions_due(invoice):
+	"""
+	Called when the outstanding amount of the `Sales Invoice` changes. The `Subscription`s
+	of the invoice are processed by the next run of the scheduler
+	"""
+	frappe.db.sql(
+		'update `tabSubscription` set next_action_date = %s '
+		'where status != "Cancelled" and name in '
+		'(select parent from `tabSubscription Invoice` where invoice = %s)',
+		(nowdate(), invoice)
+	)
+
+
 @frappe.whitelist()
 def cancel_subscription(name):
 	"""
@@ -6,8 +6,8 @@ from __future__ import unicode_literals
 import unittest
 
 import frappe
-from erpnext.accounts.doctype.subscription.subscription import get_prorata_factor
-from frappe.utils.data import nowdate, add_days, add_to_date, add_months, date_diff, flt
+from erpnext.accounts.doctype.subscription.subscription import get_prorata_factor, set_subscriptions_due
+from frappe.utils.data import nowdate, add_days, add_to_date, add_months, date_diff, flt, getdate, cint
 
 
 def create_plan():
@@ -117,6 +117,30 @@ class TestSubscription(unittest.TestCase):
 		self.assertEqual(subscription.status, 'Past Due Date')
 		subscription.delete()
 
+	def test_next_action_date(self):
+		subscription = frappe.new_doc('Subscription')
+		subscription.customer = '_Test Customer'
+		subscription.start = '2018-01-01'
+		subscription.append('plans', {'plan': '_Test Plan Name', 'qty': 1})
+		subscription.insert()
+
+		self.assertEqual(subscription.status, 'Active')
+		self.assertEqual(getdate(subscription.next_action_date), getdate('2018-02-01'))
+		subscription.process()
+
+		self.assertEqual(subscription.status, 'Past Due Date')
+		grace_period = cint(frappe.db.get_single_value('Subscription Settings', 'grace_period'))
+		self.assertEqual(getdate(subscription.next_action_date),
+			getdate(add_days(subscription.get_current_invoice().due_date, grace_period + 1)))
+
+		# paying the invoice makes the subscription due
+		frappe.db.set_value('Subscription', subscription.name, 'next_action_date', None)
+		set_subscriptions_due(subscription.invoices[-1].invoice)
+		self.assertEqual(getdate(frappe.db.get_value('Subscription', subscription.name, 'next_action_date')),
+			getdate(nowdate()))
+
+		subscription.delete()
+
 	def test_status_goes_back_to_active_after_invoice_is_paid(self):
 		subscription = frappe.new_doc('Subscription')
 		subscription.customer = '_Test Customer'
@@ -3,12 +3,17 @@
 
 from __future__ import unicode_literals
 import frappe, erpnext
-from frappe.utils import flt, cstr, cint, comma_and
+from frappe.utils import flt, cstr, cint, comma_and, now, getdate
 from frappe import _
 from erpnext.accounts.utils import get_stock_and_account_balance
 from frappe.model.meta import get_field_precision
-from erpnext.accounts.doctype.budget.budget import validate_expense_against_budget
+from erpnext.accounts.doctype.budget.budget import validate_expenses_against_budget
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import get_accounting_dimensions
+from erpnext.accounts.doctype.outstanding_voucher.outstanding_voucher import update_outstanding_vouchers
+from erpnext.accounts.doctype.monthly_expense_summary.monthly_expense_summary import (update_monthly_expense_summary,
+	remove_voucher_from_monthly_expense_summary)
+from erpnext.accounts.doctype.monthly_gl_summary.monthly_gl_summary import (update_monthly_gl_summary,
+	remove_voucher_from_monthly_gl_summary)
 
 
 class ClosedAccountingPeriod(frappe.ValidationError): pass
@@ -20,7 +25,11 @@ def make_gl_entries(gl_map, cancel=False, adv_adj=False, merge_entries=True, upd
 		if not cancel:
 			validate_accounting_period(gl_map)
 			gl_map = process_gl_map(gl_map, merge_entries)
-			if gl_map and len(gl_map) > 1:
+			if gl_map and len(gl_map) > 1 and frappe.flags.batch_gl_entries is not None and not adv_adj:
+				# collected to be posted with make_gl_entries_in_bulk, e.g. while importing vouchers
+				round_off_debit_credit(gl_map)
+				frappe.flags.batch_gl_entries.extend(gl_map)
+			elif gl_map and len(gl_map) > 1:
 				save_entries(gl_map, adv_adj, update_outstanding, from_repost)
 			else:
 				frappe.throw(_("Incorrect number of General Ledger Entries found. You might have selected a wrong Account in the transaction."))
@@ -127,14 +136,110 @@ def save_entries(gl_map, adv_adj, update_outstanding, from_repost=False):
 	for entry in gl_map:
 		make_entry(entry, adv_adj, update_outstanding, from_repost)
 
-		# check against budget
-		if not from_repost:
-			validate_expense_against_budget(entry)
+	update_outstanding_vouchers(gl_map)
+	update_monthly_expense_summary(gl_map)
+	update_monthly_gl_summary(gl_map)
+
+	# check against budget
+	if not from_repost:
+		validate_expenses_against_budget(gl_map)
 
 	if not from_repost:
 		validate_account_for_perpetual_inventory(gl_map)
 
 
+def make_gl_entries_in_bulk(gl_map, merge_entries=True, publish_progress=False):
+	"""
+		Post the GL entries with multi-row inserts, validating the accounts of all the entries together
+		instead of inserting each GL Entry. For vouchers with many entries, like the Period Closing Voucher
+	"""
+	from frappe.model import default_fields
+	from erpnext.accounts.doctype.gl_entry.gl_entry import check_freezing_date, validate_frozen_account
+
+	validate_accounting_period(gl_map)
+	gl_map = process_gl_map(gl_map, merge_entries)
+	if not gl_map:
+		return
+
+	round_off_debit_credit(gl_map)
+	validate_account_details(gl_map)
+
+	check_freezing_date(min(getdate(entry.posting_date) for entry in gl_map))
+	for account in set(entry.account for entry in gl_map):
+		validate_frozen_account(account)
+
+	fields = [fieldname for fieldname in frappe.get_meta("GL Entry").get_valid_columns()
+		if fieldname not in default_fields and fieldname != "to_rename"]
+
+	# named like GL Entry.autoname, the names are changed with the others by the scheduler
+	timestamp, user = now(), frappe.session.user
+	for i in range(0, len(gl_map), 500):
+		chunk = gl_map[i:i + 500]
+		frappe.db.sql("""
+			insert into `tabGL Entry`
+				(name, creation, modified, modified_by, owner, docstatus, to_rename, {0})
+			values {1}
+		""".format(", ".join(fields),
+			", ".join(["(" + ", ".join(["%s"] * (len(fields) + 7)) + ")"] * len(chunk))),
+			tuple(v for entry in chunk
+				for v in [frappe.generate_hash(length=10), timestamp, timestamp, user, user, 1, 1]
+					+ [entry.get(fieldname) for fieldname in fields]))
+
+		if publish_progress:
+			frappe.publish_progress(min(i + 500, len(gl_map)) * 100 / len(gl_map),
+				title=_("Posting GL Entries..."))
+
+	update_outstanding_vouchers(gl_map)
+	update_monthly_expense_summary(gl_map)
+	update_monthly_gl_summary(gl_map)
+
+	# the expense is read from the summary, so the entries are checked before they are committed
+	if gl_map[0].voucher_type != "Period Closing Voucher":
+		validate_expenses_against_budget(gl_map)
+
+def validate_account_details(gl_map):
+	"""Validate the accounts and cost centers of the entries and set their fiscal year,
+		like GL Entry does for each entry, with the details of all the accounts read at once"""
+	from erpnext.accounts.utils import get_fiscal_year, get_allow_cost_center_in_entry_of_bs_account
+
+	accounts = {d.name: d for d in frappe.db.sql("""select name, is_group, disabled, company, report_type
+		from tabAccount where name in %s""", [list(set(entry.account for entry in gl_map))], as_dict=1)}
+	allow_cost_center_in_entry_of_bs_account = get_allow_cost_center_in_entry_of_bs_account()
+
+	fiscal_years = {}
+	for entry in gl_map:
+		account = accounts.get(entry.account)
+		if not account:
+			frappe.throw(_("{0} {1}: Account {2} does not exist")
+				.format(entry.voucher_type, entry.voucher_no, entry.account))
+
+		if account.is_group:
+			frappe.throw(_("{0} {1}: Account {2} cannot be a Group")
+				.format(entry.voucher_type, entry.voucher_no, entry.account))
+
+		if account.disabled:
+			frappe.throw(_("{0} {1}: Account {2} is disabled")
+				.format(entry.voucher_type, entry.voucher_no, entry.account))
+
+		if account.company != entry.company:
+			frappe.throw(_("{0} {1}: Account {2} does not belong to Company {3}")
+				.format(entry.voucher_type, entry.voucher_no, entry.account, entry.company))
+
+		if account.report_type == "Profit and Loss":
+			if not entry.cost_center and entry.voucher_type != "Period Closing Voucher":
+				frappe.throw(_("{0} {1}: Cost Center is required for 'Profit and Loss' account {2}. Please set up a default Cost Center for the Company.")
+					.format(entry.voucher_type, entry.voucher_no, entry.account))
+		else:
+			if not allow_cost_center_in_entry_of_bs_account:
+				entry.cost_center = None
+			entry.project = None
+
+		if not entry.get("fiscal_year"):
+			key = (entry.company, getdate(entry.posting_date))
+			if key not in fiscal_years:
+				fiscal_years[key] = get_fiscal_year(entry.posting_date, company=entry.company)[0]
+			entry.fiscal_year = fiscal_years[key]
+
 def make_entry(args, adv_adj, update_outstanding, from_repost=False):
 	args.update({"doctype": "GL Entry"})
 	gle = frappe.get_doc(args)
@@ -289,21 +394,29 @@ def delete_gl_entries(gl_entries=None, voucher_type=None, voucher_no=None,
 	if not gl_entries:
 		gl_entries = frappe.db.sql("""
 			select account, posting_date, party_type, party, cost_center, fiscal_year,voucher_type,
-			voucher_no, against_voucher_type, against_voucher, cost_center, company
+			voucher_no, against_voucher_type, against_voucher, cost_center, project, company
 			from `tabGL Entry`
 			where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no), as_dict=True)
 
 	if gl_entries:
 		check_freezing_date(gl_entries[0]["posting_date"], adv_adj)
 
+	remove_voucher_from_monthly_gl_summary(voucher_type or gl_entries[0]["voucher_type"],
+		voucher_no or gl_entries[0]["voucher_no"])
+	remove_voucher_from_monthly_expense_summary(voucher_type or gl_entries[0]["voucher_type"],
+		voucher_no or gl_entries[0]["voucher_no"])
+
 	frappe.db.sql("""delete from `tabGL Entry` where voucher_type=%s and voucher_no=%s""",
 		(voucher_type or gl_entries[0]["voucher_type"], voucher_no or gl_entries[0]["voucher_no"]))
 
+	update_outstanding_vouchers(gl_entries)
+
+	if not adv_adj:
+		validate_expenses_against_budget(gl_entries)
+
 	for entry in gl_entries:
 		validate_frozen_account(entry["account"], adv_adj)
 		validate_balance_type(entry["account"], adv_adj)
-		if not adv_adj:
-			validate_expense_against_budget(entry)
 
 		if entry.get("against_voucher") and update_outstanding == 'Yes' and not adv_adj:
 			update_outstanding_amt(entry["account"], entry.get("party_type"), entry.get("party"), entry.get("against_voucher_type"),
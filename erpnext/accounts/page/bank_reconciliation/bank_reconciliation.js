@@ -300,10 +300,21 @@ erpnext.accounts.ReconciliationTool = class ReconciliationTool extends frappe.vi
 		const me = this;
 		this.$result.find('.list-row-container').remove();
 		$('[data-fieldname="name"]').remove();
-		me.data.map((value) => {
+		const rows = me.data.map((value) => {
 			const row = $('<div class="list-row-container">').data("data", value).appendTo(me.$result).get(0);
-			new erpnext.accounts.ReconciliationRow(row, value);
+			return new erpnext.accounts.ReconciliationRow(row, value);
 		})
+
+		if (rows.length) {
+			// match the payments of all the displayed transactions at once
+			frappe.xcall('erpnext.accounts.page.bank_reconciliation.bank_reconciliation.get_linked_payments_for_transactions',
+				{bank_transactions: me.data.map(value => value.name)}
+			).then((result) => {
+				rows.forEach(row => {
+					row.linked_payments = result[row.data.name] || [];
+				})
+			})
+		}
 	}
 
 	render_header() {
@@ -383,6 +394,11 @@ erpnext.accounts.ReconciliationRow = class ReconciliationRow {
 			me.gl_account = r.account;
 		})
 
+		if (me.linked_payments) {
+			me.make_dialog(me.linked_payments);
+			return;
+		}
+
 		frappe.xcall('erpnext.accounts.page.bank_reconciliation.bank_reconciliation.get_linked_payments',
 			{bank_transaction: data, freeze:true, freeze_message:__("Finding linked payments")}
 		).then((result) => {
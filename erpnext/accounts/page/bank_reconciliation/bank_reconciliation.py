@@ -3,11 +3,12 @@
 # For license information, please see license.txt
 
 from __future__ import unicode_literals
-import frappe
+import frappe, json, re
 from frappe import _
 import difflib
-from frappe.utils import flt
-from six import iteritems
+from bisect import bisect_left, bisect_right
+from frappe.utils import flt, cint, cstr, date_diff
+from six import iteritems, string_types
 from erpnext import get_company_currency
 
 @frappe.whitelist()
@@ -45,150 +46,212 @@ def add_payment_to_transaction(transaction, payment_entry, gl_entry):
 
 @frappe.whitelist()
 def get_linked_payments(bank_transaction):
-	transaction = frappe.get_doc("Bank Transaction", bank_transaction)
-	bank_account = frappe.db.get_values("Bank Account", transaction.bank_account, ["account", "company"], as_dict=True)
+	return get_linked_payments_for_transactions([bank_transaction]).get(bank_transaction) or []
 
-	# Get all payment entries with a matching amount
-	amount_matching = check_matching_amount(bank_account[0].account, bank_account[0].company, transaction)
+@frappe.whitelist()
+def get_linked_payments_for_transactions(bank_transactions, amount_tolerance=0, date_window=None):
+	"""Returns the payments matching each bank transaction, keyed by bank transaction.
 
-	# Get some data from payment entries linked to a corresponding bank transaction
-	description_matching = get_matching_descriptions_data(bank_account[0].company, transaction)
+	The uncleared payments of each bank account are loaded and indexed once for all the transactions.
+	Payments within `amount_tolerance` of the amount of the transaction are matched, or if there
+	are none, the payments whose reference number is found in the description.
+	If `date_window` is set, payments posted more than `date_window` days apart are left out"""
+	if isinstance(bank_transactions, string_types):
+		bank_transactions = json.loads(bank_transactions)
 
-	if amount_matching:
-		return check_amount_vs_description(amount_matching, description_matching)
+	transactions = frappe.get_all("Bank Transaction", filters={"name": ("in", bank_transactions)},
+		fields=["name", "date", "description", "debit", "credit", "bank_account"])
 
-	elif description_matching:
-		description_matching = filter(lambda x: not x.get('clearance_date'), description_matching)
-		if not description_matching:
-			return []
+	payment_indexes, reconciled_transactions, out = {}, None, {}
+	for transaction in transactions:
+		if transaction.bank_account not in payment_indexes:
+			account, company = frappe.db.get_value("Bank Account", transaction.bank_account, ["account", "company"])
+			payment_indexes[transaction.bank_account] = (company,
+				make_payment_index(get_uncleared_payments(account, company)))
 
-		return sorted(list(description_matching), key = lambda x: x["posting_date"], reverse=True)
+		company, payment_index = payment_indexes[transaction.bank_account]
 
-	else:
-		return []
+		# Get all payment entries with a matching amount or reference
+		amount_matching = get_matching_payments(transaction, payment_index, amount_tolerance, date_window)
+
+		# Get some data from payment entries linked to a corresponding bank transaction
+		if transaction.description and reconciled_transactions is None:
+			reconciled_transactions = get_reconciled_transactions()
+		description_matching = get_matching_descriptions_data(company, transaction, reconciled_transactions)
+
+		if amount_matching:
+			out[transaction.name] = check_amount_vs_description(amount_matching, description_matching)
+
+		elif description_matching:
+			description_matching = [x for x in description_matching if not x.get('clearance_date')]
+			out[transaction.name] = sorted(description_matching, key = lambda x: x["posting_date"], reverse=True)
+
+		else:
+			out[transaction.name] = []
+
+	return out
 
 def check_matching_amount(bank_account, company, transaction):
-	payments = []
-	amount = transaction.credit if transaction.credit > 0 else transaction.debit
-
-	payment_type = "Receive" if transaction.credit > 0 else "Pay"
-	account_from_to = "paid_to" if transaction.credit > 0 else "paid_from"
-	currency_field = "paid_to_account_currency as currency" if transaction.credit > 0 else "paid_from_account_currency as currency"
-
-	payment_entries = frappe.get_all("Payment Entry", fields=["'Payment Entry' as doctype", "name", "paid_amount", "payment_type", "reference_no", "reference_date",
-		"party", "party_type", "posting_date", "{0}".format(currency_field)], filters=[["paid_amount", "like", "{0}%".format(amount)],
-		["docstatus", "=", "1"], ["payment_type", "=", [payment_type, "Internal Transfer"]], ["ifnull(clearance_date, '')", "=", ""], ["{0}".format(account_from_to), "=", "{0}".format(bank_account)]])
-
-	if transaction.credit > 0:
-		journal_entries = frappe.db.sql("""
-			SELECT
-				'Journal Entry' as doctype, je.name, je.posting_date, je.cheque_no as reference_no,
-				je.pay_to_recd_from as party, je.cheque_date as reference_date, jea.debit_in_account_currency as paid_amount
-			FROM
-				`tabJournal Entry Account` as jea
-			JOIN
-				`tabJournal Entry` as je
-			ON
-				jea.parent = je.name
-			WHERE
-				(je.clearance_date is null or je.clearance_date='0000-00-00')
-			AND
-				jea.account = %s
-			AND
-				jea.debit_in_account_currency like %s
-			AND
-				je.docstatus = 1
-		""", (bank_account, amount), as_dict=True)
-	else:
-		journal_entries = frappe.db.sql("""
-			SELECT
-				'Journal Entry' as doctype, je.name, je.posting_date, je.cheque_no as reference_no,
-				jea.account_currency as currency, je.pay_to_recd_from as party, je.cheque_date as reference_date,
-				jea.credit_in_account_currency as paid_amount
-			FROM
-				`tabJournal Entry Account` as jea
-			JOIN
-				`tabJournal Entry` as je
-			ON
-				jea.parent = je.name
-			WHERE
-				(je.clearance_date is null or je.clearance_date='0000-00-00')
-			AND
-				jea.account = %(bank_account)s
-			AND
-				jea.credit_in_account_currency like %(txt)s
-			AND
-				je.docstatus = 1
-		""", {
-			'bank_account': bank_account,
-			'txt': '%%%s%%' % amount
-		}, as_dict=True)
-
-	if transaction.credit > 0:
-		sales_invoices = frappe.db.sql("""
-			SELECT
-				'Sales Invoice' as doctype, si.name, si.customer as party,
-				si.posting_date, sip.amount as paid_amount
-			FROM
-				`tabSales Invoice Payment` as sip
-			JOIN
-				`tabSales Invoice` as si
-			ON
-				sip.parent = si.name
-			WHERE
-				(sip.clearance_date is null or sip.clearance_date='0000-00-00')
-			AND
-				sip.account = %s
-			AND
-				sip.amount like %s
-			AND
-				si.docstatus = 1
-		""", (bank_account, amount), as_dict=True)
-	else:
-		sales_invoices = []
+	return get_matching_payments(transaction, make_payment_index(get_uncleared_payments(bank_account, company)))
 
-	if transaction.debit > 0:
-		purchase_invoices = frappe.get_all("Purchase Invoice",
-			fields = ["'Purchase Invoice' as doctype", "name", "paid_amount", "supplier as party", "posting_date", "currency"],
-			filters=[
-				["paid_amount", "like", "{0}%".format(amount)],
-				["docstatus", "=", "1"],
-				["is_paid", "=", "1"],
-				["ifnull(clearance_date, '')", "=", ""],
-				["cash_bank_account", "=", "{0}".format(bank_account)]
-			]
-		)
+def get_uncleared_payments(bank_account, company):
+	"""Returns the uncleared payments posted to the account of the bank account, with `direction`
+		"credit" for receipts, matching credit bank transactions, and "debit" for payments"""
+	payments = frappe.db.sql("""
+		SELECT
+			'Payment Entry' as doctype, name, paid_amount, payment_type, reference_no, reference_date,
+			party, party_type, posting_date,
+			if(paid_to = %(bank_account)s, paid_to_account_currency, paid_from_account_currency) as currency,
+			if(paid_to = %(bank_account)s, 'credit', 'debit') as direction
+		FROM
+			`tabPayment Entry`
+		WHERE
+			(paid_to = %(bank_account)s or paid_from = %(bank_account)s)
+		AND
+			ifnull(clearance_date, '') = ''
+		AND
+			docstatus = 1
+	""", {"bank_account": bank_account}, as_dict=True)
 
-		mode_of_payments = [x["parent"] for x in frappe.db.get_list("Mode of Payment Account",
-			filters={"default_account": bank_account}, fields=["parent"])]
+	payments.extend(frappe.db.sql("""
+		SELECT
+			'Journal Entry' as doctype, je.name, je.posting_date, je.cheque_no as reference_no,
+			jea.account_currency as currency, je.pay_to_recd_from as party, je.cheque_date as reference_date,
+			if(jea.debit_in_account_currency > 0, jea.debit_in_account_currency,
+				jea.credit_in_account_currency) as paid_amount,
+			if(jea.debit_in_account_currency > 0, 'credit', 'debit') as direction
+		FROM
+			`tabJournal Entry Account` as jea
+		JOIN
+			`tabJournal Entry` as je
+		ON
+			jea.parent = je.name
+		WHERE
+			(je.clearance_date is null or je.clearance_date='0000-00-00')
+		AND
+			jea.account = %s
+		AND
+			je.docstatus = 1
+	""", bank_account, as_dict=True))
 
+	payments.extend(frappe.db.sql("""
+		SELECT
+			'Sales Invoice' as doctype, si.name, si.customer as party, si.currency,
+			si.posting_date, sip.amount as paid_amount, 'credit' as direction
+		FROM
+			`tabSales Invoice Payment` as sip
+		JOIN
+			`tabSales Invoice` as si
+		ON
+			sip.parent = si.name
+		WHERE
+			(sip.clearance_date is null or sip.clearance_date='0000-00-00')
+		AND
+			sip.account = %s
+		AND
+			si.docstatus = 1
+	""", bank_account, as_dict=True))
+
+	payments.extend(frappe.get_all("Purchase Invoice",
+		fields = ["'Purchase Invoice' as doctype", "name", "paid_amount", "supplier as party", "posting_date",
+			"currency", "'debit' as direction"],
+		filters=[
+			["docstatus", "=", "1"],
+			["is_paid", "=", "1"],
+			["ifnull(clearance_date, '')", "=", ""],
+			["cash_bank_account", "=", bank_account]
+		]
+	))
+
+	mode_of_payments = [x["parent"] for x in frappe.db.get_list("Mode of Payment Account",
+		filters={"default_account": bank_account}, fields=["parent"])]
+
+	if mode_of_payments:
 		company_currency = get_company_currency(company)
 
-		expense_claims = frappe.get_all("Expense Claim",
+		payments.extend(frappe.get_all("Expense Claim",
 			fields=["'Expense Claim' as doctype", "name", "total_sanctioned_amount as paid_amount",
-				"employee as party", "posting_date", "'{0}' as currency".format(company_currency)],
+				"employee as party", "posting_date", "'{0}' as currency".format(company_currency),
+				"'debit' as direction"],
 			filters=[
-				["total_sanctioned_amount", "like", "{0}%".format(amount)],
 				["docstatus", "=", "1"],
 				["is_paid", "=", "1"],
 				["ifnull(clearance_date, '')", "=", ""],
-				["mode_of_payment", "in", "{0}".format(tuple(mode_of_payments))]
+				["mode_of_payment", "in", mode_of_payments]
 			]
-		)
+		))
+
+	return payments
+
+def make_payment_index(payments):
+	"""Index the payments by direction and amount, and by the words of their reference number"""
+	payment_index = frappe._dict({"amounts": {}, "sorted_amounts": {}, "references": {}})
+
+	for payment in payments:
+		key = (payment.direction, flt(payment.paid_amount, 2))
+		payment_index.amounts.setdefault(key, []).append(payment)
+
+		for word in get_reference_words(payment.get("reference_no")):
+			payment_index.references.setdefault(word, []).append(payment)
+
+	for direction, amount in payment_index.amounts:
+		payment_index.sorted_amounts.setdefault(direction, []).append(amount)
+
+	for amounts in payment_index.sorted_amounts.values():
+		amounts.sort()
+
+	return payment_index
+
+def get_reference_words(txt):
+	# short words like months and years are shared by too many references
+	return set([word for word in re.split(r"[\W_]+", cstr(txt).lower(), flags=re.UNICODE) if len(word) >= 4])
+
+def get_matching_payments(transaction, payment_index, amount_tolerance=0, date_window=None):
+	"""Returns the indexed payments matching the bank transaction, best first.
+
+	The score of each payment counts an exact or tolerated amount, its reference words found
+	in the description, and its party found in the description"""
+	direction = "credit" if flt(transaction.credit) > 0 else "debit"
+	amount = flt(transaction.credit if direction == "credit" else transaction.debit, 2)
+	amount_tolerance = flt(amount_tolerance)
+
+	candidates = []
+	if amount_tolerance:
+		amounts = payment_index.sorted_amounts.get(direction, [])
+		for i in range(bisect_left(amounts, amount - amount_tolerance), bisect_right(amounts, amount + amount_tolerance)):
+			candidates.extend(payment_index.amounts[(direction, amounts[i])])
 	else:
-		purchase_invoices = expense_claims = []
+		candidates.extend(payment_index.amounts.get((direction, amount), []))
 
-	for data in [payment_entries, journal_entries, sales_invoices, purchase_invoices, expense_claims]:
-		if data:
-			payments.extend(data)
+	description_words = get_reference_words(transaction.description)
+	if not candidates:
+		for word in description_words:
+			candidates.extend([payment for payment in payment_index.references.get(word, [])
+				if payment.direction == direction and payment not in candidates])
 
-	return payments
+	description = cstr(transaction.description).lower()
+	matches = []
+	for payment in candidates:
+		days = abs(date_diff(payment.posting_date, transaction.date)) if transaction.date else 0
+		if date_window and days > cint(date_window):
+			continue
 
-def get_matching_descriptions_data(company, transaction):
-	if not transaction.description :
-		return []
+		score = 2 if flt(payment.paid_amount, 2) == amount \
+			else (1 if abs(flt(payment.paid_amount) - amount) <= amount_tolerance else 0)
+
+		reference_words = get_reference_words(payment.get("reference_no"))
+		if reference_words:
+			score += flt(len(reference_words & description_words)) / len(reference_words)
 
-	bank_transactions = frappe.db.sql("""
+		if payment.party and cstr(payment.party).lower() in description:
+			score += 1
+
+		matches.append(frappe._dict(payment, score=score, days=days))
+
+	return sorted(matches, key=lambda x: (-x.score, x.days))
+
+def get_reconciled_transactions():
+	return frappe.db.sql("""
 		SELECT
 			bt.name, bt.description, bt.date, btp.payment_document, btp.payment_entry
 		FROM
@@ -203,6 +266,13 @@ def get_matching_descriptions_data(company, transaction):
 			bt.docstatus = 1
 		""", as_dict=True)
 
+def get_matching_descriptions_data(company, transaction, bank_transactions=None):
+	if not transaction.description :
+		return []
+
+	if bank_transactions is None:
+		bank_transactions = get_reconciled_transactions()
+
 	selection = []
 	for bank_transaction in bank_transactions:
 		if bank_transaction.description:
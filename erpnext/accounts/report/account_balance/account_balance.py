@@ -4,7 +4,10 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
-from erpnext.accounts.utils import get_balance_on
+from bisect import bisect_left
+from frappe.utils import flt, getdate, nowdate
+from erpnext.accounts.utils import get_fiscal_year, FiscalYearError
+from erpnext.accounts.doctype.monthly_gl_summary.monthly_gl_summary import get_balances
 
 def execute(filters=None):
 	filters = frappe._dict(filters or {})
@@ -61,13 +64,53 @@ def get_data(filters):
 
 	conditions = get_conditions(filters)
 
-	accounts = frappe.db.get_all("Account", fields=["name", "account_currency"],
+	accounts = frappe.db.get_all("Account", fields=["name", "account_currency", "company", "is_group", "lft", "rgt"],
 		filters=conditions)
 
+	balances = get_balances_by_account(accounts, filters.report_date or nowdate())
+
 	for d in accounts:
-		balance = get_balance_on(d.name, date=filters.report_date)
-		row = {"account": d.name, "balance": balance, "currency": d.account_currency}
+		row = {"account": d.name, "balance": balances.get(d.name, 0.0), "currency": d.account_currency}
 
 		data.append(row)
 
 	return data
+
+def get_balances_by_account(accounts, date):
+	"""Returns the balances of the accounts on the date, as `get_balance_on`, from the Monthly GL Summary"""
+	try:
+		year_start_date = get_fiscal_year(date, verbose=0)[1]
+	except FiscalYearError:
+		if getdate(date) > getdate(nowdate()):
+			year_start_date = get_fiscal_year(nowdate(), verbose=1)[1]
+		else:
+			return {}
+
+	balances = {}
+	for company in set(d.company for d in accounts):
+		company_currency = frappe.get_cached_value('Company', company, "default_currency")
+
+		# balance sheet accounts since the beginning, profit and loss accounts within the fiscal year
+		ledger_balances = get_balances(company, to_date=date, conditions=""" and account in
+			(select name from `tabAccount` where report_type = 'Balance Sheet')""")
+		ledger_balances += get_balances(company, from_date=year_start_date, to_date=date,
+			conditions=""" and account in (select name from `tabAccount` where report_type = 'Profit and Loss')""",
+			ignore_closing_entries=True)
+
+		# ledgers ordered by lft, the ledgers of a group are the ones between its lft and rgt
+		ledgers = sorted((frappe.get_cached_value("Account", d.account, "lft"), flt(d.debit) - flt(d.credit),
+			flt(d.debit_in_account_currency) - flt(d.credit_in_account_currency)) for d in ledger_balances)
+		ledger_lfts = [d[0] for d in ledgers]
+
+		for account in accounts:
+			if account.company != company:
+				continue
+
+			# groups in company currency are balanced in company currency
+			in_account_currency = not (account.is_group and account.account_currency == company_currency)
+
+			balances[account.name] = flt(sum((balance_in_account_currency if in_account_currency else balance)
+				for lft, balance, balance_in_account_currency in ledgers[bisect_left(ledger_lfts, account.lft):
+					bisect_left(ledger_lfts, account.rgt)]))
+
+	return balances
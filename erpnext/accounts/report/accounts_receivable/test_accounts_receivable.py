@@ -11,6 +11,9 @@ class TestAccountsReceivable(unittest.TestCase):
 	def test_accounts_receivable(self):
 		frappe.db.sql("delete from `tabSales Invoice` where company='_Test Company 2'")
 		frappe.db.sql("delete from `tabGL Entry` where company='_Test Company 2'")
+		frappe.db.sql("delete from `tabMonthly GL Summary` where company='_Test Company 2'")
+		frappe.db.sql("delete from `tabMonthly Expense Summary` where company='_Test Company 2'")
+		frappe.db.sql("delete from `tabOutstanding Voucher` where company='_Test Company 2'")
 
 		filters = {
 			'company': '_Test Company 2',
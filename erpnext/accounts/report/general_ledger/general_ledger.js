@@ -157,7 +157,23 @@ frappe.query_reports["General Ledger"] = {
 			"fieldtype": "Check",
 			"default": 1
 		}
-	]
+	],
+
+	onload: function(report) {
+		report.page.add_inner_button(__("Export in Background"), function() {
+			frappe.call({
+				method: "erpnext.accounts.report.general_ledger.general_ledger.export_general_ledger",
+				args: {
+					filters: report.get_values()
+				}
+			});
+		});
+
+		frappe.realtime.on("general_ledger_export", function(data) {
+			frappe.msgprint(__("The General Ledger export is ready: {0}",
+				['<a href="' + data.file_url + '" target="_blank">' + data.file_url + '</a>']));
+		});
+	}
 }
 
 erpnext.dimension_filters.forEach((dimension) => {
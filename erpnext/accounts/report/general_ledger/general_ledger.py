@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 import frappe, erpnext
 from erpnext import get_company_currency, get_default_company
 from erpnext.accounts.report.utils import get_currency, convert_to_presentation_currency
-from frappe.utils import getdate, cstr, flt, fmt_money
+from frappe.utils import getdate, cstr, flt, fmt_money, cint
 from frappe import _, _dict
 from erpnext.accounts.utils import get_account_currency
 from erpnext.accounts.report.financial_statements import get_cost_centers_with_children
@@ -17,6 +17,15 @@ def execute(filters=None):
 	if not filters:
 		return [], []
 
+	filters, account_details = validate_and_set_filters(filters)
+
+	columns = get_columns(filters)
+
+	res = get_result(filters, account_details)
+
+	return columns, res
+
+def validate_and_set_filters(filters):
 	account_details = {}
 
 	if filters and filters.get('print_in_account_currency') and \
@@ -35,11 +44,7 @@ def execute(filters=None):
 
 	filters = set_account_currency(filters)
 
-	columns = get_columns(filters)
-
-	res = get_result(filters, account_details)
-
-	return columns, res
+	return filters, account_details
 
 
 def validate_filters(filters, account_details):
@@ -106,27 +111,32 @@ def set_account_currency(filters):
 	return filters
 
 def get_result(filters, account_details):
-	gl_entries = get_gl_entries(filters)
+	conditions = get_conditions(filters)
 
-	data = get_data_with_opening_closing(filters, account_details, gl_entries)
+	gl_entries = get_gl_entries(filters, conditions)
+	opening_entries = get_opening_entries(filters, conditions)
+
+	data = get_data_with_opening_closing(filters, account_details, gl_entries, opening_entries)
 
 	result = get_result_as_list(data, filters)
 
 	return result
 
-def get_gl_entries(filters):
+def get_gl_entries(filters, conditions=None, order_by_statement=None, start=0, page_length=None):
+	"""Returns the GL entries of the period, entries before the period are
+	summed up in `get_opening_entries`"""
 	currency_map = get_currency(filters)
 	select_fields = """, debit, credit, debit_in_account_currency,
 		credit_in_account_currency """
 
-	order_by_statement = "order by posting_date, account, creation"
+	if not order_by_statement:
+		order_by_statement = "order by posting_date, account, creation"
 
-	if filters.get("group_by") == _("Group by Voucher"):
-		order_by_statement = "order by posting_date, voucher_type, voucher_no"
+		if filters.get("group_by") == _("Group by Voucher"):
+			order_by_statement = "order by posting_date, voucher_type, voucher_no"
 
-	if filters.get("include_default_book_entries"):
-		filters['company_fb'] = frappe.db.get_value("Company",
-			filters.get("company"), 'default_finance_book')
+	if conditions is None:
+		conditions = get_conditions(filters)
 
 	gl_entries = frappe.db.sql(
 		"""
@@ -137,10 +147,15 @@ def get_gl_entries(filters):
 			remarks, against, is_opening {select_fields}
 		from `tabGL Entry`
 		where company=%(company)s {conditions}
+			and posting_date >= %(from_date)s and posting_date <= %(to_date)s
+			{opening_condition}
 		{order_by_statement}
+		{limit}
 		""".format(
-			select_fields=select_fields, conditions=get_conditions(filters),
-			order_by_statement=order_by_statement
+			select_fields=select_fields, conditions=conditions,
+			opening_condition="" if filters.get("show_opening_entries") else "and ifnull(is_opening, 'No') != 'Yes'",
+			order_by_statement=order_by_statement,
+			limit="limit {0}, {1}".format(cint(start), cint(page_length)) if page_length else ""
 		),
 		filters, as_dict=1)
 
@@ -149,6 +164,56 @@ def get_gl_entries(filters):
 	else:
 		return gl_entries
 
+def get_opening_entries(filters, conditions=None):
+	"""Returns the sum of the GL entries before the period (and of the opening entries, if they
+	are not shown in the period) for each group of the report, account and account currency"""
+	group_by = group_by_field(filters.get('group_by'))
+
+	group_by_fields = ["account", "account_currency"]
+	if group_by not in group_by_fields + ["voucher_no"]:
+		group_by_fields.insert(0, group_by)
+
+	# entries in a foreign presentation currency are converted at the rate of their date
+	if filters.get('presentation_currency'):
+		group_by_fields.append("posting_date")
+
+	if conditions is None:
+		conditions = get_conditions(filters)
+
+	opening_entries = frappe.db.sql(
+		"""
+		select
+			{group_by_fields}, min(posting_date) as posting_date, 'Yes' as is_opening,
+			sum(debit) as debit, sum(credit) as credit,
+			sum(debit_in_account_currency) as debit_in_account_currency,
+			sum(credit_in_account_currency) as credit_in_account_currency
+		from `tabGL Entry`
+		where company=%(company)s {conditions}
+			and {opening_condition}
+		group by {group_by_fields}
+		order by min(posting_date), {group_by_fields}
+		""".format(
+			group_by_fields=", ".join(group_by_fields), conditions=conditions,
+			opening_condition="posting_date < %(from_date)s" if filters.get("show_opening_entries")
+				else "(posting_date < %(from_date)s or is_opening = 'Yes')"
+		),
+		filters, as_dict=1)
+
+	if not filters.get('presentation_currency'):
+		return opening_entries
+
+	# convert the debit and the credit of each group separately, as for the entries
+	entries = []
+	for d in opening_entries:
+		for field, other_field in (("debit", "credit"), ("credit", "debit")):
+			if flt(d[field]) or flt(d[field + "_in_account_currency"]):
+				entries.append(_dict(d, **{
+					other_field: 0.0,
+					other_field + "_in_account_currency": 0.0
+				}))
+
+	return convert_to_presentation_currency(entries, get_currency(filters))
+
 
 def get_conditions(filters):
 	conditions = []
@@ -184,6 +249,8 @@ def get_conditions(filters):
 
 	if filters.get("finance_book"):
 		if filters.get("include_default_book_entries"):
+			filters['company_fb'] = frappe.db.get_value("Company",
+				filters.get("company"), 'default_finance_book')
 			conditions.append("(finance_book in (%(finance_book)s, %(company_fb)s, '') OR finance_book IS NULL)")
 		else:
 			conditions.append("finance_book in (%(finance_book)s)")
@@ -204,12 +271,12 @@ def get_conditions(filters):
 	return "and {}".format(" and ".join(conditions)) if conditions else ""
 
 
-def get_data_with_opening_closing(filters, account_details, gl_entries):
+def get_data_with_opening_closing(filters, account_details, gl_entries, opening_entries=None):
 	data = []
 
-	gle_map = initialize_gle_map(gl_entries, filters)
+	gle_map = initialize_gle_map((opening_entries or []) + gl_entries, filters)
 
-	totals, entries = get_accountwise_gle(filters, gl_entries, gle_map)
+	totals, entries = get_accountwise_gle(filters, gl_entries, gle_map, opening_entries)
 
 	# Opening for filtered account
 	data.append(totals.opening)
@@ -275,7 +342,7 @@ def initialize_gle_map(gl_entries, filters):
 	return gle_map
 
 
-def get_accountwise_gle(filters, gl_entries, gle_map):
+def get_accountwise_gle(filters, gl_entries, gle_map, opening_entries=None):
 	totals = get_totals_dict()
 	entries = []
 	consolidated_gle = OrderedDict()
@@ -288,6 +355,13 @@ def get_accountwise_gle(filters, gl_entries, gle_map):
 		data[key].debit_in_account_currency += flt(gle.debit_in_account_currency)
 		data[key].credit_in_account_currency += flt(gle.credit_in_account_currency)
 
+	for gle in (opening_entries or []):
+		update_value_in_dict(gle_map[gle.get(group_by)].totals, 'opening', gle)
+		update_value_in_dict(totals, 'opening', gle)
+
+		update_value_in_dict(gle_map[gle.get(group_by)].totals, 'closing', gle)
+		update_value_in_dict(totals, 'closing', gle)
+
 	from_date, to_date = getdate(filters.from_date), getdate(filters.to_date)
 	for gle in gl_entries:
 		if (gle.posting_date < from_date or
@@ -458,3 +532,136 @@ def get_columns(filters):
 	])
 
 	return columns
+
+@frappe.whitelist()
+def export_general_ledger(filters):
+	"""Make a CSV file of the General Ledger in the background, for periods with too many
+	entries to be loaded in the report view"""
+	if not frappe.get_doc("Report", "General Ledger").is_permitted():
+		frappe.throw(_("Not permitted"), frappe.PermissionError)
+
+	frappe.enqueue("erpnext.accounts.report.general_ledger.general_ledger.make_general_ledger_export",
+		queue="long", timeout=3600, filters=frappe._dict(frappe.parse_json(filters)),
+		user=frappe.session.user, now=frappe.flags.in_test)
+
+	frappe.msgprint(_("The General Ledger is being exported, you will be notified when the file is ready"))
+
+def make_general_ledger_export(filters, user=None, page_length=10000):
+	"""Write the General Ledger to a private file page by page, the rows of the report
+	are written group by group, so the entries are ordered by the group first"""
+	from frappe.utils.csvutils import UnicodeWriter
+
+	filters, account_details = validate_and_set_filters(filters)
+
+	conditions = get_conditions(filters)
+	group_by = group_by_field(filters.get('group_by'))
+	consolidated = filters.get("group_by") == _('Group by Voucher (Consolidated)')
+
+	order_by_statement = {
+		"party": "order by party, posting_date, account, creation",
+		"account": "order by account, posting_date, creation"
+	}.get(group_by, "order by posting_date, voucher_type, voucher_no, account, creation")
+
+	if consolidated:
+		order_by_statement = "order by posting_date, voucher_type, voucher_no, account, cost_center, creation"
+
+	totals = get_totals_dict()
+	group_totals = {}
+	for gle in get_opening_entries(filters, conditions):
+		group_totals.setdefault(gle.get(group_by), get_totals_dict())
+		for d in (group_totals[gle.get(group_by)], totals):
+			for key in ("opening", "closing"):
+				update_totals(d[key], gle)
+
+	columns = get_columns(filters)
+	inv_details = get_supplier_invoice_details()
+
+	file_name = "general-ledger-{0}.csv".format(frappe.generate_hash(length=10))
+	with open(frappe.get_site_path("private", "files", file_name), "wb") as f:
+		def write_rows(rows, balance=None):
+			writer = UnicodeWriter()
+			for d in rows:
+				if balance is None or not d.get('posting_date'):
+					balance = 0
+
+				balance = d['balance'] = get_balance(d, balance, 'debit', 'credit')
+				d['account_currency'] = filters.account_currency
+				d['bill_no'] = inv_details.get(d.get('against_voucher'), '')
+
+				writer.writerow([d.get(c["fieldname"]) for c in columns])
+
+			f.write(frappe.safe_encode(writer.getvalue()))
+			return balance
+
+		def write_group(key, entries):
+			group = group_totals.setdefault(key, get_totals_dict())
+			for gle in entries:
+				for d in (group, totals):
+					for total in ("total", "closing"):
+						update_totals(d[total], gle)
+
+			if consolidated:
+				return
+
+			rows = [{}]
+			if filters.get("group_by") != _("Group by Voucher"):
+				rows.append(group.opening)
+
+			write_rows(rows + entries)
+			write_rows([group.total] if filters.get("group_by") == _("Group by Voucher")
+				else [group.total, group.closing])
+
+		header = UnicodeWriter()
+		header.writerow([c["label"] for c in columns])
+		f.write(frappe.safe_encode(header.getvalue()))
+
+		balance = write_rows([totals.opening])
+
+		start, key, entries = 0, None, []
+		while True:
+			gl_entries = get_gl_entries(filters, conditions, order_by_statement, start, page_length)
+
+			for gle in gl_entries:
+				gle_key = ((gle.voucher_type, gle.voucher_no, gle.account, gle.cost_center)
+					if consolidated else gle.get(group_by))
+
+				if entries and gle_key != key:
+					write_group(key, entries)
+					if consolidated:
+						balance = write_rows(entries, balance)
+					entries = []
+
+				if consolidated and entries:
+					update_totals(entries[0], gle)
+				else:
+					entries.append(gle)
+				key = gle_key
+
+			if len(gl_entries) < page_length:
+				break
+			start += page_length
+
+		if entries:
+			write_group(key, entries)
+			if consolidated:
+				write_rows(entries, balance)
+
+		write_rows(([] if consolidated else [{}]) + [totals.total, totals.closing])
+
+	file_doc = frappe.get_doc({
+		"doctype": "File",
+		"file_name": file_name,
+		"file_url": "/private/files/" + file_name,
+		"is_private": 1
+	})
+	file_doc.flags.ignore_permissions = True
+	file_doc.insert()
+
+	frappe.publish_realtime("general_ledger_export", {"file_url": file_doc.file_url}, user=user)
+
+def update_totals(data, gle):
+	data.debit += flt(gle.debit)
+	data.credit += flt(gle.credit)
+
+	data.debit_in_account_currency += flt(gle.debit_in_account_currency)
+	data.credit_in_account_currency += flt(gle.credit_in_account_currency)
@@ -0,0 +1,83 @@
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from collections import Counter
+from frappe.utils import flt, nowdate, add_days
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from erpnext.accounts.report.general_ledger.general_ledger import (validate_and_set_filters, get_conditions,
+	get_gl_entries, get_opening_entries, initialize_gle_map, get_accountwise_gle, get_columns,
+	make_general_ledger_export)
+
+class TestGeneralLedger(unittest.TestCase):
+	def setUp(self):
+		create_sales_invoice(posting_date=add_days(nowdate(), -10))
+		for i in range(3):
+			create_sales_invoice(posting_date=add_days(nowdate(), -i))
+
+	def test_opening_and_closing(self):
+		for group_by, filters in (
+			("Group by Account", {}),
+			("Group by Party", {"party_type": "Customer", "party": ["_Test Customer"]})):
+
+			filters, account_details = validate_and_set_filters(frappe._dict(filters, company="_Test Company",
+				from_date=add_days(nowdate(), -5), to_date=nowdate(), group_by=group_by))
+			conditions = get_conditions(filters)
+
+			# the entries before the period summed in SQL, as they were summed from all the entries before
+			totals = get_totals(filters, get_gl_entries(filters, conditions), get_opening_entries(filters, conditions))
+			self.assertEqual(totals, get_totals(filters, get_all_gl_entries(filters, conditions)))
+
+			self.assertNotEqual(totals[None]["opening"], (0, 0))
+			self.assertNotEqual(totals[None]["total"], (0, 0))
+
+	def test_export_in_pages(self):
+		filters = frappe._dict(company="_Test Company", from_date=add_days(nowdate(), -5), to_date=nowdate(),
+			group_by="Group by Voucher", party_type="Customer", party=["_Test Customer"])
+
+		existing_files = frappe.db.sql_list("select name from `tabFile` where file_name like 'general-ledger-%%'")
+		make_general_ledger_export(frappe._dict(filters), page_length=2)
+
+		file_name = frappe.db.sql_list("""select file_name from `tabFile`
+			where file_name like 'general-ledger-%%' and name not in %s""", [existing_files or [""]])[0]
+		with open(frappe.get_site_path("private", "files", file_name), "rb") as f:
+			from frappe.utils.csvutils import read_csv_content
+			rows = read_csv_content(f.read())
+
+		filters, account_details = validate_and_set_filters(filters)
+		fieldnames = [c["fieldname"] for c in get_columns(filters)]
+		voucher_no, account = fieldnames.index("voucher_no"), fieldnames.index("account")
+
+		gl_entries = get_gl_entries(filters)
+		self.assertTrue(len(gl_entries) > 2)
+
+		# every entry of the period exactly once
+		self.assertEqual(Counter([(row[voucher_no], row[account]) for row in rows[1:] if row[voucher_no]]),
+			Counter([(d.voucher_no, d.account) for d in gl_entries]))
+
+def get_all_gl_entries(filters, conditions):
+	# the entries up to the end of the period, as they were read for the report before
+	return frappe.db.sql("""
+		select
+			posting_date, account, party_type, party,
+			voucher_type, voucher_no, cost_center, project,
+			against_voucher_type, against_voucher, account_currency,
+			remarks, against, is_opening, debit, credit, debit_in_account_currency,
+			credit_in_account_currency
+		from `tabGL Entry`
+		where company=%(company)s {conditions}
+		order by posting_date, account, creation""".format(conditions=conditions), filters, as_dict=1)
+
+def get_totals(filters, gl_entries, opening_entries=None):
+	"""Returns the debit and credit of the opening, total and closing rows of each group and of the report"""
+	gle_map = initialize_gle_map((opening_entries or []) + gl_entries, filters)
+	totals, entries = get_accountwise_gle(filters, gl_entries, gle_map, opening_entries)
+
+	def get_debit_credit(totals):
+		return {key: (flt(totals[key].debit, 2), flt(totals[key].credit, 2))
+			for key in ("opening", "total", "closing")}
+
+	group_totals = {key: get_debit_credit(d.totals) for key, d in gle_map.items()}
+	group_totals[None] = get_debit_credit(totals)
+
+	return group_totals
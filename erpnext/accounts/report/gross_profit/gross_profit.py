@@ -96,9 +96,10 @@ class GrossProfitGenerator(object):
 		self.average_buying_rate = {}
 		self.filters = frappe._dict(filters)
 		self.load_invoice_items()
-		self.load_stock_ledger_entries()
 		self.load_product_bundle()
+		self.load_stock_ledger_entries()
 		self.load_non_stock_items()
+		self.load_last_purchase_rates()
 		self.get_returned_invoice_items()
 		self.process()
 
@@ -219,31 +220,24 @@ class GrossProfitGenerator(object):
 		return flt(buying_amount, self.currency_precision)
 
 	def get_buying_amount(self, row, item_code):
-		# IMP NOTE
-		# stock_ledger_entries should already be filtered by item_code and warehouse and
-		# sorted by posting_date desc, posting_time desc
 		if item_code in self.non_stock_items:
 			#Issue 6089-Get last purchasing rate for non-stock item
 			item_rate = self.get_last_purchase_rate(item_code)
 			return flt(row.qty) * item_rate
 
 		else:
-			my_sle = self.sle.get((item_code, row.warehouse))
-			if (row.update_stock or row.dn_detail) and my_sle:
+			if (row.update_stock or row.dn_detail) and (item_code, row.warehouse) in self.sle_item_warehouses:
 				parenttype, parent = row.parenttype, row.parent
 				if row.dn_detail:
 					parenttype, parent = "Delivery Note", row.delivery_note
 
-				for i, sle in enumerate(my_sle):
-					# find the stock valution rate from stock ledger entry
-					if sle.voucher_type == parenttype and parent == sle.voucher_no and \
-						sle.voucher_detail_no == row.item_row:
-							previous_stock_value = len(my_sle) > i+1 and \
-								flt(my_sle[i+1].stock_value) or 0.0
-							if previous_stock_value:
-								return (previous_stock_value - flt(sle.stock_value)) * flt(row.qty) / abs(flt(sle.qty))
-							else:
-								return flt(row.qty) * self.get_average_buying_rate(row, item_code)
+				# find the stock valution rate from stock ledger entry
+				sle = self.sle.get((parenttype, parent, row.item_row, item_code, row.warehouse))
+				if sle:
+					if flt(sle.previous_stock_value):
+						return (flt(sle.previous_stock_value) - flt(sle.stock_value)) * flt(row.qty) / abs(flt(sle.qty))
+					else:
+						return flt(row.qty) * self.get_average_buying_rate(row, item_code)
 			else:
 				return flt(row.qty) * self.get_average_buying_rate(row, item_code)
 
@@ -271,20 +265,36 @@ class GrossProfitGenerator(object):
 		return self.average_buying_rate[item_code]
 
 	def get_last_purchase_rate(self, item_code):
-		if self.filters.to_date:
-			last_purchase_rate = frappe.db.sql("""
-			select (a.base_rate / a.conversion_factor)
-			from `tabPurchase Invoice Item` a
-			where a.item_code = %s and a.docstatus=1
-			and modified <= %s
-			order by a.modified desc limit 1""", (item_code,self.filters.to_date))
-		else:
-			last_purchase_rate = frappe.db.sql("""
-			select (a.base_rate / a.conversion_factor)
+		return flt(self.last_purchase_rates.get(item_code))
+
+	def load_last_purchase_rates(self):
+		"""Load the last purchase rate of the non stock items sold, in one query"""
+		self.last_purchase_rates = {}
+
+		item_codes = set(d.item_code for d in self.si_list)
+		for bundle in self.product_bundles.values():
+			for packed_items in bundle.values():
+				for items in packed_items.values():
+					item_codes.update(d.item_code for d in items)
+
+		item_codes = [d for d in item_codes if d in self.non_stock_items]
+		if not item_codes:
+			return
+
+		conditions = " and modified <= %(to_date)s" if self.filters.to_date else ""
+
+		for item_code, rate in frappe.db.sql("""
+			select a.item_code, (a.base_rate / a.conversion_factor)
 			from `tabPurchase Invoice Item` a
-			where a.item_code = %s and a.docstatus=1
-			order by a.modified desc limit 1""", item_code)
-		return flt(last_purchase_rate[0][0]) if last_purchase_rate else 0
+			inner join (
+				select item_code, max(modified) as modified
+				from `tabPurchase Invoice Item`
+				where item_code in %(item_codes)s and docstatus=1 {0}
+				group by item_code
+			) last_purchase on last_purchase.item_code = a.item_code and last_purchase.modified = a.modified
+			where a.docstatus=1""".format(conditions),
+			{"item_codes": item_codes, "to_date": self.filters.to_date}):
+			self.last_purchase_rates.setdefault(item_code, rate)
 
 	def load_invoice_items(self):
 		conditions = ""
@@ -334,19 +344,51 @@ class GrossProfitGenerator(object):
 				sales_team_table=sales_team_table, match_cond = get_match_cond('Sales Invoice')), self.filters, as_dict=1)
 
 	def load_stock_ledger_entries(self):
-		res = frappe.db.sql("""select item_code, voucher_type, voucher_no,
-				voucher_detail_no, stock_value, warehouse, actual_qty as qty
-			from `tabStock Ledger Entry`
-			where company=%(company)s
-			order by
-				item_code desc, warehouse desc, posting_date desc,
-				posting_time desc, creation desc""", self.filters, as_dict=True)
-		self.sle = {}
-		for r in res:
-			if (r.item_code, r.warehouse) not in self.sle:
-				self.sle[(r.item_code, r.warehouse)] = []
+		"""Load the stock ledger entries of the invoices and delivery notes in the report,
+			keyed by voucher and voucher detail no, along with the stock value before each entry"""
+		vouchers = {}
+		for row in self.si_list:
+			if row.update_stock:
+				vouchers.setdefault(row.parenttype, set()).add(row.parent)
+			elif row.dn_detail:
+				vouchers.setdefault("Delivery Note", set()).add(row.delivery_note)
 
-			self.sle[(r.item_code, r.warehouse)].append(r)
+		self.sle = {}
+		self.sle_item_warehouses = set()
+		if not vouchers:
+			return
+
+		item_codes = set(d.item_code for d in self.si_list)
+		for voucher_type, voucher_nos in vouchers.items():
+			for voucher_no in voucher_nos:
+				for packed_items in self.product_bundles.get(voucher_type, {}).get(voucher_no, {}).values():
+					item_codes.update(d.item_code for d in packed_items)
+
+		self.sle_item_warehouses = set(frappe.db.sql("""select distinct item_code, warehouse
+			from `tabStock Ledger Entry` where company=%(company)s and item_code in %(item_codes)s""",
+			{"company": self.filters.company, "item_codes": list(item_codes)}))
+
+		for voucher_type, voucher_nos in vouchers.items():
+			voucher_nos = list(voucher_nos)
+			for i in range(0, len(voucher_nos), 1000):
+				for r in frappe.db.sql("""select sle.item_code, sle.voucher_type, sle.voucher_no,
+						sle.voucher_detail_no, sle.stock_value, sle.warehouse, sle.actual_qty as qty,
+						(select prev.stock_value from `tabStock Ledger Entry` prev
+							where prev.item_code = sle.item_code and prev.warehouse = sle.warehouse
+								and prev.posting_date <= sle.posting_date
+								and (timestamp(prev.posting_date, prev.posting_time) < timestamp(sle.posting_date, sle.posting_time)
+									or (timestamp(prev.posting_date, prev.posting_time) = timestamp(sle.posting_date, sle.posting_time)
+										and prev.creation < sle.creation))
+							order by prev.posting_date desc, prev.posting_time desc, prev.creation desc
+							limit 1) as previous_stock_value
+					from `tabStock Ledger Entry` sle
+					where sle.company=%(company)s and sle.voucher_type=%(voucher_type)s
+						and sle.voucher_no in %(voucher_nos)s
+					order by sle.posting_date, sle.posting_time, sle.creation""",
+					{"company": self.filters.company, "voucher_type": voucher_type,
+						"voucher_nos": voucher_nos[i:i + 1000]}, as_dict=True):
+					# the latest entry of a voucher row is used, as in the order of the stock ledger
+					self.sle[(r.voucher_type, r.voucher_no, r.voucher_detail_no, r.item_code, r.warehouse)] = r
 
 	def load_product_bundle(self):
 		self.product_bundles = {}
@@ -12,7 +12,7 @@ from erpnext.accounts.report.item_wise_sales_register.item_wise_sales_register i
 def execute(filters=None):
 	return _execute(filters)
 
-def _execute(filters=None, additional_table_columns=None, additional_query_columns=None):
+def _execute(filters=None, additional_table_columns=None, additional_query_columns=None, get_itemised_tax=None):
 	if not filters: filters = {}
 	filters.update({"from_date": filters.get("date_range")[0], "to_date": filters.get("date_range")[1]})
 	columns = get_columns(additional_table_columns, filters)
@@ -23,7 +23,7 @@ def _execute(filters=None, additional_table_columns=None, additional_query_colum
 	aii_account_map = get_aii_accounts()
 	if item_list:
 		itemised_tax, tax_columns = get_tax_accounts(item_list, columns, company_currency,
-			doctype="Purchase Invoice", tax_doctype="Purchase Taxes and Charges")
+			doctype="Purchase Invoice", tax_doctype="Purchase Taxes and Charges", get_itemised_tax=get_itemised_tax)
 
 	po_pr_map = get_purchase_receipts_against_purchase_order(item_list)
 
@@ -12,7 +12,7 @@ from erpnext.accounts.report.sales_register.sales_register import get_mode_of_pa
 def execute(filters=None):
 	return _execute(filters)
 
-def _execute(filters=None, additional_table_columns=None, additional_query_columns=None):
+def _execute(filters=None, additional_table_columns=None, additional_query_columns=None, get_itemised_tax=None):
 	if not filters: filters = {}
 	filters.update({"from_date": filters.get("date_range") and filters.get("date_range")[0], "to_date": filters.get("date_range") and filters.get("date_range")[1]})
 	columns = get_columns(additional_table_columns, filters)
@@ -21,7 +21,8 @@ def _execute(filters=None, additional_table_columns=None, additional_query_colum
 
 	item_list = get_items(filters, additional_query_columns)
 	if item_list:
-		itemised_tax, tax_columns = get_tax_accounts(item_list, columns, company_currency)
+		itemised_tax, tax_columns = get_tax_accounts(item_list, columns, company_currency,
+			get_itemised_tax=get_itemised_tax)
 
 	mode_of_payments = get_mode_of_payments(set([d.parent for d in item_list]))
 	so_dn_map = get_delivery_notes_against_sales_order(item_list)
@@ -423,7 +424,7 @@ def get_deducted_taxes():
 	return frappe.db.sql_list("select name from `tabPurchase Taxes and Charges` where add_deduct_tax = 'Deduct'")
 
 def get_tax_accounts(item_list, columns, company_currency,
-		doctype="Sales Invoice", tax_doctype="Sales Taxes and Charges"):
+		doctype="Sales Invoice", tax_doctype="Sales Taxes and Charges", get_itemised_tax=None):
 	import json
 	item_row_map = {}
 	tax_columns = []
@@ -433,6 +434,12 @@ def get_tax_accounts(item_list, columns, company_currency,
 	tax_amount_precision = get_field_precision(frappe.get_meta(tax_doctype).get_field("tax_amount"),
 		currency=company_currency) or 2
 
+	if get_itemised_tax:
+		# e.g. read from a precomputed summary instead of the tax rows
+		itemised_tax, tax_columns = get_itemised_tax(item_list, doctype, tax_amount_precision)
+		add_tax_columns(columns, tax_columns)
+		return itemised_tax, tax_columns
+
 	for d in item_list:
 		invoice_item_row.setdefault(d.parent, []).append(d)
 		item_row_map.setdefault(d.parent, {}).setdefault(d.item_code or d.item_name, []).append(d)
@@ -505,6 +512,11 @@ def get_tax_accounts(item_list, columns, company_currency,
 				})
 
 	tax_columns.sort()
+	add_tax_columns(columns, tax_columns)
+
+	return itemised_tax, tax_columns
+
+def add_tax_columns(columns, tax_columns):
 	for desc in tax_columns:
 		columns.append({
 			'label': _(desc + ' Rate'),
@@ -538,8 +550,6 @@ def get_tax_accounts(item_list, columns, company_currency,
 		}
 	]
 
-	return itemised_tax, tax_columns
-
 def add_total_row(data, filters, prev_group_by_value, item, total_row_map,
 	group_by_field, subtotal_display_field, grand_total, tax_columns):
 	if prev_group_by_value != item.get(group_by_field, ''):
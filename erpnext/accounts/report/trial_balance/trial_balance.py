@@ -4,10 +4,11 @@
 from __future__ import unicode_literals
 import frappe, erpnext
 from frappe import _
-from frappe.utils import flt, getdate, formatdate, cstr
+from frappe.utils import flt, getdate, formatdate, cstr, add_days
 from erpnext.accounts.report.financial_statements \
-	import filter_accounts, set_gl_entries_by_account, filter_out_zero_value_rows
+	import filter_accounts, get_additional_conditions, filter_out_zero_value_rows
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import get_accounting_dimensions
+from erpnext.accounts.doctype.monthly_gl_summary.monthly_gl_summary import get_balances
 
 value_fields = ("opening_debit", "opening_credit", "debit", "credit", "closing_debit", "closing_credit")
 
@@ -63,16 +64,10 @@ def get_data(filters):
 
 	accounts, accounts_by_name, parent_children_map = filter_accounts(accounts)
 
-	min_lft, max_rgt = frappe.db.sql("""select min(lft), max(rgt) from `tabAccount`
-		where company=%s""", (filters.company,))[0]
-
-	gl_entries_by_account = {}
-
 	opening_balances = get_opening_balances(filters)
-	set_gl_entries_by_account(filters.company, filters.from_date,
-		filters.to_date, min_lft, max_rgt, filters, gl_entries_by_account, ignore_closing_entries=not flt(filters.with_period_closing_entry))
+	balances_within_period = get_balances_within_period(filters)
 
-	total_row = calculate_values(accounts, gl_entries_by_account, opening_balances, filters, company_currency)
+	total_row = calculate_values(accounts, balances_within_period, opening_balances, filters, company_currency)
 	accumulate_values_into_parents(accounts, accounts_by_name)
 
 	data = prepare_data(accounts, filters, total_row, parent_children_map, company_currency)
@@ -89,13 +84,11 @@ def get_opening_balances(filters):
 
 
 def get_rootwise_opening_balances(filters, report_type):
-	additional_conditions = ""
-	if not filters.show_unclosed_fy_pl_balances:
-		additional_conditions = " and posting_date >= %(year_start_date)s" \
-			if report_type == "Profit and Loss" else ""
+	additional_conditions = " and account in (select name from `tabAccount` where report_type=%(report_type)s)"
 
-	if not flt(filters.with_period_closing_entry):
-		additional_conditions += " and ifnull(voucher_type, '')!='Period Closing Voucher'"
+	year_start_date = None
+	if not filters.show_unclosed_fy_pl_balances and report_type == "Profit and Loss":
+		year_start_date = filters.year_start_date
 
 	if filters.cost_center:
 		lft, rgt = frappe.db.get_value('Cost Center', filters.cost_center, ['lft', 'rgt'])
@@ -129,24 +122,47 @@ def get_rootwise_opening_balances(filters, report_type):
 					dimension: filters.get(dimension)
 				})
 
-	gle = frappe.db.sql("""
-		select
-			account, sum(debit) as opening_debit, sum(credit) as opening_credit
-		from `tabGL Entry`
-		where
-			company=%(company)s
-			{additional_conditions}
-			and (posting_date < %(from_date)s or ifnull(is_opening, 'No') = 'Yes')
-			and account in (select name from `tabAccount` where report_type=%(report_type)s)
-		group by account""".format(additional_conditions=additional_conditions), query_filters , as_dict=True)
+	# the entries before the period, and the opening entries posted within it
+	gle = get_balances(filters.company, from_date=year_start_date, to_date=add_days(filters.from_date, -1),
+		conditions=additional_conditions, values=query_filters,
+		ignore_closing_entries=not flt(filters.with_period_closing_entry))
+
+	gle += get_balances(filters.company, from_date=filters.from_date,
+		conditions=additional_conditions + " and ifnull(is_opening, 'No') = 'Yes'", values=query_filters,
+		ignore_closing_entries=not flt(filters.with_period_closing_entry))
 
 	opening = frappe._dict()
 	for d in gle:
-		opening.setdefault(d.account, d)
+		opening.setdefault(d.account, frappe._dict({"opening_debit": 0.0, "opening_credit": 0.0}))
+		opening[d.account].opening_debit += flt(d.debit)
+		opening[d.account].opening_credit += flt(d.credit)
 
 	return opening
 
-def calculate_values(accounts, gl_entries_by_account, opening_balances, filters, company_currency):
+def get_balances_within_period(filters):
+	additional_conditions = get_additional_conditions(None, False, filters)
+
+	gl_filters = {
+		"company": filters.company,
+		"finance_book": cstr(filters.get("finance_book"))
+	}
+
+	if filters.get("include_default_book_entries"):
+		gl_filters["company_fb"] = frappe.db.get_value("Company", filters.company, 'default_finance_book')
+
+	for key, value in filters.items():
+		if value:
+			gl_filters.update({
+				key: value
+			})
+
+	balances = get_balances(filters.company, from_date=filters.from_date, to_date=filters.to_date,
+		conditions=additional_conditions + " and ifnull(is_opening, 'No') != 'Yes'", values=gl_filters,
+		ignore_closing_entries=not flt(filters.with_period_closing_entry))
+
+	return frappe._dict((d.account, d) for d in balances)
+
+def calculate_values(accounts, balances_within_period, opening_balances, filters, company_currency):
 	init = {
 		"opening_debit": 0.0,
 		"opening_credit": 0.0,
@@ -179,10 +195,8 @@ def calculate_values(accounts, gl_entries_by_account, opening_balances, filters,
 		d["opening_debit"] = opening_balances.get(d.name, {}).get("opening_debit", 0)
 		d["opening_credit"] = opening_balances.get(d.name, {}).get("opening_credit", 0)
 
-		for entry in gl_entries_by_account.get(d.name, []):
-			if cstr(entry.is_opening) != "Yes":
-				d["debit"] += flt(entry.debit)
-				d["credit"] += flt(entry.credit)
+		d["debit"] = flt(balances_within_period.get(d.name, {}).get("debit", 0))
+		d["credit"] = flt(balances_within_period.get(d.name, {}).get("credit", 0))
 
 		d["closing_debit"] = d["opening_debit"] + d["debit"]
 		d["closing_credit"] = d["opening_credit"] + d["credit"]
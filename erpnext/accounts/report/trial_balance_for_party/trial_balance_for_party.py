@@ -4,8 +4,9 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
-from frappe.utils import flt, cint
+from frappe.utils import flt, cint, add_days
 from erpnext.accounts.report.trial_balance.trial_balance import validate_filters
+from erpnext.accounts.doctype.monthly_gl_summary.monthly_gl_summary import get_balances
 
 def execute(filters=None):
 	validate_filters(filters)
@@ -95,52 +96,38 @@ def get_data(filters, show_party_name):
 
 	return data
 
+def get_party_conditions(filters):
+	conditions = " and ifnull(party_type, '') = %(party_type)s and ifnull(party, '') != ''"
+	if filters.get('account'):
+		conditions += " and account = %s" % (frappe.db.escape(filters.get('account')))
+
+	return conditions
+
 def get_opening_balances(filters):
+	conditions = get_party_conditions(filters)
 
-	account_filter = ''
-	if filters.get('account'):
-		account_filter = "and account = %s" % (frappe.db.escape(filters.get('account')))
-
-	gle = frappe.db.sql("""
-		select party, sum(debit) as opening_debit, sum(credit) as opening_credit
-		from `tabGL Entry`
-		where company=%(company)s
-			and ifnull(party_type, '') = %(party_type)s and ifnull(party, '') != ''
-			and (posting_date < %(from_date)s or ifnull(is_opening, 'No') = 'Yes')
-			{account_filter}
-		group by party""".format(account_filter=account_filter), {
-			"company": filters.company,
-			"from_date": filters.from_date,
-			"party_type": filters.party_type
-		}, as_dict=True)
+	# the entries before the period, and the opening entries posted within it
+	gle = get_balances(filters.company, to_date=add_days(filters.from_date, -1), group_by=("party",),
+		conditions=conditions, values={"party_type": filters.party_type})
 
-	opening = frappe._dict()
+	gle += get_balances(filters.company, from_date=filters.from_date, group_by=("party",),
+		conditions=conditions + " and ifnull(is_opening, 'No') = 'Yes'", values={"party_type": filters.party_type})
+
+	opening_totals = {}
 	for d in gle:
-		opening_debit, opening_credit = toggle_debit_credit(d.opening_debit, d.opening_credit)
-		opening.setdefault(d.party, [opening_debit, opening_credit])
+		opening_debit, opening_credit = opening_totals.get(d.party, [0, 0])
+		opening_totals[d.party] = [opening_debit + flt(d.debit), opening_credit + flt(d.credit)]
+
+	opening = frappe._dict()
+	for party, (opening_debit, opening_credit) in opening_totals.items():
+		opening.setdefault(party, list(toggle_debit_credit(opening_debit, opening_credit)))
 
 	return opening
 
 def get_balances_within_period(filters):
-
-	account_filter = ''
-	if filters.get('account'):
-		account_filter = "and account = %s" % (frappe.db.escape(filters.get('account')))
-
-	gle = frappe.db.sql("""
-		select party, sum(debit) as debit, sum(credit) as credit
-		from `tabGL Entry`
-		where company=%(company)s
-			and ifnull(party_type, '') = %(party_type)s and ifnull(party, '') != ''
-			and posting_date >= %(from_date)s and posting_date <= %(to_date)s
-			and ifnull(is_opening, 'No') = 'No'
-			{account_filter}
-		group by party""".format(account_filter=account_filter), {
-			"company": filters.company,
-			"from_date": filters.from_date,
-			"to_date": filters.to_date,
-			"party_type": filters.party_type
-		}, as_dict=True)
+	gle = get_balances(filters.company, from_date=filters.from_date, to_date=filters.to_date, group_by=("party",),
+		conditions=get_party_conditions(filters) + " and ifnull(is_opening, 'No') = 'No'",
+		values={"party_type": filters.party_type})
 
 	balances_within_period = frappe._dict()
 	for d in gle:
@@ -1,6 +1,12 @@
 from __future__ import unicode_literals
 import unittest
+import frappe
 from erpnext.accounts.party import get_party_shipping_address
+from frappe.utils import nowdate
+from erpnext.accounts.utils import get_advance_entry_allocations, reconcile_against_document
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from erpnext.accounts.doctype.payment_entry.payment_entry import get_payment_entry
 from frappe.test_runner import make_test_objects
 
 
@@ -18,6 +24,86 @@ class TestUtils(unittest.TestCase):
 		address = get_party_shipping_address('Customer', '_Test Customer 2')
 		self.assertEqual(address, '_Test Shipping Address 2 Title-Shipping')
 
+	def test_get_advance_entry_allocations(self):
+		args = [frappe._dict(voucher_type=voucher_type, voucher_no=voucher_no, voucher_detail_no=voucher_detail_no)
+			for voucher_type, voucher_no, voucher_detail_no in [
+				("Journal Entry", "JV-1", "row-1"),
+				("Journal Entry", "JV-1", "row-2"),
+				("Payment Entry", "PE-1", ""),
+				("Payment Entry", "PE-1", None),
+				("Journal Entry", "JV-1", "row-1")
+			]]
+
+		advance_entries = get_advance_entry_allocations(args)
+		self.assertEqual(list(advance_entries), [("Journal Entry", "JV-1"), ("Payment Entry", "PE-1")])
+		self.assertEqual(list(advance_entries[("Journal Entry", "JV-1")]), ["row-1", "row-2"])
+		self.assertEqual(len(advance_entries[("Journal Entry", "JV-1")]["row-1"]), 2)
+		self.assertEqual(len(advance_entries[("Payment Entry", "PE-1")][None]), 2)
+
+	def test_reconcile_journal_entry_row_against_invoices(self):
+		jv = make_journal_entry("_Test Bank - _TC", "Debtors - _TC", 1000, save=False)
+		jv.accounts[1].party_type = "Customer"
+		jv.accounts[1].party = "_Test Customer"
+		jv.accounts[1].is_advance = "Yes"
+		jv.submit()
+
+		invoices = [create_sales_invoice(rate=rate) for rate in (300, 200)]
+
+		reconcile_against_document([get_allocation(si, "Journal Entry", jv.name, jv.accounts[1].name,
+			"credit_in_account_currency", 1000, si.grand_total) for si in invoices])
+
+		jv.reload()
+		self.assertEqual(sorted((d.reference_name, d.credit_in_account_currency) for d in jv.accounts
+			if d.party), sorted([(None, 500)] + [(si.name, si.grand_total) for si in invoices]))
+
+		for si in invoices:
+			self.assertEqual(frappe.db.get_value("Sales Invoice", si.name, "outstanding_amount"), 0)
+
+		gl_credit = frappe.db.sql("""select sum(credit) from `tabGL Entry`
+			where voucher_type = 'Journal Entry' and voucher_no = %s and party = '_Test Customer'""", jv.name)[0][0]
+		self.assertEqual(gl_credit, 1000)
+
+	def test_reconcile_unallocated_payment_against_invoices(self):
+		paid_si = create_sales_invoice(rate=100)
+		pe = get_payment_entry("Sales Invoice", paid_si.name, bank_account="_Test Cash - _TC")
+		pe.reference_no = "1"
+		pe.reference_date = nowdate()
+		pe.paid_amount = pe.received_amount = 1100
+		pe.insert()
+		pe.submit()
+		self.assertEqual(pe.unallocated_amount, 1000)
+
+		invoices = [create_sales_invoice(rate=rate) for rate in (300, 200)]
+
+		reconcile_against_document([get_allocation(si, "Payment Entry", pe.name, None,
+			"credit_in_account_currency", 1000, si.grand_total) for si in invoices])
+
+		pe.reload()
+		self.assertEqual(pe.unallocated_amount, 500)
+		self.assertEqual(sorted((d.reference_name, d.allocated_amount) for d in pe.references),
+			sorted([(paid_si.name, 100)] + [(si.name, si.grand_total) for si in invoices]))
+
+		for si in invoices:
+			self.assertEqual(frappe.db.get_value("Sales Invoice", si.name, "outstanding_amount"), 0)
+
+def get_allocation(si, voucher_type, voucher_no, voucher_detail_no, dr_or_cr, unadjusted_amount, allocated_amount):
+	return frappe._dict({
+		"voucher_type": voucher_type,
+		"voucher_no": voucher_no,
+		"voucher_detail_no": voucher_detail_no,
+		"against_voucher_type": "Sales Invoice",
+		"against_voucher": si.name,
+		"account": si.debit_to,
+		"party_type": "Customer",
+		"party": si.customer,
+		"is_advance": "Yes",
+		"dr_or_cr": dr_or_cr,
+		"unadjusted_amount": unadjusted_amount,
+		"allocated_amount": allocated_amount,
+		"grand_total": si.grand_total,
+		"outstanding_amount": si.outstanding_amount,
+		"exchange_rate": 1
+	})
 
 ADDRESS_RECORDS = [
 	{
@@ -10,11 +10,14 @@ from frappe.utils import nowdate, cstr, flt, cint, now, getdate
 from frappe import throw, _
 from frappe.utils import formatdate, get_number_format_info
 from six import iteritems
+from collections import OrderedDict
 # imported to enable erpnext.accounts.utils.get_account_currency
 from erpnext.accounts.doctype.account.account import get_account_currency
 
 from erpnext.stock.utils import get_stock_value_on
 from erpnext.stock import get_warehouse_account_map
+from erpnext.accounts.doctype.outstanding_voucher.outstanding_voucher import (get_open_vouchers,
+	get_party_account_type_of_account, update_outstanding_vouchers)
 
 
 class FiscalYearError(frappe.ValidationError): pass
@@ -316,32 +319,96 @@ def add_cc(args=None):
 	cc.insert()
 	return cc.name
 
-def reconcile_against_document(args):
+def reconcile_against_document(args, publish_progress=False):
 	"""
 		Cancel JV, Update aginst document, split if required and resubmit jv
+
+		The allocations are grouped by advance entry, so that each entry is updated and
+		reposted once, and the outstanding of each invoice is updated once at the end
+	"""
+	against_vouchers = set()
+	count, total = 0, len(args)
+
+	advance_entries = get_advance_entry_allocations(args)
+
+	# validate all the allocations before any entry is changed, the allocations of a row together
+	for allocations in advance_entries.values():
+		for rows in allocations.values():
+			check_if_advance_entry_modified(rows[0])
+			for d in rows:
+				validate_allocated_amount(d)
+
+			if len(rows) > 1:
+				validate_allocated_amount(frappe._dict(rows[0],
+					allocated_amount=sum(flt(d.allocated_amount) for d in rows)))
+
+	for (voucher_type, voucher_no), allocations in iteritems(advance_entries):
+		reconcile_advance_entry(voucher_type, voucher_no, allocations)
+
+		for rows in allocations.values():
+			for d in rows:
+				if d.against_voucher_type in ("Journal Entry", "Sales Invoice", "Purchase Invoice", "Fees"):
+					against_vouchers.add((d.account, d.party_type, d.party, d.against_voucher_type, d.against_voucher))
+
+			count += len(rows)
+
+		if publish_progress:
+			frappe.publish_progress(count * 100 / total, title=_("Reconciling Payments..."))
+
+	from erpnext.accounts.doctype.gl_entry.gl_entry import update_outstanding_amt
+	for account, party_type, party, against_voucher_type, against_voucher in against_vouchers:
+		update_outstanding_amt(account, party_type, party, against_voucher_type, against_voucher)
+
+def get_advance_entry_allocations(args):
+	"""
+		Returns the allocations grouped by advance entry, and in each entry by the row allocated.
+		The allocations of the unallocated amount of a Payment Entry have no row, and are grouped together
 	"""
+	advance_entries = OrderedDict()
 	for d in args:
+		advance_entries.setdefault((d.voucher_type, d.voucher_no), OrderedDict()) \
+			.setdefault(d.voucher_detail_no or None, []).append(d)
+
+	return advance_entries
 
-		check_if_advance_entry_modified(d)
-		validate_allocated_amount(d)
+def reconcile_advance_entry(voucher_type, voucher_no, allocations):
+	# cancel advance entry
+	doc = frappe.get_doc(voucher_type, voucher_no)
 
-		# cancel advance entry
-		doc = frappe.get_doc(d.voucher_type, d.voucher_no)
+	doc.make_gl_entries(cancel=1, adv_adj=1)
 
-		doc.make_gl_entries(cancel=1, adv_adj=1)
+	# update ref in advance entry
+	for voucher_detail_no, rows in iteritems(allocations):
+		if voucher_type == "Journal Entry":
+			# the first allocation keeps the row, the others are added as new rows
+			# and the balance of all of them is left in the row added for the first
+			update_reference_in_journal_entry(frappe._dict(rows[0],
+				unadjusted_amount=flt(rows[0].unadjusted_amount) - sum(flt(d.allocated_amount) for d in rows[1:])),
+				doc, do_not_save=True)
 
-		# update ref in advance entry
-		if d.voucher_type == "Journal Entry":
-			update_reference_in_journal_entry(d, doc)
+			for d in rows[1:]:
+				add_reference_in_journal_entry(d, doc)
 		else:
-			update_reference_in_payment_entry(d, doc)
+			if voucher_detail_no:
+				# the other allocations are taken out of the row before the first allocation splits it
+				existing_row = doc.get("references", {"name": voucher_detail_no})[0]
+				existing_row.allocated_amount = flt(existing_row.allocated_amount) \
+					- sum(flt(d.allocated_amount) for d in rows[1:])
+
+			for i, d in enumerate(rows):
+				update_reference_in_payment_entry(d if i == 0 else frappe._dict(d, voucher_detail_no=None),
+					doc, do_not_save=True)
+
+	# will work as update after submit
+	doc.flags.ignore_validate_update_after_submit = True
+	doc.save(ignore_permissions=True)
 
-		# re-submit advance entry
-		doc = frappe.get_doc(d.voucher_type, d.voucher_no)
-		doc.make_gl_entries(cancel = 0, adv_adj =1)
+	# re-submit advance entry, the outstanding of the invoices is updated by the caller
+	doc = frappe.get_doc(voucher_type, voucher_no)
+	doc.make_gl_entries(cancel=0, adv_adj=1, update_outstanding="No")
 
-		if d.voucher_type in ('Payment Entry', 'Journal Entry'):
-			doc.update_expense_claim()
+	if voucher_type in ('Payment Entry', 'Journal Entry'):
+		doc.update_expense_claim()
 
 def check_if_advance_entry_modified(args):
 	"""
@@ -389,7 +456,7 @@ def validate_allocated_amount(args):
 	elif args.get("allocated_amount") > args.get("unadjusted_amount"):
 		throw(_("Allocated amount cannot be greater than unadjusted amount"))
 
-def update_reference_in_journal_entry(d, jv_obj):
+def update_reference_in_journal_entry(d, jv_obj, do_not_save=False):
 	"""
 		Updates against document, if partial amount splits into rows
 	"""
@@ -405,42 +472,52 @@ def update_reference_in_journal_entry(d, jv_obj):
 	jv_detail.set("reference_name", d["against_voucher"])
 
 	if d['allocated_amount'] < d['unadjusted_amount']:
-		jvd = frappe.db.sql("""
-			select cost_center, balance, against_account, is_advance,
-				account_type, exchange_rate, account_currency
-			from `tabJournal Entry Account` where name = %s
-		""", d['voucher_detail_no'], as_dict=True)
-
-		amount_in_account_currency = flt(d['unadjusted_amount']) - flt(d['allocated_amount'])
-		amount_in_company_currency = amount_in_account_currency * flt(jvd[0]['exchange_rate'])
-
 		# new entry with balance amount
-		ch = jv_obj.append("accounts")
-		ch.account = d['account']
-		ch.account_type = jvd[0]['account_type']
-		ch.account_currency = jvd[0]['account_currency']
-		ch.exchange_rate = jvd[0]['exchange_rate']
-		ch.party_type = d["party_type"]
-		ch.party = d["party"]
-		ch.cost_center = cstr(jvd[0]["cost_center"])
-		ch.balance = flt(jvd[0]["balance"])
-
-		ch.set(d['dr_or_cr'], amount_in_account_currency)
-		ch.set('debit' if d['dr_or_cr']=='debit_in_account_currency' else 'credit', amount_in_company_currency)
-
-		ch.set('credit_in_account_currency' if d['dr_or_cr']== 'debit_in_account_currency'
-			else 'debit_in_account_currency', 0)
-		ch.set('credit' if d['dr_or_cr']== 'debit_in_account_currency' else 'debit', 0)
-
-		ch.against_account = cstr(jvd[0]["against_account"])
-		ch.reference_type = original_reference_type
-		ch.reference_name = original_reference_name
-		ch.is_advance = cstr(jvd[0]["is_advance"])
-		ch.docstatus = 1
+		append_journal_entry_row(d, jv_obj, flt(d['unadjusted_amount']) - flt(d['allocated_amount']),
+			original_reference_type, original_reference_name)
 
 	# will work as update after submit
 	jv_obj.flags.ignore_validate_update_after_submit = True
-	jv_obj.save(ignore_permissions=True)
+	if not do_not_save:
+		jv_obj.save(ignore_permissions=True)
+
+def add_reference_in_journal_entry(d, jv_obj):
+	"""
+		Adds a row for an allocation from a row of the journal entry already allocated
+	"""
+	append_journal_entry_row(d, jv_obj, flt(d['allocated_amount']), d["against_voucher_type"], d["against_voucher"])
+
+def append_journal_entry_row(d, jv_obj, amount_in_account_currency, reference_type, reference_name):
+	jvd = frappe.db.sql("""
+		select cost_center, balance, against_account, is_advance,
+			account_type, exchange_rate, account_currency
+		from `tabJournal Entry Account` where name = %s
+	""", d['voucher_detail_no'], as_dict=True)
+
+	amount_in_company_currency = amount_in_account_currency * flt(jvd[0]['exchange_rate'])
+
+	ch = jv_obj.append("accounts")
+	ch.account = d['account']
+	ch.account_type = jvd[0]['account_type']
+	ch.account_currency = jvd[0]['account_currency']
+	ch.exchange_rate = jvd[0]['exchange_rate']
+	ch.party_type = d["party_type"]
+	ch.party = d["party"]
+	ch.cost_center = cstr(jvd[0]["cost_center"])
+	ch.balance = flt(jvd[0]["balance"])
+
+	ch.set(d['dr_or_cr'], amount_in_account_currency)
+	ch.set('debit' if d['dr_or_cr']=='debit_in_account_currency' else 'credit', amount_in_company_currency)
+
+	ch.set('credit_in_account_currency' if d['dr_or_cr']== 'debit_in_account_currency'
+		else 'debit_in_account_currency', 0)
+	ch.set('credit' if d['dr_or_cr']== 'debit_in_account_currency' else 'debit', 0)
+
+	ch.against_account = cstr(jvd[0]["against_account"])
+	ch.reference_type = reference_type
+	ch.reference_name = reference_name
+	ch.is_advance = cstr(jvd[0]["is_advance"])
+	ch.docstatus = 1
 
 def update_reference_in_payment_entry(d, payment_entry, do_not_save=False):
 	reference_details = {
@@ -489,6 +566,13 @@ def unlink_ref_doc_from_payment_entries(ref_doc):
 	remove_ref_doc_link_from_jv(ref_doc.doctype, ref_doc.name)
 	remove_ref_doc_link_from_pe(ref_doc.doctype, ref_doc.name)
 
+	# the unlinked entries may leave their own vouchers outstanding
+	unlinked_gl_entries = frappe.db.sql("""select party_type, party, account, voucher_type, voucher_no,
+		against_voucher_type, against_voucher
+		from `tabGL Entry`
+		where against_voucher_type=%s and against_voucher=%s
+		and voucher_no != ifnull(against_voucher, '')""", (ref_doc.doctype, ref_doc.name), as_dict=True)
+
 	frappe.db.sql("""update `tabGL Entry`
 		set against_voucher_type=null, against_voucher=null,
 		modified=%s, modified_by=%s
@@ -496,6 +580,8 @@ def unlink_ref_doc_from_payment_entries(ref_doc):
 		and voucher_no != ifnull(against_voucher, '')""",
 		(now(), frappe.session.user, ref_doc.doctype, ref_doc.name))
 
+	update_outstanding_vouchers(unlinked_gl_entries)
+
 	if ref_doc.doctype in ("Sales Invoice", "Purchase Invoice"):
 		ref_doc.set("advances", [])
 
@@ -639,14 +725,7 @@ def get_outstanding_invoices(party_type, party, account, condition=None, filters
 	outstanding_invoices = []
 	precision = frappe.get_precision("Sales Invoice", "outstanding_amount") or 2
 
-	if account:
-		root_type, account_type = frappe.get_cached_value("Account", account, ["root_type", "account_type"])
-		party_account_type = "Receivable" if root_type == "Asset" else "Payable"
-		party_account_type = account_type or party_account_type
-	else:
-		party_account_type = erpnext.get_party_account_type(party_type)
-
-	if party_account_type == 'Receivable':
+	if get_party_account_type_of_account(party_type, account) == 'Receivable':
 		dr_or_cr = "debit_in_account_currency - credit_in_account_currency"
 		payment_dr_or_cr = "credit_in_account_currency - debit_in_account_currency"
 	else:
@@ -655,44 +734,53 @@ def get_outstanding_invoices(party_type, party, account, condition=None, filters
 
 	held_invoices = get_held_invoices(party_type, party)
 
-	invoice_list = frappe.db.sql("""
-		select
-			voucher_no, voucher_type, posting_date, due_date,
-			ifnull(sum({dr_or_cr}), 0) as invoice_amount
-		from
-			`tabGL Entry`
-		where
-			party_type = %(party_type)s and party = %(party)s
-			and account = %(account)s and {dr_or_cr} > 0
-			{condition}
-			and ((voucher_type = 'Journal Entry'
-					and (against_voucher = '' or against_voucher is null))
-				or (voucher_type not in ('Journal Entry', 'Payment Entry')))
-		group by voucher_type, voucher_no
-		order by posting_date, name""".format(
-			dr_or_cr=dr_or_cr,
-			condition=condition or ""
-		), {
+	# only the vouchers open in the Outstanding Voucher ledger are aggregated from the GL
+	open_vouchers = get_open_vouchers(party_type, party, account)
+
+	invoice_list, payment_entries = [], []
+	for i in range(0, len(open_vouchers), 500):
+		voucher_nos = ", ".join([frappe.db.escape(d) for d in open_vouchers[i:i + 500]])
+
+		invoice_list += frappe.db.sql("""
+			select
+				voucher_no, voucher_type, posting_date, due_date,
+				ifnull(sum({dr_or_cr}), 0) as invoice_amount
+			from
+				`tabGL Entry`
+			where
+				party_type = %(party_type)s and party = %(party)s
+				and account = %(account)s and {dr_or_cr} > 0
+				and voucher_no in ({voucher_nos})
+				{condition}
+				and ((voucher_type = 'Journal Entry'
+						and (against_voucher = '' or against_voucher is null))
+					or (voucher_type not in ('Journal Entry', 'Payment Entry')))
+			group by voucher_type, voucher_no
+			order by posting_date, name""".format(
+				dr_or_cr=dr_or_cr,
+				voucher_nos=voucher_nos,
+				condition=condition or ""
+			), {
+				"party_type": party_type,
+				"party": party,
+				"account": account,
+			}, as_dict=True)
+
+		payment_entries += frappe.db.sql("""
+			select against_voucher_type, against_voucher,
+				ifnull(sum({payment_dr_or_cr}), 0) as payment_amount
+			from `tabGL Entry`
+			where party_type = %(party_type)s and party = %(party)s
+				and account = %(account)s
+				and {payment_dr_or_cr} > 0
+				and against_voucher in ({voucher_nos})
+			group by against_voucher_type, against_voucher
+		""".format(payment_dr_or_cr=payment_dr_or_cr, voucher_nos=voucher_nos), {
 			"party_type": party_type,
 			"party": party,
-			"account": account,
+			"account": account
 		}, as_dict=True)
 
-	payment_entries = frappe.db.sql("""
-		select against_voucher_type, against_voucher,
-			ifnull(sum({payment_dr_or_cr}), 0) as payment_amount
-		from `tabGL Entry`
-		where party_type = %(party_type)s and party = %(party)s
-			and account = %(account)s
-			and {payment_dr_or_cr} > 0
-			and against_voucher is not null and against_voucher != ''
-		group by against_voucher_type, against_voucher
-	""".format(payment_dr_or_cr=payment_dr_or_cr), {
-		"party_type": party_type,
-		"party": party,
-		"account": account
-	}, as_dict=True)
-
 	pe_map = frappe._dict()
 	for d in payment_entries:
 		pe_map.setdefault((d.against_voucher_type, d.against_voucher), d.payment_amount)
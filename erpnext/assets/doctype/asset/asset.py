@@ -10,7 +10,7 @@ from frappe.utils import flt, add_months, cint, nowdate, getdate, today, date_di
 from frappe.model.document import Document
 from erpnext.assets.doctype.asset_category.asset_category import get_asset_category_account
 from erpnext.assets.doctype.asset.depreciation \
-	import get_disposal_account_and_cost_center, get_depreciation_accounts
+	import get_disposal_account_and_cost_center, get_depreciation_accounts, cancel_depreciation_entry
 from erpnext.accounts.general_ledger import make_gl_entries, delete_gl_entries
 from erpnext.accounts.utils import get_account_currency
 from erpnext.controllers.accounts_controller import AccountsController
@@ -404,7 +404,7 @@ class Asset(AccountsController):
 	def delete_depreciation_entries(self):
 		for d in self.get("schedules"):
 			if d.journal_entry:
-				frappe.get_doc("Journal Entry", d.journal_entry).cancel()
+				cancel_depreciation_entry(self.name, d.journal_entry)
 				d.db_set("journal_entry", None)
 
 		self.db_set("value_after_depreciation",
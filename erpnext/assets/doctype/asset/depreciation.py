@@ -6,6 +6,8 @@ from __future__ import unicode_literals
 import frappe
 from frappe import _
 from frappe.utils import flt, today, getdate, cint
+from six import iteritems
+from collections import OrderedDict
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import get_checks_for_pl_and_bs_accounts
 
 def post_depreciation_entries(date=None):
@@ -15,80 +17,87 @@ def post_depreciation_entries(date=None):
 
 	if not date:
 		date = today()
-	for asset in get_depreciable_assets(date):
-		make_depreciation_entry(asset, date)
-		frappe.db.commit()
+
+	group_by = frappe.db.get_value("Accounts Settings", None, "group_depreciation_entries_by") or "Asset"
+
+	# the chunks run on parallel workers, all the schedule of an asset is in the same chunk
+	assets = get_depreciable_assets(date)
+	for i in range(0, len(assets), 500):
+		frappe.enqueue(make_depreciation_entries, queue="long", timeout=3600,
+			asset_names=assets[i:i + 500], date=date, group_by=group_by, commit=True,
+			now=frappe.flags.in_test)
 
 def get_depreciable_assets(date):
-	return frappe.db.sql_list("""select a.name
+	return frappe.db.sql_list("""select distinct a.name
 		from tabAsset a, `tabDepreciation Schedule` ds
 		where a.name = ds.parent and a.docstatus=1 and ds.schedule_date<=%s and a.calculate_depreciation = 1
 			and a.status in ('Submitted', 'Partially Depreciated')
-			and ifnull(ds.journal_entry, '')=''""", date)
+			and ifnull(ds.journal_entry, '')=''
+		order by a.name""", date)
 
 @frappe.whitelist()
 def make_depreciation_entry(asset_name, date=None):
 	frappe.has_permission('Journal Entry', throw=True)
 
+	return make_depreciation_entries([asset_name], date)[asset_name]
+
+def make_depreciation_entries(asset_names, date=None, group_by="Asset", commit=False):
+	"""
+	Book the due depreciation of the assets and returns the assets.
+
+	Each schedule row is booked in its own Journal Entry if `group_by` is "Asset", else the rows
+	of the same date and finance book are booked together, per Asset Category or per Company.
+	The schedule rows are linked to their Journal Entry, so an interrupted run can be resumed.
+	If `commit` is set, each Journal Entry is committed with its schedule rows.
+	"""
 	if not date:
 		date = today()
 
-	asset = frappe.get_doc("Asset", asset_name)
-	fixed_asset_account, accumulated_depreciation_account, depreciation_expense_account = \
-		get_depreciation_accounts(asset)
+	assets = OrderedDict()
+	entries = OrderedDict()
+	for asset_name in asset_names:
+		asset = assets[asset_name] = frappe.get_doc("Asset", asset_name)
 
-	depreciation_cost_center, depreciation_series = frappe.get_cached_value('Company',  asset.company,
-		["depreciation_cost_center", "series_for_depreciation_entry"])
+		for d in asset.get("schedules"):
+			if not d.journal_entry and getdate(d.schedule_date) <= getdate(date):
+				key = (asset.company, d.finance_book, getdate(d.schedule_date))
+				if group_by == "Asset":
+					key += (asset.name, d.name)
+				elif group_by == "Asset Category":
+					key += (asset.asset_category,)
 
-	depreciation_cost_center = asset.cost_center or depreciation_cost_center
+				entries.setdefault(key, []).append((asset, d))
 
 	accounting_dimensions = get_checks_for_pl_and_bs_accounts()
 
-	for d in asset.get("schedules"):
-		if not d.journal_entry and getdate(d.schedule_date) <= getdate(date):
-			je = frappe.new_doc("Journal Entry")
-			je.voucher_type = "Depreciation Entry"
-			je.naming_series = depreciation_series
-			je.posting_date = d.schedule_date
-			je.company = asset.company
-			je.finance_book = d.finance_book
-			je.remark = "Depreciation Entry against {0} worth {1}".format(asset_name, d.depreciation_amount)
-
-			credit_entry = {
-				"account": accumulated_depreciation_account,
-				"credit_in_account_currency": d.depreciation_amount,
-				"reference_type": "Asset",
-				"reference_name": asset.name
-			}
-
-			debit_entry = {
-				"account": depreciation_expense_account,
-				"debit_in_account_currency": d.depreciation_amount,
-				"reference_type": "Asset",
-				"reference_name": asset.name,
-				"cost_center": depreciation_cost_center
-			}
-
-			for dimension in accounting_dimensions:
-				if (asset.get(dimension['fieldname']) or dimension.get('mandatory_for_bs')):
-					credit_entry.update({
-						dimension['fieldname']: asset.get(dimension['fieldname']) or dimension.get('default_dimension')
-					})
-
-				if (asset.get(dimension['fieldname']) or dimension.get('mandatory_for_pl')):
-					debit_entry.update({
-						dimension['fieldname']: asset.get(dimension['fieldname']) or dimension.get('default_dimension')
-					})
-
-			je.append("accounts", credit_entry)
-
-			je.append("accounts", debit_entry)
-
-			je.flags.ignore_permissions = True
-			je.save()
-			if not je.meta.get_workflow():
-				je.submit()
-
+	for key, rows in iteritems(entries):
+		company, finance_book, posting_date = key[:3]
+		depreciation_series = frappe.get_cached_value('Company', company, "series_for_depreciation_entry")
+
+		je = frappe.new_doc("Journal Entry")
+		je.voucher_type = "Depreciation Entry"
+		je.naming_series = depreciation_series
+		je.posting_date = posting_date
+		je.company = company
+		je.finance_book = finance_book
+
+		if len(rows) == 1:
+			je.remark = "Depreciation Entry against {0} worth {1}".format(rows[0][0].name,
+				rows[0][1].depreciation_amount)
+		else:
+			je.remark = "Depreciation Entry against {0} assets worth {1}".format(len(rows),
+				sum(flt(d.depreciation_amount) for asset, d in rows))
+
+		for asset, d in rows:
+			for entry in get_depreciation_gl_entries(asset, d, accounting_dimensions):
+				je.append("accounts", entry)
+
+		je.flags.ignore_permissions = True
+		je.save()
+		if not je.meta.get_workflow():
+			je.submit()
+
+		for asset, d in rows:
 			d.db_set("journal_entry", je.name)
 
 			idx = cint(d.finance_book_id)
@@ -96,9 +105,78 @@ def make_depreciation_entry(asset_name, date=None):
 			finance_books.value_after_depreciation -= d.depreciation_amount
 			finance_books.db_update()
 
-	asset.set_status()
+		for asset in set(asset for asset, d in rows):
+			asset.set_status()
+
+		if commit:
+			frappe.db.commit()
+
+	return assets
+
+def get_depreciation_gl_entries(asset, schedule, accounting_dimensions):
+	fixed_asset_account, accumulated_depreciation_account, depreciation_expense_account = \
+		get_depreciation_accounts(asset)
+
+	depreciation_cost_center = asset.cost_center or frappe.get_cached_value('Company', asset.company,
+		"depreciation_cost_center")
+
+	credit_entry = {
+		"account": accumulated_depreciation_account,
+		"credit_in_account_currency": schedule.depreciation_amount,
+		"reference_type": "Asset",
+		"reference_name": asset.name
+	}
+
+	debit_entry = {
+		"account": depreciation_expense_account,
+		"debit_in_account_currency": schedule.depreciation_amount,
+		"reference_type": "Asset",
+		"reference_name": asset.name,
+		"cost_center": depreciation_cost_center
+	}
+
+	for dimension in accounting_dimensions:
+		if (asset.get(dimension['fieldname']) or dimension.get('mandatory_for_bs')):
+			credit_entry.update({
+				dimension['fieldname']: asset.get(dimension['fieldname']) or dimension.get('default_dimension')
+			})
+
+		if (asset.get(dimension['fieldname']) or dimension.get('mandatory_for_pl')):
+			debit_entry.update({
+				dimension['fieldname']: asset.get(dimension['fieldname']) or dimension.get('default_dimension')
+			})
+
+	return credit_entry, debit_entry
+
+def cancel_depreciation_entry(asset_name, journal_entry):
+	'''Cancel the depreciation Journal Entry of the asset. If the entry is booked with other assets,
+		the lines of the asset are reversed by a new Journal Entry'''
+	je = frappe.get_doc("Journal Entry", journal_entry)
+	if all(d.reference_name == asset_name for d in je.get("accounts") if d.reference_type == "Asset"):
+		je.cancel()
+		return
 
-	return asset
+	reversal = frappe.new_doc("Journal Entry")
+	reversal.voucher_type = "Depreciation Entry"
+	reversal.naming_series = je.naming_series
+	reversal.posting_date = je.posting_date
+	reversal.company = je.company
+	reversal.finance_book = je.finance_book
+	reversal.remark = "Reversal of Depreciation Entry {0} against {1}".format(je.name, asset_name)
+
+	for d in je.get("accounts"):
+		if d.reference_type == "Asset" and d.reference_name == asset_name:
+			row = d.as_dict(no_default_fields=True)
+			row.update({
+				"debit_in_account_currency": d.credit_in_account_currency,
+				"credit_in_account_currency": d.debit_in_account_currency,
+				"debit": d.credit,
+				"credit": d.debit
+			})
+			reversal.append("accounts", row)
+
+	reversal.flags.ignore_permissions = True
+	reversal.submit()
 
 def get_depreciation_accounts(asset):
 	fixed_asset_account = accumulated_depreciation_account = depreciation_expense_account = None
@@ -6,7 +6,8 @@ from __future__ import unicode_literals
 import frappe
 import unittest
 from frappe.utils import cstr, nowdate, getdate, flt, get_last_day, add_days, add_months
-from erpnext.assets.doctype.asset.depreciation import post_depreciation_entries, scrap_asset, restore_asset
+from erpnext.assets.doctype.asset.depreciation import (post_depreciation_entries, scrap_asset, restore_asset,
+	make_depreciation_entries)
 from erpnext.assets.doctype.asset.asset import make_sales_invoice
 from erpnext.stock.doctype.purchase_receipt.test_purchase_receipt import make_purchase_receipt
 from erpnext.stock.doctype.purchase_receipt.purchase_receipt import make_purchase_invoice as make_invoice
@@ -274,6 +275,44 @@ class TestAsset(unittest.TestCase):
 		self.assertEqual(gle, expected_gle)
 		self.assertEqual(asset.get("value_after_depreciation"), 0)
 
+	def test_consolidated_depreciation_entry(self):
+		asset_names = []
+		for i in range(2):
+			pr = make_purchase_receipt(item_code="Macbook Pro",
+				qty=1, rate=100000.0, location="Test Location")
+
+			asset = frappe.get_doc('Asset', frappe.db.get_value("Asset", {"purchase_receipt": pr.name}, 'name'))
+			asset.calculate_depreciation = 1
+			asset.purchase_date = '2020-01-30'
+			asset.available_for_use_date = "2020-01-30"
+			asset.append("finance_books", {
+				"expected_value_after_useful_life": 10000,
+				"depreciation_method": "Straight Line",
+				"total_number_of_depreciations": 3,
+				"frequency_of_depreciation": 10,
+				"depreciation_start_date": "2020-12-31"
+			})
+			asset.insert()
+			asset.submit()
+			asset_names.append(asset.name)
+
+		make_depreciation_entries(asset_names, date="2021-01-01", group_by="Company")
+
+		journal_entries = set(frappe.get_doc("Asset", asset_name).get("schedules")[0].journal_entry
+			for asset_name in asset_names)
+		self.assertEqual(len(journal_entries), 1)
+
+		for asset_name in asset_names:
+			gle = frappe.db.sql("""select account, debit, credit from `tabGL Entry`
+				where against_voucher_type='Asset' and against_voucher = %s
+				order by account""", asset_name)
+
+			self.assertEqual(gle, (
+				("_Test Accumulated Depreciations - _TC", 0.0, 30000.0),
+				("_Test Depreciations - _TC", 30000.0, 0.0)
+			))
+			self.assertEqual(frappe.db.get_value("Asset", asset_name, "status"), "Partially Depreciated")
+
 	def test_depreciation_entry_for_wdv_without_pro_rata(self):
 		pr = make_purchase_receipt(item_code="Macbook Pro",
 			qty=1, rate=8000.0, location="Test Location")
@@ -44,6 +44,21 @@ def make_demo(context, site, domain='Manufacturing', days=100,
 			from erpnext.demo import demo
 			demo.make(domain, days)
 
+@click.command('rebuild-monthly-gl-summary')
+@click.option('--company', help='Rebuild only the summary of this company')
+@click.option('--from-date', help='Rebuild from the month of this date, to resume a stopped rebuild')
+@pass_context
+def rebuild_monthly_gl_summary(context, company=None, from_date=None):
+	"Rebuild the Monthly GL Summary from the GL entries"
+	from erpnext.accounts.doctype.monthly_gl_summary.monthly_gl_summary \
+		import rebuild_monthly_gl_summary as _rebuild_monthly_gl_summary
+
+	for site in context.sites:
+		with frappe.init_site(site):
+			frappe.connect()
+			_rebuild_monthly_gl_summary(company=company, from_date=from_date)
+
 commands = [
-	make_demo
+	make_demo,
+	rebuild_monthly_gl_summary
 ]
\ No newline at end of file
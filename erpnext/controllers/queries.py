@@ -4,9 +4,10 @@
 from __future__ import unicode_literals
 import frappe
 from frappe.desk.reportview import get_match_cond, get_filters_cond
-from frappe.utils import nowdate, getdate
+from frappe.utils import nowdate, getdate, cint
 from collections import defaultdict
 from erpnext.stock.get_item_details import _get_item_tax_template
+from erpnext.utilities.doctype.search_token.search_token import get_search_token_join
 
  # searches for active employees
 def employee_query(doctype, txt, searchfield, start, page_len, filters):
@@ -77,26 +78,27 @@ def customer_query(doctype, txt, searchfield, start, page_len, filters):
 	fields = ", ".join(fields)
 	searchfields = " or ".join([field + " like %(txt)s" for field in searchfields])
 
-	return frappe.db.sql("""select {fields} from `tabCustomer`
-		where docstatus < 2
-			and ({scond}) and disabled=0
-			{fcond} {mcond}
-		order by
-			if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
-			if(locate(%(_txt)s, customer_name), locate(%(_txt)s, customer_name), 99999),
-			idx desc,
-			name, customer_name
-		limit %(start)s, %(page_len)s""".format(**{
-			"fields": fields,
-			"scond": searchfields,
-			"mcond": get_match_cond(doctype),
-			"fcond": get_filters_cond(doctype, filters, conditions).replace('%', '%%'),
-		}), {
-			'txt': "%%%s%%" % txt,
-			'_txt': txt.replace("%", ""),
-			'start': start,
-			'page_len': page_len
-		})
+	def get_query(search_join):
+		return """select {fields} from `tabCustomer` {search_join}
+			where docstatus < 2
+				{scond} and disabled=0
+				{fcond} {mcond}
+			order by
+				if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
+				if(locate(%(_txt)s, customer_name), locate(%(_txt)s, customer_name), 99999),
+				idx desc,
+				name, customer_name
+			limit %(start)s, %(page_len)s""".format(**{
+				"fields": fields,
+				"search_join": search_join or "",
+				"scond": "" if search_join else "and ({0})".format(searchfields),
+				"mcond": get_match_cond(doctype),
+				"fcond": get_filters_cond(doctype, filters, conditions).replace('%', '%%'),
+			})
+
+	return search_with_tokens("Customer", txt, get_query, start, page_len, {
+		'_txt': txt.replace("%", "")
+	})
 
 # searches for supplier
 def supplier_query(doctype, txt, searchfield, start, page_len, filters):
@@ -107,26 +109,45 @@ def supplier_query(doctype, txt, searchfield, start, page_len, filters):
 		fields = ["name", "supplier_name", "supplier_group"]
 	fields = ", ".join(fields)
 
-	return frappe.db.sql("""select {field} from `tabSupplier`
-		where docstatus < 2
-			and ({key} like %(txt)s
-				or supplier_name like %(txt)s) and disabled=0
-			{mcond}
-		order by
-			if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
-			if(locate(%(_txt)s, supplier_name), locate(%(_txt)s, supplier_name), 99999),
-			idx desc,
-			name, supplier_name
-		limit %(start)s, %(page_len)s """.format(**{
-			'field': fields,
-			'key': searchfield,
-			'mcond':get_match_cond(doctype)
-		}), {
-			'txt': "%%%s%%" % txt,
-			'_txt': txt.replace("%", ""),
-			'start': start,
-			'page_len': page_len
-		})
+	def get_query(search_join):
+		return """select {field} from `tabSupplier` {search_join}
+			where docstatus < 2
+				{scond} and disabled=0
+				{mcond}
+			order by
+				if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
+				if(locate(%(_txt)s, supplier_name), locate(%(_txt)s, supplier_name), 99999),
+				idx desc,
+				name, supplier_name
+			limit %(start)s, %(page_len)s """.format(**{
+				'field': fields,
+				'search_join': search_join or "",
+				'scond': "" if search_join else
+					"and ({0} like %(txt)s or supplier_name like %(txt)s)".format(searchfield),
+				'mcond':get_match_cond(doctype)
+			})
+
+	return search_with_tokens("Supplier", txt, get_query, start, page_len, {
+		'_txt': txt.replace("%", "")
+	})
+
+def search_with_tokens(doctype, txt, get_query, start, page_len, values, as_dict=False):
+	'''Runs the link query joined on the search tokens. Only when the tokens find nothing, runs the
+		query with `like` conditions on the start of the fields, which can use their indexes.
+
+	`get_query` returns the query for a search token join, or the `like` query for `None`'''
+	search_join, search_values = get_search_token_join(doctype, txt)
+	if search_join:
+		values = dict(values, **search_values)
+		result = frappe.db.sql(get_query(search_join), dict(values, start=start, page_len=page_len),
+			as_dict=as_dict)
+
+		# an empty page after the last page found by the tokens is not filled either
+		if result or (cint(start) and frappe.db.sql(get_query(search_join), dict(values, start=0, page_len=1))):
+			return result
+
+	return frappe.db.sql(get_query(None), dict(values, txt="%s%%" % txt, start=start, page_len=page_len),
+		as_dict=as_dict)
 
 def tax_account_query(doctype, txt, searchfield, start, page_len, filters):
 	tax_accounts = frappe.db.sql("""select name, parent_account	from tabAccount
@@ -175,40 +196,45 @@ def item_query(doctype, txt, searchfield, start, page_len, filters, as_dict=Fals
 		# scan description only if items are less than 50000
 		description_cond = 'or tabItem.description LIKE %(txt)s'
 
-	return frappe.db.sql("""select tabItem.name,
-		if(length(tabItem.item_name) > 40,
-			concat(substr(tabItem.item_name, 1, 40), "..."), item_name) as item_name,
-		tabItem.item_group,
-		if(length(tabItem.description) > 40, \
-			concat(substr(tabItem.description, 1, 40), "..."), description) as description
-		{columns}
-		from tabItem
-		where tabItem.docstatus < 2
-			and tabItem.has_variants=0
-			and tabItem.disabled=0
-			and (tabItem.end_of_life > %(today)s or ifnull(tabItem.end_of_life, '0000-00-00')='0000-00-00')
-			and ({scond} or tabItem.item_code IN (select parent from `tabItem Barcode` where barcode LIKE %(txt)s)
-				{description_cond})
-			{fcond} {mcond}
-		order by
-			if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
-			if(locate(%(_txt)s, item_name), locate(%(_txt)s, item_name), 99999),
-			idx desc,
-			name, item_name
-		limit %(start)s, %(page_len)s """.format(
-			key=searchfield,
-			columns=columns,
-			scond=searchfields,
-			fcond=get_filters_cond(doctype, filters, conditions).replace('%', '%%'),
-			mcond=get_match_cond(doctype).replace('%', '%%'),
-			description_cond = description_cond),
-			{
-				"today": nowdate(),
-				"txt": "%%%s%%" % txt,
-				"_txt": txt.replace("%", ""),
-				"start": start,
-				"page_len": page_len
-			}, as_dict=as_dict)
+	def get_query(search_join):
+		# the search tokens are kept for the search fields, item code, item name,
+		# item group and barcodes of the item
+		scond = ''
+		if not search_join:
+			scond = """and ({searchfields} or tabItem.item_code IN (select parent from `tabItem Barcode` where barcode LIKE %(txt)s)
+				{description_cond})""".format(searchfields=searchfields, description_cond=description_cond)
+
+		return """select tabItem.name,
+			if(length(tabItem.item_name) > 40,
+				concat(substr(tabItem.item_name, 1, 40), "..."), item_name) as item_name,
+			tabItem.item_group,
+			if(length(tabItem.description) > 40, \
+				concat(substr(tabItem.description, 1, 40), "..."), description) as description
+			{columns}
+			from tabItem {search_join}
+			where tabItem.docstatus < 2
+				and tabItem.has_variants=0
+				and tabItem.disabled=0
+				and (tabItem.end_of_life > %(today)s or ifnull(tabItem.end_of_life, '0000-00-00')='0000-00-00')
+				{scond}
+				{fcond} {mcond}
+			order by
+				if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
+				if(locate(%(_txt)s, item_name), locate(%(_txt)s, item_name), 99999),
+				idx desc,
+				name, item_name
+			limit %(start)s, %(page_len)s """.format(
+				key=searchfield,
+				columns=columns,
+				search_join=search_join or '',
+				scond=scond,
+				fcond=get_filters_cond(doctype, filters, conditions).replace('%', '%%'),
+				mcond=get_match_cond(doctype).replace('%', '%%'))
+
+	return search_with_tokens("Item", txt, get_query, start, page_len, {
+		"today": nowdate(),
+		"_txt": txt.replace("%", "")
+	}, as_dict=as_dict)
 
 def bom(doctype, txt, searchfield, start, page_len, filters):
 	conditions = []
@@ -6,6 +6,7 @@ import frappe
 from frappe.utils import flt, comma_or, nowdate, getdate
 from frappe import _
 from frappe.model.document import Document
+from six import iteritems
 
 class OverAllowanceError(frappe.ValidationError): pass
 
@@ -241,101 +242,122 @@ class StatusUpdater(Document):
 				self._update_percent_field_in_targets(args, update_modified)
 
 	def _update_children(self, args, update_modified):
-		"""Update quantities or amount in child table"""
-		for d in self.get_all_children():
-			if d.doctype != args['source_dt']:
-				continue
+		"""Update quantities or amount in child table
+
+			The totals of all the rows linked to the document are computed with grouped queries
+			and rows with the same total are updated together"""
+		detail_ids = list(set([d.get(args['join_field'])
+			for d in self.get_all_children(args['source_dt']) if d.get(args['join_field'])]))
+
+		if not detail_ids:
+			return
 
-			self._update_modified(args, update_modified)
+		self._update_modified(args, update_modified)
 
-			# updates qty in the child table
-			args['detail_id'] = d.get(args['join_field'])
+		if not args.get("extra_cond"): args["extra_cond"] = ""
+
+		totals = dict.fromkeys(detail_ids, 0.0)
+		for i in range(0, len(detail_ids), 500):
+			args['detail_ids'] = ", ".join([frappe.db.escape(d) for d in detail_ids[i:i + 500]])
+
+			for detail_id, total in frappe.db.sql("""select `%(join_field)s`, ifnull(sum(%(source_field)s), 0)
+				from `tab%(source_dt)s` where `%(join_field)s` in (%(detail_ids)s)
+				and (docstatus=1 %(cond)s) %(extra_cond)s
+				group by `%(join_field)s`""" % args):
+				if detail_id in totals:
+					totals[detail_id] += flt(total)
 
-			args['second_source_condition'] = ""
 			if args.get('second_source_dt') and args.get('second_source_field') \
 					and args.get('second_join_field'):
 				if not args.get("second_source_extra_cond"):
 					args["second_source_extra_cond"] = ""
 
-				args['second_source_condition'] = """ + ifnull((select sum(%(second_source_field)s)
+				for detail_id, total in frappe.db.sql("""select `%(second_join_field)s`,
+						ifnull(sum(%(second_source_field)s), 0)
 					from `tab%(second_source_dt)s`
-					where `%(second_join_field)s`="%(detail_id)s"
-					and (`tab%(second_source_dt)s`.docstatus=1) %(second_source_extra_cond)s), 0) """ % args
+					where `%(second_join_field)s` in (%(detail_ids)s)
+					and (`tab%(second_source_dt)s`.docstatus=1) %(second_source_extra_cond)s
+					group by `%(second_join_field)s`""" % args):
+					if detail_id in totals:
+						totals[detail_id] += flt(total)
 
-			if args['detail_id']:
-				if not args.get("extra_cond"): args["extra_cond"] = ""
+		detail_ids_by_total = {}
+		for detail_id, total in iteritems(totals):
+			detail_ids_by_total.setdefault(total, []).append(detail_id)
+
+		for total, names in iteritems(detail_ids_by_total):
+			for i in range(0, len(names), 500):
+				args['detail_ids'] = ", ".join([frappe.db.escape(d) for d in names[i:i + 500]])
+				args['total'] = total
 
 				frappe.db.sql("""update `tab%(target_dt)s`
-					set %(target_field)s = (
-						(select ifnull(sum(%(source_field)s), 0)
-							from `tab%(source_dt)s` where `%(join_field)s`="%(detail_id)s"
-							and (docstatus=1 %(cond)s) %(extra_cond)s)
-						%(second_source_condition)s
-					)
+					set %(target_field)s = %(total)r
 					%(update_modified)s
-					where name='%(detail_id)s'""" % args)
+					where name in (%(detail_ids)s)""" % args)
 
 	def _update_percent_field_in_targets(self, args, update_modified=True):
 		"""Update percent field in parent transaction"""
 		distinct_transactions = set([d.get(args['percent_join_field'])
 			for d in self.get_all_children(args['source_dt'])])
 
-		for name in distinct_transactions:
-			if name:
-				args['name'] = name
-				self._update_percent_field(args, update_modified)
+		names = [name for name in distinct_transactions if name]
+		if names:
+			self._update_percent_fields(args, names, update_modified)
 
 	def _update_percent_field(self, args, update_modified=True):
 		"""Update percent field in parent transaction"""
+		self._update_percent_fields(args, [args['name']], update_modified)
 
-		if args.get('target_parent_field'):
-			# Get the total of the reference field values
-			target_ref_field_value = frappe.db.sql("""
+	def _update_percent_fields(self, args, names, update_modified=True):
+		"""Update percent field in the given parent transactions, totals of all the parents
+			are computed in a single grouped query"""
+
+		if not args.get('target_parent_field'):
+			return
+
+		# Since the target field in the parent is always a percentage, we assume it to
+		# be 100% if the reference field total is zero, thereby avoiding ZeroDivisionError
+		# USE CASE: if a document's amount or quantity is zero, we assume it to be fully
+		# billed or fully recieved / delivered, which would say incorrectly otherwise
+		percentages = {}
+		for i in range(0, len(names), 500):
+			args['names'] = ", ".join([frappe.db.escape(name) for name in names[i:i + 500]])
+
+			for parent, target_ref_field_value, target_field_value in frappe.db.sql("""
 				SELECT
-					SUM(ABS(%(target_ref_field)s))
+					parent,
+					SUM(ABS(%(target_ref_field)s)),
+					ROUND(
+						IFNULL(
+							(IFNULL(SUM(IF(%(target_ref_field)s > %(target_field)s, ABS(%(target_field)s), ABS(%(target_ref_field)s))), 0)
+							/ SUM(ABS(%(target_ref_field)s)) * 100), 0
+						), 6
+					)
 				FROM
 					`tab%(target_dt)s`
 				WHERE
-					parent="%(name)s"
-			""" % args)[0][0]
-
-			# Since the target field in the parent is always a percentage, we assume it to
-			# be 100% if the reference field total is zero, thereby avoiding ZeroDivisionError
-			# USE CASE: if a document's amount or quantity is zero, we assume it to be fully
-			# billed or fully recieved / delivered, which would say incorrectly otherwise
-			if target_ref_field_value == 0:
-				target_field_value = 100
-			else:
-				target_field_value = frappe.db.sql("""
-					SELECT
-						ROUND(
-							IFNULL(
-								(IFNULL(SUM(IF(%(target_ref_field)s > %(target_field)s, ABS(%(target_field)s), ABS(%(target_ref_field)s))), 0)
-								/ SUM(ABS(%(target_ref_field)s)) * 100), 0
-							), 6
-						)
-					FROM
-						`tab%(target_dt)s`
-					WHERE
-						parent="%(name)s"
-				""" % args)[0][0]
-
-			frappe.db.set_value(args.get("target_parent_dt"), args.get("name"), args.get("target_parent_field"), target_field_value, update_modified=update_modified)
+					parent in (%(names)s)
+				GROUP BY
+					parent
+			""" % args):
+				percentages[parent] = 100 if target_ref_field_value == 0 else flt(target_field_value)
+
+		for name in names:
+			target_parent_field_value = percentages.get(name, 0)
+			frappe.db.set_value(args.get("target_parent_dt"), name, args.get("target_parent_field"), target_parent_field_value, update_modified=update_modified)
 
 			# Update the status field
 			if args.get('status_field'):
-				target_parent_field_value = frappe.db.get_value(args.get("target_parent_dt"), args.get("name"), args.get("target_parent_field"))
-
 				if target_parent_field_value < 0.001:
 					status = 'Not '
 				else:
 					status = 'Fully ' if target_parent_field_value >= 99.999999 else 'Partly '
 
 				status += args.get("keyword")
-				frappe.db.set_value(args.get("target_parent_dt"), args.get("name"), args.get("status_field"), status, update_modified=update_modified)
+				frappe.db.set_value(args.get("target_parent_dt"), name, args.get("status_field"), status, update_modified=update_modified)
 
 			if update_modified:
-				target = frappe.get_doc(args["target_parent_dt"], args["name"])
+				target = frappe.get_doc(args["target_parent_dt"], name)
 				target.set_status(update=True)
 				target.notify_update()
 
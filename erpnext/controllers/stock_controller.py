@@ -11,6 +11,8 @@ from erpnext.accounts.general_ledger import make_gl_entries, delete_gl_entries,
 from erpnext.controllers.accounts_controller import AccountsController
 from erpnext.stock.stock_ledger import get_valuation_rate
 from erpnext.stock import get_warehouse_account_map
+from erpnext.accounts.doctype.monthly_expense_summary.monthly_expense_summary import remove_voucher_from_monthly_expense_summary
+from erpnext.accounts.doctype.monthly_gl_summary.monthly_gl_summary import remove_voucher_from_monthly_gl_summary
 
 class QualityInspectionRequiredError(frappe.ValidationError): pass
 class QualityInspectionRejectedError(frappe.ValidationError): pass
@@ -367,6 +369,8 @@ class StockController(AccountsController):
 def update_gl_entries_after(posting_date, posting_time, for_warehouses=None, for_items=None,
 		warehouse_account=None, company=None):
 	def _delete_gl_entries(voucher_type, voucher_no):
+		remove_voucher_from_monthly_gl_summary(voucher_type, voucher_no)
+		remove_voucher_from_monthly_expense_summary(voucher_type, voucher_no)
 		frappe.db.sql("""delete from `tabGL Entry`
 			where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no))
 
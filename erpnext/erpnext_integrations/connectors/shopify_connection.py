@@ -11,55 +11,75 @@ from erpnext.erpnext_integrations.doctype.shopify_log.shopify_log import make_sh
 
 @frappe.whitelist(allow_guest=True)
 @validate_webhooks_request("Shopify Settings", 'X-Shopify-Hmac-Sha256', secret_key='shared_secret')
-def store_request_data(order=None, event=None):
+def store_request_data(order=None, event=None, webhook_id=None):
 	if frappe.request:
 		order = json.loads(frappe.request.data)
 		event = frappe.request.headers.get('X-Shopify-Topic')
+		webhook_id = frappe.request.headers.get('X-Shopify-Webhook-Id')
 
-	dump_request_data(order, event)
+	dump_request_data(order, event, webhook_id)
 
-def sync_sales_order(order, request_id=None):
+def sync_sales_order(order, request_id=None, shopify_settings=None):
 	frappe.set_user('Administrator')
-	shopify_settings = frappe.get_doc("Shopify Settings")
+	shopify_settings = shopify_settings or frappe.get_doc("Shopify Settings")
 	frappe.flags.request_id = request_id
 
-	if not frappe.db.get_value("Sales Order", filters={"shopify_order_id": cstr(order['id'])}):
-		try:
+	try:
+		lock_shopify_order(order)
+		if not frappe.db.get_value("Sales Order", filters={"shopify_order_id": cstr(order['id'])}):
 			validate_customer(order, shopify_settings)
 			validate_item(order, shopify_settings)
 			create_order(order, shopify_settings)
-		except Exception as e:
-			make_shopify_log(status="Error", exception=e)
+	except Exception as e:
+		make_shopify_log(status="Error", exception=e)
 
-		else:
-			make_shopify_log(status="Success")
+	else:
+		make_shopify_log(status="Success")
 
-def prepare_sales_invoice(order, request_id=None):
+def prepare_sales_invoice(order, request_id=None, shopify_settings=None):
 	frappe.set_user('Administrator')
-	shopify_settings = frappe.get_doc("Shopify Settings")
+	shopify_settings = shopify_settings or frappe.get_doc("Shopify Settings")
 	frappe.flags.request_id = request_id
 
 	try:
+		lock_shopify_order(order)
 		sales_order = get_sales_order(cstr(order['id']))
 		if sales_order:
 			create_sales_invoice(order, shopify_settings, sales_order)
-			make_shopify_log(status="Success")
+		else:
+			# paid before the order was synced, the order is created along with its invoice
+			validate_customer(order, shopify_settings)
+			validate_item(order, shopify_settings)
+			create_order(order, shopify_settings)
+		make_shopify_log(status="Success")
 	except Exception as e:
 		make_shopify_log(status="Error", exception=e, rollback=True)
 
-def prepare_delivery_note(order, request_id=None):
+def prepare_delivery_note(order, request_id=None, shopify_settings=None):
 	frappe.set_user('Administrator')
-	shopify_settings = frappe.get_doc("Shopify Settings")
+	shopify_settings = shopify_settings or frappe.get_doc("Shopify Settings")
 	frappe.flags.request_id = request_id
 
 	try:
+		lock_shopify_order(order)
 		sales_order = get_sales_order(cstr(order['id']))
 		if sales_order:
 			create_delivery_note(order, shopify_settings, sales_order)
+		else:
+			# fulfilled before the order was synced, the order is created along with its delivery notes
+			validate_customer(order, shopify_settings)
+			validate_item(order, shopify_settings)
+			create_order(order, shopify_settings)
 		make_shopify_log(status="Success")
 	except Exception as e:
 		make_shopify_log(status="Error", exception=e, rollback=True)
 
+def lock_shopify_order(order):
+	"""Serialize processing of requests for the same order across workers,
+		so that an order and its invoice and delivery notes are not created twice"""
+	frappe.db.sql("""select name from `tabShopify Log`
+		where shopify_order_id = %s for update""", cstr(order['id']))
+
 def get_sales_order(shopify_order_id):
 	sales_order = frappe.db.get_value("Sales Order", filters={"shopify_order_id": shopify_order_id})
 	if sales_order:
@@ -69,12 +89,24 @@ def get_sales_order(shopify_order_id):
 def validate_customer(order, shopify_settings):
 	customer_id = order.get("customer", {}).get("id")
 	if customer_id:
-		if not frappe.db.get_value("Customer", {"shopify_customer_id": customer_id}, "name"):
+		if not get_customer(customer_id):
 			create_customer(order.get("customer"), shopify_settings)
 
+def get_customer(shopify_customer_id):
+	customers = frappe.flags.shopify_customers
+	if customers is not None and shopify_customer_id in customers:
+		return customers[shopify_customer_id]
+
+	customer = frappe.db.get_value("Customer", {"shopify_customer_id": shopify_customer_id}, "name")
+	if customer and customers is not None:
+		customers[shopify_customer_id] = customer
+
+	return customer
+
 def validate_item(order, shopify_settings):
 	for item in order.get("line_items"):
-		if item.get("product_id") and not frappe.db.get_value("Item", {"shopify_product_id": item.get("product_id")}, "name"):
+		if item.get("product_id") and not get_cached_item_code(("product", item.get("product_id")),
+			{"shopify_product_id": item.get("product_id")}):
 			sync_item_from_shopify(shopify_settings, item)
 
 def create_order(order, shopify_settings, company=None):
@@ -88,7 +120,7 @@ def create_order(order, shopify_settings, company=None):
 
 def create_sales_order(shopify_order, shopify_settings, company=None):
 	product_not_exists = []
-	customer = frappe.db.get_value("Customer", {"shopify_customer_id": shopify_order.get("customer", {}).get("id")}, "name")
+	customer = get_customer(shopify_order.get("customer", {}).get("id"))
 	so = frappe.db.get_value("Sales Order", {"shopify_order_id": shopify_order.get("id")}, "name")
 
 	if not so:
@@ -216,11 +248,27 @@ def get_order_items(order_items, shopify_settings):
 	return items
 
 def get_item_code(shopify_item):
-	item_code = frappe.db.get_value("Item", {"shopify_variant_id": shopify_item.get("variant_id")}, "item_code")
+	item_code = get_cached_item_code(("variant", shopify_item.get("variant_id")),
+		{"shopify_variant_id": shopify_item.get("variant_id")})
 	if not item_code:
-		item_code = frappe.db.get_value("Item", {"shopify_product_id": shopify_item.get("product_id")}, "item_code")
+		item_code = get_cached_item_code(("product", shopify_item.get("product_id")),
+			{"shopify_product_id": shopify_item.get("product_id")})
 	if not item_code:
-		item_code = frappe.db.get_value("Item", {"item_name": shopify_item.get("title")}, "item_code")
+		item_code = get_cached_item_code(("title", shopify_item.get("title")),
+			{"item_name": shopify_item.get("title")})
+
+	return item_code
+
+def get_cached_item_code(key, filters):
+	"""Item code lookup, cached while a batch of requests is processed.
+		Only found items are cached, as missing ones may be synced by a later order."""
+	item_codes = frappe.flags.shopify_item_codes
+	if item_codes is not None and key in item_codes:
+		return item_codes[key]
+
+	item_code = frappe.db.get_value("Item", filters, "item_code")
+	if item_code and item_codes is not None:
+		item_codes[key] = item_code
 
 	return item_code
 
@@ -229,7 +277,7 @@ def get_order_taxes(shopify_order, shopify_settings):
 	for tax in shopify_order.get("tax_lines"):
 		taxes.append({
 			"charge_type": _("On Net Total"),
-			"account_head": get_tax_account_head(tax),
+			"account_head": get_tax_account_head(tax, shopify_settings),
 			"description": "{0} - {1}%".format(tax.get("title"), tax.get("rate") * 100.0),
 			"rate": tax.get("rate") * 100.00,
 			"included_in_print_rate": 1 if shopify_order.get("taxes_included") else 0,
@@ -244,7 +292,7 @@ def update_taxes_with_shipping_lines(taxes, shipping_lines, shopify_settings):
 	for shipping_charge in shipping_lines:
 		taxes.append({
 			"charge_type": _("Actual"),
-			"account_head": get_tax_account_head(shipping_charge),
+			"account_head": get_tax_account_head(shipping_charge, shopify_settings),
 			"description": shipping_charge["title"],
 			"tax_amount": shipping_charge["price"],
 			"cost_center": shopify_settings.cost_center
@@ -252,11 +300,14 @@ def update_taxes_with_shipping_lines(taxes, shipping_lines, shopify_settings):
 
 	return taxes
 
-def get_tax_account_head(tax):
-	tax_title = tax.get("title").encode("utf-8")
+def get_tax_account_head(tax, shopify_settings):
+	tax_title = cstr(tax.get("title")).lower()
 
-	tax_account =  frappe.db.get_value("Shopify Tax Account", \
-		{"parent": "Shopify Settings", "shopify_tax": tax_title}, "tax_account")
+	tax_account = None
+	for d in shopify_settings.taxes:
+		if cstr(d.shopify_tax).lower() == tax_title:
+			tax_account = d.tax_account
+			break
 
 	if not tax_account:
 		frappe.throw(_("Tax Account not specified for Shopify Tax {0}".format(tax.get("title"))))
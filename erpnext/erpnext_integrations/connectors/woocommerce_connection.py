@@ -2,6 +2,7 @@
 from __future__ import unicode_literals
 import frappe, base64, hashlib, hmac, json
 from frappe import _
+from frappe.integrations.utils import create_request_log
 
 def verify_request():
 	woocommerce_settings = frappe.get_doc("Woocommerce Settings")
@@ -47,11 +48,65 @@ def _order(*args, **kwargs):
 		return "success"
 
 	if event == "created":
-		raw_billing_data = order.get("billing")
-		customer_name = raw_billing_data.get("first_name") + " " + raw_billing_data.get("last_name")
-		link_customer_and_address(raw_billing_data, customer_name)
-		link_items(order.get("line_items"), woocommerce_settings)
-		create_sales_order(order, woocommerce_settings, customer_name)
+		queue_order(order)
+
+def queue_order(order):
+	"""Store the order as an Integration Request, to be created in the background.
+		Webhooks are retried on timeouts, the request is named after the order so that
+		an order delivered again is not stored twice"""
+	try:
+		create_request_log(order, "Remote", "WooCommerce", name=get_order_request_name(order.get("id")))
+	except frappe.DuplicateEntryError:
+		return
+
+	frappe.enqueue("erpnext.erpnext_integrations.connectors.woocommerce_connection.process_queued_orders",
+		queue="short", now=frappe.flags.in_test)
+
+def get_order_request_name(woocommerce_id):
+	return "WooCommerce Order {0}".format(woocommerce_id)
+
+def process_queued_orders():
+	"""Create the Sales Orders of the queued requests, also run hourly for the ones
+		left queued by a worker which did not finish"""
+	for request in frappe.get_all("Integration Request", filters={"integration_request_service": "WooCommerce",
+		"status": "Queued"}, order_by="creation"):
+		process_order(request.name)
+
+def process_order(request_name):
+	# the lock keeps another job from creating the same order meanwhile
+	status = frappe.db.sql("""select status from `tabIntegration Request`
+		where name = %s for update""", request_name)
+	if not status or status[0][0] != "Queued":
+		frappe.db.rollback()
+		return
+
+	order = json.loads(frappe.db.get_value("Integration Request", request_name, "data"))
+	try:
+		sales_order = frappe.db.get_value("Sales Order", {"woocommerce_id": order.get("id")})
+		if not sales_order:
+			woocommerce_settings = frappe.get_doc("Woocommerce Settings")
+			frappe.set_user(woocommerce_settings.creation_user)
+
+			raw_billing_data = order.get("billing")
+			customer_name = raw_billing_data.get("first_name") + " " + raw_billing_data.get("last_name")
+			link_customer_and_address(raw_billing_data, customer_name)
+			items = link_items(order.get("line_items"), woocommerce_settings)
+			sales_order = create_sales_order(order, woocommerce_settings, customer_name, items)
+
+		frappe.db.set_value("Integration Request", request_name, {
+			"status": "Completed",
+			"reference_doctype": "Sales Order",
+			"reference_docname": sales_order
+		})
+	except Exception:
+		frappe.db.rollback()
+		frappe.db.set_value("Integration Request", request_name, {
+			"status": "Failed",
+			"error": frappe.get_traceback()
+		})
+		frappe.log_error(frappe.get_traceback(), "WooCommerce Error")
+
+	frappe.db.commit()
 
 def link_customer_and_address(raw_billing_data, customer_name):
 	customer_woo_com_email = raw_billing_data.get("email")
@@ -101,8 +156,12 @@ def link_customer_and_address(raw_billing_data, customer_name):
 		frappe.rename_doc("Address", old_address_title, new_address_title)
 
 def link_items(items_list, woocommerce_settings):
+	"""Create or update the items of the order, returns the items by woocommerce id"""
+	items = {}
 	for item_data in items_list:
 		item_woo_com_id = item_data.get("product_id")
+		if item_woo_com_id in items:
+			continue
 
 		if frappe.get_value("Item", {"woocommerce_id": item_woo_com_id}):
 			#Edit Item
@@ -118,8 +177,11 @@ def link_items(items_list, woocommerce_settings):
 		item.stock_uom = woocommerce_settings.uom or _("Nos")
 		item.flags.ignore_mandatory = True
 		item.save()
+		items[item_woo_com_id] = item
 
-def create_sales_order(order, woocommerce_settings, customer_name):	
+	return items
+
+def create_sales_order(order, woocommerce_settings, customer_name, items=None):	
 	new_sales_order = frappe.new_doc("Sales Order")
 	new_sales_order.customer = customer_name
 
@@ -133,19 +195,22 @@ def create_sales_order(order, woocommerce_settings, customer_name):
 
 	new_sales_order.company = woocommerce_settings.company
 
-	set_items_in_sales_order(new_sales_order, woocommerce_settings, order)
+	set_items_in_sales_order(new_sales_order, woocommerce_settings, order, items)
 	new_sales_order.flags.ignore_mandatory = True
 	new_sales_order.insert()
 	new_sales_order.submit()
 
-	frappe.db.commit()
+	return new_sales_order.name
 
-def set_items_in_sales_order(new_sales_order, woocommerce_settings, order):
+def set_items_in_sales_order(new_sales_order, woocommerce_settings, order, items=None):
 	company_abbr = frappe.db.get_value('Company', woocommerce_settings.company, 'abbr')
+	items = items or {}
 
 	for item in order.get("line_items"):
 		woocomm_item_id = item.get("product_id")
-		found_item = frappe.get_doc("Item", {"woocommerce_id": woocomm_item_id})
+		found_item = items.get(woocomm_item_id)
+		if not found_item:
+			found_item = items[woocomm_item_id] = frappe.get_doc("Item", {"woocommerce_id": woocomm_item_id})
 
 		ordered_items_tax = item.get("total_tax")
 
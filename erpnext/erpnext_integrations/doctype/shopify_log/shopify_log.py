@@ -5,9 +5,16 @@
 from __future__ import unicode_literals
 import frappe
 import json
+import time
 from frappe.model.document import Document
+from frappe.utils import cstr, flt, now, now_datetime, add_to_date
 from erpnext.erpnext_integrations.utils import get_webhook_address
 
+BATCH_SIZE = 50
+METRICS_HISTORY = 100
+# longer than the timeout of the batch job, a request still Processing after this was left by a worker that died
+PROCESSING_TIMEOUT = 3600
+
 class ShopifyLog(Document):
 	pass
 
@@ -44,25 +51,138 @@ def get_message(exception):
 		message = "Something went wrong while syncing"
 	return message
 
-def dump_request_data(data, event="create/order"):
+def dump_request_data(data, event="create/order", webhook_id=None):
 	event_mapper = {
 		"orders/create": get_webhook_address(connector_name='shopify_connection', method="sync_sales_order", exclude_uri=True),
 		"orders/paid" : get_webhook_address(connector_name='shopify_connection', method="prepare_sales_invoice", exclude_uri=True),
 		"orders/fulfilled": get_webhook_address(connector_name='shopify_connection', method="prepare_delivery_note", exclude_uri=True)
 	}
 
-	log = frappe.get_doc({
+	# Shopify retries a webhook with the same id until it gets a response in time
+	if webhook_id and frappe.db.exists("Shopify Log", {"webhook_id": webhook_id}):
+		return
+
+	frappe.get_doc({
 		"doctype": "Shopify Log",
 		"request_data": json.dumps(data, indent=1),
-		"method": event_mapper[event]
+		"method": event_mapper[event],
+		"shopify_order_id": cstr(data.get("id")),
+		"webhook_id": webhook_id
 	}).insert(ignore_permissions=True)
 
 	frappe.db.commit()
-	frappe.enqueue(method=event_mapper[event], queue='short', timeout=300, is_async=True,
-		**{"order": data, "request_id": log.name})
+	enqueue_queued_requests()
 
 @frappe.whitelist()
 def resync(method, name, request_data):
 	frappe.db.set_value("Shopify Log", name, "status", "Queued", update_modified=False)
-	frappe.enqueue(method=method, queue='short', timeout=300, is_async=True,
-		**{"order": json.loads(request_data), "request_id": name})
+	if not frappe.db.get_value("Shopify Log", name, "shopify_order_id"):
+		frappe.db.set_value("Shopify Log", name, "shopify_order_id",
+			cstr(json.loads(request_data).get("id")), update_modified=False)
+
+	enqueue_queued_requests()
+
+def enqueue_queued_requests():
+	"""Enqueue a batch job unless one is already waiting to be picked up,
+		webhooks received in the meantime are processed in the same batch"""
+	if frappe.flags.in_test or not frappe.cache().get_value("shopify_requests_enqueued"):
+		frappe.cache().set_value("shopify_requests_enqueued", 1, expires_in_sec=300)
+		frappe.enqueue("erpnext.erpnext_integrations.doctype.shopify_log.shopify_log.process_queued_requests",
+			queue='short', timeout=1500, now=frappe.flags.in_test)
+
+def process_queued_requests():
+	frappe.cache().delete_value("shopify_requests_enqueued")
+	requeue_stale_requests()
+
+	while True:
+		batch = claim_queued_requests()
+		if not batch:
+			break
+
+		process_batch(batch)
+
+def requeue_stale_requests():
+	"""Queue again the requests claimed by a batch which never finished them"""
+	frappe.db.sql("""
+		update `tabShopify Log`
+		set status = 'Queued', batch = null
+		where status = 'Processing' and modified < %s
+	""", add_to_date(now_datetime(), seconds=-PROCESSING_TIMEOUT))
+	frappe.db.commit()
+
+def claim_queued_requests():
+	"""Mark the queued requests of the oldest orders as Processing for this batch.
+		All requests of an order are claimed together so that they are processed in order."""
+	order_ids = frappe.db.sql_list("""
+		select shopify_order_id
+		from `tabShopify Log`
+		where status = 'Queued' and ifnull(shopify_order_id, '') != ''
+		group by shopify_order_id
+		order by min(creation)
+		limit %s
+	""", BATCH_SIZE)
+
+	if not order_ids:
+		return
+
+	batch = frappe.generate_hash(length=10)
+	frappe.db.sql("""
+		update `tabShopify Log`
+		set status = 'Processing', batch = %s, modified = %s
+		where status = 'Queued' and shopify_order_id in ({0})
+	""".format(", ".join(["%s"] * len(order_ids))), tuple([batch, now()] + order_ids))
+	frappe.db.commit()
+
+	return batch
+
+def process_batch(batch):
+	start_time = time.time()
+	shopify_settings = frappe.get_doc("Shopify Settings")
+
+	# lookups of items, customers and tax accounts are cached for the batch
+	frappe.flags.shopify_item_codes = {}
+	frappe.flags.shopify_customers = {}
+
+	requests = frappe.get_all("Shopify Log", filters={"batch": batch},
+		fields=["name", "method", "request_data"], order_by="creation")
+
+	for request in requests:
+		try:
+			frappe.get_attr(request.method)(json.loads(request.request_data),
+				request_id=request.name, shopify_settings=shopify_settings)
+		except Exception as e:
+			frappe.flags.request_id = request.name
+			make_shopify_log(status="Error", exception=e, rollback=True)
+
+	frappe.flags.shopify_item_codes = None
+	frappe.flags.shopify_customers = None
+
+	update_batch_metrics(batch, start_time)
+
+def update_batch_metrics(batch, start_time):
+	duration = time.time() - start_time
+	status_count = dict(frappe.db.sql("""
+		select status, count(*) from `tabShopify Log`
+		where batch = %s group by status""", batch))
+
+	requests = sum(status_count.values())
+	metrics = {
+		"batch": batch,
+		"completed_on": now(),
+		"orders": frappe.db.sql("""select count(distinct shopify_order_id)
+			from `tabShopify Log` where batch = %s""", batch)[0][0],
+		"requests": requests,
+		"success": status_count.get("Success", 0),
+		"error": status_count.get("Error", 0),
+		"duration": flt(duration, 3),
+		"requests_per_second": flt(requests / duration, 3) if duration else 0
+	}
+
+	history = frappe.cache().get_value("shopify_batch_metrics") or []
+	frappe.cache().set_value("shopify_batch_metrics", ([metrics] + history)[:METRICS_HISTORY])
+
+@frappe.whitelist()
+def get_batch_metrics():
+	"""Returns throughput of the latest batches, most recent first"""
+	frappe.only_for("System Manager")
+	return frappe.cache().get_value("shopify_batch_metrics") or []
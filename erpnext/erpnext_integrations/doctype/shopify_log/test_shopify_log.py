@@ -5,8 +5,46 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
+from frappe.utils import now_datetime, add_to_date
+from erpnext.erpnext_integrations.doctype.shopify_log.shopify_log import (claim_queued_requests,
+	requeue_stale_requests)
 
 # test_records = frappe.get_test_records('Shopify Log')
 
 class TestShopifyLog(unittest.TestCase):
-	pass
+	def setUp(self):
+		frappe.db.sql("delete from `tabShopify Log` where status in ('Queued', 'Processing')")
+
+	def test_requeue_stale_requests(self):
+		stale = make_shopify_log("Processing", modified=add_to_date(now_datetime(), hours=-2))
+		claimed = make_shopify_log("Processing")
+
+		requeue_stale_requests()
+
+		self.assertEqual(frappe.db.get_value("Shopify Log", stale, ["status", "batch"]), ("Queued", None))
+		self.assertEqual(frappe.db.get_value("Shopify Log", claimed, "status"), "Processing")
+
+	def test_claim_requests_of_an_order_together(self):
+		logs = [make_shopify_log("Queued", modified=add_to_date(now_datetime(), hours=-2)),
+			make_shopify_log("Queued")]
+
+		batch = claim_queued_requests()
+
+		self.assertEqual(sorted(frappe.db.sql_list("""select name from `tabShopify Log`
+			where batch=%s and status='Processing'""", batch)), sorted(logs))
+
+		# claimed just now, so not taken for a request left by a dead worker
+		requeue_stale_requests()
+		self.assertEqual(frappe.db.get_value("Shopify Log", logs[0], "status"), "Processing")
+
+def make_shopify_log(status, shopify_order_id="_Test Shopify Order", modified=None):
+	log = frappe.get_doc({
+		"doctype": "Shopify Log",
+		"shopify_order_id": shopify_order_id,
+		"request_data": "{}"
+	}).insert(ignore_permissions=True)
+
+	frappe.db.sql("""update `tabShopify Log` set status=%s, batch=%s, modified=%s where name=%s""",
+		(status, "_Test Batch" if status == "Processing" else None, modified or now_datetime(), log.name))
+
+	return log.name
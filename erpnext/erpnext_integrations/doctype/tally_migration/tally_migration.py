@@ -4,22 +4,28 @@
 
 from __future__ import unicode_literals
 
+import codecs
 from decimal import Decimal
+from itertools import islice
 import json
 import re
 import traceback
 import zipfile
+from lxml import etree
 import frappe
 from frappe import _
 from frappe.custom.doctype.custom_field.custom_field import create_custom_field
 from frappe.model.document import Document
-from frappe.utils.data import format_datetime
-from bs4 import BeautifulSoup as bs
+from frappe.utils.data import format_datetime, getdate
 from erpnext import encode_company_abbr
 from erpnext.accounts.doctype.account.chart_of_accounts.chart_of_accounts import create_charts
+from erpnext.accounts.general_ledger import make_gl_entries_in_bulk
 
 PRIMARY_ACCOUNT = "Primary"
 VOUCHER_CHUNK_SIZE = 500
+READ_CHUNK_SIZE = 1024 * 1024
+INVALID_XML_CHARACTERS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]"
+	r"|&#0*(?:[0-8]|1[124-9]|2[0-9]|3[01]);|&#x0*(?:[0-8bcef]|1[0-9a-f]);", re.IGNORECASE)
 
 
 class TallyMigration(Document):
@@ -27,28 +33,14 @@ class TallyMigration(Document):
 		if not self.name:
 			self.name = "Tally Migration on " + format_datetime(self.creation)
 
-	def get_collection(self, data_file):
-		def sanitize(string):
-			return re.sub("&#4;", "", string)
-
-		def emptify(string):
-			string = re.sub(r"<\w+/>", "", string)
-			string = re.sub(r"<([\w.]+)>\s*<\/\1>", "", string)
-			string = re.sub(r"\r\n", "", string)
-			return string
-
+	def get_collection(self, data_file, tags):
+		"""Yields elements with the given tags from the zipped Tally XML as they are read"""
 		master_file = frappe.get_doc("File", {"file_url": data_file})
 
 		with zipfile.ZipFile(master_file.get_full_path()) as zf:
-			encoded_content = zf.read(zf.namelist()[0])
-			try:
-				content = encoded_content.decode("utf-8-sig")
-			except UnicodeDecodeError:
-				content = encoded_content.decode("utf-16")
-
-		master = bs(sanitize(emptify(content)), "xml")
-		collection = master.BODY.IMPORTDATA.REQUESTDATA
-		return collection
+			with zf.open(zf.namelist()[0]) as f:
+				for element in iter_elements(f, tags):
+					yield element
 
 	def dump_processed_data(self, data):
 		for key, value in data.items():
@@ -61,11 +53,69 @@ class TallyMigration(Document):
 			}).insert()
 			setattr(self, key, f.file_url)
 
+	def dump_processed_vouchers(self, vouchers):
+		"""Writes vouchers as they are processed to a line delimited JSON file,
+			so that each import job can read only its own slice"""
+		file_name = frappe.scrub(self.name) + "_vouchers.jsonl"
+		file_path = frappe.get_site_path("private", "files", file_name)
+
+		with open(file_path, "w") as f:
+			for voucher in vouchers:
+				f.write(json.dumps(voucher) + "\n")
+
+		f = frappe.get_doc({
+			"doctype": "File",
+			"file_name": file_name,
+			"file_url": "/private/files/" + file_name,
+			"is_private": 1,
+			"attached_to_doctype": self.doctype,
+			"attached_to_name": self.name
+		}).insert()
+		self.vouchers = f.file_url
+
 	def _process_master_data(self):
-		def get_company_name(collection):
-			return collection.find_all("REMOTECMPINFO.LIST")[0].REMOTECMPNAME.string
+		def read_masters(elements):
+			masters = frappe._dict(company=None, groups=[], ledgers=[], units=[], stock_items=[])
+			for element in elements:
+				if element.tag == "REMOTECMPINFO.LIST":
+					masters.company = masters.company or get_text(element, "REMOTECMPNAME")
+				elif element.tag == "GROUP":
+					masters.groups.append(read_group(element))
+				elif element.tag == "LEDGER":
+					masters.ledgers.append(read_ledger(element))
+				elif element.tag == "UNIT":
+					masters.units.append(get_text(element, "NAME"))
+				elif element.tag == "STOCKITEM":
+					masters.stock_items.append({
+						"name": get_text(element, "NAME"),
+						"base_units": get_text(element, "BASEUNITS")
+					})
+				element.clear()
+			return masters
+
+		def read_group(group):
+			return {
+				"name": group.get("NAME"),
+				"parent": get_text(group, "PARENT"),
+				"is_deemed_positive": get_text(group, "ISDEEMEDPOSITIVE"),
+				"is_revenue": get_text(group, "ISREVENUE")
+			}
+
+		def read_ledger(ledger):
+			return {
+				"name": ledger.get("NAME"),
+				"ledger_name": get_text(ledger, "NAME"),
+				"parent": get_text(ledger, "PARENT"),
+				"tax_id": get_text(ledger, "INCOMETAXNUMBER"),
+				"address": [clean_text(a.text) for a in ledger.iter("ADDRESS") if clean_text(a.text)],
+				"country": get_text(ledger, "COUNTRYNAME"),
+				"state": get_text(ledger, "LEDSTATENAME"),
+				"pin_code": get_text(ledger, "PINCODE"),
+				"phone": get_text(ledger, "LEDGERPHONE"),
+				"gstin": get_text(ledger, "PARTYGSTIN")
+			}
 
-		def get_coa_customers_suppliers(collection):
+		def get_coa_customers_suppliers(masters):
 			root_type_map = {
 				"Application of Funds (Assets)": "Asset",
 				"Expenses": "Expense",
@@ -73,7 +123,7 @@ class TallyMigration(Document):
 				"Source of Funds (Liabilities)": "Liability"
 			}
 			roots = set(root_type_map.keys())
-			accounts = list(get_groups(collection.find_all("GROUP"))) + list(get_ledgers(collection.find_all("LEDGER")))
+			accounts = list(get_groups(masters.groups)) + list(get_ledgers(masters.ledgers))
 			children, parents = get_children_and_parent_dict(accounts)
 			group_set =  [acc[1] for acc in accounts if acc[2]]
 			children, customers, suppliers = remove_parties(parents, children, group_set)
@@ -86,27 +136,27 @@ class TallyMigration(Document):
 
 		def get_groups(accounts):
 			for account in accounts:
-				if account["NAME"] in (self.tally_creditors_account, self.tally_debtors_account):
-					yield get_parent(account), account["NAME"], 0
+				if account["name"] in (self.tally_creditors_account, self.tally_debtors_account):
+					yield get_parent(account), account["name"], 0
 				else:
-					yield get_parent(account), account["NAME"], 1
+					yield get_parent(account), account["name"], 1
 
 		def get_ledgers(accounts):
 			for account in accounts:
 				# If Ledger doesn't have PARENT field then don't create Account
 				# For example "Profit & Loss A/c"
-				if account.PARENT:
-					yield account.PARENT.string, account["NAME"], 0
+				if account["parent"]:
+					yield account["parent"], account["name"], 0
 
 		def get_parent(account):
-			if account.PARENT:
-				return account.PARENT.string
+			if account["parent"]:
+				return account["parent"]
 			return {
 				("Yes", "No"): "Application of Funds (Assets)",
 				("Yes", "Yes"): "Expenses",
 				("No", "Yes"): "Income",
 				("No", "No"): "Source of Funds (Liabilities)",
-			}[(account.ISDEEMEDPOSITIVE.string, account.ISREVENUE.string)]
+			}[(account["is_deemed_positive"], account["is_revenue"])]
 
 		def get_children_and_parent_dict(accounts):
 			children, parents = {}, {}
@@ -140,57 +190,57 @@ class TallyMigration(Document):
 					tree[account] = {}
 			return tree
 
-		def get_parties_addresses(collection, customers, suppliers):
+		def get_parties_addresses(ledgers, customers, suppliers):
 			parties, addresses = [], []
-			for account in collection.find_all("LEDGER"):
+			for account in ledgers:
 				party_type = None
-				if account.NAME.string in customers:
+				if account["ledger_name"] in customers:
 					party_type = "Customer"
 					parties.append({
 						"doctype": party_type,
-						"customer_name": account.NAME.string,
-						"tax_id": account.INCOMETAXNUMBER.string if account.INCOMETAXNUMBER else None,
+						"customer_name": account["ledger_name"],
+						"tax_id": account["tax_id"],
 						"customer_group": "All Customer Groups",
 						"territory": "All Territories",
 						"customer_type": "Individual",
 					})
-				elif account.NAME.string in suppliers:
+				elif account["ledger_name"] in suppliers:
 					party_type = "Supplier"
 					parties.append({
 						"doctype": party_type,
-						"supplier_name": account.NAME.string,
-						"pan": account.INCOMETAXNUMBER.string if account.INCOMETAXNUMBER else None,
+						"supplier_name": account["ledger_name"],
+						"pan": account["tax_id"],
 						"supplier_group": "All Supplier Groups",
 						"supplier_type": "Individual",
 					})
 				if party_type:
-					address = "\n".join([a.string for a in account.find_all("ADDRESS")])
+					address = "\n".join(account["address"])
 					addresses.append({
 						"doctype": "Address",
 						"address_line1": address[:140].strip(),
 						"address_line2": address[140:].strip(),
-						"country": account.COUNTRYNAME.string if account.COUNTRYNAME else None,
-						"state": account.LEDSTATENAME.string if account.LEDSTATENAME else None,
-						"gst_state": account.LEDSTATENAME.string if account.LEDSTATENAME else None,
-						"pin_code": account.PINCODE.string if account.PINCODE else None,
-						"mobile": account.LEDGERPHONE.string if account.LEDGERPHONE else None,
-						"phone": account.LEDGERPHONE.string if account.LEDGERPHONE else None,
-						"gstin": account.PARTYGSTIN.string if account.PARTYGSTIN else None,
-						"links": [{"link_doctype": party_type, "link_name": account["NAME"]}],
+						"country": account["country"],
+						"state": account["state"],
+						"gst_state": account["state"],
+						"pin_code": account["pin_code"],
+						"mobile": account["phone"],
+						"phone": account["phone"],
+						"gstin": account["gstin"],
+						"links": [{"link_doctype": party_type, "link_name": account["name"]}],
 					})
 			return parties, addresses
 
-		def get_stock_items_uoms(collection):
+		def get_stock_items_uoms(masters):
 			uoms = []
-			for uom in collection.find_all("UNIT"):
-				uoms.append({"doctype": "UOM", "uom_name": uom.NAME.string})
+			for uom in masters.units:
+				uoms.append({"doctype": "UOM", "uom_name": uom})
 
 			items = []
-			for item in collection.find_all("STOCKITEM"):
+			for item in masters.stock_items:
 				items.append({
 					"doctype": "Item",
-					"item_code" : item.NAME.string,
-					"stock_uom": item.BASEUNITS.string,
+					"item_code" : item["name"],
+					"stock_uom": item["base_units"],
 					"is_stock_item": 0,
 					"item_group": "All Item Groups",
 					"item_defaults": [{"company": self.erpnext_company}]
@@ -199,18 +249,19 @@ class TallyMigration(Document):
 
 
 		self.publish("Process Master Data", _("Reading Uploaded File"), 1, 5)
-		collection = self.get_collection(self.master_data)
+		masters = read_masters(self.get_collection(self.master_data,
+			("REMOTECMPINFO.LIST", "GROUP", "LEDGER", "UNIT", "STOCKITEM")))
 
-		company = get_company_name(collection)
+		company = masters.company
 		self.tally_company = company
 		self.erpnext_company = company
 
 		self.publish("Process Master Data", _("Processing Chart of Accounts and Parties"), 2, 5)
-		chart_of_accounts, customers, suppliers = get_coa_customers_suppliers(collection)
+		chart_of_accounts, customers, suppliers = get_coa_customers_suppliers(masters)
 		self.publish("Process Master Data", _("Processing Party Addresses"), 3, 5)
-		parties, addresses = get_parties_addresses(collection, customers, suppliers)
+		parties, addresses = get_parties_addresses(masters.ledgers, customers, suppliers)
 		self.publish("Process Master Data", _("Processing Items and UOMs"), 4, 5)
-		items, uoms = get_stock_items_uoms(collection)
+		items, uoms = get_stock_items_uoms(masters)
 		data = {"chart_of_accounts": chart_of_accounts, "parties": parties, "addresses": addresses, "items": items, "uoms": uoms}
 		self.publish("Process Master Data", _("Done"), 5, 5)
 
@@ -285,36 +336,43 @@ class TallyMigration(Document):
 
 	def _process_day_book_data(self):
 		def get_vouchers(collection):
-			vouchers = []
-			for voucher in collection.find_all("VOUCHER"):
-				if voucher.ISCANCELLED.string == "Yes":
+			for voucher in collection:
+				if get_text(voucher, "ISCANCELLED") == "Yes":
+					voucher.clear()
 					continue
-				inventory_entries = voucher.find_all("INVENTORYENTRIES.LIST") + voucher.find_all("ALLINVENTORYENTRIES.LIST") + voucher.find_all("INVENTORYENTRIESIN.LIST") + voucher.find_all("INVENTORYENTRIESOUT.LIST")
-				if voucher.VOUCHERTYPENAME.string not in ["Journal", "Receipt", "Payment", "Contra"] and inventory_entries:
+				inventory_entries = get_inventory_entries(voucher)
+				if get_text(voucher, "VOUCHERTYPENAME") not in ["Journal", "Receipt", "Payment", "Contra"] and inventory_entries:
 					function = voucher_to_invoice
 				else:
 					function = voucher_to_journal_entry
 				try:
 					processed_voucher = function(voucher)
 					if processed_voucher:
-						vouchers.append(processed_voucher)
+						yield processed_voucher
 				except:
-					self.log(voucher)
-			return vouchers
+					self.log(etree.tostring(voucher, encoding="unicode"))
+				voucher.clear()
+
+		def get_inventory_entries(voucher):
+			return find_all(voucher, "INVENTORYENTRIES.LIST") + find_all(voucher, "ALLINVENTORYENTRIES.LIST") \
+				+ find_all(voucher, "INVENTORYENTRIESIN.LIST") + find_all(voucher, "INVENTORYENTRIESOUT.LIST")
+
+		def get_ledger_entries(voucher):
+			return find_all(voucher, "ALLLEDGERENTRIES.LIST") + find_all(voucher, "LEDGERENTRIES.LIST")
 
 		def voucher_to_journal_entry(voucher):
 			accounts = []
-			ledger_entries = voucher.find_all("ALLLEDGERENTRIES.LIST") + voucher.find_all("LEDGERENTRIES.LIST")
-			for entry in ledger_entries:
-				account = {"account": encode_company_abbr(entry.LEDGERNAME.string, self.erpnext_company), "cost_center": self.default_cost_center}
-				if entry.ISPARTYLEDGER.string == "Yes":
-					party_details = get_party(entry.LEDGERNAME.string)
+			for entry in get_ledger_entries(voucher):
+				ledger_name = get_text(entry, "LEDGERNAME")
+				account = {"account": encode_company_abbr(ledger_name, self.erpnext_company), "cost_center": self.default_cost_center}
+				if get_text(entry, "ISPARTYLEDGER") == "Yes":
+					party_details = get_party(ledger_name)
 					if party_details:
 						party_type, party_account = party_details
 						account["party_type"] = party_type
 						account["account"] = party_account
-						account["party"] = entry.LEDGERNAME.string
-				amount = Decimal(entry.AMOUNT.string)
+						account["party"] = ledger_name
+				amount = Decimal(get_text(entry, "AMOUNT"))
 				if amount > 0:
 					account["credit_in_account_currency"] = str(abs(amount))
 				else:
@@ -323,21 +381,22 @@ class TallyMigration(Document):
 
 			journal_entry = {
 				"doctype": "Journal Entry",
-				"tally_guid": voucher.GUID.string,
-				"posting_date": voucher.DATE.string,
+				"tally_guid": get_text(voucher, "GUID"),
+				"posting_date": get_text(voucher, "DATE"),
 				"company": self.erpnext_company,
 				"accounts": accounts,
 			}
 			return journal_entry
 
 		def voucher_to_invoice(voucher):
-			if voucher.VOUCHERTYPENAME.string in ["Sales", "Credit Note"]:
+			voucher_type = get_text(voucher, "VOUCHERTYPENAME")
+			if voucher_type in ["Sales", "Credit Note"]:
 				doctype = "Sales Invoice"
 				party_field = "customer"
 				account_field = "debit_to"
 				account_name = encode_company_abbr(self.tally_debtors_account, self.erpnext_company)
 				price_list_field = "selling_price_list"
-			elif voucher.VOUCHERTYPENAME.string in ["Purchase", "Debit Note"]:
+			elif voucher_type in ["Purchase", "Debit Note"]:
 				doctype = "Purchase Invoice"
 				party_field = "supplier"
 				account_field = "credit_to"
@@ -350,10 +409,10 @@ class TallyMigration(Document):
 
 			invoice = {
 				"doctype": doctype,
-				party_field: voucher.PARTYNAME.string,
-				"tally_guid": voucher.GUID.string,
-				"posting_date": voucher.DATE.string,
-				"due_date": voucher.DATE.string,
+				party_field: get_text(voucher, "PARTYNAME"),
+				"tally_guid": get_text(voucher, "GUID"),
+				"posting_date": get_text(voucher, "DATE"),
+				"due_date": get_text(voucher, "DATE"),
 				"items": get_voucher_items(voucher, doctype),
 				"taxes": get_voucher_taxes(voucher),
 				account_field: account_name,
@@ -365,62 +424,62 @@ class TallyMigration(Document):
 			return invoice
 
 		def get_voucher_items(voucher, doctype):
-			inventory_entries = voucher.find_all("INVENTORYENTRIES.LIST") + voucher.find_all("ALLINVENTORYENTRIES.LIST") + voucher.find_all("INVENTORYENTRIESIN.LIST") + voucher.find_all("INVENTORYENTRIESOUT.LIST")
+			inventory_entries = get_inventory_entries(voucher)
 			if doctype == "Sales Invoice":
 				account_field = "income_account"
 			elif doctype == "Purchase Invoice":
 				account_field = "expense_account"
 			items = []
 			for entry in inventory_entries:
-				qty, uom = entry.ACTUALQTY.string.strip().split()
+				qty, uom = get_text(entry, "ACTUALQTY").strip().split()
 				items.append({
-					"item_code": entry.STOCKITEMNAME.string,
-					"description": entry.STOCKITEMNAME.string,
+					"item_code": get_text(entry, "STOCKITEMNAME"),
+					"description": get_text(entry, "STOCKITEMNAME"),
 					"qty": qty.strip(),
 					"uom": uom.strip(),
 					"conversion_factor": 1,
-					"price_list_rate": entry.RATE.string.split("/")[0],
+					"price_list_rate": get_text(entry, "RATE").split("/")[0],
 					"cost_center": self.default_cost_center,
 					"warehouse": self.default_warehouse,
-					account_field: encode_company_abbr(entry.find_all("ACCOUNTINGALLOCATIONS.LIST")[0].LEDGERNAME.string, self.erpnext_company),
+					account_field: encode_company_abbr(get_text(find_all(entry, "ACCOUNTINGALLOCATIONS.LIST")[0], "LEDGERNAME"), self.erpnext_company),
 				})
 			return items
 
 		def get_voucher_taxes(voucher):
-			ledger_entries = voucher.find_all("ALLLEDGERENTRIES.LIST") + voucher.find_all("LEDGERENTRIES.LIST")
 			taxes = []
-			for entry in ledger_entries:
-				if entry.ISPARTYLEDGER.string == "No":
-					tax_account = encode_company_abbr(entry.LEDGERNAME.string, self.erpnext_company)
+			for entry in get_ledger_entries(voucher):
+				if get_text(entry, "ISPARTYLEDGER") == "No":
+					tax_account = encode_company_abbr(get_text(entry, "LEDGERNAME"), self.erpnext_company)
 					taxes.append({
 						"charge_type": "Actual",
 						"account_head": tax_account,
 						"description": tax_account,
-						"tax_amount": entry.AMOUNT.string,
+						"tax_amount": get_text(entry, "AMOUNT"),
 						"cost_center": self.default_cost_center,
 					})
 			return taxes
 
 		def get_party(party):
-			if frappe.db.exists({"doctype": "Supplier", "supplier_name": party}):
+			if party in suppliers:
 				return "Supplier", encode_company_abbr(self.tally_creditors_account, self.erpnext_company)
-			elif frappe.db.exists({"doctype": "Customer", "customer_name": party}):
+			elif party in customers:
 				return "Customer", encode_company_abbr(self.tally_debtors_account, self.erpnext_company)
 
+		suppliers = set(d.supplier_name for d in frappe.get_all("Supplier", fields=["supplier_name"]))
+		customers = set(d.customer_name for d in frappe.get_all("Customer", fields=["customer_name"]))
+
 		self.publish("Process Day Book Data", _("Reading Uploaded File"), 1, 3)
-		collection = self.get_collection(self.day_book_data)
+		collection = self.get_collection(self.day_book_data, ("VOUCHER",))
 		self.publish("Process Day Book Data", _("Processing Vouchers"), 2, 3)
-		vouchers = get_vouchers(collection)
+		self.dump_processed_vouchers(get_vouchers(collection))
 		self.publish("Process Day Book Data", _("Done"), 3, 3)
-		self.dump_processed_data({"vouchers": vouchers})
 		self.status = ""
 		self.is_day_book_data_processed = 1
 		self.save()
 
 	def _import_day_book_data(self):
-		def create_fiscal_years(vouchers):
-			from frappe.utils.data import add_years, getdate
-			earliest_date = getdate(min(voucher["posting_date"] for voucher in vouchers))
+		def create_fiscal_years(earliest_date):
+			from frappe.utils.data import add_years
 			oldest_year = frappe.get_all("Fiscal Year", fields=["year_start_date", "year_end_date"], order_by="year_start_date")[0]
 			while earliest_date < oldest_year.year_start_date:
 				new_year = frappe.get_doc({"doctype": "Fiscal Year"})
@@ -457,33 +516,57 @@ class TallyMigration(Document):
 		frappe.db.set_value("Account", encode_company_abbr(self.tally_debtors_account, self.erpnext_company), "account_type", "Receivable")
 		frappe.db.set_value("Company", self.erpnext_company, "round_off_account", self.round_off_account)
 
-		vouchers_file = frappe.get_doc("File", {"file_url": self.vouchers})
-		vouchers = json.loads(vouchers_file.get_content())
+		total, earliest_date, chunk_offsets = self.get_voucher_chunks()
+		if not total:
+			return
 
-		create_fiscal_years(vouchers)
+		create_fiscal_years(earliest_date)
 		create_price_list()
 		create_custom_fields(["Journal Entry", "Purchase Invoice", "Sales Invoice"])
 
-		total = len(vouchers)
-		is_last = False
-		for index in range(0, total, VOUCHER_CHUNK_SIZE):
-			if index + VOUCHER_CHUNK_SIZE >= total:
-				is_last = True
-			frappe.enqueue_doc(self.doctype, self.name, "_import_vouchers", queue="long", timeout=3600, start=index+1, total=total, is_last=is_last)
-
-	def _import_vouchers(self, start, total, is_last=False):
+		for chunk_index, offset in enumerate(chunk_offsets):
+			start = chunk_index * VOUCHER_CHUNK_SIZE
+			is_last = start + VOUCHER_CHUNK_SIZE >= total
+			frappe.enqueue_doc(self.doctype, self.name, "_import_vouchers", queue="long", timeout=3600,
+				start=start+1, total=total, is_last=is_last, offset=offset)
+
+	def get_voucher_chunks(self):
+		"""Returns the voucher count, the earliest posting date and the byte offset
+			at which each chunk of vouchers starts in the processed vouchers file"""
+		total, earliest_date, chunk_offsets = 0, None, []
+		with open(self.get_vouchers_file_path(), "rb") as f:
+			offset = 0
+			for line in f:
+				if total % VOUCHER_CHUNK_SIZE == 0:
+					chunk_offsets.append(offset)
+				offset += len(line)
+				total += 1
+
+				posting_date = getdate(json.loads(line)["posting_date"])
+				if not earliest_date or posting_date < earliest_date:
+					earliest_date = posting_date
+
+		return total, earliest_date, chunk_offsets
+
+	def get_vouchers_file_path(self):
+		return frappe.get_doc("File", {"file_url": self.vouchers}).get_full_path()
+
+	def _import_vouchers(self, start, total, is_last=False, offset=0):
 		frappe.flags.in_migrate = True
-		vouchers_file = frappe.get_doc("File", {"file_url": self.vouchers})
-		vouchers = json.loads(vouchers_file.get_content())
-		chunk = vouchers[start: start + VOUCHER_CHUNK_SIZE]
-
-		for index, voucher in enumerate(chunk, start=start):
-			try:
-				doc = frappe.get_doc(voucher).insert()
-				doc.submit()
-				self.publish("Importing Vouchers", _("{} of {}").format(index, total), index, total)
-			except:
-				self.log(voucher)
+		with open(self.get_vouchers_file_path(), "rb") as f:
+			f.seek(offset)
+			chunk = [json.loads(line) for line in islice(f, VOUCHER_CHUNK_SIZE)]
+
+		try:
+			self.submit_vouchers(chunk, batch_gl_entries=True)
+		except Exception:
+			# posting the chunk failed, post every voucher on its own so that only the bad ones are left out
+			frappe.db.rollback()
+			self.submit_vouchers(chunk)
+
+		index = start + len(chunk) - 1
+		self.publish("Importing Vouchers", _("{} of {}").format(index, total), index, total)
+		frappe.db.commit()
 
 		if is_last:
 			self.status = ""
@@ -492,6 +575,27 @@ class TallyMigration(Document):
 			frappe.db.set_value("Price List", "Tally Price List", "enabled", 0)
 		frappe.flags.in_migrate = False
 
+	def submit_vouchers(self, vouchers, batch_gl_entries=False):
+		"""Creates and submits the vouchers, logging the ones that fail.
+			With `batch_gl_entries`, the GL entries of the vouchers are collected as they are
+			submitted and posted together at the end, with multi-row inserts"""
+		frappe.flags.batch_gl_entries = [] if batch_gl_entries else None
+		try:
+			for voucher in vouchers:
+				collected = len(frappe.flags.batch_gl_entries or [])
+				try:
+					doc = frappe.get_doc(voucher).insert()
+					doc.submit()
+				except:
+					if batch_gl_entries:
+						del frappe.flags.batch_gl_entries[collected:]
+					self.log(voucher)
+
+			if frappe.flags.batch_gl_entries:
+				make_gl_entries_in_bulk(frappe.flags.batch_gl_entries, merge_entries=False)
+		finally:
+			frappe.flags.batch_gl_entries = None
+
 	def process_master_data(self):
 		self.status = "Processing Master Data"
 		self.save()
@@ -515,3 +619,73 @@ class TallyMigration(Document):
 	def log(self, data=None):
 		message = "\n".join(["Data", json.dumps(data, default=str, indent=4), "Exception", traceback.format_exc()])
 		return frappe.log_error(title="Tally Migration Error", message=message)
+
+def iter_elements(f, tags):
+	"""Yields the elements with the given tags from a Tally XML file object as they are read.
+		Each element is detached from the document once the caller is done with it,
+		so memory use is bounded by the size of a single master or voucher.
+
+		Tally exports are often not well formed, so the parser recovers from errors
+		instead of stopping at the first one, like the BeautifulSoup parser did"""
+	tags = set(tags)
+	# the content is fed re-encoded, whatever encoding the XML declaration names
+	parser = etree.XMLPullParser(events=("start", "end"), recover=True, huge_tree=True, encoding="utf-8")
+	stack = []
+
+	def read_events():
+		for event, element in parser.read_events():
+			if event == "start":
+				stack.append(element)
+				continue
+
+			stack.pop()
+			if element.tag not in tags:
+				continue
+
+			yield element
+
+			# nested elements are yielded before their parent, keep them until the parent is done
+			if stack and not any(e.tag in tags for e in stack):
+				stack[-1].remove(element)
+
+	for content in read_sanitized_content(f):
+		parser.feed(content.encode("utf-8"))
+		for element in read_events():
+			yield element
+
+	parser.close()
+	for element in read_events():
+		yield element
+
+def read_sanitized_content(f):
+	"""Reads the Tally XML in chunks, decoded and without the characters that are invalid in XML"""
+	data = f.read(READ_CHUNK_SIZE)
+	encoding = "utf-16" if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)) else "utf-8-sig"
+
+	decoder = codecs.getincrementaldecoder(encoding)()
+	pending = ""
+	while data:
+		content = sanitize(pending + decoder.decode(data))
+		# keep the tail, it may contain the start of an invalid character reference
+		content, pending = content[:-8], content[-8:]
+		yield content
+		data = f.read(READ_CHUNK_SIZE)
+
+	yield sanitize(pending + decoder.decode(b"", final=True))
+
+def sanitize(string):
+	"""Removes the control characters, and references to them, which are not allowed in XML"""
+	return INVALID_XML_CHARACTERS.sub("", string)
+
+def find_all(element, tag):
+	return list(element.iter(tag))
+
+def get_text(element, tag):
+	"""Returns the text of the first descendant with the given tag, None if it is missing or empty"""
+	child = element.find(".//" + tag)
+	if child is not None:
+		return clean_text(child.text)
+
+def clean_text(text):
+	if text and text.strip():
+		return text.replace("\r\n", "")
@@ -3,8 +3,59 @@
 # See license.txt
 from __future__ import unicode_literals
 
+import codecs
+import io
 import frappe
 import unittest
+from frappe.utils import nowdate
+from erpnext.erpnext_integrations.doctype.tally_migration.tally_migration import iter_elements, get_text
 
 class TestTallyMigration(unittest.TestCase):
-	pass
+	def test_parse_malformed_xml(self):
+		content = """<?xml version="1.0" encoding="UTF-16"?>
+			<ENVELOPE><BODY><DATA>
+				<LEDGER NAME="Cash&#4;"><NAME>Cash&#4;</NAME><PARENT>Cash-in-Hand\x01</PARENT></LEDGER>
+				<LEDGER NAME="Bank"><NAME>Bank&#x1F;</NAME><PARENT>Bank Accounts</PARENT></LEDGER>
+				<LEDGER NAME="Sales"><NAME>Sales</NAME><PARENT>Sales & Services</PARENT></LEDGER>
+				<GROUP NAME="Bank Accounts"><PARENT>Current Assets</PARENT></GROUP>
+				<LEDGER NAME="Tax"><NAME>Tax</NAME><PARENT>Duties</PARENT></LEDGER>
+			</DATA></BODY></ENVELOPE>"""
+
+		for data in (content.encode("utf-8"), codecs.BOM_UTF16_LE + content.encode("utf-16-le")):
+			ledgers = [(element.get("NAME"), get_text(element, "NAME"))
+				for element in iter_elements(io.BytesIO(data), ("LEDGER",))]
+
+			# the unescaped ampersand does not stop the parser
+			self.assertEqual([d[0] for d in ledgers], ["Cash", "Bank", "Sales", "Tax"])
+			self.assertEqual(ledgers[0][1], "Cash")
+			self.assertEqual(ledgers[1][1], "Bank")
+
+	def test_submit_vouchers_in_batch(self):
+		def make_voucher(amount, account="_Test Cash - _TC"):
+			return {
+				"doctype": "Journal Entry",
+				"posting_date": nowdate(),
+				"company": "_Test Company",
+				"accounts": [
+					{"account": "_Test Bank - _TC", "cost_center": "_Test Cost Center - _TC",
+						"debit_in_account_currency": amount},
+					{"account": account, "cost_center": "_Test Cost Center - _TC",
+						"credit_in_account_currency": amount}
+				]
+			}
+
+		existing = frappe.db.sql_list("select name from `tabJournal Entry`")
+		tally_migration = frappe.new_doc("Tally Migration")
+		tally_migration.submit_vouchers([make_voucher(101.5), make_voucher(50, account="_Test Missing Account"),
+			make_voucher(202.25)], batch_gl_entries=True)
+
+		journal_entries = frappe.get_all("Journal Entry", filters={"name": ("not in", existing), "docstatus": 1},
+			fields=["name", "total_debit"], order_by="total_debit")
+		self.assertEqual([d.total_debit for d in journal_entries], [101.5, 202.25])
+
+		for d in journal_entries:
+			gl_entries = frappe.db.sql("""select sum(debit), sum(credit), count(name) from `tabGL Entry`
+				where voucher_type='Journal Entry' and voucher_no=%s""", d.name)[0]
+			self.assertEqual(list(gl_entries), [d.total_debit, d.total_debit, 2])
+
+		self.assertFalse(frappe.flags.batch_gl_entries)
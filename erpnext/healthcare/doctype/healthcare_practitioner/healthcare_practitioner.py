@@ -8,6 +8,7 @@ from frappe.model.document import Document
 from frappe import throw, _
 from frappe.utils import cstr
 from erpnext.accounts.party import validate_party_accounts
+from erpnext.healthcare.doctype.patient_appointment.patient_appointment import clear_practitioner_schedule_cache
 from frappe.contacts.address_and_contact import load_address_and_contact, delete_contact_and_address
 from frappe.desk.reportview import build_match_conditions, get_filters_cond
 
@@ -44,6 +45,7 @@ class HealthcarePractitioner(Document):
 	def on_update(self):
 		if self.user_id:
 			frappe.permissions.add_user_permission("Healthcare Practitioner", self.name, self.user_id)
+		clear_practitioner_schedule_cache()
 
 
 	def validate_for_enabled_user_id(self):
@@ -6,6 +6,7 @@ from __future__ import unicode_literals
 
 from frappe.utils.nestedset import NestedSet
 import frappe
+from erpnext.healthcare.doctype.patient_appointment.patient_appointment import clear_practitioner_schedule_cache
 
 class HealthcareServiceUnit(NestedSet):
 	nsm_parent_field = 'parent_healthcare_service_unit'
@@ -21,6 +22,7 @@ class HealthcareServiceUnit(NestedSet):
 	def on_update(self):
 		super(HealthcareServiceUnit, self).on_update()
 		self.validate_one_root()
+		clear_practitioner_schedule_cache()
 
 	def validate(self):
 		if self.is_group == 1:
@@ -6,11 +6,12 @@ from __future__ import unicode_literals
 import frappe
 from frappe.model.document import Document
 import json
-from frappe.utils import getdate, add_days, get_time
+from frappe.utils import getdate, add_days, get_time, date_diff
 from frappe import _
 import datetime
+from six import string_types
 from frappe.core.doctype.sms_settings.sms_settings import send_sms
-from erpnext.hr.doctype.employee.employee import is_holiday
+from erpnext.hr.doctype.employee.employee import is_holiday, get_holiday_list_for_employee
 from erpnext.healthcare.doctype.healthcare_settings.healthcare_settings import get_receivable_account,get_income_account
 from erpnext.healthcare.utils import validity_exists, service_item_and_practitioner_charge
 
@@ -182,24 +183,9 @@ def get_availability_data(date, practitioner):
 	date = getdate(date)
 	weekday = date.strftime("%A")
 
-	available_slots = []
-	slot_details = []
-	practitioner_schedule = None
-
-	employee = None
-
-	practitioner_obj = frappe.get_doc("Healthcare Practitioner", practitioner)
-
-	# Get practitioner employee relation
-	if practitioner_obj.employee:
-		employee = practitioner_obj.employee
-	elif practitioner_obj.user_id:
-		if frappe.db.exists({
-			"doctype": "Employee",
-			"user_id": practitioner_obj.user_id
-			}):
-			employee = frappe.get_doc("Employee", {"user_id": practitioner_obj.user_id}).name
+	practitioner_details = get_practitioner_schedule_details(practitioner)
 
+	employee = practitioner_details.employee
 	if employee:
 		# Check if it is Holiday
 		if is_holiday(employee, date):
@@ -215,53 +201,13 @@ def get_availability_data(date, practitioner):
 			else:
 				frappe.throw(_("{0} on Leave on {1}").format(practitioner, date))
 
-	# get practitioners schedule
-	if practitioner_obj.practitioner_schedules:
-		for schedule in practitioner_obj.practitioner_schedules:
-			if schedule.schedule:
-				practitioner_schedule = frappe.get_doc("Practitioner Schedule", schedule.schedule)
-			else:
-				frappe.throw(_("{0} does not have a Healthcare Practitioner Schedule. Add it in Healthcare Practitioner master".format(practitioner)))
-
-			if practitioner_schedule:
-				available_slots = []
-				for t in practitioner_schedule.time_slots:
-					if weekday == t.day:
-						available_slots.append(t)
-
-				if available_slots:
-					appointments = []
-
-					if schedule.service_unit:
-						slot_name  = schedule.schedule+" - "+schedule.service_unit
-						allow_overlap = frappe.get_value('Healthcare Service Unit', schedule.service_unit, 'overlap_appointments')
-						if allow_overlap:
-							# fetch all appointments to practitioner by service unit
-							appointments = frappe.get_all(
-								"Patient Appointment",
-								filters={"practitioner": practitioner, "service_unit": schedule.service_unit, "appointment_date": date, "status": ["not in",["Cancelled"]]},
-								fields=["name", "appointment_time", "duration", "status"])
-						else:
-							# fetch all appointments to service unit
-							appointments = frappe.get_all(
-								"Patient Appointment",
-								filters={"service_unit": schedule.service_unit, "appointment_date": date, "status": ["not in",["Cancelled"]]},
-								fields=["name", "appointment_time", "duration", "status"])
-					else:
-						slot_name = schedule.schedule
-						# fetch all appointments to practitioner without service unit
-						appointments = frappe.get_all(
-							"Patient Appointment",
-							filters={"practitioner": practitioner, "service_unit": '', "appointment_date": date, "status": ["not in",["Cancelled"]]},
-							fields=["name", "appointment_time", "duration", "status"])
-
-					slot_details.append({"slot_name":slot_name, "service_unit":schedule.service_unit,
-						"avail_slot":available_slots, 'appointments': appointments})
-
-	else:
+	if practitioner_details.missing_schedule:
 		frappe.throw(_("{0} does not have a Healthcare Practitioner Schedule. Add it in Healthcare Practitioner master".format(practitioner)))
 
-	if not available_slots and not slot_details:
+	appointments = get_booked_appointments([practitioner_details], date, date)
+	slot_details = get_slot_details(practitioner_details, date, appointments)
+
+	if not slot_details:
 		# TODO: return available slots in nearby dates
 		frappe.throw(_("Healthcare Practitioner not available on {0}").format(weekday))
 
@@ -269,6 +215,186 @@ def get_availability_data(date, practitioner):
 		"slot_details": slot_details
 	}
 
+@frappe.whitelist()
+def get_availability(practitioners, from_date, to_date):
+	"""
+	Get availability data of multiple practitioners over a date range in one call
+	:param practitioners: List (or JSON list) of practitioner names
+	:param from_date: First date to check in schedule
+	:param to_date: Last date to check in schedule
+	:return: dict of practitioner -> date -> dict containing slot details, or the reason
+		the practitioner is not available on that date
+	"""
+	if isinstance(practitioners, string_types):
+		practitioners = json.loads(practitioners)
+
+	from_date, to_date = getdate(from_date), getdate(to_date)
+	if from_date > to_date:
+		frappe.throw(_("From Date cannot be greater than To Date"))
+
+	practitioner_details = [get_practitioner_schedule_details(p) for p in practitioners]
+	employees = [d.employee for d in practitioner_details if d.employee]
+	holidays = get_employee_holidays(employees, from_date, to_date)
+	leaves = get_employee_leaves(employees, from_date, to_date)
+	appointments = get_booked_appointments(practitioner_details, from_date, to_date)
+
+	availability = {}
+	for details in practitioner_details:
+		practitioner_availability = availability.setdefault(details.practitioner, {})
+		for day in range(date_diff(to_date, from_date) + 1):
+			date = add_days(from_date, day)
+			message = None
+
+			if details.missing_schedule:
+				message = _("{0} does not have a Healthcare Practitioner Schedule. Add it in Healthcare Practitioner master").format(details.practitioner)
+			elif date in holidays.get(details.employee, []):
+				message = _("{0} is a company holiday").format(date)
+			elif (details.employee, date) in leaves:
+				if leaves[(details.employee, date)]:
+					message = _("{0} on Half day Leave on {1}").format(details.practitioner, date)
+				else:
+					message = _("{0} on Leave on {1}").format(details.practitioner, date)
+
+			slot_details = [] if message else get_slot_details(details, date, appointments)
+			if not message and not slot_details:
+				message = _("Healthcare Practitioner not available on {0}").format(date.strftime("%A"))
+
+			practitioner_availability[str(date)] = {"slot_details": slot_details, "message": message}
+
+	return availability
+
+def get_practitioner_schedule_details(practitioner):
+	"""Returns the practitioner's employee and schedules with their time slots.
+		Cached, as schedules change rarely but availability is checked on every date browsed."""
+	def get_details():
+		practitioner_obj = frappe.get_doc("Healthcare Practitioner", practitioner)
+		details = frappe._dict({
+			"practitioner": practitioner,
+			"employee": practitioner_obj.employee,
+			"schedules": [],
+			"missing_schedule": not practitioner_obj.practitioner_schedules
+		})
+
+		# Get practitioner employee relation
+		if not details.employee and practitioner_obj.user_id:
+			details.employee = frappe.db.get_value("Employee", {"user_id": practitioner_obj.user_id})
+
+		for schedule in practitioner_obj.practitioner_schedules:
+			if not schedule.schedule:
+				details.missing_schedule = True
+				break
+
+			details.schedules.append(frappe._dict({
+				"schedule": schedule.schedule,
+				"service_unit": schedule.service_unit,
+				"allow_overlap": frappe.db.get_value("Healthcare Service Unit", schedule.service_unit,
+					"overlap_appointments") if schedule.service_unit else 0,
+				"time_slots": frappe.get_all("Healthcare Schedule Time Slot",
+					filters={"parent": schedule.schedule, "parenttype": "Practitioner Schedule"},
+					fields=["name", "day", "from_time", "to_time"], order_by="idx")
+			}))
+
+		return details
+
+	return frappe.cache().hget("practitioner_schedule_details", practitioner, get_details)
+
+def clear_practitioner_schedule_cache(doc=None, method=None):
+	frappe.cache().delete_value("practitioner_schedule_details")
+
+def get_slot_details(practitioner_details, date, appointments):
+	weekday = date.strftime("%A")
+	slot_details = []
+
+	for schedule in practitioner_details.schedules:
+		available_slots = [t for t in schedule.time_slots if t.day == weekday]
+		if not available_slots:
+			continue
+
+		if schedule.service_unit:
+			slot_name  = schedule.schedule+" - "+schedule.service_unit
+			if schedule.allow_overlap:
+				# appointments to practitioner by service unit
+				booked = [d for d in appointments.by_service_unit.get((date, schedule.service_unit), [])
+					if d.practitioner == practitioner_details.practitioner]
+			else:
+				# all appointments to service unit
+				booked = appointments.by_service_unit.get((date, schedule.service_unit), [])
+		else:
+			slot_name = schedule.schedule
+			# appointments to practitioner without service unit
+			booked = [d for d in appointments.by_practitioner.get((date, practitioner_details.practitioner), [])
+				if not d.service_unit]
+
+		slot_details.append({"slot_name":slot_name, "service_unit":schedule.service_unit,
+			"avail_slot":available_slots, 'appointments': [get_appointment_details(d) for d in booked]})
+
+	return slot_details
+
+def get_appointment_details(appointment):
+	return frappe._dict({
+		"name": appointment.name,
+		"appointment_time": appointment.appointment_time,
+		"duration": appointment.duration,
+		"status": appointment.status
+	})
+
+def get_booked_appointments(practitioner_details, from_date, to_date):
+	"""Returns appointments which are not cancelled, grouped by date
+		and practitioner and by date and service unit"""
+	appointments = frappe._dict(by_practitioner={}, by_service_unit={})
+
+	practitioners = [d.practitioner for d in practitioner_details]
+	service_units = list(set(s.service_unit for d in practitioner_details
+		for s in d.schedules if s.service_unit))
+	if not practitioners:
+		return appointments
+
+	conditions = "practitioner in ({0})".format(", ".join(["%s"] * len(practitioners)))
+	if service_units:
+		conditions += " or service_unit in ({0})".format(", ".join(["%s"] * len(service_units)))
+
+	for d in frappe.db.sql("""
+		select
+			name, practitioner, service_unit, appointment_date, appointment_time, duration, status
+		from `tabPatient Appointment`
+		where
+			appointment_date between %s and %s and status != 'Cancelled'
+			and ({0})
+		order by appointment_date, appointment_time
+	""".format(conditions), tuple([from_date, to_date] + practitioners + service_units), as_dict=1):
+		appointments.by_practitioner.setdefault((d.appointment_date, d.practitioner), []).append(d)
+		if d.service_unit:
+			appointments.by_service_unit.setdefault((d.appointment_date, d.service_unit), []).append(d)
+
+	return appointments
+
+def get_employee_holidays(employees, from_date, to_date):
+	holidays = {}
+	for employee in employees:
+		holiday_list = get_holiday_list_for_employee(employee)
+		if holiday_list:
+			holidays[employee] = set(getdate(d) for d in frappe.db.sql_list("""
+				select holiday_date from `tabHoliday`
+				where parent=%s and holiday_date between %s and %s
+			""", (holiday_list, from_date, to_date)))
+
+	return holidays
+
+def get_employee_leaves(employees, from_date, to_date):
+	leaves = {}
+	if not employees:
+		return leaves
+
+	for d in frappe.db.sql("""
+		select employee, from_date, to_date, half_day
+		from `tabLeave Application`
+		where employee in ({0}) and docstatus = 1
+			and from_date <= %s and to_date >= %s
+	""".format(", ".join(["%s"] * len(employees))), tuple(employees + [to_date, from_date]), as_dict=1):
+		for day in range(date_diff(d.to_date, d.from_date) + 1):
+			leaves.setdefault((d.employee, add_days(d.from_date, day)), d.half_day)
+
+	return leaves
 
 @frappe.whitelist()
 def update_status(appointment_id, status):
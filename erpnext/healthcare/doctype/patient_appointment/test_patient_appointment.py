@@ -2,9 +2,139 @@
 # Copyright (c) 2015, ESS LLP and Contributors
 # See license.txt
 from __future__ import unicode_literals
+
+import frappe
 import unittest
+from frappe.utils import nowdate, add_days, getdate
+from erpnext.hr.doctype.employee.test_employee import make_employee
+from erpnext.healthcare.doctype.patient_appointment.patient_appointment import (get_availability,
+	get_availability_data, clear_practitioner_schedule_cache)
+
+test_dependencies = ["Company"]
 
 # test_records = frappe.get_test_records('Patient Appointment')
 
 class TestPatientAppointment(unittest.TestCase):
-	pass
+	def setUp(self):
+		# a Monday to Wednesday in the next week
+		today = getdate(nowdate())
+		self.monday = add_days(today, 7 - today.weekday())
+		self.tuesday, self.wednesday = add_days(self.monday, 1), add_days(self.monday, 2)
+
+		self.patient = get_patient()
+		self.practitioner = get_practitioner("_Test Availability Practitioner",
+			["Monday", "Tuesday", "Wednesday"], holiday=self.tuesday)
+		self.other_practitioner = get_practitioner("_Test Availability Other Practitioner", ["Monday"])
+
+		frappe.db.sql("""delete from `tabPatient Appointment` where practitioner in (%s, %s)""",
+			(self.practitioner, self.other_practitioner))
+		clear_practitioner_schedule_cache()
+
+	def test_availability_over_days_and_practitioners(self):
+		appointment = create_appointment(self.patient, self.practitioner, self.monday, "09:00:00")
+		cancelled = create_appointment(self.patient, self.practitioner, self.monday, "10:00:00")
+		frappe.db.set_value("Patient Appointment", cancelled.name, "status", "Cancelled")
+
+		availability = get_availability([self.practitioner, self.other_practitioner],
+			self.monday, self.wednesday)
+
+		self.assertEqual(sorted(availability), sorted([self.practitioner, self.other_practitioner]))
+		for practitioner in availability:
+			self.assertEqual(sorted(availability[practitioner]),
+				[str(self.monday), str(self.tuesday), str(self.wednesday)])
+
+		# booked appointments are listed with the slots of their day, cancelled ones are left out
+		monday = availability[self.practitioner][str(self.monday)]
+		self.assertFalse(monday["message"])
+		self.assertEqual([d.day for d in monday["slot_details"][0]["avail_slot"]], ["Monday"])
+		self.assertEqual([d.name for d in monday["slot_details"][0]["appointments"]], [appointment.name])
+
+		wednesday = availability[self.practitioner][str(self.wednesday)]
+		self.assertFalse(wednesday["message"])
+		self.assertEqual([d.day for d in wednesday["slot_details"][0]["avail_slot"]], ["Wednesday"])
+		self.assertEqual(wednesday["slot_details"][0]["appointments"], [])
+
+		# holiday of the practitioner's employee
+		tuesday = availability[self.practitioner][str(self.tuesday)]
+		self.assertEqual(tuesday["slot_details"], [])
+		self.assertTrue(tuesday["message"])
+
+		# no slots of the other practitioner on the day
+		other_monday = availability[self.other_practitioner][str(self.monday)]
+		self.assertFalse(other_monday["message"])
+		self.assertEqual(other_monday["slot_details"][0]["appointments"], [])
+		for date in (self.tuesday, self.wednesday):
+			self.assertEqual(availability[self.other_practitioner][str(date)]["slot_details"], [])
+			self.assertTrue(availability[self.other_practitioner][str(date)]["message"])
+
+	def test_availability_of_a_day(self):
+		create_appointment(self.patient, self.practitioner, self.monday, "09:00:00")
+
+		for practitioner in (self.practitioner, self.other_practitioner):
+			availability = get_availability([practitioner], self.monday, self.monday)
+			self.assertEqual(availability[practitioner][str(self.monday)]["slot_details"],
+				get_availability_data(self.monday, practitioner)["slot_details"])
+
+		self.assertRaises(frappe.ValidationError, get_availability_data, self.tuesday, self.practitioner)
+		self.assertRaises(frappe.ValidationError, get_availability_data, self.tuesday, self.other_practitioner)
+
+def get_patient():
+	patient = frappe.db.get_value("Patient", {"patient_name": "_Test Patient"})
+	if not patient:
+		patient = frappe.new_doc("Patient")
+		patient.patient_name = "_Test Patient"
+		patient.sex = "Male"
+		patient.save(ignore_permissions=True)
+		patient = patient.name
+
+	return patient
+
+def get_practitioner(first_name, days, holiday=None):
+	"""Returns a practitioner with a schedule from 9 to 12 on the given days
+		and, if a holiday is given, an employee with that holiday"""
+	if not frappe.db.exists("Practitioner Schedule", first_name):
+		schedule = frappe.new_doc("Practitioner Schedule")
+		schedule.schedule_name = first_name
+		for day in days:
+			schedule.append("time_slots", {"day": day, "from_time": "09:00:00", "to_time": "12:00:00"})
+		schedule.save(ignore_permissions=True)
+
+	practitioner = frappe.db.get_value("Healthcare Practitioner", {"first_name": first_name})
+	if practitioner:
+		practitioner = frappe.get_doc("Healthcare Practitioner", practitioner)
+	else:
+		practitioner = frappe.new_doc("Healthcare Practitioner")
+		practitioner.first_name = first_name
+		practitioner.append("practitioner_schedules", {"schedule": first_name})
+
+	if holiday:
+		practitioner.employee = make_employee("test_availability_practitioner@example.com")
+		frappe.db.set_value("Employee", practitioner.employee, "holiday_list",
+			get_holiday_list(first_name, holiday))
+
+	practitioner.save(ignore_permissions=True)
+	return practitioner.name
+
+def get_holiday_list(name, holiday):
+	name = "{0} {1}".format(name, holiday)
+	if not frappe.db.exists("Holiday List", name):
+		frappe.get_doc({
+			"doctype": "Holiday List",
+			"holiday_list_name": name,
+			"from_date": add_days(holiday, -30),
+			"to_date": add_days(holiday, 30),
+			"holidays": [{"holiday_date": holiday, "description": "_Test Holiday"}]
+		}).insert()
+
+	return name
+
+def create_appointment(patient, practitioner, appointment_date, appointment_time):
+	appointment = frappe.new_doc("Patient Appointment")
+	appointment.patient = patient
+	appointment.practitioner = practitioner
+	appointment.appointment_date = appointment_date
+	appointment.appointment_time = appointment_time
+	appointment.company = "_Test Company"
+	appointment.duration = 15
+	appointment.save(ignore_permissions=True)
+	return appointment
@@ -4,7 +4,14 @@
 
 from __future__ import unicode_literals
 from frappe.model.document import Document
+from erpnext.healthcare.doctype.patient_appointment.patient_appointment import clear_practitioner_schedule_cache
 
 class PractitionerSchedule(Document):
 	def autoname(self):
 		self.name = self.schedule_name
+
+	def on_update(self):
+		clear_practitioner_schedule_cache()
+
+	def on_trash(self):
+		clear_practitioner_schedule_cache()
@@ -227,6 +227,9 @@ doc_events = {
 		"on_submit": "erpnext.stock.doctype.material_request.material_request.update_completed_and_requested_qty",
 		"on_cancel": "erpnext.stock.doctype.material_request.material_request.update_completed_and_requested_qty"
 	},
+	"Employee": {
+		"on_update": "erpnext.healthcare.doctype.patient_appointment.patient_appointment.clear_practitioner_schedule_cache"
+	},
 	"User": {
 		"after_insert": "frappe.contacts.doctype.contact.contact.update_contact",
 		"validate": "erpnext.hr.doctype.employee.employee.validate_employee_role",
@@ -240,10 +243,16 @@ doc_events = {
 		"validate": "erpnext.portal.doctype.products_settings.products_settings.home_page_is_products"
 	},
 	"Sales Invoice": {
-		"on_submit": ["erpnext.regional.create_transaction_log", "erpnext.regional.italy.utils.sales_invoice_on_submit"],
-		"on_cancel": "erpnext.regional.italy.utils.sales_invoice_on_cancel",
+		"on_submit": ["erpnext.regional.create_transaction_log", "erpnext.regional.italy.utils.sales_invoice_on_submit",
+			"erpnext.regional.doctype.gst_invoice_summary.gst_invoice_summary.update_gst_invoice_summary"],
+		"on_cancel": ["erpnext.regional.italy.utils.sales_invoice_on_cancel",
+			"erpnext.regional.doctype.gst_invoice_summary.gst_invoice_summary.delete_gst_invoice_summary"],
 		"on_trash": "erpnext.regional.check_deletion_permission"
 	},
+	"Purchase Invoice": {
+		"on_submit": "erpnext.regional.doctype.gst_invoice_summary.gst_invoice_summary.update_gst_invoice_summary",
+		"on_cancel": "erpnext.regional.doctype.gst_invoice_summary.gst_invoice_summary.delete_gst_invoice_summary"
+	},
 	"Payment Entry": {
 		"on_submit": ["erpnext.regional.create_transaction_log", "erpnext.accounts.doctype.payment_request.payment_request.make_status_as_paid"],
 		"on_trash": "erpnext.regional.check_deletion_permission"
@@ -263,6 +272,15 @@ doc_events = {
 	},
 	"Email Unsubscribe": {
 		"after_insert": "erpnext.crm.doctype.email_campaign.email_campaign.unsubscribe_recipient"
+	},
+	("Item", "Customer", "Supplier"): {
+		"on_update": "erpnext.utilities.doctype.search_token.search_token.update_search_tokens",
+		"on_trash": "erpnext.utilities.doctype.search_token.search_token.delete_search_tokens",
+		"after_rename": "erpnext.utilities.doctype.search_token.search_token.rename_search_tokens"
+	},
+	("Quotation", "Sales Order", "Delivery Note", "Sales Invoice", "Issue", "Project"): {
+		"on_update": "erpnext.selling.doctype.daily_transaction_summary.daily_transaction_summary.update_daily_transaction_summary",
+		"on_trash": "erpnext.selling.doctype.daily_transaction_summary.daily_transaction_summary.update_daily_transaction_summary"
 	}
 }
 
@@ -284,6 +302,8 @@ scheduler_events = {
 		"erpnext.projects.doctype.project.project.collect_project_status",
 		"erpnext.hr.doctype.shift_type.shift_type.process_auto_attendance_for_all_shifts",
 		"erpnext.support.doctype.issue.issue.set_service_level_agreement_variance",
+		"erpnext.erpnext_integrations.doctype.shopify_log.shopify_log.process_queued_requests",
+		"erpnext.erpnext_integrations.connectors.woocommerce_connection.process_queued_orders",
 	],
 	"daily": [
 		"erpnext.stock.reorder_item.reorder_item",
@@ -312,7 +332,8 @@ scheduler_events = {
 		"erpnext.setup.doctype.email_digest.email_digest.send",
 		"erpnext.manufacturing.doctype.bom_update_tool.bom_update_tool.update_latest_price_in_all_boms",
 		"erpnext.hr.doctype.leave_ledger_entry.leave_ledger_entry.process_expired_allocation",
-		"erpnext.hr.utils.generate_leave_encashment"
+		"erpnext.hr.utils.generate_leave_encashment",
+		"erpnext.stock.doctype.stock_ageing_snapshot.stock_ageing_snapshot.update_stock_ageing_snapshots"
 	],
 	"monthly_long": [
 		"erpnext.accounts.deferred_revenue.convert_deferred_revenue_to_income",
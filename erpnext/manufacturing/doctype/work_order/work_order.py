@@ -14,9 +14,9 @@ from erpnext.stock.doctype.item.item import validate_end_of_life
 from erpnext.manufacturing.doctype.workstation.workstation import WorkstationHolidayError
 from erpnext.projects.doctype.timesheet.timesheet import OverlapError
 from erpnext.manufacturing.doctype.manufacturing_settings.manufacturing_settings import get_mins_between_operations
-from erpnext.stock.stock_balance import get_planned_qty, update_bin_qty
+from erpnext.stock.doctype.projected_qty_ledger_entry.projected_qty_ledger_entry import update_projected_qty_ledger
 from frappe.utils.csvutils import getlink
-from erpnext.stock.utils import get_bin, validate_warehouse_company, get_latest_stock_qty
+from erpnext.stock.utils import validate_warehouse_company, get_latest_stock_qty
 from erpnext.utilities.transaction_base import validate_uom_is_integer
 from frappe.model.mapper import get_mapped_doc
 
@@ -277,9 +277,7 @@ class WorkOrder(Document):
 			frappe.throw(_("Cannot cancel because submitted Stock Entry {0} exists").format(stock_entry[0][0]))
 
 	def update_planned_qty(self):
-		update_bin_qty(self.production_item, self.fg_warehouse, {
-			"planned_qty": get_planned_qty(self.production_item, self.fg_warehouse)
-		})
+		update_projected_qty_ledger(self.doctype, self.name, ["planned_qty"])
 
 		if self.material_request:
 			mr_obj = frappe.get_doc("Material Request", self.material_request)
@@ -441,10 +439,7 @@ class WorkOrder(Document):
 
 	def update_reserved_qty_for_production(self, items=None):
 		'''update reserved_qty_for_production in bins'''
-		for d in self.required_items:
-			if d.source_warehouse:
-				stock_bin = get_bin(d.item_code, d.source_warehouse)
-				stock_bin.update_reserved_qty_for_production()
+		update_projected_qty_ledger(self.doctype, self.name, ["reserved_qty_for_production"])
 
 	def get_items_and_operations_from_bom(self):
 		self.set_required_items()
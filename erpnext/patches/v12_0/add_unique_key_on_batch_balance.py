@@ -0,0 +1,11 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.stock.doctype.batch_balance.batch_balance import rebuild_batch_balance
+
+
+def execute():
+	frappe.reload_doc("stock", "doctype", "batch_balance")
+
+	# merge the rows added twice for a batch and warehouse before the key is added
+	rebuild_batch_balance()
+	frappe.db.add_unique("Batch Balance", ["batch_no", "warehouse"])
@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.stock.doctype.batch_balance.batch_balance import rebuild_batch_balance
+
+
+def execute():
+	frappe.reload_doc("stock", "doctype", "batch_balance")
+	rebuild_batch_balance()
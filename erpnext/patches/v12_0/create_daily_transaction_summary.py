@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.selling.doctype.daily_transaction_summary.daily_transaction_summary import rebuild_daily_transaction_summary
+
+
+def execute():
+	frappe.reload_doc("selling", "doctype", "daily_transaction_summary")
+	rebuild_daily_transaction_summary()
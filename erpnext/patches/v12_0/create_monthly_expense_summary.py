@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.accounts.doctype.monthly_expense_summary.monthly_expense_summary import rebuild_monthly_expense_summary
+
+
+def execute():
+	frappe.reload_doc("accounts", "doctype", "monthly_expense_summary")
+	rebuild_monthly_expense_summary()
@@ -0,0 +1,33 @@
+from __future__ import unicode_literals
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_field
+from erpnext.accounts.doctype.monthly_gl_summary.monthly_gl_summary import rebuild_monthly_gl_summary
+
+
+def execute():
+	frappe.reload_doc("accounts", "doctype", "monthly_gl_summary")
+
+	accounting_dimensions = frappe.db.sql("""select fieldname, label, document_type from
+		`tabAccounting Dimension`""", as_dict=1)
+
+	count = 1
+	for d in accounting_dimensions:
+		if count % 2 == 0:
+			insert_after_field = 'dimension_col_break'
+		else:
+			insert_after_field = 'accounting_dimensions_section'
+
+		if not frappe.db.get_value("Custom Field", {"dt": "Monthly GL Summary", "fieldname": d.fieldname}):
+			create_custom_field("Monthly GL Summary", {
+				"fieldname": d.fieldname,
+				"label": d.label,
+				"fieldtype": "Link",
+				"options": d.document_type,
+				"insert_after": insert_after_field
+			})
+
+		count += 1
+
+	frappe.clear_cache(doctype="Monthly GL Summary")
+
+	rebuild_monthly_gl_summary()
@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.selling.doctype.monthly_sales_summary.monthly_sales_summary import rebuild_monthly_sales_summary
+
+
+def execute():
+	frappe.reload_doc("selling", "doctype", "monthly_sales_summary")
+	rebuild_monthly_sales_summary()
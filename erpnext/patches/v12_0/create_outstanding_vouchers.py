@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.accounts.doctype.outstanding_voucher.outstanding_voucher import rebuild_outstanding_vouchers
+
+
+def execute():
+	frappe.reload_doc("accounts", "doctype", "outstanding_voucher")
+	rebuild_outstanding_vouchers()
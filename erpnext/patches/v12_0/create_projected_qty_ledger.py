@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.stock.doctype.projected_qty_ledger_entry.projected_qty_ledger_entry import rebuild_projected_qty_ledger
+
+
+def execute():
+	frappe.reload_doc("stock", "doctype", "projected_qty_ledger_entry")
+	rebuild_projected_qty_ledger()
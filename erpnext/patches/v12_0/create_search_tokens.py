@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.utilities.doctype.search_token.search_token import rebuild_search_tokens
+
+
+def execute():
+	frappe.reload_doc("utilities", "doctype", "search_token")
+	rebuild_search_tokens()
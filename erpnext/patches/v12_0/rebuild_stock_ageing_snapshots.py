@@ -0,0 +1,9 @@
+from __future__ import unicode_literals
+import frappe
+
+
+def execute():
+	frappe.reload_doc("stock", "doctype", "stock_ageing_snapshot")
+
+	# the snapshots made before did not keep the transferred batches, the next daily run makes them again
+	frappe.db.sql("delete from `tabStock Ageing Snapshot`")
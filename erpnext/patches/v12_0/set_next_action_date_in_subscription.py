@@ -0,0 +1,12 @@
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import nowdate
+
+
+def execute():
+	frappe.reload_doc("accounts", "doctype", "subscription_invoice")
+	frappe.reload_doc("accounts", "doctype", "subscription")
+
+	# processed once by the next run of the scheduler, which sets the actual date
+	frappe.db.sql("""update `tabSubscription` set next_action_date = %s
+		where status != 'Cancelled'""", nowdate())
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe, json
+from frappe.utils import flt, cstr, now
+from frappe.utils.xlsxutils import handle_html
+from frappe.model.document import Document
+from six import iteritems
+from erpnext import get_region
+from erpnext.regional.india.utils import get_gst_accounts
+
+class GSTInvoiceSummary(Document):
+	pass
+
+tax_doctypes = {
+	"Sales Invoice": "Sales Taxes and Charges",
+	"Purchase Invoice": "Purchase Taxes and Charges"
+}
+
+summary_fields = ("company", "invoice_doctype", "invoice", "posting_date", "item_code",
+	"rate", "taxable_value", "is_rate_applicable", "cess_amount", "is_igst")
+
+item_tax_summary_fields = ("company", "invoice_doctype", "invoice", "posting_date", "item_code",
+	"description", "tax_rate", "tax_amount")
+
+def update_gst_invoice_summary(doc, method=None):
+	'''Write the rate wise taxable value of a submitted invoice, used by the GST returns,
+		and its item wise tax amounts, used by the HSN summary and the itemised registers'''
+	if doc.doctype not in tax_doctypes or get_region(doc.company) != "India":
+		return
+
+	delete_gst_invoice_summary(doc)
+	insert_summary("GST Item Tax Summary", item_tax_summary_fields,
+		build_gst_item_tax_summary(doc.doctype, [doc.name]))
+
+	if not frappe.db.exists("GST Account", {"parent": "GST Settings", "company": doc.company}):
+		return
+
+	insert_summary("GST Invoice Summary", summary_fields,
+		build_gst_invoice_summary(doc.doctype, [doc.name], get_gst_accounts(doc.company)))
+
+def delete_gst_invoice_summary(doc, method=None):
+	if doc.doctype not in tax_doctypes:
+		return
+
+	for summary_doctype in ("GST Invoice Summary", "GST Item Tax Summary"):
+		frappe.db.sql("""delete from `tab{0}`
+			where invoice_doctype=%s and invoice=%s""".format(summary_doctype), (doc.doctype, doc.name))
+
+def get_invoice_details(doctype, invoices):
+	invoice_details = frappe._dict()
+	for d in frappe.db.sql("""
+		select name, company, posting_date, export_type, base_net_total
+		from `tab{0}`
+		where name in ({1})
+	""".format(doctype, ', '.join(['%s']*len(invoices))), tuple(invoices), as_dict=1):
+		invoice_details[d.name] = d
+
+	return invoice_details
+
+def build_gst_invoice_summary(doctype, invoices, gst_accounts):
+	'''Returns the item and rate wise taxable values of the given invoices'''
+	if not invoices:
+		return []
+
+	invoice_details = get_invoice_details(doctype, invoices)
+	invoice_items, item_tax_rate = get_invoice_items(doctype, invoices)
+	items_based_on_tax_rate = frappe._dict()
+	invoice_cess = frappe._dict()
+	igst_invoices = set()
+
+	tax_details = frappe.db.sql("""
+		select
+			parent, account_head, item_wise_tax_detail, base_tax_amount_after_discount_amount
+		from `tab%s`
+		where
+			parenttype = %s and docstatus = 1
+			and parent in (%s)
+		order by account_head
+	""" % (tax_doctypes[doctype], '%s', ', '.join(['%s']*len(invoices))),
+		tuple([doctype] + list(invoices)))
+
+	for parent, account, item_wise_tax_detail, tax_amount in tax_details:
+		if account in gst_accounts.igst_account:
+			igst_invoices.add(parent)
+
+		if account in gst_accounts.cess_account:
+			invoice_cess.setdefault(parent, tax_amount)
+		elif item_wise_tax_detail:
+			try:
+				item_wise_tax_detail = json.loads(item_wise_tax_detail)
+			except ValueError:
+				continue
+
+			cgst_or_sgst = False
+			if account in gst_accounts.cgst_account \
+				or account in gst_accounts.sgst_account:
+				cgst_or_sgst = True
+
+			if not (cgst_or_sgst or account in gst_accounts.igst_account):
+				continue
+
+			for item_code, tax_amounts in item_wise_tax_detail.items():
+				# the item tax rate is set per account, so CGST and SGST
+				# carry half of the GST rate under which the item is reported
+				account_rate = tax_amounts[0]
+				tax_rate = account_rate * 2 if cgst_or_sgst else account_rate
+
+				items_based_on_tax_rate.setdefault(parent, {})\
+					.setdefault(tax_rate, {}).setdefault(item_code, set()).add(account_rate)
+
+	# Build itemised tax for export invoices where tax table is blank
+	for invoice, items in iteritems(invoice_items):
+		if invoice not in items_based_on_tax_rate \
+			and invoice_details.get(invoice, {}).get("export_type") == "Without Payment of Tax":
+				items_based_on_tax_rate.setdefault(invoice, {})[0] = {item_code: {0} for item_code in items}
+
+	summary = []
+	for invoice, rate_wise_items in iteritems(items_based_on_tax_rate):
+		details = invoice_details.get(invoice)
+		for rate, items in iteritems(rate_wise_items):
+			for item_code, account_rates in iteritems(items):
+				if item_code not in invoice_items.get(invoice, {}):
+					continue
+
+				if item_tax_rate.get(invoice):
+					is_rate_applicable = any(r in item_tax_rate[invoice].get(item_code, []) for r in account_rates)
+				else:
+					is_rate_applicable = True
+
+				summary.append(frappe._dict({
+					"company": details.company,
+					"invoice_doctype": doctype,
+					"invoice": invoice,
+					"posting_date": details.posting_date,
+					"item_code": item_code,
+					"rate": rate,
+					"taxable_value": abs(invoice_items[invoice][item_code]),
+					"is_rate_applicable": 1 if is_rate_applicable else 0,
+					"cess_amount": flt(invoice_cess.get(invoice)),
+					"is_igst": 1 if invoice in igst_invoices else 0
+				}))
+
+	return summary
+
+def build_gst_item_tax_summary(doctype, invoices):
+	'''Returns the tax amount of every item code of the given invoices, by tax description.
+		Actual charges without item wise details are shared by the items in proportion to their net amount'''
+	if not invoices:
+		return []
+
+	invoice_details = get_invoice_details(doctype, invoices)
+	invoice_items = get_invoice_items(doctype, invoices)[0]
+
+	conditions, add_deduct_tax = "", "'Add'"
+	if doctype == "Purchase Invoice":
+		conditions = " and category in ('Total', 'Valuation and Total') and base_tax_amount_after_discount_amount != 0"
+		add_deduct_tax = "add_deduct_tax"
+
+	tax_details = frappe.db.sql("""
+		select
+			parent, description, item_wise_tax_detail, charge_type,
+			base_tax_amount_after_discount_amount, {add_deduct_tax} as add_deduct_tax
+		from `tab{tax_doctype}`
+		where
+			parenttype = %s and docstatus = 1
+			and (description is not null and description != '')
+			and parent in ({invoices})
+			{conditions}
+		order by idx
+	""".format(add_deduct_tax=add_deduct_tax, tax_doctype=tax_doctypes[doctype], conditions=conditions,
+		invoices=', '.join(['%s']*len(invoices))), tuple([doctype] + list(invoices)), as_dict=1)
+
+	summary = []
+	for d in tax_details:
+		item_wise_tax = {}
+		if d.item_wise_tax_detail:
+			try:
+				item_wise_tax_detail = json.loads(d.item_wise_tax_detail)
+			except ValueError:
+				continue
+
+			for item_code, tax_data in iteritems(item_wise_tax_detail):
+				if isinstance(tax_data, list):
+					tax_rate, tax_amount = tax_data
+				else:
+					tax_rate, tax_amount = tax_data, 0
+
+				if d.charge_type == "Actual" and not tax_rate:
+					tax_rate = "NA"
+
+				item_wise_tax[item_code] = (tax_rate, tax_amount)
+
+		elif d.charge_type == "Actual" and d.base_tax_amount_after_discount_amount:
+			base_net_total = invoice_details[d.parent].base_net_total
+			for item_code, net_amount in iteritems(invoice_items.get(d.parent, {})):
+				item_wise_tax[item_code] = ("NA", flt(d.base_tax_amount_after_discount_amount * net_amount
+					/ base_net_total) if base_net_total else 0)
+
+		details = invoice_details.get(d.parent)
+		for item_code, (tax_rate, tax_amount) in iteritems(item_wise_tax):
+			if not flt(tax_amount):
+				continue
+
+			summary.append(frappe._dict({
+				"company": details.company,
+				"invoice_doctype": doctype,
+				"invoice": d.parent,
+				"posting_date": details.posting_date,
+				"item_code": item_code,
+				"description": handle_html(d.description),
+				"tax_rate": cstr(tax_rate),
+				"tax_amount": -flt(tax_amount) if d.add_deduct_tax == "Deduct" else flt(tax_amount)
+			}))
+
+	return summary
+
+def get_itemised_tax(item_list, doctype, tax_amount_precision):
+	'''Returns the tax amounts of the invoice item rows by tax description, and the tax descriptions.
+		Invoices submitted before the summary was maintained are computed from their tax rows'''
+	item_row_map = {}
+	for d in item_list:
+		item_row_map.setdefault(d.parent, {}).setdefault(d.item_code or d.item_name, []).append(d)
+
+	invoices = list(item_row_map)
+	if not invoices:
+		return {}, []
+
+	summary = frappe.db.sql("""
+		select invoice, item_code, description, tax_rate, tax_amount
+		from `tabGST Item Tax Summary`
+		where invoice_doctype = %s and invoice in ({0})
+	""".format(', '.join(['%s']*len(invoices))), tuple([doctype] + invoices), as_dict=1)
+
+	missing_invoices = set(invoices) - set(d.invoice for d in summary)
+	if missing_invoices:
+		summary += build_gst_item_tax_summary(doctype, list(missing_invoices))
+
+	itemised_tax = {}
+	tax_columns = []
+	for d in summary:
+		if d.description not in tax_columns:
+			tax_columns.append(d.description)
+
+		rows = item_row_map.get(d.invoice, {}).get(d.item_code, [])
+		item_net_amount = sum([flt(row.base_net_amount) for row in rows])
+
+		for row in rows:
+			item_tax_amount = flt((flt(d.tax_amount) * row.base_net_amount) / item_net_amount) \
+				if item_net_amount else 0
+			if item_tax_amount:
+				itemised_tax.setdefault(row.name, {})[d.description] = frappe._dict({
+					"tax_rate": d.tax_rate if d.tax_rate == "NA" else flt(d.tax_rate),
+					"tax_amount": flt(item_tax_amount, tax_amount_precision)
+				})
+
+	tax_columns.sort()
+	return itemised_tax, tax_columns
+
+def get_unidentified_gst_accounts(doctype, gst_accounts, conditions="", values=None):
+	'''Returns the tax accounts of the invoices which look like GST accounts but are not set in GST Settings'''
+	accounts = [account for accounts in gst_accounts.values() for account in accounts if account]
+
+	return frappe.db.sql_list("""
+		select distinct account_head
+		from `tab{tax_doctype}`
+		where parenttype = %(doctype)s and docstatus = 1
+			and account_head like %(account_pattern)s and account_head not in %(gst_accounts)s
+			and parent in (select name from `tab{doctype}` where docstatus = 1 {conditions})
+	""".format(tax_doctype=tax_doctypes[doctype], doctype=doctype, conditions=conditions),
+		dict(values or {}, doctype=doctype, account_pattern="%gst%", gst_accounts=accounts or [""]))
+
+def get_invoice_items(doctype, invoices):
+	invoice_items = frappe._dict()
+	item_tax_rate = frappe._dict()
+
+	items = frappe.db.sql("""
+		select item_code, parent, base_net_amount, item_tax_rate
+		from `tab%s Item`
+		where parent in (%s)
+	""" % (doctype, ', '.join(['%s']*len(invoices))), tuple(invoices), as_dict=1)
+
+	for d in items:
+		parent_items = invoice_items.setdefault(d.parent, {})
+		if d.item_code in parent_items:
+			parent_items[d.item_code] += d.base_net_amount
+			continue
+
+		parent_items[d.item_code] = d.base_net_amount
+		if d.item_tax_rate:
+			for account, rate in json.loads(d.item_tax_rate).items():
+				item_tax_rate.setdefault(d.parent, {}).setdefault(d.item_code, []).append(rate)
+
+	return invoice_items, item_tax_rate
+
+def insert_summary(summary_doctype, fields, summary):
+	if not summary:
+		return
+
+	timestamp, user = now(), frappe.session.user
+	values = []
+	for d in summary:
+		values.append([frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0]
+			+ [d.get(fieldname) for fieldname in fields])
+
+	frappe.db.sql("""
+		insert into `tab{0}`
+			(name, creation, modified, modified_by, owner, docstatus, {1})
+		values {2}
+	""".format(summary_doctype, ", ".join(fields),
+		", ".join(["(" + ", ".join(["%s"] * (len(fields) + 6)) + ")"] * len(values))),
+		tuple(v for row in values for v in row))
+
+def rebuild_gst_invoice_summary(doctype, company, from_date=None, chunk_size=500, item_tax=True):
+	'''Backfill the summary for invoices submitted before it was maintained.
+	The item wise tax amounts do not depend on GST Settings, so they can be left as they are with `item_tax`
+
+	Can be run as `bench execute erpnext.regional.doctype.gst_invoice_summary.gst_invoice_summary.rebuild_gst_invoice_summary`'''
+	gst_accounts = get_gst_accounts(company)
+	conditions = " and posting_date >= %(from_date)s" if from_date else ""
+
+	invoices = frappe.db.sql_list("""
+		select name from `tab{0}`
+		where docstatus=1 and company=%(company)s {1}
+		order by posting_date
+	""".format(doctype, conditions), {"company": company, "from_date": from_date})
+
+	summary_doctypes = ["GST Invoice Summary"] + (["GST Item Tax Summary"] if item_tax else [])
+	for i in range(0, len(invoices), chunk_size):
+		chunk = invoices[i:i + chunk_size]
+		for summary_doctype in summary_doctypes:
+			frappe.db.sql("""delete from `tab{0}`
+				where invoice_doctype=%s and invoice in ({1})""".format(summary_doctype,
+					", ".join(["%s"] * len(chunk))), tuple([doctype] + chunk))
+
+		if gst_accounts:
+			insert_summary("GST Invoice Summary", summary_fields,
+				build_gst_invoice_summary(doctype, chunk, gst_accounts))
+		if item_tax:
+			insert_summary("GST Item Tax Summary", item_tax_summary_fields,
+				build_gst_item_tax_summary(doctype, chunk))
+		frappe.db.commit()
+
+def rebuild_gst_invoice_summary_for_companies(companies):
+	'''Rebuild the rate wise summary of the companies whose GST accounts were changed in GST Settings'''
+	for company in companies:
+		if not frappe.db.exists("GST Account", {"parent": "GST Settings", "company": company}):
+			frappe.db.sql("delete from `tabGST Invoice Summary` where company=%s", company)
+			frappe.db.commit()
+			continue
+
+		for doctype in tax_doctypes:
+			rebuild_gst_invoice_summary(doctype, company, item_tax=False)
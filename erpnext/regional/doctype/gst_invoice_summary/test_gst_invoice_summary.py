@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from erpnext.accounts.report.item_wise_sales_register.item_wise_sales_register import get_tax_accounts
+from erpnext.regional.doctype.gstr_3b_report.test_gstr_3b_report import (make_company,
+	set_account_heads, make_customers)
+from erpnext.regional.doctype.gst_invoice_summary.gst_invoice_summary import (get_itemised_tax,
+	rebuild_gst_invoice_summary_for_companies)
+from erpnext.regional.report.gstr_1.gstr_1 import execute as gstr_1
+
+test_dependencies = ["Territory", "Customer Group", "Supplier Group", "Item"]
+
+class TestGSTInvoiceSummary(unittest.TestCase):
+	def setUp(self):
+		frappe.set_user("Administrator")
+		make_company()
+		set_account_heads()
+		make_customers()
+
+	def test_summary_on_submit(self):
+		si = make_sales_invoice()
+
+		summary = frappe.get_all("GST Invoice Summary",
+			filters={"invoice_doctype": "Sales Invoice", "invoice": si.name},
+			fields=["item_code", "rate", "taxable_value", "is_igst"])
+		self.assertEqual([(d.item_code, d.rate, d.taxable_value, d.is_igst) for d in summary],
+			[("_Test Item", 18, si.base_net_total, 1)])
+
+		si.cancel()
+		self.assertFalse(frappe.db.exists("GST Invoice Summary", {"invoice": si.name}))
+		self.assertFalse(frappe.db.exists("GST Item Tax Summary", {"invoice": si.name}))
+
+	def test_gstr_1_from_summary(self):
+		si = make_sales_invoice()
+		filters = {
+			"company": "_Test Company GST",
+			"from_date": si.posting_date,
+			"to_date": si.posting_date,
+			"type_of_business": "B2B"
+		}
+
+		data = gstr_1(dict(filters))[1]
+		self.assertTrue([row for row in data if si.name in row])
+
+		# computed from the invoice and tax rows when the summary is missing
+		frappe.db.sql("delete from `tabGST Invoice Summary` where invoice=%s", si.name)
+		self.assertEqual(gstr_1(dict(filters))[1], data)
+
+		rebuild_gst_invoice_summary_for_companies(["_Test Company GST"])
+		self.assertTrue(frappe.db.exists("GST Invoice Summary", {"invoice": si.name}))
+		self.assertEqual(gstr_1(dict(filters))[1], data)
+
+	def test_itemised_tax_from_summary(self):
+		si = make_sales_invoice()
+		item_list = frappe.get_all("Sales Invoice Item", filters={"parent": si.name},
+			fields=["name", "parent", "item_code", "item_name", "base_net_amount"])
+
+		def get_item_row_tax(**kwargs):
+			itemised_tax, tax_columns = get_tax_accounts(item_list, [], "INR", **kwargs)
+			return {d.name: itemised_tax.get(d.name) for d in item_list}, tax_columns
+
+		item_row_tax = get_item_row_tax(get_itemised_tax=get_itemised_tax)
+		self.assertEqual(item_row_tax, get_item_row_tax())
+		self.assertEqual(item_row_tax[0][item_list[0].name]["IGST @ 18.0"].tax_amount, 18)
+
+		frappe.db.sql("delete from `tabGST Item Tax Summary` where invoice=%s", si.name)
+		self.assertEqual(get_item_row_tax(get_itemised_tax=get_itemised_tax), item_row_tax)
+
+def make_sales_invoice():
+	si = create_sales_invoice(company="_Test Company GST",
+		customer = '_Test GST Customer',
+		currency = 'INR',
+		warehouse = 'Finished Goods - _GST',
+		debit_to = 'Debtors - _GST',
+		income_account = 'Sales - _GST',
+		expense_account = 'Cost of Goods Sold - _GST',
+		cost_center = 'Main - _GST',
+		do_not_save=1
+	)
+
+	si.append("taxes", {
+		"charge_type": "On Net Total",
+		"account_head": "IGST - _GST",
+		"cost_center": "Main - _GST",
+		"description": "IGST @ 18.0",
+		"rate": 18
+	})
+
+	si.submit()
+	return si
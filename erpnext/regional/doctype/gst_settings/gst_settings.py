@@ -19,6 +19,28 @@ class GSTSettings(Document):
 			from tabAddress where country = "India" and ifnull(gstin, '')!='' ''')
 		self.set_onload('data', data)
 
+	def on_update(self):
+		self.rebuild_gst_invoice_summary()
+
+	def rebuild_gst_invoice_summary(self):
+		'''The rate wise GST Invoice Summary depends on the GST accounts,
+			so rebuild it for the companies whose accounts were changed'''
+		def get_company_accounts(doc):
+			company_accounts = {}
+			for d in (doc.get("gst_accounts") if doc else []):
+				company_accounts.setdefault(d.company, set()).add((d.cgst_account, d.sgst_account,
+					d.igst_account, d.cess_account))
+			return company_accounts
+
+		previous_accounts = get_company_accounts(self.get_doc_before_save())
+		accounts = get_company_accounts(self)
+
+		companies = [company for company in set(previous_accounts) | set(accounts)
+			if previous_accounts.get(company) != accounts.get(company)]
+		if companies:
+			frappe.enqueue("erpnext.regional.doctype.gst_invoice_summary.gst_invoice_summary.rebuild_gst_invoice_summary_for_companies",
+				queue="long", companies=companies, enqueue_after_commit=True, now=frappe.flags.in_test)
+
 @frappe.whitelist()
 def send_reminder():
 	frappe.has_permission('GST Settings', throw=True)
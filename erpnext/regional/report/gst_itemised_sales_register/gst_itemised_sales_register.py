@@ -4,6 +4,7 @@
 from __future__ import unicode_literals
 
 from erpnext.accounts.report.item_wise_sales_register.item_wise_sales_register import _execute
+from erpnext.regional.doctype.gst_invoice_summary.gst_invoice_summary import get_itemised_tax
 
 def execute(filters=None):
 	return _execute(filters, additional_table_columns=[
@@ -26,4 +27,4 @@ def execute(filters=None):
 		'export_type',
 		'ecommerce_gstin',
 		'gst_hsn_code'
-	])
+	], get_itemised_tax=get_itemised_tax)
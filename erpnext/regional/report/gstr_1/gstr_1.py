@@ -9,6 +9,8 @@ from datetime import date
 from six import iteritems
 from erpnext.regional.doctype.gstr_3b_report.gstr_3b_report import get_period
 from erpnext.regional.india.utils import get_gst_accounts
+from erpnext.regional.doctype.gst_invoice_summary.gst_invoice_summary import (build_gst_invoice_summary,
+	get_unidentified_gst_accounts)
 
 def execute(filters=None):
 	return Gstr1Report(filters).run()
@@ -46,8 +48,7 @@ class Gstr1Report(object):
 		self.get_invoice_data()
 
 		if self.invoices:
-			self.get_invoice_items()
-			self.get_items_based_on_tax_rate()
+			self.get_invoice_tax_summary()
 			self.invoice_fields = [d["fieldname"] for d in self.invoice_columns]
 			self.get_data()
 
@@ -57,10 +58,9 @@ class Gstr1Report(object):
 		if self.filters.get("type_of_business") ==  "B2C Small":
 			self.get_b2cs_data()
 		else:
-			for inv, items_based_on_rate in self.items_based_on_tax_rate.items():
-				invoice_details = self.invoices.get(inv)
-				for rate, items in items_based_on_rate.items():
-					row, taxable_value = self.get_row_data_for_invoice(inv, invoice_details, rate, items)
+			for inv, invoice_details in iteritems(self.invoices):
+				for rate, values in iteritems(self.invoice_tax_summary.get(inv, {})):
+					row, taxable_value = self.get_row_data_for_invoice(inv, invoice_details, rate, values.taxable_value)
 
 					if self.filters.get("type_of_business") ==  "CDNR":
 						row.append("Y" if invoice_details.posting_date <= date(2017, 7, 1) else "N")
@@ -72,9 +72,8 @@ class Gstr1Report(object):
 	def get_b2cs_data(self):
 		b2cs_output = {}
 
-		for inv, items_based_on_rate in self.items_based_on_tax_rate.items():
-			invoice_details = self.invoices.get(inv)
-			for rate, items in items_based_on_rate.items():
+		for inv, invoice_details in iteritems(self.invoices):
+			for rate, values in iteritems(self.invoice_tax_summary.get(inv, {})):
 				place_of_supply = invoice_details.get("place_of_supply")
 				ecommerce_gstin =  invoice_details.get("ecommerce_gstin")
 
@@ -91,15 +90,14 @@ class Gstr1Report(object):
 				row["place_of_supply"] = place_of_supply
 				row["ecommerce_gstin"] = ecommerce_gstin
 				row["rate"] = rate
-				row["taxable_value"] += sum([abs(net_amount)
-					for item_code, net_amount in self.invoice_items.get(inv).items() if item_code in items])
+				row["taxable_value"] += values.gross_taxable_value
 				row["cess_amount"] += flt(self.invoice_cess.get(inv), 2)
 				row["type"] = "E" if ecommerce_gstin else "OE"
 
 		for key, value in iteritems(b2cs_output):
 			self.data.append(value)
 
-	def get_row_data_for_invoice(self, invoice, invoice_details, tax_rate, items):
+	def get_row_data_for_invoice(self, invoice, invoice_details, tax_rate, taxable_value):
 		row = []
 		for fieldname in self.invoice_fields:
 			if self.filters.get("type_of_business") ==  "CDNR" and fieldname == "invoice_value":
@@ -113,13 +111,6 @@ class Gstr1Report(object):
 				row.append(export_type)
 			else:
 				row.append(invoice_details.get(fieldname))
-		taxable_value = 0
-		for item_code, net_amount in self.invoice_items.get(invoice).items():
-				if item_code in items:
-					if self.item_tax_rate.get(invoice) and tax_rate in self.item_tax_rate.get(invoice, {}).get(item_code, []):
-						taxable_value += abs(net_amount)
-					elif not self.item_tax_rate.get(invoice):
-						taxable_value += abs(net_amount)
 
 		row += [tax_rate or 0, taxable_value]
 
@@ -179,83 +170,61 @@ class Gstr1Report(object):
 			conditions += """ and is_return !=1 and gst_category = 'Overseas' """
 		return conditions
 
-	def get_invoice_items(self):
-		self.invoice_items = frappe._dict()
-		self.item_tax_rate = frappe._dict()
-
-		items = frappe.db.sql("""
-			select item_code, parent, base_net_amount, item_tax_rate
-			from `tab%s Item`
-			where parent in (%s)
-		""" % (self.doctype, ', '.join(['%s']*len(self.invoices))), tuple(self.invoices), as_dict=1)
-
-		for d in items:
-			if d.item_code not in self.invoice_items.get(d.parent, {}):
-				self.invoice_items.setdefault(d.parent, {}).setdefault(d.item_code,
-					sum(i.get('base_net_amount', 0) for i in items
-					    if i.item_code == d.item_code and i.parent == d.parent))
-
-				item_tax_rate = {}
-
-				if d.item_tax_rate:
-					item_tax_rate = json.loads(d.item_tax_rate)
-
-					for account, rate in item_tax_rate.items():
-						tax_rate_dict = self.item_tax_rate.setdefault(d.parent, {}).setdefault(d.item_code, [])
-						tax_rate_dict.append(rate)
+	def get_invoice_tax_summary(self):
+		"""Rate wise taxable values of the invoices, aggregated from the GST Invoice Summary
+			written on submit. Invoices submitted before the summary was maintained are
+			computed from their item and tax rows."""
+		self.invoice_tax_summary = {}
+		self.invoice_cess = frappe._dict()
+		self.igst_invoices = []
 
-	def get_items_based_on_tax_rate(self):
-		self.tax_details = frappe.db.sql("""
+		summary = frappe.db.sql("""
 			select
-				parent, account_head, item_wise_tax_detail, base_tax_amount_after_discount_amount
-			from `tab%s`
-			where
-				parenttype = %s and docstatus = 1
-				and parent in (%s)
-			order by account_head
-		""" % (self.tax_doctype, '%s', ', '.join(['%s']*len(self.invoices.keys()))),
-			tuple([self.doctype] + list(self.invoices.keys())))
-
-		self.items_based_on_tax_rate = {}
-		self.invoice_cess = frappe._dict()
-		unidentified_gst_accounts = []
-		for parent, account, item_wise_tax_detail, tax_amount in self.tax_details:
-			if account in self.gst_accounts.cess_account:
-				self.invoice_cess.setdefault(parent, tax_amount)
-			else:
-				if item_wise_tax_detail:
-					try:
-						item_wise_tax_detail = json.loads(item_wise_tax_detail)
-						cgst_or_sgst = False
-						if account in self.gst_accounts.cgst_account \
-							or account in self.gst_accounts.sgst_account:
-							cgst_or_sgst = True
-
-						if not (cgst_or_sgst or account in self.gst_accounts.igst_account):
-							if "gst" in account.lower() and account not in unidentified_gst_accounts:
-								unidentified_gst_accounts.append(account)
-							continue
-
-						for item_code, tax_amounts in item_wise_tax_detail.items():
-							tax_rate = tax_amounts[0]
-							if cgst_or_sgst:
-								tax_rate *= 2
-
-							rate_based_dict = self.items_based_on_tax_rate\
-								.setdefault(parent, {}).setdefault(tax_rate, [])
-							if item_code not in rate_based_dict:
-								rate_based_dict.append(item_code)
-					except ValueError:
-						continue
+				invoice, rate,
+				sum(if(is_rate_applicable = 1, taxable_value, 0)) as taxable_value,
+				sum(taxable_value) as gross_taxable_value,
+				max(cess_amount) as cess_amount, max(is_igst) as is_igst
+			from `tabGST Invoice Summary`
+			where invoice_doctype = %(doctype)s
+				and invoice in (select name from `tab{doctype}` where docstatus = 1 {where_conditions})
+			group by invoice, rate
+		""".format(doctype=self.doctype, where_conditions=self.get_conditions()),
+			dict(self.filters, doctype=self.doctype), as_dict=1)
+
+		missing_invoices = set(self.invoices) - set(d.invoice for d in summary)
+		if missing_invoices:
+			summary += self.get_invoice_tax_summary_from_transactions(list(missing_invoices))
+
+		for d in summary:
+			self.invoice_tax_summary.setdefault(d.invoice, {})[d.rate] = d
+			self.invoice_cess.setdefault(d.invoice, d.cess_amount)
+			if d.is_igst and d.invoice not in self.igst_invoices:
+				self.igst_invoices.append(d.invoice)
+
+		unidentified_gst_accounts = get_unidentified_gst_accounts(self.doctype, self.gst_accounts,
+			self.get_conditions(), self.filters)
 		if unidentified_gst_accounts:
 			frappe.msgprint(_("Following accounts might be selected in GST Settings:")
 				+ "<br>" + "<br>".join(unidentified_gst_accounts), alert=True)
 
-		# Build itemised tax for export invoices where tax table is blank
-		for invoice, items in iteritems(self.invoice_items):
-			if invoice not in self.items_based_on_tax_rate \
-				and frappe.db.get_value(self.doctype, invoice, "export_type") == "Without Payment of Tax":
-					self.items_based_on_tax_rate.setdefault(invoice, {}).setdefault(0, items.keys())
+	def get_invoice_tax_summary_from_transactions(self, invoices):
+		summary = build_gst_invoice_summary(self.doctype, invoices, self.gst_accounts)
+
+		rate_wise_summary = {}
+		for d in summary:
+			row = rate_wise_summary.setdefault((d.invoice, d.rate), frappe._dict({
+				"invoice": d.invoice,
+				"rate": d.rate,
+				"taxable_value": 0,
+				"gross_taxable_value": 0,
+				"cess_amount": d.cess_amount,
+				"is_igst": d.is_igst
+			}))
+			row.gross_taxable_value += d.taxable_value
+			if d.is_rate_applicable:
+				row.taxable_value += d.taxable_value
+
+		return list(rate_wise_summary.values())
 
 	def get_columns(self):
 		self.tax_columns = [
@@ -4,6 +4,7 @@
 from __future__ import unicode_literals
 import frappe
 from datetime import date
+from six import iteritems
 from erpnext.regional.report.gstr_1.gstr_1 import Gstr1Report
 
 def execute(filters=None):
@@ -40,17 +41,15 @@ class Gstr2Report(Gstr1Report):
 		"""
 
 	def get_data(self):
-		self.get_igst_invoices()
-		for inv, items_based_on_rate in self.items_based_on_tax_rate.items():
-			invoice_details = self.invoices.get(inv)
-			for rate, items in items_based_on_rate.items():
+		for inv, invoice_details in iteritems(self.invoices):
+			for rate, values in iteritems(self.invoice_tax_summary.get(inv, {})):
 				if inv not in self.igst_invoices:
 					rate = rate / 2
-					row, taxable_value = self.get_row_data_for_invoice(inv, invoice_details, rate, items)
+					row, taxable_value = self.get_row_data_for_invoice(inv, invoice_details, rate, values.taxable_value)
 					tax_amount = taxable_value * rate / 100
 					row += [0, tax_amount, tax_amount]
 				else:
-					row, taxable_value = self.get_row_data_for_invoice(inv, invoice_details, rate, items)
+					row, taxable_value = self.get_row_data_for_invoice(inv, invoice_details, rate, values.taxable_value)
 					tax_amount = taxable_value * rate / 100
 					row += [tax_amount, 0, 0]
 
@@ -69,13 +68,6 @@ class Gstr2Report(Gstr1Report):
 
 				self.data.append(row)
 
-	def get_igst_invoices(self):
-		self.igst_invoices = []
-		for d in self.tax_details:
-			is_igst = True if d[1] in self.gst_accounts.igst_account else False
-			if is_igst and d[0] not in self.igst_invoices:
-				self.igst_invoices.append(d[0])
-
 	def get_conditions(self):
 		conditions = ""
 
@@ -6,7 +6,7 @@ import frappe, erpnext
 from frappe import _
 from frappe.utils import flt
 from frappe.model.meta import get_field_precision
-from frappe.utils.xlsxutils import handle_html
+from erpnext.regional.doctype.gst_invoice_summary.gst_invoice_summary import get_itemised_tax
 
 def execute(filters=None):
 	return _execute(filters)
@@ -121,69 +121,28 @@ def get_items(filters):
 
 def get_tax_accounts(item_list, columns, company_currency,
 		doctype="Sales Invoice", tax_doctype="Sales Taxes and Charges"):
-	import json
-	item_row_map = {}
-	tax_columns = []
-	invoice_item_row = {}
-	itemised_tax = {}
-	conditions = ""
-
 	tax_amount_precision = get_field_precision(frappe.get_meta(tax_doctype).get_field("tax_amount"),
 		currency=company_currency) or 2
 
-	for d in item_list:
-		invoice_item_row.setdefault(d.parent, []).append(d)
-		item_row_map.setdefault(d.parent, {}).setdefault(d.item_code or d.item_name, []).append(d)
+	items_with_hsn_code = get_items_with_hsn_code(item_list)
+	itemised_tax, tax_columns = get_itemised_tax([d for d in item_list if d.item_code in items_with_hsn_code],
+		doctype, tax_amount_precision)
 
-	tax_details = frappe.db.sql("""
-		select
-			parent, description, item_wise_tax_detail,
-			base_tax_amount_after_discount_amount
-		from `tab%s`
-		where
-			parenttype = %s and docstatus = 1
-			and (description is not null and description != '')
-			and parent in (%s)
-			%s
-		order by description
-	""" % (tax_doctype, '%s', ', '.join(['%s']*len(invoice_item_row)), conditions),
-		tuple([doctype] + list(invoice_item_row)))
-
-	for parent, description, item_wise_tax_detail, tax_amount in tax_details:
-		description = handle_html(description)
-		if description not in tax_columns and tax_amount:
-			# as description is text editor earlier and markup can break the column convention in reports
-			tax_columns.append(description)
-
-		if item_wise_tax_detail:
-			try:
-				item_wise_tax_detail = json.loads(item_wise_tax_detail)
-
-				for item_code, tax_data in item_wise_tax_detail.items():
-					if not frappe.db.get_value("Item", item_code, "gst_hsn_code"):
-						continue
-					itemised_tax.setdefault(item_code, frappe._dict())
-					if isinstance(tax_data, list):
-						tax_amount = tax_data[1]
-					else:
-						tax_amount = 0
-
-					for d in item_row_map.get(parent, {}).get(item_code, []):
-						item_tax_amount = tax_amount
-						if item_tax_amount:
-							itemised_tax.setdefault(d.name, {})[description] = frappe._dict({
-								"tax_amount": flt(item_tax_amount, tax_amount_precision)
-							})
-			except ValueError:
-				continue
-
-	tax_columns.sort()
 	for desc in tax_columns:
 		columns.append(desc + " Amount:Currency/currency:160")
 
-	# columns += ["Total Amount:Currency/currency:110"]
 	return itemised_tax, tax_columns
 
+def get_items_with_hsn_code(item_list):
+	item_codes = list(set(d.item_code for d in item_list if d.item_code))
+	if not item_codes:
+		return set()
+
+	return set(frappe.db.sql_list("""
+		select name from `tabItem`
+		where name in ({0}) and ifnull(gst_hsn_code, '') != ''
+	""".format(', '.join(['%s']*len(item_codes))), tuple(item_codes)))
+
 def get_merged_data(columns, data):
 	merged_hsn_dict = {} # to group same hsn under one key and perform row addition
 	add_column_index = [] # store index of columns that needs to be added
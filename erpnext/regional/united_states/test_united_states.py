@@ -4,6 +4,9 @@ from __future__ import unicode_literals
 import frappe
 import unittest
 from erpnext.regional.report.irs_1099.irs_1099 import execute as execute_1099_report
+from erpnext.accounts.doctype.monthly_gl_summary.monthly_gl_summary import update_monthly_gl_summary
+from erpnext.accounts.doctype.monthly_expense_summary.monthly_expense_summary import update_monthly_expense_summary
+from erpnext.accounts.doctype.outstanding_voucher.outstanding_voucher import update_outstanding_vouchers
 
 
 class TestUnitedStates(unittest.TestCase):
@@ -36,8 +39,15 @@ class TestUnitedStates(unittest.TestCase):
 
 def make_payment_entry_to_irs_1099_supplier():
 
+    # take the entries out of the summaries before they are deleted
+    gl_entries = frappe.db.sql("""select * from `tabGL Entry`
+        where party='_US 1099 Test Supplier' or against='_US 1099 Test Supplier'""", as_dict=1)
+    update_monthly_gl_summary(gl_entries, sign=-1)
+    update_monthly_expense_summary(gl_entries, sign=-1)
+
     frappe.db.sql("delete from `tabGL Entry` where party='_US 1099 Test Supplier'")
     frappe.db.sql("delete from `tabGL Entry` where against='_US 1099 Test Supplier'")
+    update_outstanding_vouchers(gl_entries)
     frappe.db.sql("delete from `tabPayment Entry` where party='_US 1099 Test Supplier'")
 
     pe = frappe.new_doc("Payment Entry")
@@ -9,7 +9,7 @@ import frappe.defaults
 from frappe.utils import flt, cint, cstr, today
 from frappe.desk.reportview import build_match_conditions, get_filters_cond
 from erpnext.utilities.transaction_base import TransactionBase
-from erpnext.accounts.party import validate_party_accounts, get_dashboard_info, get_timeline_data # keep this
+from erpnext.accounts.party import validate_party_accounts, get_dashboard_info # keep this
 from frappe.contacts.address_and_contact import load_address_and_contact, delete_contact_and_address
 from frappe.model.rename_doc import update_linked_doctypes
 from frappe.model.mapper import get_mapped_doc
@@ -277,6 +277,12 @@ def _set_missing_values(source, target):
 	if contact:
 		target.contact_person = contact[0].parent
 
+def get_timeline_data(doctype, name):
+	'''Returns the count of transactions of the customer of each day of the last year, for the heatmap'''
+	from erpnext.selling.doctype.daily_transaction_summary.daily_transaction_summary import get_transaction_counts
+
+	return get_transaction_counts(customer=name)
+
 @frappe.whitelist()
 def get_loyalty_programs(doc):
 	''' returns applicable loyalty programs for a customer '''
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import cint, now, getdate, add_years, get_timestamp
+from frappe.model.document import Document
+from six import iteritems
+
+exclude_from_linked_with = True
+
+# the transactions counted in the heatmaps of the Company and the Customer, with their date field
+transaction_date_fields = {
+	"Quotation": "transaction_date",
+	"Sales Order": "transaction_date",
+	"Delivery Note": "posting_date",
+	"Sales Invoice": "posting_date",
+	"Issue": "creation",
+	"Project": "creation"
+}
+
+class DailyTransactionSummary(Document):
+	pass
+
+def get_summary_key(doc):
+	if doc.get("doctype") == "Quotation":
+		customer = doc.get("party_name") if doc.get("quotation_to") == "Customer" else None
+	else:
+		customer = doc.get("customer")
+
+	transaction_date = doc.get(transaction_date_fields[doc.get("doctype")])
+	if not (doc.get("company") and transaction_date):
+		return
+
+	return (doc.get("company"), getdate(transaction_date), customer or None)
+
+def update_daily_transaction_summary(doc, method=None):
+	'''Called on update and trash of the counted transactions, moves the count of the document
+		from its previous company, date and customer to the current ones'''
+	counts = {}
+	def add_count(key, count):
+		if key:
+			counts[key] = counts.get(key, 0) + count
+
+	if method == "on_trash":
+		add_count(get_summary_key(doc), -1)
+	else:
+		doc_before_save = doc.get_doc_before_save()
+		if doc_before_save:
+			add_count(get_summary_key(doc_before_save), -1)
+		add_count(get_summary_key(doc), 1)
+
+	counts = dict((key, count) for key, count in iteritems(counts) if count)
+	if not counts:
+		return
+
+	existing = {}
+	for d in frappe.db.sql("""select name, company, transaction_date, customer
+		from `tabDaily Transaction Summary`
+		where company in %(companies)s and transaction_date in %(dates)s""", {
+			"companies": list(set(key[0] for key in counts)),
+			"dates": list(set(key[1] for key in counts))
+		}, as_dict=1):
+		existing.setdefault((d.company, getdate(d.transaction_date), d.customer or None), d.name)
+
+	rows, updated = [], []
+	for key, count in iteritems(counts):
+		if existing.get(key):
+			frappe.db.sql("""update `tabDaily Transaction Summary`
+				set transaction_count = transaction_count + %s, modified = %s
+				where name = %s""", (count, now(), existing[key]))
+			updated.append(existing[key])
+		else:
+			rows.append(list(key) + [count])
+
+	make_daily_transaction_summary_entries(rows)
+
+	if updated:
+		# rows left without transactions would keep the links to the customers of deleted transactions
+		frappe.db.sql("""delete from `tabDaily Transaction Summary`
+			where name in %s and transaction_count = 0""", [updated])
+
+def make_daily_transaction_summary_entries(rows):
+	fields = ["company", "transaction_date", "customer", "transaction_count"]
+
+	timestamp, user = now(), frappe.session.user
+	for i in range(0, len(rows), 500):
+		chunk = rows[i:i + 500]
+		frappe.db.sql("""
+			insert into `tabDaily Transaction Summary`
+				(name, creation, modified, modified_by, owner, docstatus, {0})
+			values {1}
+		""".format(", ".join(fields),
+			", ".join(["(" + ", ".join(["%s"] * (len(fields) + 6)) + ")"] * len(chunk))),
+			tuple(v for row in chunk
+				for v in [frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0] + row))
+
+def rebuild_daily_transaction_summary(company=None):
+	'''Replace the summary with the count of the transactions of each day'''
+	frappe.db.sql("""delete from `tabDaily Transaction Summary` {0}""".format(
+		"where company = %(company)s" if company else ""), {"company": company})
+
+	counts = {}
+	for doctype, date_field in iteritems(transaction_date_fields):
+		customer_field = "if(quotation_to = 'Customer', party_name, null)" if doctype == "Quotation" else "customer"
+
+		for d in frappe.db.sql("""select company, date({date_field}) as transaction_date,
+				{customer_field} as customer, count(*) as transaction_count
+			from `tab{doctype}`
+			where ifnull(company, '') != '' {conditions}
+			group by company, date({date_field}), {customer_field}""".format(doctype=doctype, #nosec
+				date_field=date_field, customer_field=customer_field,
+				conditions=" and company = %(company)s" if company else ""), {"company": company}, as_dict=1):
+			key = (d.company, getdate(d.transaction_date), d.customer or None)
+			counts[key] = counts.get(key, 0) + cint(d.transaction_count)
+
+	make_daily_transaction_summary_entries([list(key) + [count] for key, count in iteritems(counts)])
+
+def get_transaction_counts(company=None, customer=None):
+	'''Returns the count of transactions of each day of the last year, keyed by the timestamp of the day'''
+	conditions = ""
+	if company:
+		conditions += " and company = %(company)s"
+	if customer:
+		conditions += " and customer = %(customer)s"
+
+	return dict((get_timestamp(transaction_date), cint(count)) for transaction_date, count in frappe.db.sql("""
+		select transaction_date, sum(transaction_count)
+		from `tabDaily Transaction Summary`
+		where transaction_date > %(from_date)s {0}
+		group by transaction_date
+		having sum(transaction_count) > 0""".format(conditions), {
+			"company": company,
+			"customer": customer,
+			"from_date": add_years(None, -1)
+		}))
+
+def on_doctype_update():
+	frappe.db.add_index("Daily Transaction Summary", ["company", "transaction_date"])
+	frappe.db.add_index("Daily Transaction Summary", ["customer", "transaction_date"])
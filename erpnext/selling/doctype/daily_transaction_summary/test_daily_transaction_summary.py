@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import add_days, nowdate, get_timestamp
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from erpnext.selling.doctype.daily_transaction_summary.daily_transaction_summary import (get_transaction_counts,
+	rebuild_daily_transaction_summary)
+
+class TestDailyTransactionSummary(unittest.TestCase):
+	def test_backdated_and_deleted_transactions(self):
+		posting_date = add_days(nowdate(), -40)
+		timestamp = get_timestamp(posting_date)
+
+		def get_count(customer=None):
+			return get_transaction_counts("_Test Company", customer=customer).get(timestamp, 0)
+
+		existing_count, existing_customer_count = get_count(), get_count("_Test Customer")
+
+		si = create_sales_invoice(posting_date=posting_date, do_not_submit=True)
+		self.assertEqual(get_count(), existing_count + 1)
+		self.assertEqual(get_count("_Test Customer"), existing_customer_count + 1)
+
+		si.posting_date = add_days(posting_date, 1)
+		si.save()
+		self.assertEqual(get_count(), existing_count)
+
+		si.posting_date = posting_date
+		si.save()
+		counts = get_transaction_counts("_Test Company")
+
+		rebuild_daily_transaction_summary("_Test Company")
+		self.assertEqual(get_transaction_counts("_Test Company"), counts)
+
+		si.delete()
+		self.assertEqual(get_count(), existing_count)
+		self.assertEqual(get_count("_Test Customer"), existing_customer_count)
+
+		# rows left without transactions are deleted
+		self.assertFalse(frappe.db.exists("Daily Transaction Summary", {"company": "_Test Company",
+			"transaction_date": add_days(posting_date, 1), "transaction_count": 0}))
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt, now, get_first_day
+from frappe.model.document import Document
+from six import iteritems
+
+exclude_from_linked_with = True
+
+summary_fields = ("company", "month_start_date", "customer", "item_code",
+	"qty", "base_net_amount", "base_grand_total", "invoice_count")
+
+class MonthlySalesSummary(Document):
+	pass
+
+def update_monthly_sales_summary(doc):
+	'''Add the submitted Sales Invoice to the summary of its month, or take it out on cancel.
+
+	The invoice totals are kept in the rows without item, the item totals in the rows of each item.
+	Concurrent invoices may add two rows for the same key, so the rows are always summed'''
+	sign = -1 if doc.docstatus == 2 else 1
+	month_start_date = get_first_day(doc.posting_date)
+
+	totals = {None: [0, 0, sign * flt(doc.base_grand_total), sign]}
+	for d in doc.get("items"):
+		if d.item_code:
+			item_totals = totals.setdefault(d.item_code, [0, 0, 0, 0])
+			item_totals[0] += sign * flt(d.stock_qty)
+			item_totals[1] += sign * flt(d.base_net_amount)
+
+	existing = {}
+	for name, item_code in frappe.db.sql("""select name, item_code from `tabMonthly Sales Summary`
+		where company=%s and month_start_date=%s and customer=%s""",
+		(doc.company, month_start_date, doc.customer)):
+		existing[item_code or None] = name
+
+	rows = []
+	for item_code, values in iteritems(totals):
+		if existing.get(item_code):
+			frappe.db.sql("""update `tabMonthly Sales Summary`
+				set qty = qty + %s, base_net_amount = base_net_amount + %s,
+					base_grand_total = base_grand_total + %s, invoice_count = invoice_count + %s,
+					modified = %s
+				where name = %s""", tuple(values + [now(), existing[item_code]]))
+		else:
+			rows.append([doc.company, month_start_date, doc.customer, item_code] + values)
+
+	make_monthly_sales_summary_entries(rows)
+
+def make_monthly_sales_summary_entries(rows):
+	timestamp, user = now(), frappe.session.user
+	for i in range(0, len(rows), 500):
+		chunk = rows[i:i + 500]
+		frappe.db.sql("""
+			insert into `tabMonthly Sales Summary`
+				(name, creation, modified, modified_by, owner, docstatus, {0})
+			values {1}
+		""".format(", ".join(summary_fields),
+			", ".join(["(" + ", ".join(["%s"] * (len(summary_fields) + 6)) + ")"] * len(chunk))),
+			tuple(v for row in chunk
+				for v in [frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0] + row))
+
+def rebuild_monthly_sales_summary(company=None):
+	'''Replace the summary with the totals of the submitted Sales Invoices'''
+	conditions = " and si.company = %(company)s" if company else ""
+	frappe.db.sql("""delete from `tabMonthly Sales Summary` {0}""".format(
+		"where company = %(company)s" if company else ""), {"company": company})
+
+	totals = {}
+	def add_to_totals(d, item_code, values):
+		key = (d.company, get_first_day(d.posting_date), d.customer, item_code)
+		totals[key] = [a + flt(b) for a, b in zip(totals.get(key, [0, 0, 0, 0]), values)]
+
+	# grouped by date and folded into months here, to keep the query portable
+	for d in frappe.db.sql("""select si.company, si.customer, si.posting_date,
+			sum(si.base_grand_total) as base_grand_total, count(*) as invoice_count
+		from `tabSales Invoice` si
+		where si.docstatus = 1 {0}
+		group by si.company, si.customer, si.posting_date""".format(conditions),
+		{"company": company}, as_dict=1):
+		add_to_totals(d, None, [0, 0, d.base_grand_total, d.invoice_count])
+
+	for d in frappe.db.sql("""select si.company, si.customer, si.posting_date, item.item_code,
+			sum(item.stock_qty) as qty, sum(item.base_net_amount) as base_net_amount
+		from `tabSales Invoice Item` item, `tabSales Invoice` si
+		where item.parent = si.name and si.docstatus = 1 and ifnull(item.item_code, '') != '' {0}
+		group by si.company, si.customer, si.posting_date, item.item_code""".format(conditions),
+		{"company": company}, as_dict=1):
+		add_to_totals(d, d.item_code, [d.qty, d.base_net_amount, 0, 0])
+
+	make_monthly_sales_summary_entries([list(key) + values for key, values in iteritems(totals)])
+
+def get_monthly_sales(company, from_date=None, to_date=None, customer=None, item_code=None):
+	'''Returns the sales of each month between the dates, ordered by month.
+
+	Without `item_code`, returns the grand total and the count of the invoices,
+	with `item_code`, the qty and the net amount of the item'''
+	conditions = ""
+	if from_date:
+		conditions += " and month_start_date >= %(from_date)s"
+	if to_date:
+		conditions += " and month_start_date <= %(to_date)s"
+	if customer:
+		conditions += " and customer = %(customer)s"
+	conditions += " and item_code = %(item_code)s" if item_code else " and ifnull(item_code, '') = ''"
+
+	return frappe.db.sql("""select month_start_date, sum(qty) as qty,
+			sum(base_net_amount) as base_net_amount, sum(base_grand_total) as base_grand_total,
+			sum(invoice_count) as invoice_count
+		from `tabMonthly Sales Summary`
+		where company = %(company)s {0}
+		group by month_start_date
+		order by month_start_date""".format(conditions), {
+			"company": company,
+			"from_date": get_first_day(from_date) if from_date else None,
+			"to_date": to_date,
+			"customer": customer,
+			"item_code": item_code
+		}, as_dict=1)
+
+def on_doctype_update():
+	frappe.db.add_index("Monthly Sales Summary", ["company", "month_start_date", "customer"])
@@ -190,6 +190,37 @@ class TestSalesOrder(unittest.TestCase):
 		so.cancel()
 		self.assertEqual(get_reserved_qty(), existing_reserved_qty)
 
+	def test_reserved_qty_from_projected_qty_ledger(self):
+		from erpnext.stock.stock_balance import verify_bin_qty
+
+		def get_reserved_qty_drift():
+			return [d for d in verify_bin_qty("_Test Item", "_Test Warehouse - _TC")
+				if d.qty_field == "reserved_qty"]
+
+		make_stock_entry(target="_Test Warehouse - _TC", qty=10, rate=100)
+		verify_bin_qty("_Test Item", "_Test Warehouse - _TC", fix=True)
+		existing_reserved_qty = get_reserved_qty()
+
+		so = make_sales_order()
+		dn = create_dn_against_so(so.name, delivered_qty=4)
+		self.assertEqual(get_reserved_qty(), existing_reserved_qty + 6)
+		self.assertFalse(get_reserved_qty_drift())
+
+		ledger_qty = frappe.db.sql("""select sum(qty) from `tabProjected Qty Ledger Entry`
+			where voucher_type='Sales Order' and voucher_no=%s""", so.name)[0][0]
+		self.assertEqual(ledger_qty, 6)
+
+		dn.cancel()
+		so.load_from_db()
+		so.cancel()
+		self.assertEqual(get_reserved_qty(), existing_reserved_qty)
+		self.assertFalse(get_reserved_qty_drift())
+
+		# the entries of the cancelled order are deleted, so that it can be deleted
+		self.assertFalse(frappe.db.exists("Projected Qty Ledger Entry",
+			{"voucher_type": "Sales Order", "voucher_no": so.name}))
+		frappe.delete_doc("Sales Order", so.name)
+
 	def test_reserved_qty_for_over_delivery(self):
 		make_stock_entry(target="_Test Warehouse - _TC", qty=10, rate=100)
 		# set over-delivery allowance
@@ -4,9 +4,7 @@
 from __future__ import unicode_literals
 import frappe, os, json
 from frappe import _
-from frappe.utils import get_timestamp
-
-from frappe.utils import cint, today, formatdate
+from frappe.utils import cint, flt, today, getdate
 import frappe.defaults
 from frappe.cache_manager import clear_defaults_cache
 
@@ -420,39 +418,28 @@ def install_country_fixtures(company):
 			.format(frappe.scrub(company_doc.country)))(company_doc, False)
 
 def update_company_current_month_sales(company):
-	current_month_year = formatdate(today(), "MM-yyyy")
-
-	results = frappe.db.sql('''
-		SELECT
-			SUM(base_grand_total) AS total,
-			DATE_FORMAT(`posting_date`, '%m-%Y') AS month_year
-		FROM
-			`tabSales Invoice`
-		WHERE
-			DATE_FORMAT(`posting_date`, '%m-%Y') = '{current_month_year}'
-			AND docstatus = 1
-			AND company = {company}
-		GROUP BY
-			month_year
-	'''.format(current_month_year=current_month_year, company=frappe.db.escape(company)),
-		as_dict = True)
+	from erpnext.selling.doctype.monthly_sales_summary.monthly_sales_summary import get_monthly_sales
 
-	monthly_total = results[0]['total'] if len(results) > 0 else 0
+	results = get_monthly_sales(company, from_date=today(), to_date=today())
+	monthly_total = flt(results[0].base_grand_total) if results else 0
 
 	frappe.db.set_value("Company", company, "total_monthly_sales", monthly_total)
 
 def update_company_monthly_sales(company):
-	'''Cache past year monthly sales of every company based on sales invoices'''
-	from frappe.utils.goal import get_monthly_results
-	import json
-	filter_str = "company = {0} and status != 'Draft' and docstatus=1".format(frappe.db.escape(company))
-	month_to_value_dict = get_monthly_results("Sales Invoice", "base_grand_total",
-		"posting_date", filter_str, "sum")
+	'''Cache the monthly sales of the company, from the Monthly Sales Summary'''
+	from erpnext.selling.doctype.monthly_sales_summary.monthly_sales_summary import get_monthly_sales
+
+	month_to_value_dict = {}
+	for d in get_monthly_sales(company):
+		month_to_value_dict[getdate(d.month_start_date).strftime("%m-%Y")] = flt(d.base_grand_total)
 
 	frappe.db.set_value("Company", company, "sales_monthly_history", json.dumps(month_to_value_dict))
 
 def update_transactions_annual_history(company, commit=False):
-	transactions_history = get_all_transactions_annual_history(company)
+	'''Cache the count of transactions of each day of the last year, from the Daily Transaction Summary'''
+	from erpnext.selling.doctype.daily_transaction_summary.daily_transaction_summary import get_transaction_counts
+
+	transactions_history = get_transaction_counts(company)
 	frappe.db.set_value("Company", company, "transactions_annual_history", json.dumps(transactions_history))
 
 	if commit:
@@ -494,57 +481,6 @@ def add_node():
 
 	frappe.get_doc(args).insert()
 
-def get_all_transactions_annual_history(company):
-	out = {}
-
-	items = frappe.db.sql('''
-		select transaction_date, count(*) as count
-
-		from (
-			select name, transaction_date, company
-			from `tabQuotation`
-
-			UNION ALL
-
-			select name, transaction_date, company
-			from `tabSales Order`
-
-			UNION ALL
-
-			select name, posting_date as transaction_date, company
-			from `tabDelivery Note`
-
-			UNION ALL
-
-			select name, posting_date as transaction_date, company
-			from `tabSales Invoice`
-
-			UNION ALL
-
-			select name, creation as transaction_date, company
-			from `tabIssue`
-
-			UNION ALL
-
-			select name, creation as transaction_date, company
-			from `tabProject`
-		) t
-
-		where
-			company=%s
-			and
-			transaction_date > date_sub(curdate(), interval 1 year)
-
-		group by
-			transaction_date
-			''', (company), as_dict=True)
-
-	for d in items:
-		timestamp = get_timestamp(d["transaction_date"])
-		out.update({ timestamp: d["count"] })
-
-	return out
-
 def get_timeline_data(doctype, name):
 	'''returns timeline data based on linked records in dashboard'''
 	out = {}
@@ -5,12 +5,13 @@ from __future__ import unicode_literals
 import frappe
 from frappe import _
 from frappe.utils import (fmt_money, formatdate, format_time, now_datetime,
-	get_url_to_form, get_url_to_list, flt, get_link_to_report, add_to_date, today)
+	get_url_to_form, get_url_to_list, flt, cint, get_link_to_report, add_to_date, today,
+	getdate, get_first_day, get_last_day)
 from datetime import timedelta
 from dateutil.relativedelta import relativedelta
 from frappe.core.doctype.user.user import STANDARD_USERS
 import frappe.desk.notifications
-from erpnext.accounts.utils import get_balance_on, get_count_on, get_fiscal_year
+from erpnext.accounts.utils import get_fiscal_year, get_currency_precision, FiscalYearError
 
 user_specific_content = ["calendar_events", "todo_list"]
 
@@ -244,13 +245,10 @@ class EmailDigest(Document):
 					"new_quotations", "pending_quotations"):
 
 			if self.get(key):
-				cache_key = "email_digest:card:{0}:{1}:{2}:{3}".format(self.company, self.frequency, key, self.from_date)
-				card = cache.get(cache_key)
+				cache_key = "email_digest_card:{0}:{1}:{2}:{3}".format(self.company, self.frequency, key, self.from_date)
+				card = cache.get_value(cache_key)
 
-				if card:
-					card = eval(card)
-
-				else:
+				if not card:
 					card = frappe._dict(getattr(self, "get_" + key)())
 
 					# format values
@@ -283,13 +281,13 @@ class EmailDigest(Document):
 						card.value = card.value *-1
 					card.value = self.fmt_money(card.value,False if key in ("bank_balance", "credit_balance") else True)
 
-					cache.setex(cache_key, card, 24 * 60 * 60)
+					cache.set_value(cache_key, card, expires_in_sec=24 * 60 * 60)
 
 				context.cards.append(card)
 
 	def get_income(self):
 		"""Get income for given period"""
-		income, past_income, count = self.get_period_amounts(self.get_roots("income"),'income')
+		income, past_income, count = self.get_period_amounts("income")
 
 		income_account = frappe.db.get_all('Account',
 			fields=["name"],
@@ -327,9 +325,17 @@ class EmailDigest(Document):
 		balance = 0.0
 		count = 0
 
-		for account in self.get_root_type_accounts(root_type):
-			balance += get_balance_on(account, date = self.future_to_date)
-			count += get_count_on(account, fieldname, date = self.future_to_date)
+		try:
+			year_start_date = get_fiscal_year(self.future_to_date, verbose=0)[1]
+		except FiscalYearError:
+			year_start_date = None
+
+		if year_start_date:
+			gl_totals = get_gl_totals(self.company, year_start_date, self.future_to_date)
+			for account in self.get_root_type_accounts(root_type):
+				if account in gl_totals:
+					balance += gl_totals[account].balance
+					count += gl_totals[account].count
 
 		if fieldname == 'income':
 			filters = {
@@ -364,7 +370,7 @@ class EmailDigest(Document):
 		return self.get_type_balance('invoiced_amount', 'Receivable')
 
 	def get_expenses_booked(self):
-		expenses, past_expenses, count = self.get_period_amounts(self.get_roots("expense"), 'expenses_booked')
+		expenses, past_expenses, count = self.get_period_amounts("expense")
 
 		expense_account = frappe.db.get_all('Account',
 			fields=["name"],
@@ -390,14 +396,19 @@ class EmailDigest(Document):
 			"count": count
 		}
 
-	def get_period_amounts(self, accounts, fieldname):
+	def get_period_amounts(self, root_type):
 		"""Get amounts for current and past periods"""
 		balance = past_balance = 0.0
 		count = 0
-		for account in accounts:
-			balance += get_incomes_expenses_for_period(account, self.future_from_date, self.future_to_date)
-			past_balance += get_incomes_expenses_for_period(account, self.past_from_date, self.past_to_date)
-			count += get_count_for_period(account, fieldname, self.future_from_date, self.future_to_date)
+
+		gl_totals = get_gl_totals(self.company, self.future_from_date, self.future_to_date)
+		past_gl_totals = get_gl_totals(self.company, self.past_from_date, self.past_to_date)
+		for account in self.get_root_type_accounts(root_type):
+			if account in gl_totals:
+				balance += gl_totals[account].balance
+				count += gl_totals[account].count
+			if account in past_gl_totals:
+				past_balance += past_gl_totals[account].balance
 
 		return balance, past_balance, count
 
@@ -514,10 +525,21 @@ class EmailDigest(Document):
 
 		balance = prev_balance = 0.0
 		count = 0
+
+		# the balance on the last day of the past period, plus the entries of the current period
+		past_gl_totals = get_gl_totals(self.company, None, self.past_to_date)
+		gl_totals = get_gl_totals(self.company, self.future_from_date, self.future_to_date)
 		for account in accounts:
-			balance += get_balance_on(account, date=self.future_to_date, in_account_currency=False)
-			count += get_count_on(account, fieldname, date=self.future_to_date)
-			prev_balance += get_balance_on(account, date=self.past_to_date, in_account_currency=False)
+			for totals in (past_gl_totals.get(account), gl_totals.get(account)):
+				if totals:
+					balance += totals.balance + totals.closing_balance
+					count += totals.count + totals.closing_count
+
+			if account in past_gl_totals:
+				prev_balance += past_gl_totals[account].balance + past_gl_totals[account].closing_balance
+
+		if fieldname in ("invoiced_amount", "payables"):
+			count = get_outstanding_count(accounts, fieldname, self.future_to_date)
 
 		if fieldname in ("bank_balance","credit_balance"):
 			label = ""
@@ -662,8 +684,8 @@ class EmailDigest(Document):
 		date_field = 'posting_date' if doc_type in ['Sales Invoice', 'Purchase Invoice'] \
 			else 'transaction_date'
 
-		value = flt(self.get_total_on(doc_type, self.future_from_date, self.future_to_date)[0].grand_total)
-		count = self.get_total_on(doc_type, self.future_from_date, self.future_to_date)[0].count
+		total = self.get_total_on(doc_type, self.future_from_date, self.future_to_date)[0]
+		value, count = flt(total.grand_total), total.count
 
 		last_value = flt(self.get_total_on(doc_type, self.past_from_date, self.past_to_date)[0].grand_total)
 
@@ -688,6 +710,16 @@ class EmailDigest(Document):
 		date_field = 'posting_date' if doc_type in ['Sales Invoice', 'Purchase Invoice'] \
 			else 'transaction_date'
 
+		if doc_type == "Sales Invoice" and getdate(from_date) == get_first_day(from_date) \
+			and getdate(to_date) == get_last_day(to_date):
+			# whole months, read from the Monthly Sales Summary
+			from erpnext.selling.doctype.monthly_sales_summary.monthly_sales_summary import get_monthly_sales
+			months = get_monthly_sales(self.company, from_date, to_date)
+			return [frappe._dict({
+				"count": sum([cint(d.invoice_count) for d in months]),
+				"grand_total": sum([flt(d.base_grand_total) for d in months])
+			})]
+
 		return frappe.get_all(doc_type,
 			filters={
 				date_field: ['between', (from_date, to_date)],
@@ -792,39 +824,76 @@ def send():
 def get_digest_msg(name):
 	return frappe.get_doc("Email Digest", name).get_msg_html()
 
-def get_incomes_expenses_for_period(account, from_date, to_date):
-		"""Get amounts for current and past periods"""
-
-		val = 0.0
-		balance_on_to_date = get_balance_on(account, date = to_date)
-		balance_before_from_date = get_balance_on(account, date = from_date - timedelta(days=1))
-
-		fy_start_date = get_fiscal_year(to_date)[1]
-
-		if from_date == fy_start_date:
-			val = balance_on_to_date
-		elif from_date > fy_start_date:
-			val = balance_on_to_date - balance_before_from_date
+def get_gl_totals(company, from_date, to_date):
+	"""Returns the balance (debit - credit in company currency) and the count of the GL Entries
+		of each account of the company between the dates, in one grouped query.
+		Entries of Period Closing Vouchers are totalled separately as `closing_balance` and `closing_count`.
+
+	The totals are cached for a day and shared by all the digests of the company"""
+	cache_key = "email_digest_gl_totals:{0}:{1}:{2}".format(company, from_date, to_date)
+	gl_totals = frappe.cache().get_value(cache_key)
+	if gl_totals is not None:
+		return gl_totals
+
+	gl_totals = {}
+	for account, is_closing, balance, count in frappe.db.sql("""
+		select account, voucher_type = 'Period Closing Voucher' as is_closing,
+			sum(debit) - sum(credit), count(*)
+		from `tabGL Entry`
+		where company = %(company)s and posting_date <= %(to_date)s {0}
+		group by account, is_closing""".format("and posting_date >= %(from_date)s" if from_date else ""),
+		{"company": company, "from_date": from_date, "to_date": to_date}):
+		totals = gl_totals.setdefault(account, frappe._dict({"balance": 0.0, "count": 0,
+			"closing_balance": 0.0, "closing_count": 0}))
+		if cint(is_closing):
+			totals.closing_balance, totals.closing_count = flt(balance), cint(count)
 		else:
-			last_year_closing_balance = get_balance_on(account, date=fy_start_date - timedelta(days=1))
-			print(fy_start_date - timedelta(days=1), last_year_closing_balance)
-			val = balance_on_to_date + (last_year_closing_balance - balance_before_from_date)
-
-		return val
-
-def get_count_for_period(account, fieldname, from_date, to_date):
-	count = 0.0
-	count_on_to_date = get_count_on(account, fieldname, to_date)
-	count_before_from_date = get_count_on(account, fieldname, from_date - timedelta(days=1))
-
-	fy_start_date = get_fiscal_year(to_date)[1]
-	if from_date == fy_start_date:
-		count = count_on_to_date
-	elif from_date > fy_start_date:
-		count = count_on_to_date - count_before_from_date
-	else:
-		last_year_closing_count = get_count_on(account, fieldname, fy_start_date - timedelta(days=1))
-		count = count_on_to_date + (last_year_closing_count - count_before_from_date)
+			totals.balance, totals.count = flt(balance), cint(count)
+
+	frappe.cache().set_value(cache_key, gl_totals, expires_in_sec=24 * 60 * 60)
+	return gl_totals
+
+def get_outstanding_count(accounts, fieldname, date):
+	"""Returns the count of the entries of the receivable or payable accounts still outstanding on the date,
+		as in `erpnext.accounts.utils.get_count_on`, with the payments summed in grouped queries"""
+	if not accounts:
+		return 0
+
+	dr_or_cr, cr_or_dr = ("debit", "credit") if fieldname == "invoiced_amount" else ("credit", "debit")
+	select_field = "credit - debit" if fieldname == "invoiced_amount" else "debit - credit"
+
+	entries = [gle for gle in frappe.db.sql("""
+		select name, party, debit, credit, voucher_no, against_voucher_type, against_voucher
+		from `tabGL Entry`
+		where account in %(accounts)s and posting_date <= %(date)s""",
+		{"accounts": tuple(accounts), "date": date}, as_dict=1)
+		if (not gle.against_voucher) or (gle.against_voucher_type in ["Sales Order", "Purchase Order"])
+			or (gle.against_voucher == gle.voucher_no and gle.get(dr_or_cr) > 0)]
+
+	payments = {}
+	voucher_nos = list(set([gle.voucher_no for gle in entries]))
+	for i in range(0, len(voucher_nos), 500):
+		for against_voucher, party, amount in frappe.db.sql("""
+			select against_voucher, party, ifnull(sum({0}), 0)
+			from `tabGL Entry`
+			where docstatus < 2 and posting_date <= %(date)s and against_voucher in %(voucher_nos)s
+			group by against_voucher, party""".format(select_field),
+			{"date": date, "voucher_nos": tuple(voucher_nos[i:i + 500])}):
+			payments[(against_voucher, party)] = flt(amount)
+
+	count = 0
+	currency_precision = get_currency_precision() or 2
+	for gle in entries:
+		payment_amount = 0.0
+		if gle.party:
+			payment_amount = payments.get((gle.voucher_no, gle.party), 0.0)
+			if gle.against_voucher == gle.voucher_no:
+				# the entry itself is not a payment against the voucher
+				payment_amount -= flt(gle.get(cr_or_dr)) - flt(gle.get(dr_or_cr))
+
+		outstanding_amount = flt(gle.get(dr_or_cr)) - flt(gle.get(cr_or_dr)) - payment_amount
+		if abs(flt(outstanding_amount)) > 0.1/10**currency_precision:
+			count += 1
 
 	return count
 
@@ -5,8 +5,71 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
+from frappe.utils import flt
+from erpnext.accounts.utils import get_count_on
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from erpnext.setup.doctype.email_digest.email_digest import get_outstanding_count
 
 # test_records = frappe.get_test_records('Email Digest')
 
 class TestEmailDigest(unittest.TestCase):
-	pass
+	def test_accounting_cards(self):
+		digest = frappe.get_doc({
+			"doctype": "Email Digest",
+			"company": "_Test Company",
+			"frequency": "Monthly"
+		})
+		posting_date = digest.future_from_date
+
+		make_journal_entry("_Test Bank - _TC", "Sales - _TC", 700, posting_date=posting_date, submit=True)
+		make_journal_entry("_Test Account Cost for Goods Sold - _TC", "_Test Bank - _TC", 300,
+			posting_date=posting_date, submit=True)
+		create_sales_invoice(posting_date=posting_date)
+		frappe.cache().delete_keys("email_digest_gl_totals")
+
+		# the entries of period closing vouchers are left out of the income and expense of a period,
+		# and are not posted to bank, receivable or payable accounts
+		def get_gl_balance(accounts, from_date, to_date):
+			return flt(frappe.db.sql("""select sum(debit) - sum(credit) from `tabGL Entry`
+				where company = '_Test Company' and account in %s and posting_date <= %s
+					and posting_date >= %s and voucher_type != 'Period Closing Voucher'""",
+				(accounts, to_date, from_date or "1900-01-01"))[0][0])
+
+		def get_gl_count(accounts, from_date, to_date):
+			return frappe.db.sql("""select count(*) from `tabGL Entry`
+				where company = '_Test Company' and account in %s and posting_date between %s and %s
+					and voucher_type != 'Period Closing Voucher'""", (accounts, from_date, to_date))[0][0]
+
+		def get_accounts(filters):
+			return [d.name for d in frappe.get_all("Account",
+				filters=dict(filters, company="_Test Company", is_group=0))]
+
+		for root_type, card in (("Income", digest.get_income()), ("Expense", digest.get_expenses_booked())):
+			accounts = get_accounts({"root_type": root_type})
+			self.assertAlmostEqual(card["value"],
+				get_gl_balance(accounts, digest.future_from_date, digest.future_to_date), 2)
+			self.assertAlmostEqual(card["last_value"],
+				get_gl_balance(accounts, digest.past_from_date, digest.past_to_date), 2)
+			self.assertEqual(card["count"],
+				get_gl_count(accounts, digest.future_from_date, digest.future_to_date))
+
+		self.assertNotEqual(digest.get_income()["value"], 0)
+		self.assertNotEqual(digest.get_expenses_booked()["value"], 0)
+
+		bank_accounts = get_accounts({"account_type": "Bank", "root_type": "Asset"})
+		card = digest.get_bank_balance()
+		self.assertAlmostEqual(card["value"], get_gl_balance(bank_accounts, None, digest.future_to_date), 2)
+		self.assertAlmostEqual(card["last_value"], get_gl_balance(bank_accounts, None, digest.past_to_date), 2)
+
+		for fieldname, account_type, getter in (("invoiced_amount", "Receivable", digest.get_invoiced_amount),
+			("payables", "Payable", digest.get_payables)):
+			accounts = get_accounts({"account_type": account_type})
+			card = getter()
+			self.assertAlmostEqual(card["value"], get_gl_balance(accounts, None, digest.future_to_date), 2)
+			self.assertAlmostEqual(card["last_value"], get_gl_balance(accounts, None, digest.past_to_date), 2)
+
+			# the count of outstanding entries, as counted for each account before
+			count = sum([get_count_on(account, fieldname, digest.future_to_date) for account in accounts])
+			self.assertEqual(card["count"], count)
+			self.assertEqual(get_outstanding_count(accounts, fieldname, digest.future_to_date), count)
@@ -115,7 +115,7 @@ class Batch(Document):
 			frappe.throw(_("The selected item cannot have Batch"))
 
 	def calculate_batch_qty(self):
-		self.batch_qty = frappe.db.get_value("Stock Ledger Entry", {"docstatus": 1, "batch_no": self.batch_id}, "sum(actual_qty)")
+		self.batch_qty = frappe.db.get_value("Batch Balance", {"batch_no": self.batch_id}, "sum(actual_qty)")
 
 	def before_save(self):
 		has_expiry_date, shelf_life_in_days = frappe.db.get_value('Item', self.item, ['has_expiry_date', 'shelf_life_in_days'])
@@ -154,19 +154,19 @@ def get_batch_qty(batch_no=None, warehouse=None, item_code=None):
 	out = 0
 	if batch_no and warehouse:
 		out = float(frappe.db.sql("""select sum(actual_qty)
-			from `tabStock Ledger Entry`
+			from `tabBatch Balance`
 			where warehouse=%s and batch_no=%s""",
 			(warehouse, batch_no))[0][0] or 0)
 
 	if batch_no and not warehouse:
 		out = frappe.db.sql('''select warehouse, sum(actual_qty) as qty
-			from `tabStock Ledger Entry`
+			from `tabBatch Balance`
 			where batch_no=%s
 			group by warehouse''', batch_no, as_dict=1)
 
 	if not batch_no and item_code and warehouse:
 		out = frappe.db.sql('''select batch_no, sum(actual_qty) as qty
-			from `tabStock Ledger Entry`
+			from `tabBatch Balance`
 			where item_code = %s and warehouse=%s
 			group by batch_no''', (item_code, warehouse), as_dict=1)
 
@@ -176,10 +176,19 @@ def get_batch_qty(batch_no=None, warehouse=None, item_code=None):
 @frappe.whitelist()
 def get_batches_by_oldest(item_code, warehouse):
 	"""Returns the oldest batch and qty for the given item_code and warehouse"""
-	batches = get_batch_qty(item_code=item_code, warehouse=warehouse)
-	batches_dates = [[batch, frappe.get_value('Batch', batch.batch_no, 'expiry_date')] for batch in batches]
-	batches_dates.sort(key=lambda tup: tup[1])
-	return batches_dates
+	batches = frappe.db.sql("""
+		SELECT
+			bb.batch_no, bb.actual_qty AS qty, batch.expiry_date
+		FROM
+			`tabBatch Balance` AS bb
+				JOIN `tabBatch` AS batch ON (batch.name = bb.batch_no)
+		WHERE
+			bb.item_code = %s AND bb.warehouse = %s
+		ORDER BY
+			batch.expiry_date IS NULL, batch.expiry_date ASC
+		""", (item_code, warehouse), as_dict=1)
+
+	return [[frappe._dict(batch_no=d.batch_no, qty=d.qty), d.expiry_date] for d in batches]
 
 
 @frappe.whitelist()
@@ -281,21 +290,18 @@ def get_batches(item_code, warehouse, qty=1, serial_no=None, as_dict=True):
 	batches = frappe.db.sql("""
 		SELECT
 			batch.batch_id,
-			sum(sle.actual_qty) AS qty
+			bb.actual_qty AS qty
 		FROM
 			`tabBatch` AS batch
-				JOIN `tabStock Ledger Entry` AS sle ignore index (item_code, warehouse)
-					ON (batch.batch_id = sle.batch_no)
+				JOIN `tabBatch Balance` AS bb
+					ON (batch.batch_id = bb.batch_no)
 		WHERE
-			sle.item_code = %s
-				AND sle.warehouse = %s
+			bb.item_code = %s
+				AND bb.warehouse = %s
 				AND batch.disabled = 0
 				AND (batch.expiry_date >= CURDATE() or batch.expiry_date IS NULL)
 				{0}
-		GROUP BY
-			batch.batch_id
-		HAVING
-			sum(sle.actual_qty) >= %s
+				AND bb.actual_qty >= %s
 		ORDER BY
 			batch.expiry_date ASC,
 			batch.creation ASC
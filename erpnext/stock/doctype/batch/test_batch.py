@@ -175,6 +175,30 @@ class TestBatch(unittest.TestCase):
 
 		self.assertEqual(get_batch_qty('batch a', '_Test Warehouse - _TC'), 90)
 
+	def test_batch_balance_matches_stock_ledger(self):
+		'''Test the batch balance is updated on submit and cancel of stock transactions'''
+		from erpnext.stock.doctype.batch_balance.batch_balance import rebuild_batch_balance
+
+		receipt = self.test_purchase_receipt()
+		batch_no, warehouse = receipt.items[0].batch_no, receipt.items[0].warehouse
+
+		def get_ledger_qty():
+			return frappe.db.sql("""select sum(actual_qty) from `tabStock Ledger Entry`
+				where batch_no=%s and warehouse=%s""", (batch_no, warehouse))[0][0] or 0
+
+		self.assertEqual(get_batch_qty(batch_no, warehouse), get_ledger_qty())
+		self.assertEqual(frappe.db.get_value("Batch", batch_no, "batch_qty"), 100)
+
+		receipt.cancel()
+		self.assertEqual(get_batch_qty(batch_no, warehouse), 0)
+		self.assertEqual(get_ledger_qty(), 0)
+
+		# the cancelling entries are added to the same row
+		self.assertEqual(frappe.db.count("Batch Balance", {"batch_no": batch_no, "warehouse": warehouse}), 1)
+
+		rebuild_batch_balance(batch_no)
+		self.assertEqual(get_batch_qty(batch_no, warehouse), 0)
+
 	@classmethod
 	def make_new_batch_and_entry(cls, item_name, batch_name, warehouse):
 		'''Make a new stock entry for given target warehouse and batch name of item'''
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt, now
+from frappe.model.document import Document
+
+exclude_from_linked_with = True
+
+class BatchBalance(Document):
+	pass
+
+def update_batch_balance(args):
+	'''Called on submit of the Stock Ledger Entry, add its qty to the balance of the batch in the warehouse.
+
+	There is a unique key on the batch and warehouse, so concurrent entries add to the same row'''
+	if not args.get("batch_no") or not flt(args.get("actual_qty")):
+		return
+
+	timestamp, user = now(), frappe.session.user
+	frappe.db.sql("""
+		insert into `tabBatch Balance`
+			(name, creation, modified, modified_by, owner, docstatus, batch_no, item_code, warehouse, actual_qty)
+		values (%s, %s, %s, %s, %s, 0, %s, %s, %s, %s)
+		on duplicate key update actual_qty = actual_qty + values(actual_qty), modified = values(modified)
+	""", (frappe.generate_hash(length=10), timestamp, timestamp, user, user, args.get("batch_no"),
+		args.get("item_code"), args.get("warehouse"), flt(args.get("actual_qty"))))
+
+def rebuild_batch_balance(batch_no=None, item_code=None, warehouse=None):
+	'''Recompute the batch balances from the stock ledger'''
+	conditions, values = "", []
+	for fieldname, value in (("batch_no", batch_no), ("item_code", item_code), ("warehouse", warehouse)):
+		if value:
+			conditions += " and {0} = %s".format(fieldname)
+			values.append(value)
+
+	frappe.db.sql("delete from `tabBatch Balance` where 1=1 {0}".format(conditions), tuple(values))
+
+	for d in frappe.db.sql("""select batch_no, item_code, warehouse, sum(actual_qty) as actual_qty
+		from `tabStock Ledger Entry`
+		where ifnull(batch_no, '') != '' {0}
+		group by batch_no, item_code, warehouse""".format(conditions), tuple(values), as_dict=1):
+		frappe.get_doc(dict(d, doctype="Batch Balance")).db_insert()
+
+def on_doctype_update():
+	frappe.db.add_unique("Batch Balance", ["batch_no", "warehouse"])
+	frappe.db.add_index("Batch Balance", ["item_code", "warehouse"])
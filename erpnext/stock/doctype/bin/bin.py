@@ -68,21 +68,11 @@ class Bin(Document):
 	def update_reserved_qty_for_production(self):
 		'''Update qty reserved for production from Production Item tables
 			in open work orders'''
-		self.reserved_qty_for_production = frappe.db.sql('''
-			select sum(item.required_qty - item.transferred_qty)
-			from `tabWork Order` pro, `tabWork Order Item` item
-			where
-				item.item_code = %s
-				and item.parent = pro.name
-				and pro.docstatus = 1
-				and item.source_warehouse = %s
-				and pro.status not in ("Stopped", "Completed")
-				and item.required_qty > item.transferred_qty''', (self.item_code, self.warehouse))[0][0]
-
-		self.set_projected_qty()
+		from erpnext.stock.doctype.projected_qty_ledger_entry.projected_qty_ledger_entry import \
+			update_projected_qty_ledger_for_bin
 
-		self.db_set('reserved_qty_for_production', flt(self.reserved_qty_for_production))
-		self.db_set('projected_qty', self.projected_qty)
+		update_projected_qty_ledger_for_bin(self.item_code, self.warehouse, ["reserved_qty_for_production"])
+		self.load_from_db()
 
 	def update_reserved_qty_for_sub_contracting(self):
 		#reserved qty
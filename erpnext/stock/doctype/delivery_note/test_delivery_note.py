@@ -542,6 +542,36 @@ class TestDeliveryNote(unittest.TestCase):
 		self.assertEqual(dn.per_billed, 100)
 		self.assertEqual(dn.status, "Completed")
 
+	def test_delivery_status_against_multiple_sales_orders(self):
+		# SO1, SO2 -> DN
+		from erpnext.selling.doctype.sales_order.sales_order import make_delivery_note
+		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", 1)
+
+		so1 = make_sales_order(qty=10)
+		so2 = make_sales_order(qty=4)
+
+		dn = make_delivery_note(so1.name)
+		dn = make_delivery_note(so2.name, dn)
+		dn.get("items")[0].qty = 5
+		dn.submit()
+
+		so1.load_from_db()
+		so2.load_from_db()
+		self.assertEqual(so1.get("items")[0].delivered_qty, 5)
+		self.assertEqual(so1.per_delivered, 50)
+		self.assertEqual(so2.get("items")[0].delivered_qty, 4)
+		self.assertEqual(so2.per_delivered, 100)
+		self.assertEqual(so2.status, "To Bill")
+
+		dn.cancel()
+
+		so1.load_from_db()
+		so2.load_from_db()
+		self.assertEqual(so1.get("items")[0].delivered_qty, 0)
+		self.assertEqual(so1.per_delivered, 0)
+		self.assertEqual(so2.per_delivered, 0)
+		self.assertEqual(so2.status, "To Deliver and Bill")
+
 	def test_delivery_trip(self):
 		dn = create_delivery_note()
 		dt = make_delivery_trip(dn.name)
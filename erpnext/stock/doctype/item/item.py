@@ -642,6 +642,7 @@ class Item(WebsiteGenerator):
 
 	def recalculate_bin_qty(self, new_name):
 		from erpnext.stock.stock_balance import repost_stock
+		from erpnext.stock.doctype.batch_balance.batch_balance import rebuild_batch_balance
 		frappe.db.auto_commit_on_many_writes = 1
 		existing_allow_negative_stock = frappe.db.get_value("Stock Settings", None, "allow_negative_stock")
 		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", 1)
@@ -655,6 +656,8 @@ class Item(WebsiteGenerator):
 		for warehouse in repost_stock_for_warehouses:
 			repost_stock(new_name, warehouse)
 
+		rebuild_batch_balance(item_code=new_name)
+
 		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", existing_allow_negative_stock)
 		frappe.db.auto_commit_on_many_writes = 0
 
@@ -10,7 +10,7 @@ import frappe
 from frappe.utils import cstr, flt, getdate, new_line_sep, nowdate, add_days
 from frappe import msgprint, _
 from frappe.model.mapper import get_mapped_doc
-from erpnext.stock.stock_balance import update_bin_qty, get_indented_qty
+from erpnext.stock.doctype.projected_qty_ledger_entry.projected_qty_ledger_entry import update_projected_qty_ledger
 from erpnext.controllers.buying_controller import BuyingController
 from erpnext.manufacturing.doctype.work_order.work_order import get_item_details
 from erpnext.buying.utils import check_on_hold_or_closed_status, validate_for_items
@@ -185,17 +185,9 @@ class MaterialRequest(BuyingController):
 		}, update_modified)
 
 	def update_requested_qty(self, mr_item_rows=None):
-		"""update requested qty (before ordered_qty is updated)"""
-		item_wh_list = []
-		for d in self.get("items"):
-			if (not mr_item_rows or d.name in mr_item_rows) and [d.item_code, d.warehouse] not in item_wh_list \
-					and frappe.db.get_value("Item", d.item_code, "is_stock_item") == 1 and d.warehouse:
-				item_wh_list.append([d.item_code, d.warehouse])
-
-		for item_code, warehouse in item_wh_list:
-			update_bin_qty(item_code, warehouse, {
-				"indented_qty": get_indented_qty(item_code, warehouse)
-			})
+		"""update requested qty in the bins from the change in the pending qty of the request
+			(after ordered_qty is updated)"""
+		update_projected_qty_ledger(self.doctype, self.name, ["indented_qty"])
 
 	def update_requested_qty_in_production_plan(self):
 		production_plans = []
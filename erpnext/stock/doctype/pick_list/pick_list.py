@@ -186,24 +186,20 @@ def get_available_item_locations_for_serialized_item(item_code, from_warehouses,
 	return locations
 
 def get_available_item_locations_for_batched_item(item_code, from_warehouses, required_qty):
-	warehouse_condition = 'and warehouse in %(warehouses)s' if from_warehouses else ''
+	warehouse_condition = 'and bb.warehouse in %(warehouses)s' if from_warehouses else ''
 	batch_locations = frappe.db.sql("""
 		SELECT
-			sle.`warehouse`,
-			sle.`batch_no`,
-			SUM(sle.`actual_qty`) AS `qty`
+			bb.`warehouse`,
+			bb.`batch_no`,
+			bb.`actual_qty` AS `qty`
 		FROM
-			`tabStock Ledger Entry` sle, `tabBatch` batch
+			`tabBatch Balance` bb, `tabBatch` batch
 		WHERE
-			sle.batch_no = batch.name
-			and sle.`item_code`=%(item_code)s
+			bb.batch_no = batch.name
+			and bb.`item_code`=%(item_code)s
 			and IFNULL(batch.`expiry_date`, '2200-01-01') > %(today)s
+			and bb.`actual_qty` > 0
 			{warehouse_condition}
-		GROUP BY
-			`warehouse`,
-			`batch_no`,
-			`item_code`
-		HAVING `qty` > 0
 		ORDER BY IFNULL(batch.`expiry_date`, '2200-01-01'), batch.`creation`
 	""".format(warehouse_condition=warehouse_condition), { #nosec
 		'item_code': item_code,
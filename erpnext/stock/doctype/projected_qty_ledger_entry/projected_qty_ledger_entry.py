@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt, now
+from frappe.model.document import Document
+from six import iteritems
+
+exclude_from_linked_with = True
+
+# sign of the quantity in the projected qty of the bin
+projected_qty_fields = {
+	"reserved_qty": -1,
+	"ordered_qty": 1,
+	"indented_qty": 1,
+	"planned_qty": 1,
+	"reserved_qty_for_production": -1
+}
+
+# queries for the open quantity of each transaction row, as computed in
+# erpnext.stock.stock_balance, with the columns used to filter them
+open_qty_queries = {
+	"reserved_qty": [
+		("Sales Order", """
+			select so.name, so_item.name, so_item.item_code, so_item.warehouse,
+				so_item.stock_qty * (so_item.qty - so_item.delivered_qty) / so_item.qty
+			from `tabSales Order Item` so_item, `tabSales Order` so, `tabItem` item
+			where so_item.parent = so.name and so.docstatus = 1 and so.status != 'Closed'
+				and so_item.item_code = item.name and item.is_stock_item = 1
+				and ifnull(so_item.warehouse, '') != ''
+				and ifnull(so_item.delivered_by_supplier, 0) = 0
+				and so_item.qty >= so_item.delivered_qty {conditions}""",
+			{"voucher_no": "so.name", "item_code": "so_item.item_code", "warehouse": "so_item.warehouse"}),
+		("Sales Order", """
+			select so.name, dnpi.name, dnpi.item_code, dnpi.warehouse,
+				dnpi.qty * (so_item.qty - so_item.delivered_qty) / so_item.qty
+			from `tabPacked Item` dnpi, `tabSales Order Item` so_item, `tabSales Order` so, `tabItem` item
+			where dnpi.parenttype = 'Sales Order' and dnpi.parent = so.name
+				and dnpi.item_code = item.name and item.is_stock_item = 1
+				and so.docstatus = 1 and so.status != 'Closed'
+				and so_item.name = dnpi.parent_detail_docname and dnpi.item_code != dnpi.parent_item
+				and ifnull(dnpi.warehouse, '') != ''
+				and ifnull(so_item.delivered_by_supplier, 0) = 0
+				and so_item.qty >= so_item.delivered_qty {conditions}""",
+			{"voucher_no": "so.name", "item_code": "dnpi.item_code", "warehouse": "dnpi.warehouse"})
+	],
+	"ordered_qty": [
+		("Purchase Order", """
+			select po.name, po_item.name, po_item.item_code, po_item.warehouse,
+				(po_item.qty - po_item.received_qty) * po_item.conversion_factor
+			from `tabPurchase Order Item` po_item, `tabPurchase Order` po, `tabItem` item
+			where po_item.parent = po.name and po.docstatus = 1
+				and po.status not in ('Closed', 'Delivered')
+				and po_item.item_code = item.name and item.is_stock_item = 1
+				and ifnull(po_item.warehouse, '') != '' and po_item.delivered_by_supplier = 0
+				and po_item.qty > po_item.received_qty {conditions}""",
+			{"voucher_no": "po.name", "item_code": "po_item.item_code", "warehouse": "po_item.warehouse"})
+	],
+	"indented_qty": [
+		("Material Request", """
+			select mr.name, mr_item.name, mr_item.item_code, mr_item.warehouse,
+				(mr_item.qty - mr_item.ordered_qty) * mr_item.conversion_factor
+			from `tabMaterial Request Item` mr_item, `tabMaterial Request` mr, `tabItem` item
+			where mr_item.parent = mr.name and mr.docstatus = 1 and mr.status != 'Stopped'
+				and mr_item.item_code = item.name and item.is_stock_item = 1
+				and ifnull(mr_item.warehouse, '') != ''
+				and mr_item.qty > mr_item.ordered_qty {conditions}""",
+			{"voucher_no": "mr.name", "item_code": "mr_item.item_code", "warehouse": "mr_item.warehouse"})
+	],
+	"planned_qty": [
+		("Work Order", """
+			select pro.name, pro.name, pro.production_item, pro.fg_warehouse, pro.qty - pro.produced_qty
+			from `tabWork Order` pro, `tabItem` item
+			where pro.docstatus = 1 and pro.status not in ('Stopped', 'Completed')
+				and pro.production_item = item.name and item.is_stock_item = 1
+				and ifnull(pro.fg_warehouse, '') != ''
+				and pro.qty > pro.produced_qty {conditions}""",
+			{"voucher_no": "pro.name", "item_code": "pro.production_item", "warehouse": "pro.fg_warehouse"})
+	],
+	"reserved_qty_for_production": [
+		("Work Order", """
+			select pro.name, item.name, item.item_code, item.source_warehouse,
+				item.required_qty - item.transferred_qty
+			from `tabWork Order` pro, `tabWork Order Item` item, `tabItem` stock_item
+			where item.parent = pro.name and pro.docstatus = 1
+				and pro.status not in ('Stopped', 'Completed')
+				and item.item_code = stock_item.name and stock_item.is_stock_item = 1
+				and ifnull(item.source_warehouse, '') != ''
+				and item.required_qty > item.transferred_qty {conditions}""",
+			{"voucher_no": "pro.name", "item_code": "item.item_code", "warehouse": "item.source_warehouse"})
+	]
+}
+
+class ProjectedQtyLedgerEntry(Document):
+	pass
+
+def get_open_qty(qty_field, voucher_type=None, voucher_no=None, item_code=None, warehouse=None):
+	'''Returns the open quantity of each transaction row for the given qty field of the bin,
+		keyed by (voucher_type, voucher_no, voucher_detail_no, item_code, warehouse)'''
+	open_qty = {}
+	for query_voucher_type, query, columns in open_qty_queries[qty_field]:
+		if voucher_type and voucher_type != query_voucher_type:
+			continue
+
+		conditions, values = "", []
+		for key, value in (("voucher_no", voucher_no), ("item_code", item_code), ("warehouse", warehouse)):
+			if value:
+				conditions += " and {0} = %s".format(columns[key])
+				values.append(value)
+
+		for d in frappe.db.sql(query.format(conditions=conditions), tuple(values)):
+			if flt(d[4]):
+				key = (query_voucher_type,) + tuple(d[:4])
+				open_qty[key] = open_qty.get(key, 0) + flt(d[4])
+
+	return open_qty
+
+def update_projected_qty_ledger(voucher_type, voucher_no, qty_fields):
+	'''Post the change in the open quantities of the transaction since the last update
+		to the ledger and add it to the bins'''
+	lock_bins([key[3:] for qty_field in qty_fields
+		for key in list(get_open_qty(qty_field, voucher_type, voucher_no))
+			+ list(get_posted_qty(qty_field, voucher_type=voucher_type, voucher_no=voucher_no))])
+
+	for qty_field in qty_fields:
+		post_open_qty_changes(qty_field, get_open_qty(qty_field, voucher_type, voucher_no),
+			get_posted_qty(qty_field, voucher_type=voucher_type, voucher_no=voucher_no))
+
+def update_projected_qty_ledger_for_bin(item_code, warehouse, qty_fields):
+	'''Post the change in the open quantities of all the transactions of the item and warehouse
+		since the last update to the ledger and add it to the bin'''
+	lock_bins([(item_code, warehouse)])
+
+	for qty_field in qty_fields:
+		post_open_qty_changes(qty_field, get_open_qty(qty_field, item_code=item_code, warehouse=warehouse),
+			get_posted_qty(qty_field, item_code=item_code, warehouse=warehouse))
+
+def lock_bins(item_warehouses):
+	'''Lock the bins of the items and warehouses, so that concurrent updates of the ledger,
+		from a transaction or from a bin, do not post the same change twice.
+		The bins are locked in the same order every time, not to deadlock'''
+	from erpnext.stock.utils import get_bin
+
+	for item_code, warehouse in sorted(set(item_warehouses)):
+		frappe.db.sql("select name from `tabBin` where name=%s for update", get_bin(item_code, warehouse).name)
+
+def get_posted_qty(qty_field, voucher_type=None, voucher_no=None, item_code=None, warehouse=None):
+	'''Returns the quantity posted to the ledger for each transaction row, keyed as in `get_open_qty`'''
+	conditions, values = "", [qty_field]
+	for fieldname, value in (("voucher_type", voucher_type), ("voucher_no", voucher_no),
+		("item_code", item_code), ("warehouse", warehouse)):
+		if value:
+			conditions += " and {0} = %s".format(fieldname)
+			values.append(value)
+
+	posted_qty = {}
+	for d in frappe.db.sql("""select voucher_type, voucher_no, voucher_detail_no, item_code, warehouse, sum(qty)
+		from `tabProjected Qty Ledger Entry`
+		where qty_field=%s {0}
+		group by voucher_type, voucher_no, voucher_detail_no, item_code, warehouse""".format(conditions), #nosec
+		tuple(values)):
+		posted_qty[tuple(d[:5])] = flt(d[5])
+
+	return posted_qty
+
+def post_open_qty_changes(qty_field, open_qty, posted_qty):
+	entries, closed, bin_qty = [], [], {}
+	for key in set(open_qty) | set(posted_qty):
+		qty = flt(open_qty.get(key, 0) - posted_qty.get(key, 0), 9)
+		if key not in open_qty:
+			# the entries of rows that are no longer open are deleted instead of reversed,
+			# so that they do not keep links to cancelled transactions
+			closed.append(key)
+		elif qty:
+			entries.append(list(key) + [qty_field, qty])
+
+		if qty:
+			bin_qty[key[3:]] = bin_qty.get(key[3:], 0) + qty
+
+	make_projected_qty_ledger_entries(entries)
+	delete_projected_qty_ledger_entries(qty_field, closed)
+
+	for (item_code, warehouse), qty in iteritems(bin_qty):
+		update_bin_projected_qty(item_code, warehouse, qty_field, qty)
+
+def update_bin_projected_qty(item_code, warehouse, qty_field, qty):
+	from erpnext.stock.utils import get_bin
+
+	bin = get_bin(item_code, warehouse)
+	frappe.db.sql("""update `tabBin`
+		set {0} = ifnull({0}, 0) + %s, projected_qty = ifnull(projected_qty, 0) + %s, modified = %s
+		where name = %s""".format(qty_field),
+		(qty, projected_qty_fields[qty_field] * qty, now(), bin.name))
+	bin.clear_cache()
+
+def make_projected_qty_ledger_entries(entries):
+	fields = ["voucher_type", "voucher_no", "voucher_detail_no", "item_code", "warehouse", "qty_field", "qty"]
+
+	timestamp, user = now(), frappe.session.user
+	for i in range(0, len(entries), 500):
+		chunk = entries[i:i + 500]
+		frappe.db.sql("""
+			insert into `tabProjected Qty Ledger Entry`
+				(name, creation, modified, modified_by, owner, docstatus, {0})
+			values {1}
+		""".format(", ".join(fields),
+			", ".join(["(" + ", ".join(["%s"] * (len(fields) + 6)) + ")"] * len(chunk))),
+			tuple(v for row in chunk
+				for v in [frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0] + row))
+
+def delete_projected_qty_ledger_entries(qty_field, keys):
+	for key in keys:
+		frappe.db.sql("""delete from `tabProjected Qty Ledger Entry`
+			where voucher_type=%s and voucher_no=%s and voucher_detail_no=%s
+				and item_code=%s and warehouse=%s and qty_field=%s""", tuple(key) + (qty_field,))
+
+def rebuild_projected_qty_ledger(item_code=None, warehouse=None, qty_fields=None):
+	'''Replace the ledger entries with the current open quantities of the transactions.
+		Does not update the bins'''
+	for qty_field in (qty_fields or projected_qty_fields):
+		conditions, values = "", [qty_field]
+		for fieldname, value in (("item_code", item_code), ("warehouse", warehouse)):
+			if value:
+				conditions += " and {0} = %s".format(fieldname)
+				values.append(value)
+
+		frappe.db.sql("""delete from `tabProjected Qty Ledger Entry`
+			where qty_field = %s {0}""".format(conditions), tuple(values))
+
+		make_projected_qty_ledger_entries([list(key) + [qty_field, qty] for key, qty
+			in iteritems(get_open_qty(qty_field, item_code=item_code, warehouse=warehouse))])
+
+def get_projected_qty_from_ledger(item_code, warehouse):
+	qty = frappe._dict({qty_field: 0.0 for qty_field in projected_qty_fields})
+	for qty_field, value in frappe.db.sql("""select qty_field, sum(qty)
+		from `tabProjected Qty Ledger Entry`
+		where item_code=%s and warehouse=%s group by qty_field""", (item_code, warehouse)):
+		qty[qty_field] = flt(value)
+
+	return qty
+
+def on_doctype_update():
+	frappe.db.add_index("Projected Qty Ledger Entry", ["voucher_type", "voucher_no", "qty_field"])
+	frappe.db.add_index("Projected Qty Ledger Entry", ["item_code", "warehouse"])
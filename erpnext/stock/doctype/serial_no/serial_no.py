@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 import frappe
 
 from frappe.model.naming import make_autoname
-from frappe.utils import cint, cstr, flt, add_days, nowdate, getdate
+from frappe.utils import cint, cstr, flt, add_days, nowdate, getdate, now
 from erpnext.stock.get_item_details import get_reserved_qty_for_so
 
 from frappe import _, ValidationError
@@ -85,9 +85,8 @@ class SerialNo(StockController):
 			self.purchase_time = purchase_sle.posting_time
 			self.purchase_rate = purchase_sle.incoming_rate
 			if purchase_sle.voucher_type in ("Purchase Receipt", "Purchase Invoice"):
-				self.supplier, self.supplier_name = \
-					frappe.db.get_value(purchase_sle.voucher_type, purchase_sle.voucher_no,
-						["supplier", "supplier_name"])
+				self.supplier, self.supplier_name = get_voucher_party(purchase_sle.voucher_type,
+					purchase_sle.voucher_no, ("supplier", "supplier_name"))
 
 			# If sales return entry
 			if self.purchase_document_type == 'Delivery Note':
@@ -104,9 +103,8 @@ class SerialNo(StockController):
 			self.delivery_date = delivery_sle.posting_date
 			self.delivery_time = delivery_sle.posting_time
 			if delivery_sle.voucher_type  in ("Delivery Note", "Sales Invoice"):
-				self.customer, self.customer_name = \
-					frappe.db.get_value(delivery_sle.voucher_type, delivery_sle.voucher_no,
-						["customer", "customer_name"])
+				self.customer, self.customer_name = get_voucher_party(delivery_sle.voucher_type,
+					delivery_sle.voucher_no, ("customer", "customer_name"))
 			if self.warranty_period:
 				self.warranty_expiry_date	= add_days(cstr(delivery_sle.posting_date),
 					cint(self.warranty_period))
@@ -116,9 +114,10 @@ class SerialNo(StockController):
 				"warranty_expiry_date"):
 					self.set(fieldname, None)
 
-	def get_last_sle(self, serial_no=None):
+	def get_last_sle(self, serial_no=None, sle_dict=None):
 		entries = {}
-		sle_dict = self.get_stock_ledger_entries(serial_no)
+		if sle_dict is None:
+			sle_dict = self.get_stock_ledger_entries(serial_no)
 		if sle_dict:
 			if sle_dict.get("incoming", []):
 				entries["purchase_sle"] = sle_dict["incoming"][0]
@@ -192,8 +191,8 @@ class SerialNo(StockController):
 					where name=%s""" % (dt[0], '%s', '%s'),
 					('\n'.join(list(serial_nos)), item[0]))
 
-	def update_serial_no_reference(self, serial_no=None):
-		last_sle = self.get_last_sle(serial_no)
+	def update_serial_no_reference(self, serial_no=None, sle_dict=None):
+		last_sle = self.get_last_sle(serial_no, sle_dict)
 		self.set_purchase_details(last_sle.get("purchase_sle"))
 		self.set_sales_details(last_sle.get("delivery_sle"))
 		self.set_maintenance_status()
@@ -222,12 +221,15 @@ def validate_serial_no(sle, item_det):
 			if len(serial_nos) != len(set(serial_nos)):
 				frappe.throw(_("Duplicate Serial No entered for Item {0}").format(sle.item_code), SerialNoDuplicateError)
 
-			for serial_no in serial_nos:
-				if frappe.db.exists("Serial No", serial_no):
-					sr = frappe.get_doc("Serial No", serial_no)
+			serial_no_details = get_serial_no_details(serial_nos)
+			# lookups on the voucher, made once for all the serial nos of the entry
+			voucher_details = frappe._dict()
 
+			for serial_no in serial_nos:
+				sr = serial_no_details.get(serial_no)
+				if sr:
 					if sr.item_code!=sle.item_code:
-						if not allow_serial_nos_with_different_item(serial_no, sle):
+						if not allow_serial_nos_with_different_item(serial_no, sle, voucher_details):
 							frappe.throw(_("Serial No {0} does not belong to Item {1}").format(serial_no,
 								sle.item_code), SerialNoItemError)
 
@@ -237,7 +239,10 @@ def validate_serial_no(sle, item_det):
 
 					if (sr.delivery_document_no and sle.voucher_type not in ['Stock Entry', 'Stock Reconciliation']
 						and sle.voucher_type == sr.delivery_document_type):
-						return_against = frappe.db.get_value(sle.voucher_type, sle.voucher_no, 'return_against')
+						if "return_against" not in voucher_details:
+							voucher_details.return_against = frappe.db.get_value(sle.voucher_type,
+								sle.voucher_no, 'return_against')
+						return_against = voucher_details.return_against
 						if return_against and return_against != sr.delivery_document_no:
 							frappe.throw(_("Serial no {0} has been already returned").format(sr.name))
 
@@ -257,41 +262,18 @@ def validate_serial_no(sle, item_det):
 									.format(serial_no), SerialNoWarehouseError)
 
 							# if Sales Order reference in Serial No validate the Delivery Note or Invoice is against the same
-							if sr.sales_order:
+							if sr.sales_order and not is_delivered_against_sales_order(sr.sales_order, sle, voucher_details):
 								if sle.voucher_type == "Sales Invoice":
-									if not frappe.db.exists("Sales Invoice Item", {"parent": sle.voucher_no,
-										"item_code": sle.item_code, "sales_order": sr.sales_order}):
-										frappe.throw(_("Cannot deliver Serial No {0} of item {1} as it is reserved \
+									frappe.throw(_("Cannot deliver Serial No {0} of item {1} as it is reserved \
 											to fullfill Sales Order {2}").format(sr.name, sle.item_code, sr.sales_order))
-								elif sle.voucher_type == "Delivery Note":
-									if not frappe.db.exists("Delivery Note Item", {"parent": sle.voucher_no,
-										"item_code": sle.item_code, "against_sales_order": sr.sales_order}):
-										invoice = frappe.db.get_value("Delivery Note Item", {"parent": sle.voucher_no,
-											"item_code": sle.item_code}, "against_sales_invoice")
-										if not invoice or frappe.db.exists("Sales Invoice Item",
-											{"parent": invoice, "item_code": sle.item_code,
-											"sales_order": sr.sales_order}):
-											frappe.throw(_("Cannot deliver Serial No {0} of item {1} as it is reserved to \
+								else:
+									frappe.throw(_("Cannot deliver Serial No {0} of item {1} as it is reserved to \
 												fullfill Sales Order {2}").format(sr.name, sle.item_code, sr.sales_order))
+
 							# if Sales Order reference in Delivery Note or Invoice validate SO reservations for item
-							if sle.voucher_type == "Sales Invoice":
-								sales_order = frappe.db.get_value("Sales Invoice Item", {"parent": sle.voucher_no,
-									"item_code": sle.item_code}, "sales_order")
-								if sales_order and get_reserved_qty_for_so(sales_order, sle.item_code):
-									validate_so_serial_no(sr, sales_order)
-							elif sle.voucher_type == "Delivery Note":
-								sales_order = frappe.get_value("Delivery Note Item", {"parent": sle.voucher_no,
-									"item_code": sle.item_code}, "against_sales_order")
-								if sales_order and get_reserved_qty_for_so(sales_order, sle.item_code):
-									validate_so_serial_no(sr, sales_order)
-								else:
-									sales_invoice = frappe.get_value("Delivery Note Item", {"parent": sle.voucher_no,
-										"item_code": sle.item_code}, "against_sales_invoice")
-									if sales_invoice:
-										sales_order = frappe.db.get_value("Sales Invoice Item", {
-											"parent": sales_invoice, "item_code": sle.item_code}, "sales_order")
-										if sales_order and get_reserved_qty_for_so(sales_order, sle.item_code):
-											validate_so_serial_no(sr, sales_order)
+							sales_order = get_reserved_sales_order(sle, voucher_details)
+							if sales_order:
+								validate_so_serial_no(sr, sales_order)
 				elif cint(sle.actual_qty) < 0:
 					# transfer out
 					frappe.throw(_("Serial No {0} not in stock").format(serial_no), SerialNoNotExistsError)
@@ -299,12 +281,78 @@ def validate_serial_no(sle, item_det):
 			frappe.throw(_("Serial Nos Required for Serialized Item {0}").format(sle.item_code),
 				SerialNoRequiredError)
 	elif serial_nos:
+		serial_no_details = get_serial_no_details(serial_nos)
 		for serial_no in serial_nos:
-			sr = frappe.db.get_value("Serial No", serial_no, ["name", "warehouse"], as_dict=1)
+			sr = serial_no_details.get(serial_no)
 			if sr and cint(sle.actual_qty) < 0 and sr.warehouse != sle.warehouse:
 				frappe.throw(_("Cannot cancel {0} {1} because Serial No {2} does not belong to the warehouse {3}")
 					.format(sle.voucher_type, sle.voucher_no, serial_no, sle.warehouse))
 
+def get_serial_no_details(serial_nos):
+	"""Returns the Serial No records of the given serial nos, keyed by the serial no in upper case"""
+	serial_no_details = {}
+	if not serial_nos:
+		return serial_no_details
+
+	for d in frappe.db.sql("""select name, item_code, warehouse, batch_no, company, sales_order,
+			purchase_document_no, delivery_document_type, delivery_document_no
+		from `tabSerial No` where name in ({0})""".format(", ".join(["%s"] * len(serial_nos))),
+		tuple(serial_nos), as_dict=1):
+		serial_no_details[d.name.upper()] = d
+
+	return serial_no_details
+
+def is_delivered_against_sales_order(sales_order, sle, voucher_details):
+	"""Check if the Delivery Note or Sales Invoice of the entry is made against the Sales Order
+		for which the serial no is reserved"""
+	delivered_against = voucher_details.setdefault("delivered_against", {})
+	if sales_order in delivered_against:
+		return delivered_against[sales_order]
+
+	if sle.voucher_type == "Sales Invoice":
+		allowed = frappe.db.exists("Sales Invoice Item", {"parent": sle.voucher_no,
+			"item_code": sle.item_code, "sales_order": sales_order})
+	else:
+		allowed = frappe.db.exists("Delivery Note Item", {"parent": sle.voucher_no,
+			"item_code": sle.item_code, "against_sales_order": sales_order})
+		if not allowed:
+			invoice = frappe.db.get_value("Delivery Note Item", {"parent": sle.voucher_no,
+				"item_code": sle.item_code}, "against_sales_invoice")
+			allowed = invoice and not frappe.db.exists("Sales Invoice Item",
+				{"parent": invoice, "item_code": sle.item_code, "sales_order": sales_order})
+
+	delivered_against[sales_order] = True if allowed else False
+	return delivered_against[sales_order]
+
+def get_reserved_sales_order(sle, voucher_details):
+	"""Returns the Sales Order referred in the Delivery Note or Sales Invoice of the entry,
+		if it has a reservation for the item"""
+	if "reserved_sales_order" in voucher_details:
+		return voucher_details.reserved_sales_order
+
+	reserved_sales_order = None
+	if sle.voucher_type == "Sales Invoice":
+		sales_order = frappe.db.get_value("Sales Invoice Item", {"parent": sle.voucher_no,
+			"item_code": sle.item_code}, "sales_order")
+		if sales_order and get_reserved_qty_for_so(sales_order, sle.item_code):
+			reserved_sales_order = sales_order
+	elif sle.voucher_type == "Delivery Note":
+		sales_order = frappe.get_value("Delivery Note Item", {"parent": sle.voucher_no,
+			"item_code": sle.item_code}, "against_sales_order")
+		if sales_order and get_reserved_qty_for_so(sales_order, sle.item_code):
+			reserved_sales_order = sales_order
+		else:
+			sales_invoice = frappe.get_value("Delivery Note Item", {"parent": sle.voucher_no,
+				"item_code": sle.item_code}, "against_sales_invoice")
+			if sales_invoice:
+				sales_order = frappe.db.get_value("Sales Invoice Item", {
+					"parent": sales_invoice, "item_code": sle.item_code}, "sales_order")
+				if sales_order and get_reserved_qty_for_so(sales_order, sle.item_code):
+					reserved_sales_order = sales_order
+
+	voucher_details.reserved_sales_order = reserved_sales_order
+	return reserved_sales_order
+
 def validate_so_serial_no(sr, sales_order,):
 	if not sr.sales_order or sr.sales_order!= sales_order:
 		frappe.throw(_("""Sales Order {0} has reservation for item {1}, you can
@@ -330,22 +378,26 @@ def has_duplicate_serial_no(sn, sle):
 
 	return status
 
-def allow_serial_nos_with_different_item(sle_serial_no, sle):
+def allow_serial_nos_with_different_item(sle_serial_no, sle, voucher_details=None):
 	"""
 		Allows same serial nos for raw materials and finished goods
 		in Manufacture / Repack type Stock Entry
 	"""
-	allow_serial_nos = False
-	if sle.voucher_type=="Stock Entry" and cint(sle.actual_qty) > 0:
-		stock_entry = frappe.get_doc("Stock Entry", sle.voucher_no)
-		if stock_entry.purpose in ("Repack", "Manufacture"):
-			for d in stock_entry.get("items"):
-				if d.serial_no and (d.s_warehouse if sle.is_cancelled=="No" else d.t_warehouse):
-					serial_nos = get_serial_nos(d.serial_no)
-					if sle_serial_no in serial_nos:
-						allow_serial_nos = True
-
-	return allow_serial_nos
+	if voucher_details is None:
+		voucher_details = frappe._dict()
+
+	if "consumed_serial_nos" not in voucher_details:
+		consumed_serial_nos = set()
+		if sle.voucher_type=="Stock Entry" and cint(sle.actual_qty) > 0:
+			stock_entry = frappe.get_doc("Stock Entry", sle.voucher_no)
+			if stock_entry.purpose in ("Repack", "Manufacture"):
+				for d in stock_entry.get("items"):
+					if d.serial_no and (d.s_warehouse if sle.is_cancelled=="No" else d.t_warehouse):
+						consumed_serial_nos.update(get_serial_nos(d.serial_no))
+
+		voucher_details.consumed_serial_nos = consumed_serial_nos
+
+	return sle_serial_no in voucher_details.consumed_serial_nos
 
 def update_serial_nos(sle, item_det):
 	if sle.is_cancelled == "No" and not sle.serial_no and cint(sle.actual_qty) > 0 \
@@ -364,25 +416,28 @@ def get_auto_serial_nos(serial_no_series, qty):
 	return "\n".join(serial_nos)
 
 def auto_make_serial_nos(args):
+	"""Create or update the serial nos of a stock ledger entry.
+
+	The serial nos, their ledger entries and the party of the vouchers are loaded
+	in bulk and the serial nos are written with multi row statements."""
 	serial_nos = get_serial_nos(args.get('serial_no'))
-	created_numbers = []
-	for serial_no in serial_nos:
-		if frappe.db.exists("Serial No", serial_no):
-			sr = frappe.get_doc("Serial No", serial_no)
-			sr.via_stock_ledger = True
-			sr.item_code = args.get('item_code')
-			sr.warehouse = args.get('warehouse') if args.get('actual_qty', 0) > 0 else None
-			sr.batch_no = args.get('batch_no')
-			sr.location = args.get('location')
-			sr.company = args.get('company')
-			sr.supplier = args.get('supplier')
-			if sr.sales_order and args.get('voucher_type') == "Stock Entry" \
-				and not args.get('actual_qty', 0) > 0:
-				sr.sales_order = None
-			sr.update_serial_no_reference()
-			sr.save(ignore_permissions=True)
-		elif args.get('actual_qty', 0) > 0:
-			created_numbers.append(make_serial_no(serial_no, args))
+	existing_serial_nos = frappe.db.sql_list("""select name from `tabSerial No`
+		where name in ({0})""".format(", ".join(["%s"] * len(serial_nos))), tuple(serial_nos)) if serial_nos else []
+	existing_serial_nos = {d.upper(): d for d in existing_serial_nos}
+
+	ledger_entries = get_serial_no_ledger_entries(args.get('item_code'), args.get('company'), serial_nos)
+	frappe.flags.serial_no_voucher_parties = {}
+
+	try:
+		update_serial_nos_from_ledger([existing_serial_nos[d] for d in serial_nos if d in existing_serial_nos],
+			args, ledger_entries)
+
+		created_numbers = []
+		if args.get('actual_qty', 0) > 0:
+			created_numbers = make_serial_nos([d for d in serial_nos if d not in existing_serial_nos],
+				args, ledger_entries)
+	finally:
+		frappe.flags.serial_no_voucher_parties = None
 
 	form_links = list(map(lambda d: frappe.utils.get_link_to_form('Serial No', d), created_numbers))
 	if len(form_links) == 1:
@@ -390,6 +445,124 @@ def auto_make_serial_nos(args):
 	elif len(form_links) > 0:
 		frappe.msgprint(_("The following serial numbers were created: <br> {0}").format(', '.join(form_links)))
 
+serial_no_update_fields = ("item_code", "warehouse", "batch_no", "location", "company", "supplier",
+	"supplier_name", "sales_order", "purchase_document_type", "purchase_document_no", "purchase_date",
+	"purchase_time", "purchase_rate", "delivery_document_type", "delivery_document_no", "delivery_date",
+	"delivery_time", "customer", "customer_name", "sales_invoice", "warranty_expiry_date",
+	"maintenance_status", "item_group", "description", "item_name", "brand", "warranty_period")
+
+def update_serial_nos_from_ledger(serial_nos, args, ledger_entries):
+	"""Set the item, warehouse and purchase and delivery details of existing serial nos.
+		Serial nos getting the same values are updated together."""
+	if not serial_nos:
+		return
+
+	serial_no_docs = frappe.db.sql("""select * from `tabSerial No`
+		where name in ({0})""".format(", ".join(["%s"] * len(serial_nos))), tuple(serial_nos), as_dict=1)
+
+	serial_nos_by_values = {}
+	for d in serial_no_docs:
+		sr = frappe.get_doc(dict(d, doctype="Serial No"))
+		sr.via_stock_ledger = True
+		sr.item_code = args.get('item_code')
+		sr.warehouse = args.get('warehouse') if args.get('actual_qty', 0) > 0 else None
+		sr.batch_no = args.get('batch_no')
+		sr.location = args.get('location')
+		sr.company = args.get('company')
+		sr.supplier = args.get('supplier')
+		if sr.sales_order and args.get('voucher_type') == "Stock Entry" \
+			and not args.get('actual_qty', 0) > 0:
+			sr.sales_order = None
+		sr.update_serial_no_reference(sle_dict=ledger_entries.get(sr.name.upper(), {}))
+		sr.validate_item()
+
+		values = tuple(sr.get(fieldname) for fieldname in serial_no_update_fields)
+		serial_nos_by_values.setdefault(values, []).append(sr.name)
+
+	modified, modified_by = now(), frappe.session.user
+	for values, names in serial_nos_by_values.items():
+		frappe.db.sql("""update `tabSerial No` set {0}, modified=%s, modified_by=%s
+			where name in ({1})""".format(", ".join("{0}=%s".format(f) for f in serial_no_update_fields),
+			", ".join(["%s"] * len(names))), values + (modified, modified_by) + tuple(names))
+
+def make_serial_nos(serial_nos, args, ledger_entries):
+	"""Insert new serial nos with a multi row insert, returns the created serial nos"""
+	if not serial_nos:
+		return []
+
+	timestamp, user = now(), frappe.session.user
+	columns, values = None, []
+	for serial_no in serial_nos:
+		sr = frappe.new_doc("Serial No")
+		sr.name = sr.serial_no = serial_no
+		sr.item_code = args.get('item_code')
+		sr.company = args.get('company')
+		sr.batch_no = args.get('batch_no')
+		sr.via_stock_ledger = args.get('via_stock_ledger') or True
+		sr.warehouse = args.get('warehouse')
+		sr.creation = sr.modified = timestamp
+		sr.owner = sr.modified_by = user
+
+		sr.validate_item()
+		sr.update_serial_no_reference(serial_no, ledger_entries.get(serial_no, {}))
+
+		d = sr.get_valid_dict()
+		if not columns:
+			columns = list(d)
+		values.append([d.get(column) for column in columns])
+
+	for i in range(0, len(values), 500):
+		chunk = values[i:i + 500]
+		frappe.db.sql("""insert into `tabSerial No` ({0}) values {1}""".format(
+			", ".join("`{0}`".format(column) for column in columns),
+			", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(chunk))),
+			tuple(v for row in chunk for v in row))
+
+	return serial_nos
+
+def get_serial_no_ledger_entries(item_code, company, serial_nos, chunk_size=100):
+	"""Returns the incoming and outgoing ledger entries of the given serial nos, latest first,
+		in the format of `SerialNo.get_stock_ledger_entries`"""
+	ledger_entries = {}
+	for i in range(0, len(serial_nos), chunk_size):
+		chunk = serial_nos[i:i + chunk_size]
+		conditions, values = [], [item_code, company]
+		for serial_no in chunk:
+			conditions.append("serial_no = %s OR serial_no like %s OR serial_no like %s OR serial_no like %s")
+			values.extend([serial_no, serial_no+'\n%', '%\n'+serial_no, '%\n'+serial_no+'\n%'])
+
+		chunk = set(d.upper() for d in chunk)
+		for sle in frappe.db.sql("""
+			SELECT voucher_type, voucher_no,
+				posting_date, posting_time, incoming_rate, actual_qty, serial_no
+			FROM
+				`tabStock Ledger Entry`
+			WHERE
+				item_code=%s AND company = %s AND ifnull(is_cancelled, 'No')='No'
+				AND ({0})
+			ORDER BY
+				posting_date desc, posting_time desc, creation desc""".format(" OR ".join(conditions)),
+			tuple(values), as_dict=1):
+			for serial_no in get_serial_nos(sle.serial_no):
+				if serial_no in chunk:
+					ledger_entries.setdefault(serial_no, {}).setdefault(
+						"incoming" if cint(sle.actual_qty) > 0 else "outgoing", []).append(sle)
+
+	return ledger_entries
+
+def get_voucher_party(voucher_type, voucher_no, fields):
+	"""Party of the voucher, cached while the serial nos of a ledger entry are updated"""
+	voucher_parties = frappe.flags.serial_no_voucher_parties
+	key = (voucher_type, voucher_no)
+	if voucher_parties is not None and key in voucher_parties:
+		return voucher_parties[key]
+
+	party = frappe.db.get_value(voucher_type, voucher_no, fields) or (None, None)
+	if voucher_parties is not None:
+		voucher_parties[key] = party
+
+	return party
+
 def get_item_details(item_code):
 	return frappe.db.sql("""select name, has_batch_no, docstatus,
 		is_stock_item, has_serial_no, serial_no_series
@@ -399,21 +572,6 @@ def get_serial_nos(serial_no):
 	return [s.strip() for s in cstr(serial_no).strip().upper().replace(',', '\n').split('\n')
 		if s.strip()]
 
-def make_serial_no(serial_no, args):
-	sr = frappe.new_doc("Serial No")
-	sr.serial_no = serial_no
-	sr.item_code = args.get('item_code')
-	sr.company = args.get('company')
-	sr.batch_no = args.get('batch_no')
-	sr.via_stock_ledger = args.get('via_stock_ledger') or True
-	sr.warehouse = args.get('warehouse')
-
-	sr.validate_item()
-	sr.update_serial_no_reference(serial_no)
-	sr.db_insert()
-
-	return sr.name
-
 def update_serial_nos_after_submit(controller, parentfield):
 	stock_ledger_entries = frappe.db.sql("""select voucher_detail_no, serial_no, actual_qty, warehouse
 		from `tabStock Ledger Entry` where voucher_type=%s and voucher_no=%s""",
@@ -54,5 +54,31 @@ class TestSerialNo(unittest.TestCase):
 		self.assertEqual(serial_no.warehouse, wh)
 		self.assertEqual(serial_no.company, "_Test Company 1")
 
+	def test_serial_no_purchase_and_delivery_details(self):
+		serial_nos = ["_TCSER-BULK-{0}".format(i) for i in range(5)]
+		for serial_no in serial_nos:
+			frappe.delete_doc_if_exists("Serial No", serial_no)
+
+		pr = make_purchase_receipt(item_code="_Test Serialized Item", qty=5, serial_no="\n".join(serial_nos))
+		for serial_no in serial_nos:
+			sr = frappe.db.get_value("Serial No", serial_no,
+				["warehouse", "purchase_document_no", "supplier", "delivery_document_no"], as_dict=1)
+			self.assertEqual(sr.warehouse, pr.items[0].warehouse)
+			self.assertEqual(sr.purchase_document_no, pr.name)
+			self.assertEqual(sr.supplier, pr.supplier)
+			self.assertFalse(sr.delivery_document_no)
+
+		dn = create_delivery_note(item_code="_Test Serialized Item", qty=5, serial_no="\n".join(serial_nos))
+		for serial_no in serial_nos:
+			sr = frappe.db.get_value("Serial No", serial_no,
+				["warehouse", "purchase_document_no", "delivery_document_no", "customer"], as_dict=1)
+			self.assertFalse(sr.warehouse)
+			self.assertEqual(sr.purchase_document_no, pr.name)
+			self.assertEqual(sr.delivery_document_no, dn.name)
+			self.assertEqual(sr.customer, dn.customer)
+
+		self.assertRaises(SerialNoWarehouseError, create_delivery_note,
+			item_code="_Test Serialized Item", qty=1, serial_no=serial_nos[0])
+
 	def tearDown(self):
 		frappe.db.rollback()
\ No newline at end of file
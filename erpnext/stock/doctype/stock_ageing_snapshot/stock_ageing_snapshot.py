@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe, json
+from frappe.utils import cstr, flt, getdate, nowdate, now, add_days, add_months, get_last_day
+from frappe.model.document import Document
+from six import iteritems
+from collections import deque
+
+exclude_from_linked_with = True
+
+snapshot_fields = ("company", "posting_date", "warehouse_wise", "entry_type", "item_code", "warehouse",
+	"voucher_no", "qty_after_transaction", "total_qty", "fifo_queue", "serial_nos")
+
+# serial nos stored in a row of purchase dates
+serial_nos_per_row = 1000
+
+class StockAgeingSnapshot(Document):
+	pass
+
+def load_stock_ageing_snapshot(filters, item_details, state):
+	'''Load the FIFO queues of the latest snapshot on or before the `to_date` of the filters
+		into `item_details` and `state`, returns the date of the snapshot'''
+	from erpnext.stock.report.stock_ageing.stock_ageing import get_new_item_dict, get_item_conditions
+
+	warehouse_wise = 1 if filters.get("show_warehouse_wise_stock") else 0
+	posting_date = frappe.db.sql("""select max(posting_date) from `tabStock Ageing Snapshot`
+		where company=%s and warehouse_wise=%s and posting_date<=%s""",
+		(filters.get("company"), warehouse_wise, filters.get("to_date")))[0][0]
+
+	if not posting_date:
+		return
+
+	values = dict(filters, posting_date=posting_date, warehouse_wise=warehouse_wise)
+	for d in frappe.db.sql("""select entry_type, item_code, voucher_no, fifo_queue, serial_nos
+		from `tabStock Ageing Snapshot`
+		where company = %(company)s and posting_date = %(posting_date)s
+			and warehouse_wise = %(warehouse_wise)s
+			and entry_type in ('Serial No Purchase Dates', 'Transferred Batches')""", values, as_dict=1):
+		if d.entry_type == "Serial No Purchase Dates":
+			for serial_no, purchase_date in json.loads(d.serial_nos or "[]"):
+				state.serial_no_batch_purchase_details[serial_no] = getdate(purchase_date)
+		else:
+			state.transferred_item_details[(d.voucher_no, d.item_code)] = deque(
+				[qty, getdate(batch_date) if batch_date else None]
+				for qty, batch_date in json.loads(d.fifo_queue or "[]"))
+
+	for d in frappe.db.sql("""select
+			item.name, item.item_name, item.item_group, item.brand, item.description, item.stock_uom,
+			snapshot.warehouse, snapshot.qty_after_transaction, snapshot.total_qty,
+			snapshot.fifo_queue, snapshot.serial_nos
+		from `tabStock Ageing Snapshot` snapshot,
+			(select name, item_name, description, stock_uom, brand, item_group
+				from `tabItem` {item_conditions}) item
+		where snapshot.item_code = item.name and snapshot.company = %(company)s
+			and snapshot.posting_date = %(posting_date)s and snapshot.warehouse_wise = %(warehouse_wise)s
+			and snapshot.entry_type = 'Item'""" #nosec
+		.format(item_conditions=get_item_conditions(filters)), values, as_dict=1):
+		key = (d.name, d.warehouse) if warehouse_wise else d.name
+
+		item_dict = get_new_item_dict(frappe._dict({
+			"name": d.name,
+			"item_name": d.item_name,
+			"description": d.description,
+			"item_group": d.item_group,
+			"brand": d.brand,
+			"stock_uom": d.stock_uom,
+			"warehouse": d.warehouse
+		}))
+
+		for qty, batch_date in json.loads(d.fifo_queue or "[]"):
+			item_dict["fifo_queue"].append([qty, getdate(batch_date) if batch_date else None])
+
+		for serial_no, batch_date in json.loads(d.serial_nos or "[]"):
+			item_dict["serial_nos"][serial_no] = [serial_no, getdate(batch_date)]
+
+		item_dict["qty_after_transaction"] = d.qty_after_transaction
+		item_dict["total_qty"] = d.total_qty
+		item_details[key] = item_dict
+
+	return posting_date
+
+def save_stock_ageing_snapshot(company, posting_date, warehouse_wise, item_details, state):
+	frappe.db.sql("""delete from `tabStock Ageing Snapshot`
+		where company=%s and posting_date=%s and warehouse_wise=%s""", (company, posting_date, warehouse_wise))
+
+	rows = []
+	for key, item_dict in iteritems(item_details):
+		if not (item_dict["fifo_queue"] or item_dict["serial_nos"]
+			or flt(item_dict.get("qty_after_transaction")) or flt(item_dict.get("total_qty"))):
+			continue
+
+		item_code, warehouse = key if warehouse_wise else (key, None)
+		rows.append([company, posting_date, warehouse_wise, "Item", item_code, warehouse, None,
+			flt(item_dict.get("qty_after_transaction")), flt(item_dict.get("total_qty")),
+			json.dumps(list(item_dict["fifo_queue"]), default=cstr),
+			json.dumps(list(item_dict["serial_nos"].values()), default=cstr)])
+
+	# batches moved out by a voucher that has not moved them in yet
+	for (voucher_no, item_code), transferred in iteritems(state.transferred_item_details):
+		if transferred:
+			rows.append([company, posting_date, warehouse_wise, "Transferred Batches", item_code, None,
+				voucher_no, 0, 0, json.dumps(list(transferred), default=cstr), None])
+
+	serial_nos = sorted(iteritems(state.serial_no_batch_purchase_details))
+	for i in range(0, len(serial_nos), serial_nos_per_row):
+		rows.append([company, posting_date, warehouse_wise, "Serial No Purchase Dates", None, None, None,
+			0, 0, None, json.dumps(serial_nos[i:i + serial_nos_per_row], default=cstr)])
+
+	timestamp, user = now(), frappe.session.user
+	for i in range(0, len(rows), 500):
+		chunk = rows[i:i + 500]
+		frappe.db.sql("""
+			insert into `tabStock Ageing Snapshot`
+				(name, creation, modified, modified_by, owner, docstatus, {0})
+			values {1}
+		""".format(", ".join(snapshot_fields),
+			", ".join(["(" + ", ".join(["%s"] * (len(snapshot_fields) + 6)) + ")"] * len(chunk))),
+			tuple(v for row in chunk
+				for v in [frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0] + row))
+
+def update_stock_ageing_snapshots(company=None, keep_months=12):
+	'''Advance the snapshots of each company month by month up to the end of the last month.
+		The first snapshot of a company is made for the end of the last month.
+
+	Runs daily, so that snapshots removed by backdated transactions are made again'''
+	from erpnext.stock.report.stock_ageing.stock_ageing import (get_new_state,
+		get_stock_ledger_entries, process_stock_ledger_entries)
+
+	to_date = get_last_day(add_months(nowdate(), -1))
+	companies = [company] if company else frappe.db.sql_list("select name from tabCompany")
+
+	for company in companies:
+		for warehouse_wise in (0, 1):
+			filters = frappe._dict({
+				"company": company,
+				"to_date": to_date,
+				"show_warehouse_wise_stock": warehouse_wise
+			})
+
+			item_details, state = {}, get_new_state()
+			from_date = load_stock_ageing_snapshot(filters, item_details, state)
+			if from_date and getdate(from_date) >= getdate(to_date):
+				continue
+
+			posting_date = get_last_day(add_days(from_date, 1)) if from_date else to_date
+			while getdate(posting_date) <= getdate(to_date):
+				filters.to_date = posting_date
+				process_stock_ledger_entries(filters,
+					get_stock_ledger_entries(filters, from_date), item_details, state)
+
+				save_stock_ageing_snapshot(company, posting_date, warehouse_wise, item_details, state)
+				frappe.db.commit()
+
+				from_date, posting_date = posting_date, get_last_day(add_days(posting_date, 1))
+
+		frappe.db.sql("""delete from `tabStock Ageing Snapshot`
+			where company=%s and posting_date<%s""", (company, add_months(to_date, -keep_months)))
+		frappe.cache().hdel("stock_ageing_snapshot_date", company)
+		frappe.db.commit()
+
+def invalidate_stock_ageing_snapshots(sle):
+	'''Remove the snapshots on or after the posting date of a backdated stock ledger entry'''
+	last_snapshot_date = frappe.cache().hget("stock_ageing_snapshot_date", sle.company,
+		lambda: cstr(frappe.db.sql("""select max(posting_date) from `tabStock Ageing Snapshot`
+			where company=%s""", sle.company)[0][0]) or "none")
+
+	if last_snapshot_date != "none" and getdate(sle.posting_date) <= getdate(last_snapshot_date):
+		frappe.db.sql("""delete from `tabStock Ageing Snapshot`
+			where company=%s and posting_date>=%s""", (sle.company, sle.posting_date))
+		frappe.cache().hdel("stock_ageing_snapshot_date", sle.company)
+
+def on_doctype_update():
+	frappe.db.add_index("Stock Ageing Snapshot", ["company", "posting_date"])
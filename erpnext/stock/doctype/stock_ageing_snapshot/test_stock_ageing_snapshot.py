@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import flt, nowdate, add_months, get_last_day
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.doctype.stock_ageing_snapshot.stock_ageing_snapshot import update_stock_ageing_snapshots
+from erpnext.stock.report.stock_ageing.stock_ageing import get_fifo_queue, get_stock_ledger_entries
+
+class TestStockAgeingSnapshot(unittest.TestCase):
+	def test_fifo_queue_from_snapshot(self):
+		item_code = "_Test Item"
+		last_month_end = get_last_day(add_months(nowdate(), -1))
+
+		make_stock_entry(item_code=item_code, qty=10, to_warehouse="_Test Warehouse - _TC",
+			rate=100, posting_date=add_months(nowdate(), -3))
+		make_stock_entry(item_code=item_code, qty=5, to_warehouse="_Test Warehouse - _TC",
+			rate=100, posting_date=add_months(nowdate(), -2))
+		make_stock_entry(item_code=item_code, qty=12, from_warehouse="_Test Warehouse - _TC",
+			to_warehouse="_Test Warehouse 1 - _TC", posting_date=add_months(nowdate(), -2))
+		make_stock_entry(item_code=item_code, qty=3, from_warehouse="_Test Warehouse 1 - _TC",
+			posting_date=last_month_end)
+
+		update_stock_ageing_snapshots("_Test Company")
+		self.assertTrue(frappe.db.exists("Stock Ageing Snapshot",
+			{"company": "_Test Company", "posting_date": last_month_end, "warehouse_wise": 1}))
+
+		make_stock_entry(item_code=item_code, qty=4, from_warehouse="_Test Warehouse 1 - _TC",
+			to_warehouse="_Test Warehouse - _TC", posting_date=nowdate())
+
+		for warehouse_wise in (0, 1):
+			filters = frappe._dict({
+				"company": "_Test Company",
+				"to_date": nowdate(),
+				"item_code": item_code,
+				"show_warehouse_wise_stock": warehouse_wise
+			})
+
+			from_snapshot = get_fifo_queue(filters)
+			recomputed = get_fifo_queue(filters, get_stock_ledger_entries(filters))
+
+			self.assertEqual(sorted(from_snapshot), sorted(recomputed))
+			for key, item_dict in recomputed.items():
+				self.assertEqual(from_snapshot[key]["fifo_queue"], item_dict["fifo_queue"])
+				self.assertEqual(flt(from_snapshot[key]["total_qty"]), flt(item_dict["total_qty"]))
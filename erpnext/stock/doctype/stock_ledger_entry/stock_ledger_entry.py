@@ -10,6 +10,8 @@ from frappe.model.document import Document
 from datetime import date
 from erpnext.controllers.item_variant import ItemTemplateCannotHaveStock
 from erpnext.accounts.utils import get_fiscal_year
+from erpnext.stock.doctype.batch_balance.batch_balance import update_batch_balance
+from erpnext.stock.doctype.stock_ageing_snapshot.stock_ageing_snapshot import invalidate_stock_ageing_snapshots
 
 class StockFreezeError(frappe.ValidationError): pass
 
@@ -39,10 +41,13 @@ class StockLedgerEntry(Document):
 		self.actual_amt_check()
 
 		if self.batch_no:
+			update_batch_balance(self)
 			batch = frappe.get_doc("Batch", self.batch_no)
 			batch.calculate_batch_qty()
 			batch.save()
 
+		invalidate_stock_ageing_snapshots(self)
+
 		if not self.get("via_landed_cost_voucher") and self.voucher_type != 'Stock Reconciliation':
 			from erpnext.stock.doctype.serial_no.serial_no import process_serial_no
 			process_serial_no(self)
@@ -50,10 +55,11 @@ class StockLedgerEntry(Document):
 	#check for item quantity available in stock
 	def actual_amt_check(self):
 		if self.batch_no and not self.get("allow_negative_stock"):
+			# the balance is updated after this check, on submit
 			batch_bal_after_transaction = flt(frappe.db.sql("""select sum(actual_qty)
-				from `tabStock Ledger Entry`
+				from `tabBatch Balance`
 				where warehouse=%s and item_code=%s and batch_no=%s""",
-				(self.warehouse, self.item_code, self.batch_no))[0][0])
+				(self.warehouse, self.item_code, self.batch_no))[0][0]) + flt(self.actual_qty)
 
 			if batch_bal_after_transaction < 0:
 				frappe.throw(_("Stock balance in Batch {0} will become negative {1} for Item {2} at Warehouse {3}")
@@ -98,6 +98,7 @@ class Warehouse(NestedSet):
 
 	def recalculate_bin_qty(self, new_name):
 		from erpnext.stock.stock_balance import repost_stock
+		from erpnext.stock.doctype.batch_balance.batch_balance import rebuild_batch_balance
 		frappe.db.auto_commit_on_many_writes = 1
 		existing_allow_negative_stock = frappe.db.get_value("Stock Settings", None, "allow_negative_stock")
 		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", 1)
@@ -111,6 +112,8 @@ class Warehouse(NestedSet):
 		for item_code in repost_stock_for_items:
 			repost_stock(item_code, new_name)
 
+		rebuild_batch_balance(warehouse=new_name)
+
 		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", existing_allow_negative_stock)
 		frappe.db.auto_commit_on_many_writes = 0
 
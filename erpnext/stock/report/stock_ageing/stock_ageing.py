@@ -6,6 +6,7 @@ import frappe
 from frappe import _
 from frappe.utils import date_diff, flt
 from six import iteritems
+from collections import deque, OrderedDict
 from erpnext.stock.doctype.serial_no.serial_no import get_serial_nos
 
 def execute(filters=None):
@@ -136,18 +137,57 @@ def get_columns(filters):
 
 def get_fifo_queue(filters, sle=None):
 	item_details = {}
-	transferred_item_details = {}
-	serial_no_batch_purchase_details = {}
+	state = get_new_state()
 
 	if sle == None:
-		sle = get_stock_ledger_entries(filters)
+		from_date = None
+		if not filters.get("warehouse"):
+			from erpnext.stock.doctype.stock_ageing_snapshot.stock_ageing_snapshot import load_stock_ageing_snapshot
+			from_date = load_stock_ageing_snapshot(filters, item_details, state)
+
+		sle = get_stock_ledger_entries(filters, from_date)
+
+	process_stock_ledger_entries(filters, sle, item_details, state)
+
+	for key, item_dict in iteritems(item_details):
+		item_dict["fifo_queue"] = get_fifo_queue_list(item_dict)
+
+	return item_details
+
+def get_new_state():
+	return frappe._dict({
+		# batches moved out by a voucher, added back to the queue when the voucher moves them in
+		"transferred_item_details": {},
+		# the first purchase date of the serial nos
+		"serial_no_batch_purchase_details": {}
+	})
+
+def get_new_item_dict(details):
+	return {
+		"details": details,
+		# qty batches as [qty, posting_date], oldest first
+		"fifo_queue": deque(),
+		# serial nos in stock, as serial no: [serial_no, posting_date]
+		"serial_nos": OrderedDict()
+	}
+
+def get_fifo_queue_list(item_dict):
+	return list(item_dict["fifo_queue"]) + list(item_dict["serial_nos"].values())
+
+def process_stock_ledger_entries(filters, sle, item_details, state):
+	"""Move the FIFO queues of the items forward with the given stock ledger entries"""
+	transferred_item_details = state.transferred_item_details
+	serial_no_batch_purchase_details = state.serial_no_batch_purchase_details
 
 	for d in sle:
 		key = (d.name, d.warehouse) if filters.get('show_warehouse_wise_stock') else d.name
-		item_details.setdefault(key, {"details": d, "fifo_queue": []})
+		if key not in item_details:
+			item_details[key] = get_new_item_dict(d)
+
 		fifo_queue = item_details[key]["fifo_queue"]
+		serial_nos = item_details[key]["serial_nos"]
 
-		transferred_item_details.setdefault((d.voucher_no, d.name), [])
+		transferred = transferred_item_details.setdefault((d.voucher_no, d.name), deque())
 
 		if d.voucher_type == "Stock Reconciliation":
 			d.actual_qty = flt(d.qty_after_transaction) - flt(item_details[key].get("qty_after_transaction", 0))
@@ -155,25 +195,22 @@ def get_fifo_queue(filters, sle=None):
 		serial_no_list = get_serial_nos(d.serial_no) if d.serial_no else []
 
 		if d.actual_qty > 0:
-			if transferred_item_details.get((d.voucher_no, d.name)):
-				batch = transferred_item_details[(d.voucher_no, d.name)][0]
-				fifo_queue.append(batch)
-				transferred_item_details[((d.voucher_no, d.name))].pop(0)
+			if transferred:
+				fifo_queue.append(transferred.popleft())
 			else:
 				if serial_no_list:
 					for serial_no in serial_no_list:
 						if serial_no_batch_purchase_details.get(serial_no):
-							fifo_queue.append([serial_no, serial_no_batch_purchase_details.get(serial_no)])
+							serial_nos[serial_no] = [serial_no, serial_no_batch_purchase_details.get(serial_no)]
 						else:
 							serial_no_batch_purchase_details.setdefault(serial_no, d.posting_date)
-							fifo_queue.append([serial_no, d.posting_date])
+							serial_nos[serial_no] = [serial_no, d.posting_date]
 				else:
 					fifo_queue.append([d.actual_qty, d.posting_date])
 		else:
 			if serial_no_list:
-				for serial_no in fifo_queue:
-					if serial_no[0] in serial_no_list:
-						fifo_queue.remove(serial_no)
+				for serial_no in serial_no_list:
+					serial_nos.pop(serial_no, None)
 			else:
 				qty_to_pop = abs(d.actual_qty)
 				while qty_to_pop:
@@ -182,11 +219,11 @@ def get_fifo_queue(filters, sle=None):
 						# if batch qty > 0
 						# not enough or exactly same qty in current batch, clear batch
 						qty_to_pop -= batch[0]
-						transferred_item_details[(d.voucher_no, d.name)].append(fifo_queue.pop(0))
+						transferred.append(fifo_queue.popleft())
 					else:
 						# all from current batch
 						batch[0] -= qty_to_pop
-						transferred_item_details[(d.voucher_no, d.name)].append([qty_to_pop, batch[1]])
+						transferred.append([qty_to_pop, batch[1]])
 						qty_to_pop = 0
 
 		item_details[key]["qty_after_transaction"] = d.qty_after_transaction
@@ -196,9 +233,11 @@ def get_fifo_queue(filters, sle=None):
 		else:
 			item_details[key]["total_qty"] += d.actual_qty
 
-	return item_details
+def get_stock_ledger_entries(filters, from_date=None):
+	sle_conditions = get_sle_conditions(filters)
+	if from_date:
+		sle_conditions += " and posting_date > %(from_date)s"
 
-def get_stock_ledger_entries(filters):
 	return frappe.db.sql("""select
 			item.name, item.item_name, item_group, brand, description, item.stock_uom,
 			actual_qty, posting_date, voucher_type, voucher_no, serial_no, batch_no, qty_after_transaction, warehouse
@@ -211,7 +250,7 @@ def get_stock_ledger_entries(filters):
 			{sle_conditions}
 			order by posting_date, posting_time, sle.creation, actual_qty""" #nosec
 		.format(item_conditions=get_item_conditions(filters),
-			sle_conditions=get_sle_conditions(filters)), filters, as_dict=True)
+			sle_conditions=sle_conditions), dict(filters, from_date=from_date), as_dict=True)
 
 def get_item_conditions(filters):
 	conditions = []
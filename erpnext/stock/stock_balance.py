@@ -7,6 +7,8 @@ from frappe.utils import flt, cstr, nowdate, nowtime
 from erpnext.stock.utils import update_bin
 from erpnext.stock.stock_ledger import update_entries_after
 from erpnext.controllers.stock_controller import update_gl_entries_after
+from erpnext.stock.doctype.projected_qty_ledger_entry.projected_qty_ledger_entry import (projected_qty_fields,
+	rebuild_projected_qty_ledger, get_projected_qty_from_ledger)
 
 def repost(only_actual=False, allow_negative_stock=False, allow_zero_rate=False, only_bin=False):
 	"""
@@ -47,7 +49,8 @@ def repost_stock(item_code, warehouse, allow_zero_rate=False,
 			"reserved_qty": get_reserved_qty(item_code, warehouse),
 			"indented_qty": get_indented_qty(item_code, warehouse),
 			"ordered_qty": get_ordered_qty(item_code, warehouse),
-			"planned_qty": get_planned_qty(item_code, warehouse)
+			"planned_qty": get_planned_qty(item_code, warehouse),
+			"reserved_qty_for_production": get_reserved_qty_for_production(item_code, warehouse)
 		}
 		if only_bin:
 			qty_dict.update({
@@ -55,6 +58,7 @@ def repost_stock(item_code, warehouse, allow_zero_rate=False,
 			})
 
 		update_bin_qty(item_code, warehouse, qty_dict)
+		rebuild_projected_qty_ledger(item_code, warehouse)
 
 def repost_actual_qty(item_code, warehouse, allow_zero_rate=False, allow_negative_stock=False):		update_entries_after({ "item_code": item_code, "warehouse": warehouse },
 		allow_zero_rate=allow_zero_rate, allow_negative_stock=allow_negative_stock)
@@ -93,6 +97,7 @@ def get_reserved_qty(item_code, warehouse):
 					where item_code = %s and warehouse = %s
 					and parenttype="Sales Order"
 					and item_code != parent_item
+					and exists (select name from `tabItem` where name = dnpi_in.item_code and is_stock_item = 1)
 					and exists (select * from `tabSales Order` so
 					where name = dnpi_in.parent and docstatus = 1 and status != 'Closed')
 				) dnpi)
@@ -102,6 +107,7 @@ def get_reserved_qty(item_code, warehouse):
 				from `tabSales Order Item` so_item
 				where item_code = %s and warehouse = %s
 				and (so_item.delivered_by_supplier is null or so_item.delivered_by_supplier = 0)
+				and exists (select name from `tabItem` where name = so_item.item_code and is_stock_item = 1)
 				and exists(select * from `tabSales Order` so
 					where so.name = so_item.parent and so.docstatus = 1
 					and so.status != 'Closed'))
@@ -117,7 +123,8 @@ def get_indented_qty(item_code, warehouse):
 		from `tabMaterial Request Item` mr_item, `tabMaterial Request` mr
 		where mr_item.item_code=%s and mr_item.warehouse=%s
 		and mr_item.qty > mr_item.ordered_qty and mr_item.parent=mr.name
-		and mr.status!='Stopped' and mr.docstatus=1""", (item_code, warehouse))
+		and mr.status!='Stopped' and mr.docstatus=1
+		and exists (select name from `tabItem` where name = mr_item.item_code and is_stock_item = 1)""", (item_code, warehouse))
 
 	return flt(indented_qty[0][0]) if indented_qty else 0
 
@@ -128,7 +135,8 @@ def get_ordered_qty(item_code, warehouse):
 		where po_item.item_code=%s and po_item.warehouse=%s
 		and po_item.qty > po_item.received_qty and po_item.parent=po.name
 		and po.status not in ('Closed', 'Delivered') and po.docstatus=1
-		and po_item.delivered_by_supplier = 0""", (item_code, warehouse))
+		and po_item.delivered_by_supplier = 0
+		and exists (select name from `tabItem` where name = po_item.item_code and is_stock_item = 1)""", (item_code, warehouse))
 
 	return flt(ordered_qty[0][0]) if ordered_qty else 0
 
@@ -136,10 +144,73 @@ def get_planned_qty(item_code, warehouse):
 	planned_qty = frappe.db.sql("""
 		select sum(qty - produced_qty) from `tabWork Order`
 		where production_item = %s and fg_warehouse = %s and status not in ("Stopped", "Completed")
-		and docstatus=1 and qty > produced_qty""", (item_code, warehouse))
+		and docstatus=1 and qty > produced_qty
+		and exists (select name from `tabItem` where name = production_item and is_stock_item = 1)""", (item_code, warehouse))
 
 	return flt(planned_qty[0][0]) if planned_qty else 0
 
+def get_reserved_qty_for_production(item_code, warehouse):
+	reserved_qty_for_production = frappe.db.sql("""
+		select sum(item.required_qty - item.transferred_qty)
+		from `tabWork Order` pro, `tabWork Order Item` item
+		where
+			item.item_code = %s
+			and item.parent = pro.name
+			and pro.docstatus = 1
+			and item.source_warehouse = %s
+			and pro.status not in ("Stopped", "Completed")
+			and item.required_qty > item.transferred_qty
+			and exists (select name from `tabItem` where name = item.item_code and is_stock_item = 1)""",
+		(item_code, warehouse))
+
+	return flt(reserved_qty_for_production[0][0]) if reserved_qty_for_production else 0
+
+def verify_bin_qty(item_code=None, warehouse=None, fix=False):
+	"""
+	Compare the reserved, ordered, indented and planned quantities of the bins, updated from the
+	Projected Qty Ledger, with the quantities computed from the transactions. Returns the drift.
+
+	If `fix` is set, the bins and the ledger are reset to the computed quantities.
+	"""
+	conditions, values = "", []
+	for fieldname, value in (("item_code", item_code), ("warehouse", warehouse)):
+		if value:
+			conditions += " and {0} = %s".format(fieldname)
+			values.append(value)
+
+	drift = []
+	for bin in frappe.db.sql("""select item_code, warehouse, {0}
+		from tabBin where 1=1 {1}""".format(", ".join(projected_qty_fields), conditions), #nosec
+		tuple(values), as_dict=1):
+		qty_dict = {
+			"reserved_qty": get_reserved_qty(bin.item_code, bin.warehouse),
+			"indented_qty": get_indented_qty(bin.item_code, bin.warehouse),
+			"ordered_qty": get_ordered_qty(bin.item_code, bin.warehouse),
+			"planned_qty": get_planned_qty(bin.item_code, bin.warehouse),
+			"reserved_qty_for_production": get_reserved_qty_for_production(bin.item_code, bin.warehouse)
+		}
+
+		bin_drift = []
+		ledger_qty = get_projected_qty_from_ledger(bin.item_code, bin.warehouse)
+		for qty_field, qty in qty_dict.items():
+			if flt(bin.get(qty_field), 6) != flt(qty, 6) or flt(ledger_qty.get(qty_field), 6) != flt(qty, 6):
+				bin_drift.append(frappe._dict({
+					"item_code": bin.item_code,
+					"warehouse": bin.warehouse,
+					"qty_field": qty_field,
+					"bin_qty": flt(bin.get(qty_field)),
+					"ledger_qty": flt(ledger_qty.get(qty_field)),
+					"expected_qty": qty
+				}))
+
+		if fix and bin_drift:
+			update_bin_qty(bin.item_code, bin.warehouse, qty_dict)
+			rebuild_projected_qty_ledger(bin.item_code, bin.warehouse)
+
+		drift.extend(bin_drift)
+
+	return drift
+
 
 def update_bin_qty(item_code, warehouse, qty_dict=None):
 	from erpnext.stock.utils import get_bin
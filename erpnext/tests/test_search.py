@@ -12,5 +12,40 @@ class TestSearch(unittest.TestCase):
 		result = [['found' for x in y if x=="Lead"] for y in output]
 		self.assertTrue(['found'] in result)
 
+	def test_item_query_with_search_tokens(self):
+		from erpnext.controllers.queries import item_query
+		from erpnext.utilities.doctype.search_token.search_token import update_search_tokens
+
+		item = frappe.get_doc("Item", "_Test Item Home Desktop 100")
+		update_search_tokens(item)
+
+		for txt in ("home desk", "_Test Item Home", "DESKTOP 10"):
+			result = item_query("Item", txt, "name", 0, 20, {})
+			self.assertTrue(item.name in [d[0] for d in result])
+
+		result = item_query("Item", "desktop home 200", "name", 0, 20, {})
+		self.assertFalse(item.name in [d[0] for d in result])
+
+	def test_item_query_by_prefix(self):
+		from erpnext.controllers.queries import item_query
+		from erpnext.utilities.doctype.search_token.search_token import update_search_tokens
+
+		item = frappe.get_doc("Item", "_Test Item Home Desktop 100")
+		if not [d for d in item.barcodes if d.barcode == "4006381333931"]:
+			item.append("barcodes", {"barcode": "4006381333931"})
+			item.save()
+
+		# not found by the tokens, found by the start of the barcode
+		frappe.db.sql("""delete from `tabSearch Token`
+			where reference_doctype='Item' and reference_name=%s""", item.name)
+
+		result = item_query("Item", "40063813", "name", 0, 20, {})
+		self.assertTrue(item.name in [d[0] for d in result])
+
+		result = item_query("Item", "8133393", "name", 0, 20, {})
+		self.assertFalse(item.name in [d[0] for d in result])
+
+		update_search_tokens(item)
+
 	def tearDown(self):
 		frappe.local.lang = 'en'
\ No newline at end of file
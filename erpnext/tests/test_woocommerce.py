@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 import unittest, frappe, requests, os, time, erpnext
-from erpnext.erpnext_integrations.connectors.woocommerce_connection import order
+from erpnext.erpnext_integrations.connectors.woocommerce_connection import (order, process_queued_orders,
+	get_order_request_name)
 
 class TestWoocommerce(unittest.TestCase):
 	def setUp(self):
@@ -31,6 +32,21 @@ class TestWoocommerce(unittest.TestCase):
 		self.assertTrue(frappe.get_value("Customer",{"woocommerce_email":"tony@gmail.com"}))
 		self.assertTrue(frappe.get_value("Item",{"woocommerce_id": 56}))
 		self.assertTrue(frappe.get_value("Sales Order",{"woocommerce_id":75}))
+
+		# a webhook delivered again is stored once
+		order()
+		self.assertEqual(frappe.db.count("Sales Order", {"woocommerce_id": 75}), 1)
+		self.assertEqual(frappe.db.count("Integration Request", {"name": get_order_request_name(75)}), 1)
+
+		request = frappe.get_doc("Integration Request", get_order_request_name(75))
+		self.assertEqual(request.status, "Completed")
+		self.assertEqual(request.reference_docname, frappe.get_value("Sales Order", {"woocommerce_id": 75}))
+
+		# left queued by a worker which stopped after the order was created
+		request.db_set("status", "Queued")
+		process_queued_orders()
+		self.assertEqual(frappe.db.count("Sales Order", {"woocommerce_id": 75}), 1)
+		self.assertEqual(frappe.db.get_value("Integration Request", request.name, "status"), "Completed")
 		frappe.flags.woocomm_test_order_data = {}
 
 def emulate_request():
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import re
+import frappe
+from frappe.utils import cstr, now
+from frappe.model.document import Document
+
+exclude_from_linked_with = True
+
+# fields indexed along with the search fields of the doctype
+search_token_fields = {
+	"Item": ["item_code", "item_name", "item_group"],
+	"Customer": ["customer_name"],
+	"Supplier": ["supplier_name"]
+}
+
+class SearchToken(Document):
+	pass
+
+def get_words(txt):
+	'''Split the text into lower case words, at spaces, punctuation and underscores'''
+	return [word[:140] for word in re.split(r"[\W_]+", cstr(txt).lower(), flags=re.UNICODE) if word]
+
+def get_search_token_fieldnames(doctype):
+	fieldnames = ["name"] + search_token_fields[doctype]
+	for fieldname in frappe.get_meta(doctype, cached=True).get_search_fields():
+		if fieldname not in fieldnames and fieldname != "description":
+			fieldnames.append(fieldname)
+
+	return fieldnames
+
+def get_tokens(doc):
+	values = [doc.get(fieldname) for fieldname in get_search_token_fieldnames(doc.doctype)]
+	if doc.doctype == "Item":
+		values.extend([d.barcode for d in doc.get("barcodes", [])])
+
+	tokens = set()
+	for value in values:
+		tokens.update(get_words(value))
+
+	return tokens
+
+def update_search_tokens(doc, method=None):
+	'''Called on update of Item, Customer and Supplier, replaces the search tokens of the document'''
+	frappe.db.sql("""delete from `tabSearch Token`
+		where reference_doctype=%s and reference_name=%s""", (doc.doctype, doc.name))
+
+	make_search_tokens([[doc.doctype, doc.name, token] for token in get_tokens(doc)])
+
+def delete_search_tokens(doc, method=None):
+	frappe.db.sql("""delete from `tabSearch Token`
+		where reference_doctype=%s and reference_name=%s""", (doc.doctype, doc.name))
+
+def rename_search_tokens(doc, method=None, old_name=None, new_name=None, merge=False):
+	frappe.db.sql("""delete from `tabSearch Token`
+		where reference_doctype=%s and reference_name in (%s, %s)""", (doc.doctype, old_name, new_name))
+
+	update_search_tokens(frappe.get_doc(doc.doctype, new_name))
+
+def make_search_tokens(rows):
+	timestamp, user = now(), frappe.session.user
+	for i in range(0, len(rows), 500):
+		chunk = rows[i:i + 500]
+		frappe.db.sql("""
+			insert into `tabSearch Token`
+				(name, creation, modified, modified_by, owner, docstatus,
+				reference_doctype, reference_name, token)
+			values {0}
+		""".format(", ".join(["(%s, %s, %s, %s, %s, 0, %s, %s, %s)"] * len(chunk))),
+			tuple(v for row in chunk
+				for v in [frappe.generate_hash(length=10), timestamp, timestamp, user, user] + row))
+
+def rebuild_search_tokens(doctype=None):
+	'''Index all the documents of the doctypes, run after the search fields are changed'''
+	for doctype in ([doctype] if doctype else search_token_fields):
+		frappe.db.sql("delete from `tabSearch Token` where reference_doctype=%s", doctype)
+
+		barcodes = {}
+		if doctype == "Item":
+			for parent, barcode in frappe.db.sql("""select parent, barcode from `tabItem Barcode`
+				where parenttype='Item'"""):
+				barcodes.setdefault(parent, []).append(barcode)
+
+		rows = []
+		fieldnames = get_search_token_fieldnames(doctype)
+		for d in frappe.db.sql("select {0} from `tab{1}`".format(", ".join(fieldnames), doctype)):
+			tokens = set()
+			for value in list(d) + barcodes.get(d[0], []):
+				tokens.update(get_words(value))
+
+			rows.extend([[doctype, d[0], token] for token in tokens])
+
+			if len(rows) >= 5000:
+				make_search_tokens(rows)
+				rows = []
+
+		make_search_tokens(rows)
+
+def get_search_token_join(doctype, txt):
+	'''Returns the join on the documents whose tokens start with each word of the text, for link
+		queries, and the query values. Returns `None` if there are no words in the text'''
+	words = get_words(txt)[:5]
+	if not words:
+		return None, {}
+
+	values = {"search_token_doctype": doctype}
+	for i, word in enumerate(words):
+		values["search_token_{0}".format(i)] = word + "%"
+
+	return """inner join (
+			select reference_name from `tabSearch Token`
+			where reference_doctype = %(search_token_doctype)s and ({or_conditions})
+			group by reference_name
+			having {and_conditions}
+		) search_token on search_token.reference_name = `tab{doctype}`.name""".format(
+			doctype=doctype,
+			or_conditions=" or ".join(["token like %(search_token_{0})s".format(i) for i in range(len(words))]),
+			and_conditions=" and ".join(["sum(token like %(search_token_{0})s) > 0".format(i)
+				for i in range(len(words))])), values
+
+def on_doctype_update():
+	frappe.db.add_index("Search Token", ["reference_doctype", "token"])